@@ -96,6 +96,24 @@ def create_app():
     except ImportError:
         pass
 
+    try:
+        from modules.pdf_jobs import pdf_jobs_bp
+        app.register_blueprint(pdf_jobs_bp)
+    except ImportError:
+        pass
+
+    try:
+        from modules.return_packet import packet_bp
+        app.register_blueprint(packet_bp)
+    except ImportError:
+        pass
+
+    try:
+        from modules.smart_ledger import smart_ledger_bp
+        app.register_blueprint(smart_ledger_bp, url_prefix='/ledger')
+    except ImportError:
+        pass
+
     # Database tables are managed by Flask-Migrate
     # Use 'flask db upgrade' to create/update tables
 
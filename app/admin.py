@@ -97,7 +97,8 @@ def tax_rules_by_year(year):
         'standardDeductions': rules['standard_deductions'],
         'taxBrackets': rules['tax_brackets'],
         'selfEmploymentTaxRate': rules['self_employment_tax_rate'],
-        'qbiDeductionRate': rules['qbi_deduction_rate']
+        'qbiDeductionRate': rules['qbi_deduction_rate'],
+        'standardMileageRate': rules['standard_mileage_rate']
     })
 
 
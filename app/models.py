@@ -104,10 +104,33 @@ class User(UserMixin, db.Model):
         Returns:
             bool: True if user has access to the feature, False otherwise
         """
+        return feature_name in self.get_features()
+
+    def has_any_feature(self, *feature_names) -> bool:
+        """
+        Check if user's subscription includes at least one of several features
+        with a single subscription lookup.
+
+        Args:
+            feature_names: Features to check
+
+        Returns:
+            bool: True if user has access to any of the features
+        """
+        features = self.get_features()
+        return any(feature_name in features for feature_name in feature_names)
+
+    def get_features(self) -> list:
+        """
+        Get the features included in the user's active subscription.
+
+        Returns:
+            list: Feature names (empty if there is no active subscription)
+        """
         active_subscription = self.subscriptions.filter_by(status='active').first()
 
         if not active_subscription:
-            return False
+            return []
 
         # Feature matrix by subscription type
         feature_map = {
@@ -143,8 +166,7 @@ class User(UserMixin, db.Model):
             ],
         }
 
-        allowed_features = feature_map.get(active_subscription.subscription_type, [])
-        return feature_name in allowed_features
+        return feature_map.get(active_subscription.subscription_type, [])
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -471,6 +493,10 @@ class Contractor(db.Model):
     # Relationships
     payments = db.relationship('ContractorPayment', backref='contractor', lazy='dynamic')
 
+    __table_args__ = (
+        db.Index('ix_contractors_user_name', 'user_id', 'name'),
+    )
+
     def __repr__(self):
         return f'<Contractor {self.name}>'
 
@@ -496,6 +522,30 @@ class ContractorPayment(db.Model):
         return f'<ContractorPayment ${self.amount} to Contractor {self.contractor_id}>'
 
 
+class ContractorPaymentRollup(db.Model):
+    """Per-tax-year payment totals for each contractor, maintained on payment writes"""
+    __tablename__ = 'contractor_payment_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    contractor_id = db.Column(db.Integer, db.ForeignKey('contractors.id'), nullable=False)
+    tax_year = db.Column(db.Integer, nullable=False)
+
+    # Aggregates over ContractorPayment rows in the tax year
+    total_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'contractor_id', 'tax_year', name='uq_contractor_payment_rollups_key'),
+        db.Index('ix_contractor_payment_rollups_user_year', 'user_id', 'tax_year'),
+    )
+
+    def __repr__(self):
+        return f'<ContractorPaymentRollup {self.tax_year} - Contractor {self.contractor_id}: ${self.total_amount}>'
+
+
 class Form1099(db.Model):
     """Generated 1099-NEC forms"""
     __tablename__ = 'forms_1099'
@@ -518,4 +568,280 @@ class Form1099(db.Model):
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
     def __repr__(self):
-        return f'<Form1099 {self.tax_year} - Contractor {self.contractor_id}>'
\ No newline at end of file
+        return f'<Form1099 {self.tax_year} - Contractor {self.contractor_id}>'
+
+class Document(db.Model):
+    """Uploaded tax document index (replaces per-user metadata.json files)"""
+    __tablename__ = 'documents'
+
+    id = db.Column(db.String(36), primary_key=True)  # UUID, used in document URLs
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    # File information
+    original_filename = db.Column(db.String(255), nullable=False)
+    unique_filename = db.Column(db.String(255), nullable=False)
+    file_extension = db.Column(db.String(10))
+    file_path = db.Column(db.String(512), nullable=False)
+    content_hash = db.Column(db.String(64))  # SHA-256 of file contents
+
+    # Classification
+    category = db.Column(db.String(64), default='other')
+    detected_type = db.Column(db.String(64), default='unknown')
+
+    # Extraction and analysis results
+    extracted_text = db.Column(db.Text)  # Full extracted text; extracted_data keeps a preview
+    extracted_data = db.Column(JSON)
+    ai_analysis = db.Column(JSON)
+    analyzed_at = db.Column(db.DateTime)
+
+    # Extended data storage
+    data = db.Column(JSON)  # For extensibility without schema changes
+
+    # Timestamps
+    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_documents_user_upload_date', 'user_id', 'upload_date'),
+        db.Index('ix_documents_user_category', 'user_id', 'category', 'upload_date'),
+        db.Index('ix_documents_user_detected_type', 'user_id', 'detected_type'),
+        db.Index('ix_documents_user_content_hash', 'user_id', 'content_hash'),
+    )
+
+    def to_dict(self):
+        """Serialize to the metadata dictionary shape used by the documents views"""
+        metadata = dict(self.data or {})
+        metadata.update({
+            'id': self.id,
+            'user_id': self.user_id,
+            'original_filename': self.original_filename,
+            'unique_filename': self.unique_filename,
+            'category': self.category,
+            'file_extension': self.file_extension,
+            'file_path': self.file_path,
+            'content_hash': self.content_hash,
+            'detected_type': self.detected_type,
+            'upload_date': self.upload_date.isoformat() if self.upload_date else None,
+            'extracted_data': self.extracted_data or {},
+        })
+        if self.ai_analysis is not None:
+            metadata['ai_analysis'] = self.ai_analysis
+        if self.analyzed_at is not None:
+            metadata['analyzed_at'] = self.analyzed_at.isoformat()
+        return metadata
+
+    def __repr__(self):
+        return f'<Document {self.original_filename} ({self.category})>'
+
+
+class LedgerTransaction(db.Model):
+    """Smart Ledger transaction (negative amounts are expenses, positive are income)"""
+    __tablename__ = 'ledger_transactions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    tax_year = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+
+    # Transaction details
+    amount = db.Column(db.Numeric(12, 2), nullable=False)
+    merchant = db.Column(db.String(255))
+    description = db.Column(db.Text)
+
+    # Categorization
+    category = db.Column(db.String(50), nullable=False, default='uncategorized')
+    deductible_percentage = db.Column(db.Integer, nullable=False, default=0)
+    deductible_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    confidence = db.Column(db.Integer)
+    categorized_by = db.Column(db.String(10), default='rules')  # rules, ai or user
+    source = db.Column(db.String(20), default='manual')  # manual, import, bank, etc.
+    external_id = db.Column(db.String(64))  # Bank's transaction ID (OFX FITID) for imported rows
+
+    # Receipt documenting the transaction
+    receipt_path = db.Column(db.String(500))
+    receipt_matched_by = db.Column(db.String(10))  # auto or user
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_ledger_transactions_user_year_date', 'user_id', 'tax_year', 'date'),
+        # Receipt matching looks up transactions still missing a receipt by amount, then date
+        db.Index(
+            'ix_ledger_transactions_unmatched_amount_date', 'user_id', 'amount', 'date',
+            postgresql_where=db.text('receipt_path IS NULL'),
+            sqlite_where=db.text('receipt_path IS NULL')
+        ),
+    )
+
+    def to_dict(self):
+        """Serialize for the Smart Ledger API"""
+        return {
+            'id': self.id,
+            'tax_year': self.tax_year,
+            'date': self.date.isoformat(),
+            'amount': float(self.amount),
+            'merchant': self.merchant,
+            'description': self.description,
+            'category': self.category,
+            'deductible_percentage': self.deductible_percentage,
+            'deductible_amount': float(self.deductible_amount or 0),
+            'confidence': self.confidence,
+            'categorized_by': self.categorized_by,
+            'source': self.source,
+            'has_receipt': bool(self.receipt_path),
+        }
+
+    def __repr__(self):
+        return f'<LedgerTransaction {self.date} ${self.amount} ({self.category})>'
+
+
+class LedgerCategoryRollup(db.Model):
+    """Per-tax-year category totals for each user's ledger, maintained on transaction writes"""
+    __tablename__ = 'ledger_category_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    tax_year = db.Column(db.Integer, nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+
+    # Aggregates over LedgerTransaction rows in the tax year and category
+    income_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    expense_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)  # Stored as a positive total
+    deductible_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'tax_year', 'category', name='uq_ledger_category_rollups_key'),
+    )
+
+    def __repr__(self):
+        return f'<LedgerCategoryRollup {self.tax_year} {self.category}: {self.transaction_count}>'
+
+
+class ReceiptUpload(db.Model):
+    """Receipt file a user uploaded to the Smart Ledger, looked up by file ID when linking"""
+    __tablename__ = 'receipt_uploads'
+
+    id = db.Column(db.String(36), primary_key=True)  # UUID file ID returned to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    original_filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(512), nullable=False)
+
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReceiptUpload {self.id} {self.original_filename}>'
+
+
+class LedgerDuplicateCandidate(db.Model):
+    """Possible duplicate ledger transactions waiting for the user to merge or dismiss"""
+    __tablename__ = 'ledger_duplicate_candidates'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('ledger_transactions.id'), nullable=False)  # Likely duplicate
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('ledger_transactions.id'), nullable=False)  # Transaction to keep
+
+    score = db.Column(db.Float, nullable=False)  # Merchant similarity, 0-1
+    reason = db.Column(db.String(50))
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending or dismissed; merged pairs go with their transaction
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('transaction_id', 'duplicate_of_id', name='uq_ledger_duplicate_candidates_pair'),
+        db.Index('ix_ledger_duplicate_candidates_user_status', 'user_id', 'status'),
+    )
+
+    def __repr__(self):
+        return f'<LedgerDuplicateCandidate {self.transaction_id} ~ {self.duplicate_of_id} ({self.status})>'
+
+
+class MileageTrip(db.Model):
+    """Vehicle trip in a user's mileage log"""
+    __tablename__ = 'mileage_trips'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    tax_year = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+
+    # Trip details
+    miles = db.Column(db.Numeric(8, 1), nullable=False)
+    business = db.Column(db.Boolean, nullable=False, default=True)  # Personal and commuting miles aren't deductible
+    purpose = db.Column(db.String(255))
+    origin = db.Column(db.String(255))
+    destination = db.Column(db.String(255))
+    vehicle = db.Column(db.String(100))
+    source = db.Column(db.String(20), default='manual')  # manual or import
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_mileage_trips_user_year_date', 'user_id', 'tax_year', 'date'),
+    )
+
+    def to_dict(self):
+        """Serialize for the mileage log API"""
+        return {
+            'id': self.id,
+            'tax_year': self.tax_year,
+            'date': self.date.isoformat(),
+            'miles': float(self.miles),
+            'business': self.business,
+            'purpose': self.purpose,
+            'origin': self.origin,
+            'destination': self.destination,
+            'vehicle': self.vehicle,
+            'source': self.source,
+        }
+
+    def __repr__(self):
+        return f'<MileageTrip {self.date} {self.miles} mi>'
+
+
+class MileageYearTotal(db.Model):
+    """Per-tax-year mileage totals for each user, maintained on trip writes"""
+    __tablename__ = 'mileage_year_totals'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    tax_year = db.Column(db.Integer, nullable=False)
+
+    # Aggregates over MileageTrip rows in the tax year
+    trip_count = db.Column(db.Integer, nullable=False, default=0)
+    business_miles = db.Column(db.Numeric(10, 1), nullable=False, default=0)
+    personal_miles = db.Column(db.Numeric(10, 1), nullable=False, default=0)
+    undocumented_trips = db.Column(db.Integer, nullable=False, default=0)  # Business trips with no purpose recorded
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'tax_year', name='uq_mileage_year_totals_key'),
+    )
+
+    def __repr__(self):
+        return f'<MileageYearTotal {self.tax_year}: {self.business_miles} business mi>'
+
+
+class DataVersion(db.Model):
+    """Per-user change counter for a group of tables, bumped in the same transaction as the writes"""
+    __tablename__ = 'data_versions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)  # 0 counts changes made for every user at once
+    scope = db.Column(db.String(50), nullable=False)  # Which data the counter covers, e.g. ledger
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'scope', name='uq_data_versions_key'),
+    )
+
+    def __repr__(self):
+        return f'<DataVersion {self.user_id} {self.scope}: {self.version}>'
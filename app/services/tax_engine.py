@@ -9,7 +9,7 @@ Based on the Tax Rules Administration System architecture.
 
 from typing import Dict, List, Optional, Any
 from datetime import datetime
-from app.models import BusinessProfile
+from app.models import BusinessProfile, MileageYearTotal
 
 
 # Multi-Year IRS Tax Rules (Historical and Projected)
@@ -34,6 +34,7 @@ DEFAULT_TAX_RULES = {
         'self_employment_tax_rate': 0.153,  # 15.3% (Social Security + Medicare)
         'qbi_deduction_rate': 0.20,  # 20% Qualified Business Income deduction
         'ss_wage_base': 160200,  # Social Security wage base for 2023
+        'standard_mileage_rate': 0.655,  # 65.5 cents per business mile
     },
     2024: {
         'standard_deductions': {
@@ -54,6 +55,7 @@ DEFAULT_TAX_RULES = {
         'self_employment_tax_rate': 0.153,  # 15.3% (Social Security + Medicare)
         'qbi_deduction_rate': 0.20,  # 20% Qualified Business Income deduction
         'ss_wage_base': 168600,  # Social Security wage base for 2024
+        'standard_mileage_rate': 0.67,  # 67 cents per business mile
     },
     2025: {
         'standard_deductions': {
@@ -74,6 +76,7 @@ DEFAULT_TAX_RULES = {
         'self_employment_tax_rate': 0.153,  # 15.3% (Social Security + Medicare)
         'qbi_deduction_rate': 0.20,  # 20% Qualified Business Income deduction
         'ss_wage_base': 176100,  # Social Security wage base for 2025
+        'standard_mileage_rate': 0.70,  # 70 cents per business mile
     },
     2026: {
         'standard_deductions': {
@@ -94,6 +97,7 @@ DEFAULT_TAX_RULES = {
         'self_employment_tax_rate': 0.153,  # 15.3% (Social Security + Medicare)
         'qbi_deduction_rate': 0.20,  # 20% Qualified Business Income deduction
         'ss_wage_base': 168600,  # Social Security wage base for 2026 (projected)
+        'standard_mileage_rate': 0.725,  # 72.5 cents per business mile
     }
 }
 
@@ -209,12 +213,22 @@ class TaxCalculationEngine:
             recommendations.append('Maintain home office square footage documentation')
             recommendations.append('Ensure exclusive business use of home office space')
 
-        # Vehicle deduction (high scrutiny item)
-        if profile.has_vehicle or (profile.vehicle_deduction and profile.vehicle_deduction > 0):
+        # Vehicle deduction (high scrutiny item), checked against the mileage log's yearly totals
+        mileage = self._mileage_totals(profile)
+        business_miles = float(mileage.business_miles) if mileage else 0
+        if profile.has_vehicle or business_miles or (profile.vehicle_deduction and profile.vehicle_deduction > 0):
             risk_score += 10
-            risk_factors.append('Vehicle deduction claimed')
-            recommendations.append('Maintain contemporaneous mileage logs')
-            recommendations.append('Document business purpose for each trip')
+            if business_miles:
+                risk_factors.append(f'Vehicle deduction claimed ({business_miles:,.0f} logged business miles)')
+            else:
+                risk_factors.append('Vehicle deduction claimed')
+                recommendations.append('Maintain contemporaneous mileage logs')
+            if mileage and mileage.undocumented_trips:
+                risk_score += 5
+                risk_factors.append(f'{mileage.undocumented_trips} logged business trips have no recorded purpose')
+                recommendations.append('Record the business purpose of every logged trip')
+            elif not business_miles:
+                recommendations.append('Document business purpose for each trip')
 
         # Loss patterns (hobby loss rules)
         if profile.reported_losses and profile.reported_losses >= 3:
@@ -362,12 +376,20 @@ class TaxCalculationEngine:
             opportunities.append('Claim home office deduction (simplified method)')
             total_savings += home_office_savings
 
-        # Vehicle deduction (if applicable)
-        if profile.has_vehicle or 'rideshare' in (profile.industry or '').lower():
-            vehicle_savings = 3500  # Standard mileage deduction, avg 5000 miles @ $0.70/mile
+        # Vehicle deduction from the mileage log's business miles at the standard mileage rate
+        mileage = self._mileage_totals(profile)
+        business_miles = float(mileage.business_miles) if mileage else 0
+        if business_miles:
+            rate = self.rules['standard_mileage_rate']
+            mileage_deduction = standard_mileage_deduction(business_miles, self.tax_year)
+            vehicle_savings = mileage_deduction * 0.22  # Assuming 22% marginal rate
             savings_breakdown['Vehicle/Mileage Deduction'] = vehicle_savings
-            opportunities.append('Maintain mileage logs for vehicle deduction')
+            opportunities.append(
+                f'Claim standard mileage deduction (${mileage_deduction:,.0f} for {business_miles:,.0f} miles at {rate * 100:g} cents/mile)'
+            )
             total_savings += vehicle_savings
+        elif profile.has_vehicle or 'rideshare' in (profile.industry or '').lower():
+            opportunities.append('Log business trips to claim the standard mileage deduction')
 
         # Equipment depreciation (Section 179)
         if profile.has_equipment_purchases:
@@ -397,6 +419,17 @@ class TaxCalculationEngine:
             'entity_recommendation': entity_recommendation
         }
 
+    def _mileage_totals(self, profile: BusinessProfile) -> Optional[MileageYearTotal]:
+        """
+        Precomputed mileage log totals for the profile's user in this tax year
+
+        Returns:
+            MileageYearTotal or None if no trips are logged
+        """
+        if not profile.user_id:
+            return None
+        return MileageYearTotal.query.filter_by(user_id=profile.user_id, tax_year=self.tax_year).first()
+
     def _recommend_entity_type(self, profile: BusinessProfile, revenue: float) -> str:
         """
         Recommend optimal entity type based on revenue and complexity
@@ -588,3 +621,32 @@ def estimate_quarterly_payments(profile: BusinessProfile, tax_year: int = 2025)
     """
     engine = TaxCalculationEngine(tax_year=tax_year)
     return engine.estimate_quarterly_tax_payments(profile)
+
+
+def get_standard_mileage_rate(tax_year: int) -> Optional[float]:
+    """
+    Get the standard mileage rate for a tax year
+
+    Args:
+        tax_year: Tax year
+
+    Returns:
+        float: Dollars per business mile, or None if the year isn't supported
+    """
+    rules = DEFAULT_TAX_RULES.get(tax_year)
+    return rules['standard_mileage_rate'] if rules else None
+
+
+def standard_mileage_deduction(business_miles: float, tax_year: int) -> float:
+    """
+    Calculate the standard mileage deduction for a year's business miles
+
+    Args:
+        business_miles: Business miles driven in the tax year
+        tax_year: Tax year whose rate applies
+
+    Returns:
+        float: Deduction in dollars (0 if the year isn't supported)
+    """
+    rate = get_standard_mileage_rate(tax_year)
+    return round(float(business_miles) * rate, 2) if rate else 0.0
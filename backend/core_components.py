@@ -3,12 +3,14 @@
 
 from flask import Flask, request, jsonify, session
 from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, JSON
+from sqlalchemy import Index, and_, case, event, func, inspect, select, true, tuple_
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, column_property, sessionmaker
 import openai
+import base64
 import json
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 import stripe
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
@@ -47,16 +49,212 @@ class SmartLedgerEntry(Base):
     __tablename__ = 'smart_ledger_entries'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, nullable=False)
+    # Fields feeding the readiness counters keep their old value on change
+    # (active_history) so the counters can be adjusted without a rescan
+    user_id = column_property(Column(Integer, nullable=False), active_history=True)
     amount = Column(Float, nullable=False)
     description = Column(String(500), nullable=False)
-    category = Column(String(100))  # AI-suggested category
+    category = column_property(Column(String(100)), active_history=True)  # AI-suggested category
     tax_deductible = Column(Boolean, default=False)
-    ai_confidence = Column(Float, default=0.0)  # How confident AI is in categorization
-    receipt_url = Column(String(500))
+    ai_confidence = column_property(Column(Float, default=0.0), active_history=True)  # How confident AI is in categorization
+    receipt_url = column_property(Column(String(500)), active_history=True)
     date = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Keyset pagination walks (date, id) newest first within a user
+        Index('ix_smart_ledger_entries_user_date_id', 'user_id', 'date', 'id'),
+        Index('ix_smart_ledger_entries_user_category_date_id', 'user_id', 'category', 'date', 'id'),
+    )
+
+class SmartLedgerReadiness(Base):
+    __tablename__ = 'smart_ledger_readiness'
+
+    # One row per user, maintained alongside smart_ledger_entries
+    user_id = Column(Integer, primary_key=True)
+    total_entries = Column(Integer, nullable=False, default=0)
+    categorized_entries = Column(Integer, nullable=False, default=0)  # category set with >0.7 confidence
+    entries_with_receipts = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+# =============================================================================
+# READINESS COUNTERS - Per-user totals kept in step with the ledger
+# =============================================================================
+
+# Minimum AI confidence for an entry to count as categorized
+CATEGORIZED_CONFIDENCE = 0.7
+
+_READINESS_FIELDS = ('user_id', 'category', 'ai_confidence', 'receipt_url')
+
+def _readiness_counts(values: Dict) -> Tuple[int, int, int]:
+    """(total, categorized, with receipt) contribution of one entry"""
+    categorized = bool(values['category']) and (values['ai_confidence'] or 0) > CATEGORIZED_CONFIDENCE
+    return 1, int(categorized), int(bool(values['receipt_url']))
+
+def _entry_values(entry, committed: bool = False) -> Dict:
+    """An entry's readiness fields as flushed last time (committed) or as they are now"""
+    if not committed:
+        return {key: getattr(entry, key) for key in _READINESS_FIELDS}
+    state = inspect(entry)
+    values = {}
+    for key in _READINESS_FIELDS:
+        history = state.attrs[key].load_history()
+        values[key] = (history.deleted or history.unchanged or (None,))[0]
+    return values
+
+def _add_readiness_delta(deltas: Dict, values: Dict, sign: int):
+    """Add (sign=1) or remove (sign=-1) an entry's counts in a per-user delta dict"""
+    counts = _readiness_counts(values)
+    current = deltas.get(values['user_id'], (0, 0, 0))
+    deltas[values['user_id']] = tuple(c + sign * n for c, n in zip(current, counts))
+
+def apply_readiness_deltas(connection, deltas: Dict):
+    """
+    Add per-user (total, categorized, with receipt) deltas to the readiness counters
+
+    Uses one upsert on PostgreSQL/SQLite and an update-or-insert per user elsewhere.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            'user_id': user_id,
+            'total_entries': total,
+            'categorized_entries': categorized,
+            'entries_with_receipts': receipts,
+            'updated_at': now
+        }
+        for user_id, (total, categorized, receipts) in deltas.items()
+        if user_id is not None and (total or categorized or receipts)
+    ]
+    if not rows:
+        return
+
+    table = SmartLedgerReadiness.__table__
+    if connection.dialect.name in ('postgresql', 'sqlite'):
+        if connection.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={
+                'total_entries': table.c.total_entries + statement.excluded.total_entries,
+                'categorized_entries': table.c.categorized_entries + statement.excluded.categorized_entries,
+                'entries_with_receipts': table.c.entries_with_receipts + statement.excluded.entries_with_receipts,
+                'updated_at': statement.excluded.updated_at
+            }
+        )
+        connection.execute(statement)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            table.update().where(table.c.user_id == row['user_id']).values(
+                total_entries=table.c.total_entries + row['total_entries'],
+                categorized_entries=table.c.categorized_entries + row['categorized_entries'],
+                entries_with_receipts=table.c.entries_with_receipts + row['entries_with_receipts'],
+                updated_at=row['updated_at']
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+class CoreSession(Session):
+    """Session for the core models; flushes keep the readiness counters in step with the ledger"""
+
+@event.listens_for(CoreSession, 'before_flush')
+def _track_readiness(session, flush_context, instances):
+    """
+    Adjust readiness counters for SmartLedgerEntry rows added, changed or deleted in this flush
+
+    Only CoreSession flushes are tracked, so sessions of other apps sharing
+    the process pay nothing. The counters are written on the session's
+    connection, so they commit or roll back with the entries. Bulk and raw
+    SQL writes bypass this; the reconcile job corrects any drift they cause.
+    """
+    deltas = {}
+    for entry in session.new:
+        if isinstance(entry, SmartLedgerEntry):
+            _add_readiness_delta(deltas, _entry_values(entry), 1)
+    for entry in session.deleted:
+        if isinstance(entry, SmartLedgerEntry):
+            _add_readiness_delta(deltas, _entry_values(entry, committed=True), -1)
+    for entry in session.dirty:
+        if isinstance(entry, SmartLedgerEntry) and session.is_modified(entry):
+            _add_readiness_delta(deltas, _entry_values(entry, committed=True), -1)
+            _add_readiness_delta(deltas, _entry_values(entry), 1)
+    if deltas:
+        apply_readiness_deltas(session.connection(), deltas)
+
+def reconcile_readiness_counters(db_session, user_id: int = None) -> Dict:
+    """
+    Recount readiness counters from smart_ledger_entries and fix any that drifted
+
+    Meant to run periodically (see reconcile_readiness.py). Counter rows are
+    locked before counting so concurrent ledger writes wait rather than
+    being lost.
+
+    Args:
+        db_session: SQLAlchemy session
+        user_id: Optional user ID to limit the reconcile to
+
+    Returns:
+        Dictionary with users checked and counters corrected
+    """
+    stored_query = db_session.query(SmartLedgerReadiness).with_for_update()
+    counts_query = db_session.query(
+        SmartLedgerEntry.user_id,
+        func.count(SmartLedgerEntry.id),
+        func.sum(case((and_(
+            SmartLedgerEntry.category.isnot(None),
+            SmartLedgerEntry.category != '',
+            SmartLedgerEntry.ai_confidence > CATEGORIZED_CONFIDENCE
+        ), 1), else_=0)),
+        func.sum(case((and_(
+            SmartLedgerEntry.receipt_url.isnot(None),
+            SmartLedgerEntry.receipt_url != ''
+        ), 1), else_=0))
+    )
+    if user_id is not None:
+        stored_query = stored_query.filter(SmartLedgerReadiness.user_id == user_id)
+        counts_query = counts_query.filter(SmartLedgerEntry.user_id == user_id)
+
+    try:
+        stored = {row.user_id: row for row in stored_query}
+        actual = {
+            row_user_id: (total, int(categorized or 0), int(receipts or 0))
+            for row_user_id, total, categorized, receipts in counts_query.group_by(SmartLedgerEntry.user_id)
+        }
+
+        corrected = 0
+        now = datetime.utcnow()
+        for row_user_id, (total, categorized, receipts) in actual.items():
+            row = stored.pop(row_user_id, None)
+            if row is None:
+                row = SmartLedgerReadiness(user_id=row_user_id)
+                db_session.add(row)
+            elif (row.total_entries, row.categorized_entries, row.entries_with_receipts) == (total, categorized, receipts):
+                continue
+            row.total_entries = total
+            row.categorized_entries = categorized
+            row.entries_with_receipts = receipts
+            row.updated_at = now
+            corrected += 1
+
+        # Counters left over for users with no entries
+        for row in stored.values():
+            if row.total_entries or row.categorized_entries or row.entries_with_receipts:
+                corrected += 1
+            db_session.delete(row)
+
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+
+    return {"users_checked": len(actual), "corrected": corrected}
+
 # =============================================================================
 # AI TAX ASSISTANT - Core intelligence engine
 # =============================================================================
@@ -415,11 +613,121 @@ class AITaxAssistant:
 # SMART LEDGER - Monthly expense tracking with AI
 # =============================================================================
 
+# Fields a client may request from the expenses API, and the default set
+EXPENSE_FIELDS = ('id', 'amount', 'description', 'category', 'tax_deductible', 'ai_confidence',
+                  'receipt_url', 'date', 'created_at')
+DEFAULT_EXPENSE_FIELDS = ('id', 'amount', 'description', 'category', 'tax_deductible', 'ai_confidence',
+                          'date', 'created_at')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_expense_cursor(date: datetime, entry_id: int) -> str:
+    """Opaque cursor pointing just after an entry in (date, id) newest-first order"""
+    payload = json.dumps([date.isoformat(), entry_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_expense_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor from encode_expense_cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_text, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(date_text), int(entry_id)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
 class SmartLedger:
     def __init__(self, db_session, ai_assistant: AITaxAssistant):
         self.db = db_session
         self.ai = ai_assistant
-    
+
+    def list_expenses(self, user_id: int, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                      categories: List[str] = None, start_date: datetime = None, end_date: datetime = None,
+                      deductible: bool = None, fields: List[str] = None, include_totals: bool = False) -> Dict:
+        """
+        Page through a user's expenses newest first using (date, id) keyset pagination
+
+        Args:
+            user_id: User ID
+            cursor: next_cursor from the previous page, or None for the first page
+            limit: Page size (capped at MAX_PAGE_SIZE)
+            categories: Only these categories
+            start_date: Only entries on or after this date
+            end_date: Only entries on or before this date (whole day)
+            deductible: Only deductible (True) or non-deductible (False) entries
+            fields: Fields to return (defaults to DEFAULT_EXPENSE_FIELDS)
+            include_totals: Also return count and amount totals for all matching entries
+
+        Returns:
+            Dictionary with expenses, next_cursor, has_more and optionally totals
+        """
+        fields = list(fields or DEFAULT_EXPENSE_FIELDS)
+        unknown = [field for field in fields if field not in EXPENSE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        conditions = [SmartLedgerEntry.user_id == user_id]
+        if categories:
+            conditions.append(SmartLedgerEntry.category.in_(categories))
+        if start_date:
+            conditions.append(SmartLedgerEntry.date >= start_date)
+        if end_date:
+            conditions.append(SmartLedgerEntry.date < end_date + timedelta(days=1))
+        if deductible is not None:
+            conditions.append(SmartLedgerEntry.tax_deductible.is_(deductible))
+
+        # date and id are always read to build the next cursor
+        columns = [getattr(SmartLedgerEntry, field) for field in fields if field not in ('date', 'id')]
+        page = select(SmartLedgerEntry.date, SmartLedgerEntry.id, *columns).where(*conditions)
+        if cursor:
+            cursor_date, cursor_id = decode_expense_cursor(cursor)
+            page = page.where(tuple_(SmartLedgerEntry.date, SmartLedgerEntry.id) < tuple_(cursor_date, cursor_id))
+        page = page.order_by(SmartLedgerEntry.date.desc(), SmartLedgerEntry.id.desc()).limit(limit + 1)
+
+        if include_totals:
+            # One statement: the page is left-joined onto the totals so totals
+            # come back even when the page is empty
+            totals = select(
+                func.count(SmartLedgerEntry.id).label('total_count'),
+                func.coalesce(func.sum(SmartLedgerEntry.amount), 0).label('total_amount'),
+                func.coalesce(func.sum(case((SmartLedgerEntry.tax_deductible.is_(True), SmartLedgerEntry.amount),
+                                            else_=0)), 0).label('deductible_amount')
+            ).where(*conditions).subquery()
+            page = page.subquery()
+            statement = select(totals, page).select_from(totals.outerjoin(page, true())).order_by(
+                page.c.date.desc(), page.c.id.desc()
+            )
+        else:
+            statement = page
+
+        rows = self.db.execute(statement).all()
+        result = {}
+        if include_totals:
+            first = rows[0]
+            result['totals'] = {
+                'count': first.total_count,
+                'total_amount': round(float(first.total_amount), 2),
+                'deductible_amount': round(float(first.deductible_amount), 2)
+            }
+            rows = [row for row in rows if row.id is not None]
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        expenses = []
+        for row in rows:
+            expense = {}
+            for field in fields:
+                value = getattr(row, field)
+                expense[field] = value.isoformat() if isinstance(value, datetime) else value
+            expenses.append(expense)
+
+        result.update({
+            'expenses': expenses,
+            'next_cursor': encode_expense_cursor(rows[-1].date, rows[-1].id) if has_more else None,
+            'has_more': has_more
+        })
+        return result
+
     def add_expense(self, user_id: int, amount: float, description: str, date: datetime, 
                    business_type: str = "sole_proprietorship") -> Dict:
         """Add expense with AI categorization"""
@@ -454,16 +762,16 @@ class SmartLedger:
         return deductible_amount * 0.35
     
     def get_tax_readiness_score(self, user_id: int) -> Dict:
-        """Calculate how tax-ready the user's records are"""
-        entries = self.db.query(SmartLedgerEntry).filter_by(user_id=user_id).all()
-        
-        if not entries:
+        """Calculate how tax-ready the user's records are (one primary-key read of the readiness counters)"""
+        counters = self.db.get(SmartLedgerReadiness, user_id)
+
+        if counters is None or counters.total_entries <= 0:
             return {"score": 0, "message": "No expenses tracked yet"}
-        
-        total_entries = len(entries)
-        categorized_entries = len([e for e in entries if e.category and e.ai_confidence > 0.7])
-        entries_with_receipts = len([e for e in entries if e.receipt_url])
-        
+
+        total_entries = counters.total_entries
+        categorized_entries = counters.categorized_entries
+        entries_with_receipts = counters.entries_with_receipts
+
         # Scoring algorithm
         categorization_score = (categorized_entries / total_entries) * 40
         receipt_score = (entries_with_receipts / total_entries) * 30
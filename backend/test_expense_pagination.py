@@ -0,0 +1,134 @@
+"""
+Tests for keyset pagination of smart ledger expenses
+
+Covers walking every page without gaps or repeats (including entries that
+share a date), filters, totals, field selection and rejection of malformed
+cursors, both on SmartLedger.list_expenses and the expenses API route.
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from core_components import (
+    AITaxAssistant, Base, CoreSession, SmartLedger, SmartLedgerEntry, create_engine,
+    decode_expense_cursor, encode_expense_cursor
+)
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'ledger.db'}"
+
+
+@pytest.fixture
+def db(database_url):
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, class_=CoreSession)()
+    # Two entries per day so pages have to break ties on id
+    for day in range(1, 8):
+        for amount in (10.0, 25.0):
+            session.add(SmartLedgerEntry(
+                user_id=1, amount=amount, description=f'Expense {day}',
+                category='meals' if amount == 10.0 else 'office_supplies',
+                tax_deductible=amount == 25.0, date=datetime(2025, 3, day, 9, 30)
+            ))
+    session.add(SmartLedgerEntry(user_id=2, amount=99.0, description='Other user', date=datetime(2025, 3, 4)))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def ledger(db):
+    return SmartLedger(db, AITaxAssistant())
+
+
+def _walk(ledger, **kwargs):
+    """Every page for user 1, following next_cursor"""
+    pages, cursor = [], None
+    while True:
+        page = ledger.list_expenses(1, cursor=cursor, **kwargs)
+        pages.append(page)
+        if not page['has_more']:
+            return pages
+        cursor = page['next_cursor']
+
+
+def test_cursor_round_trip():
+    cursor = encode_expense_cursor(datetime(2025, 3, 4, 9, 30), 17)
+    assert decode_expense_cursor(cursor) == (datetime(2025, 3, 4, 9, 30), 17)
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', encode_expense_cursor(datetime(2025, 1, 1), 1)[:-3], ''])
+def test_malformed_cursor_raises(cursor):
+    with pytest.raises(ValueError):
+        decode_expense_cursor(cursor)
+
+
+def test_pages_cover_every_entry_once_newest_first(ledger, db):
+    pages = _walk(ledger, limit=3)
+    ids = [expense['id'] for page in pages for expense in page['expenses']]
+
+    expected = [
+        entry.id for entry in db.query(SmartLedgerEntry).filter_by(user_id=1)
+        .order_by(SmartLedgerEntry.date.desc(), SmartLedgerEntry.id.desc())
+    ]
+    assert ids == expected
+    assert [len(page['expenses']) for page in pages] == [3, 3, 3, 3, 2]
+    assert pages[-1]['next_cursor'] is None
+
+
+def test_filters_and_totals(ledger):
+    pages = _walk(
+        ledger, limit=2, categories=['office_supplies'], deductible=True,
+        start_date=datetime(2025, 3, 2), end_date=datetime(2025, 3, 5), include_totals=True
+    )
+    expenses = [expense for page in pages for expense in page['expenses']]
+
+    assert [expense['date'][:10] for expense in expenses] == ['2025-03-05', '2025-03-04', '2025-03-03', '2025-03-02']
+    assert {expense['category'] for expense in expenses} == {'office_supplies'}
+    # Totals cover every match, not just the page, and repeat on each page
+    for page in pages:
+        assert page['totals'] == {'count': 4, 'total_amount': 100.0, 'deductible_amount': 100.0}
+
+
+def test_totals_come_back_for_an_empty_page(ledger):
+    page = ledger.list_expenses(1, categories=['travel'], include_totals=True)
+    assert page == {
+        'totals': {'count': 0, 'total_amount': 0.0, 'deductible_amount': 0.0},
+        'expenses': [], 'next_cursor': None, 'has_more': False
+    }
+
+
+def test_fields_and_limit(ledger):
+    page = ledger.list_expenses(1, limit=1000, fields=['amount', 'receipt_url'])
+    assert len(page['expenses']) == 14
+    assert set(page['expenses'][0]) == {'amount', 'receipt_url'}
+
+    with pytest.raises(ValueError):
+        ledger.list_expenses(1, fields=['password_hash'])
+
+
+def test_expenses_route(database_url, db, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', database_url)
+    from api_routes import create_app
+    client = create_app().test_client()
+
+    first = client.get('/api/smart-ledger/expenses/1?limit=5&category=meals&include_totals=true')
+    assert first.status_code == 200
+    body = first.get_json()
+    assert len(body['expenses']) == 5
+    assert body['totals']['count'] == 7
+
+    second = client.get(f"/api/smart-ledger/expenses/1?limit=5&category=meals&cursor={body['next_cursor']}")
+    assert second.status_code == 200
+    assert len(second.get_json()['expenses']) == 2
+    assert second.get_json()['has_more'] is False
+
+    assert client.get('/api/smart-ledger/expenses/1?cursor=garbage').status_code == 400
+    assert client.get('/api/smart-ledger/expenses/1?start_date=03/01/2025').status_code == 400
+    assert client.get('/api/smart-ledger/expenses/1?fields=email').status_code == 400
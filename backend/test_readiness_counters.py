@@ -0,0 +1,104 @@
+"""
+Tests for the Smart Ledger readiness counters
+
+Covers the counters following entries added, changed and deleted through a
+CoreSession, plain sessions leaving them alone, and the reconcile job
+correcting counters that drifted.
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy.orm import Session, sessionmaker
+
+from core_components import (
+    Base, CoreSession, SmartLedgerEntry, SmartLedgerReadiness, create_engine, reconcile_readiness_counters
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, class_=CoreSession)()
+    yield session
+    session.close()
+
+
+def _entry(user_id=1, **fields):
+    return SmartLedgerEntry(
+        user_id=user_id, amount=fields.pop('amount', 20.0), description='Expense',
+        date=datetime(2025, 3, 1), **fields
+    )
+
+
+def _counters(db, user_id=1):
+    row = db.get(SmartLedgerReadiness, user_id, populate_existing=True)
+    return row and (row.total_entries, row.categorized_entries, row.entries_with_receipts)
+
+
+def test_counters_follow_inserts_updates_and_deletes(db):
+    categorized = _entry(category='meals', ai_confidence=0.9)
+    unsure = _entry(category='travel', ai_confidence=0.5)
+    db.add_all([categorized, unsure, _entry(user_id=2, receipt_url='r.pdf')])
+    db.commit()
+    assert _counters(db) == (2, 1, 0)
+    assert _counters(db, 2) == (1, 0, 1)
+
+    unsure.ai_confidence = 0.95
+    categorized.receipt_url = 'receipt.pdf'
+    db.commit()
+    assert _counters(db) == (2, 2, 1)
+
+    # A change to a field the counters don't use leaves them alone
+    categorized.amount = 25.0
+    db.commit()
+    assert _counters(db) == (2, 2, 1)
+
+    db.delete(categorized)
+    db.commit()
+    assert _counters(db) == (1, 1, 0)
+
+
+def test_rolled_back_entries_leave_counters_alone(db):
+    db.add(_entry(category='meals', ai_confidence=0.9))
+    db.commit()
+
+    db.add(_entry())
+    db.flush()
+    db.rollback()
+    assert _counters(db) == (1, 1, 0)
+
+
+def test_plain_sessions_are_not_tracked(engine):
+    with Session(engine) as session:
+        session.add(_entry())
+        session.commit()
+        assert _counters(session) is None
+
+
+def test_reconcile_fixes_drift(db, engine):
+    db.add_all([_entry(category='meals', ai_confidence=0.9), _entry(receipt_url='r.pdf')])
+    db.commit()
+
+    # Bulk writes bypass the counters
+    with Session(engine) as session:
+        session.add(_entry(user_id=3))
+        session.query(SmartLedgerEntry).filter_by(user_id=1, receipt_url='r.pdf').update({'receipt_url': None})
+        session.commit()
+    db.add(SmartLedgerReadiness(user_id=4, total_entries=2, categorized_entries=0, entries_with_receipts=0))
+    db.commit()
+
+    result = reconcile_readiness_counters(db)
+    assert result == {'users_checked': 2, 'corrected': 3}
+    assert _counters(db) == (2, 1, 0)
+    assert _counters(db, 3) == (1, 0, 0)
+    assert _counters(db, 4) is None
+
+    assert reconcile_readiness_counters(db) == {'users_checked': 2, 'corrected': 0}
@@ -0,0 +1,64 @@
+"""
+Shared pytest fixtures
+
+Each test gets the Flask app bound to its own throwaway SQLite database.
+"""
+
+import os
+
+import pytest
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App with a fresh SQLite database, inside an app context"""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('OPENAI_API_KEY', os.environ.get('OPENAI_API_KEY') or 'test-key')
+
+    from app import create_app, db
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    """A saved user"""
+    from app import db
+    from app.models import User
+    user = User(username='tester', email='tester@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    """Test client logged in as `user`"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def committed_version(app):
+    """Read a data version on its own connection, as another worker process would"""
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import Session
+
+    from app import db
+    from app.models import DataVersion
+    from modules.db_utils import ALL_USERS
+
+    def read(user_id, scope):
+        with Session(db.engine) as session:
+            return session.scalar(select(func.coalesce(func.sum(DataVersion.version), 0)).where(
+                DataVersion.scope == scope, DataVersion.user_id.in_((user_id, ALL_USERS))
+            ))
+    return read
@@ -0,0 +1,26 @@
+"""
+Match a folder of receipt files to a user's ledger transactions
+Usage: python match_receipts.py <user_id> <folder>
+"""
+
+import sys
+from app import create_app
+from modules.receipt_matcher import match_receipt_folder
+from modules.smart_ledger import AUTO_LINK_RECEIPTS, SmartLedger
+
+def match(user_id, folder):
+    app = create_app()
+    with app.app_context():
+        results = match_receipt_folder(user_id, folder, SmartLedger().process_receipt_ocr,
+                                       auto_link=AUTO_LINK_RECEIPTS)
+        linked = sum(1 for result in results if result['status'] == 'linked')
+        pending = sum(1 for result in results if result['status'] == 'candidates')
+        print(f"Matched {len(results)} receipts: {linked} linked, {pending} need review")
+        return True
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__.strip())
+        sys.exit(1)
+    success = match(int(sys.argv[1]), sys.argv[2])
+    sys.exit(0 if success else 1)
@@ -0,0 +1,30 @@
+"""
+Import legacy per-user metadata.json files into the documents table
+Usage: python migrate_document_metadata.py
+"""
+
+import os
+import sys
+from app import create_app
+from modules.document_upload import UPLOAD_FOLDER, migrate_legacy_metadata
+
+def migrate_all():
+    app = create_app()
+    with app.app_context():
+        total = 0
+        for entry in sorted(os.listdir(UPLOAD_FOLDER)):
+            if not entry.isdigit():
+                continue
+            if not os.path.exists(os.path.join(UPLOAD_FOLDER, entry, "metadata.json")):
+                continue
+
+            imported = migrate_legacy_metadata(int(entry))
+            print(f"User {entry}: imported {imported} documents")
+            total += imported
+
+        print(f"Done. {total} documents imported")
+        return True
+
+if __name__ == "__main__":
+    success = migrate_all()
+    sys.exit(0 if success else 1)
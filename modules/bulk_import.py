@@ -0,0 +1,146 @@
+"""
+Bulk Import Module
+
+This module holds the pieces shared by the file importers (contractor
+payments, bank statements and mileage logs): mapping spreadsheet headers onto
+known columns, streaming CSV rows, and BulkImport, which validates every row,
+inserts valid rows in chunks as the file is read and commits all-or-nothing.
+"""
+
+import csv
+import io
+
+from app import db
+
+# Rows inserted per bulk statement
+INSERT_CHUNK_SIZE = 1000
+
+# Stop collecting line errors beyond this many (the import still validates every row)
+MAX_REPORTED_ERRORS = 500
+
+
+def normalize_header(header, column_aliases):
+    """
+    Map a spreadsheet header onto a known column name
+
+    Args:
+        header: Header cell as exported
+        column_aliases: Dictionary of column name -> set of accepted spellings
+                        (lowercase, spaces as underscores)
+
+    Returns:
+        Column name, or None for an unknown header
+    """
+    key = str(header or '').strip().lower().replace(' ', '_')
+    for column, aliases in column_aliases.items():
+        if key in aliases:
+            return column
+    return None
+
+
+def iter_csv_rows(stream, column_aliases, check_headers=None):
+    """
+    Yield (line_number, row dict) keyed by normalized column names from a binary CSV stream
+
+    Bytes that aren't UTF-8 (cp1252 exports, for instance) are replaced
+    rather than failing the whole file, and blank lines are skipped.
+
+    Args:
+        stream: Binary file-like object
+        column_aliases: Dictionary of column name -> set of accepted spellings
+        check_headers: Optional callable given the set of recognized columns;
+                       it raises if the file is missing a required column
+    """
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline=''))
+    try:
+        headers = [normalize_header(header, column_aliases) for header in next(reader)]
+    except StopIteration:
+        return
+    if check_headers is not None:
+        check_headers(set(headers))
+
+    for line_number, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        yield line_number, {column: value for column, value in zip(headers, values) if column}
+
+
+class BulkImport:
+    """
+    All-or-nothing bulk insert of imported rows
+
+    Every row is validated. Valid rows are inserted in chunks as the file is
+    read; once a row fails (or on a dry run) nothing more is inserted and the
+    transaction is rolled back instead of committed, so only the report is
+    returned.
+    """
+
+    def __init__(self, model, dry_run=False, chunk_size=INSERT_CHUNK_SIZE):
+        self.model = model
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.rows_processed = 0
+        self.valid_rows = 0
+        self.error_count = 0
+        self.errors = []
+        self._pending = []
+
+    @property
+    def saving(self):
+        """Whether the rows read so far will be saved"""
+        return not self.dry_run and not self.error_count
+
+    def _flush(self):
+        if self._pending and self.saving:
+            db.session.bulk_insert_mappings(self.model, self._pending)
+        self._pending.clear()
+
+    def run(self, rows, build_row, apply_totals):
+        """
+        Import rows, then apply totals and commit (or roll back)
+
+        Args:
+            rows: Iterator of (line_number, fields)
+            build_row: Callable turning fields into an insert mapping, or
+                       None to skip the row; raises ValueError for an invalid row
+            apply_totals: Callable updating running totals before the commit
+        """
+        try:
+            for line_number, fields in rows:
+                self.rows_processed += 1
+                try:
+                    mapping = build_row(fields)
+                except ValueError as e:
+                    self.error_count += 1
+                    if len(self.errors) < MAX_REPORTED_ERRORS:
+                        self.errors.append({'line': line_number, 'error': str(e)})
+                    continue
+                if mapping is None:
+                    continue
+
+                self._pending.append(mapping)
+                self.valid_rows += 1
+                if len(self._pending) >= self.chunk_size:
+                    self._flush()
+            self._flush()
+
+            if self.saving:
+                apply_totals()
+                db.session.commit()
+            else:
+                db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def report(self, **details):
+        """Import report: the shared counts and errors plus importer-specific details"""
+        return {
+            'dry_run': self.dry_run,
+            'imported': self.saving,
+            'rows_processed': self.rows_processed,
+            'valid_rows': self.valid_rows,
+            **details,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
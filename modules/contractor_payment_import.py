@@ -0,0 +1,235 @@
+"""
+Contractor Payment Import Module
+
+This module imports contractor payments in bulk from CSV or XLSX exports.
+Rows are streamed from the upload rather than loaded into memory, contractors
+are resolved from a single lookup of the user's contractors (by id, email or
+EIN), payments are written with chunked bulk inserts, and contractor totals are
+updated once at the end (one rollup upsert and one aggregate UPDATE) instead of
+once per payment.
+"""
+
+import re
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import select
+
+from app import db
+from app.models import Contractor, ContractorPayment
+from modules.bulk_import import BulkImport, iter_csv_rows, normalize_header
+from modules.contractor_rollups import apply_payment_deltas
+
+# openpyxl is only needed for XLSX uploads
+try:
+    import openpyxl
+    HAS_OPENPYXL = True
+except ImportError:
+    openpyxl = None
+    HAS_OPENPYXL = False
+
+SUPPORTED_EXTENSIONS = {'csv', 'xlsx'}
+
+# Accepted header spellings for each column
+COLUMN_ALIASES = {
+    'contractor_id': {'contractor_id', 'contractor', 'id'},
+    'email': {'email', 'contractor_email', 'e-mail'},
+    'ein': {'ein', 'tin', 'ssn', 'tax_id', 'contractor_ein'},
+    'amount': {'amount', 'payment_amount', 'paid'},
+    'payment_date': {'payment_date', 'date', 'paid_on'},
+    'description': {'description', 'memo'},
+    'category': {'category'},
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y')
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+class PaymentImportError(Exception):
+    """Raised when an upload cannot be read at all (as opposed to bad rows)"""
+
+
+def normalize_tin(value):
+    """Reduce an EIN/SSN to its digits for matching"""
+    return _NON_DIGITS.sub('', str(value or ''))
+
+
+def _iter_xlsx_rows(stream):
+    """Yield (line_number, row dict) from an XLSX stream using read-only mode"""
+    if not HAS_OPENPYXL:
+        raise PaymentImportError('XLSX import requires openpyxl; upload a CSV instead')
+
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        try:
+            headers = [normalize_header(header, COLUMN_ALIASES) for header in next(rows)]
+        except StopIteration:
+            return
+        for line_number, values in enumerate(rows, start=2):
+            if not any(value not in (None, '') for value in values):
+                continue
+            yield line_number, {
+                column: value for column, value in zip(headers, values) if column
+            }
+    finally:
+        workbook.close()
+
+
+def iter_payment_rows(stream, file_extension):
+    """
+    Stream rows from an uploaded payment file
+
+    Args:
+        stream: Binary file-like object
+        file_extension: 'csv' or 'xlsx'
+
+    Returns:
+        Iterator of (line_number, row dict) keyed by normalized column names
+    """
+    if file_extension == 'csv':
+        return iter_csv_rows(stream, COLUMN_ALIASES)
+    if file_extension == 'xlsx':
+        return _iter_xlsx_rows(stream)
+    raise PaymentImportError(f'Unsupported file type: {file_extension}')
+
+
+def _parse_amount(value):
+    """Parse a positive payment amount like '1,250.00' or '$300'"""
+    if isinstance(value, (int, float, Decimal)):
+        amount = Decimal(str(value))
+    else:
+        cleaned = str(value or '').strip().replace('$', '').replace(',', '')
+        if not cleaned:
+            raise ValueError('Missing amount')
+        try:
+            amount = Decimal(cleaned)
+        except InvalidOperation:
+            raise ValueError(f'Invalid amount: {value}')
+    if amount <= 0:
+        raise ValueError(f'Amount must be positive: {value}')
+    return amount.quantize(Decimal('0.01'))
+
+
+def _parse_date(value):
+    """Parse a payment date from a string or spreadsheet date cell"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or '').strip()
+    if not text:
+        raise ValueError('Missing payment date')
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f'Invalid payment date: {value}')
+
+
+class ContractorResolver:
+    """Resolves import rows to the user's contractors from one lookup query"""
+
+    def __init__(self, user_id):
+        self.by_id = {}
+        self.by_email = {}
+        self.by_tin = {}
+
+        rows = db.session.execute(
+            select(Contractor.id, Contractor.email, Contractor.ein).where(Contractor.user_id == user_id)
+        )
+        for contractor_id, email, ein in rows:
+            self.by_id[contractor_id] = contractor_id
+            if email:
+                self.by_email.setdefault(email.strip().lower(), contractor_id)
+            tin = normalize_tin(ein)
+            if tin:
+                self.by_tin.setdefault(tin, contractor_id)
+
+    def resolve(self, row):
+        """
+        Find the contractor for a row by id, then email, then EIN
+
+        Returns:
+            Contractor id
+
+        Raises:
+            ValueError: If no contractor matches
+        """
+        raw_id = row.get('contractor_id')
+        if raw_id not in (None, ''):
+            try:
+                contractor_id = int(str(raw_id).strip())
+            except ValueError:
+                raise ValueError(f'Invalid contractor id: {raw_id}')
+            if contractor_id in self.by_id:
+                return contractor_id
+            raise ValueError(f'Unknown contractor id: {raw_id}')
+
+        email = str(row.get('email') or '').strip().lower()
+        if email:
+            if email in self.by_email:
+                return self.by_email[email]
+            raise ValueError(f'No contractor with email {email}')
+
+        tin = normalize_tin(row.get('ein'))
+        if tin:
+            if tin in self.by_tin:
+                return self.by_tin[tin]
+            raise ValueError('No contractor with that EIN/SSN')
+
+        raise ValueError('Row needs a contractor_id, email or ein')
+
+
+def import_payments(user_id, stream, file_extension, dry_run=False):
+    """
+    Validate and import contractor payments from an uploaded file
+
+    Every row is validated. Valid rows are inserted in chunks as the file is
+    read, and the import is all-or-nothing: if any row fails (or this is a dry
+    run) the transaction is rolled back and only the report is returned.
+
+    Args:
+        user_id: User ID that owns the contractors
+        stream: Binary file-like object
+        file_extension: 'csv' or 'xlsx'
+        dry_run: Validate only, without saving anything
+
+    Returns:
+        Dictionary report with counts, totals and per-line errors
+    """
+    resolver = ContractorResolver(user_id)
+    created_at = datetime.utcnow()
+    batch = BulkImport(ContractorPayment, dry_run)
+    total_amount = Decimal('0')
+    deltas = {}
+
+    def _build_row(row):
+        nonlocal total_amount
+        contractor_id = resolver.resolve(row)
+        amount = _parse_amount(row.get('amount'))
+        payment_date = _parse_date(row.get('payment_date'))
+
+        total_amount += amount
+        key = (contractor_id, payment_date.year)
+        year_amount, year_count = deltas.get(key, (Decimal('0'), 0))
+        deltas[key] = (year_amount + amount, year_count + 1)
+        return {
+            'contractor_id': contractor_id,
+            'user_id': user_id,
+            'amount': amount,
+            'payment_date': payment_date,
+            'description': str(row.get('description') or '').strip(),
+            'category': str(row.get('category') or '').strip() or 'Services',
+            'created_at': created_at,
+        }
+
+    batch.run(
+        iter_payment_rows(stream, file_extension), _build_row, lambda: apply_payment_deltas(user_id, deltas)
+    )
+    return batch.report(
+        total_amount=float(total_amount),
+        contractors_affected=len({contractor_id for contractor_id, _ in deltas}),
+    )
@@ -0,0 +1,210 @@
+"""
+Contractor Payment Rollups Module
+
+This module maintains ContractorPaymentRollup rows: one per (user, contractor,
+tax year) holding the total paid and the payment count. Rollups are adjusted
+incrementally whenever payments are inserted (deleting a contractor drops its
+payments and rollups together), and can be rebuilt from ContractorPayment
+with a single aggregate query. Per-year totals for the
+dashboard, summaries and 1099 generation are read from here instead of being
+summed from payments or taken from the running Contractor.total_paid_ytd.
+"""
+
+from datetime import datetime, date
+from decimal import Decimal
+
+from sqlalchemy import Integer, cast, extract, func, select, update
+
+from app import db
+from app.models import Contractor, ContractorPayment, ContractorPaymentRollup
+from modules.db_utils import ALL_USERS, bump_data_version, get_data_version, upsert_totals
+
+# Total at which a contractor needs a 1099-NEC
+FORM_1099_THRESHOLD = Decimal('600')
+
+_ROLLUP_KEY = ['user_id', 'contractor_id', 'tax_year']
+
+# DataVersion scope moved by every contractor or payment write
+CONTRACTORS_SCOPE = 'contractors'
+
+
+def get_rollup_version(user_id):
+    """Version token that changes whenever a user's contractors or rollups are written"""
+    return get_data_version(user_id, CONTRACTORS_SCOPE)
+
+
+def mark_contractors_changed(user_id):
+    """
+    Bump a user's contractor version in the current transaction
+
+    The version is stored in the database and commits with the writes, so
+    cached summaries in every worker process see it move together with the
+    data. Writes that don't go through the rollups (adding or deleting a
+    contractor) call this directly.
+    """
+    bump_data_version(user_id, CONTRACTORS_SCOPE)
+
+
+def apply_payment_deltas(user_id, deltas):
+    """
+    Adjust rollups by per-(contractor, year) amount and count deltas
+
+    All deltas are applied in one upsert statement where the database
+    supports it. The caller commits.
+
+    Args:
+        user_id: User ID
+        deltas: Dictionary of (contractor_id, tax_year) -> (amount_delta, count_delta)
+    """
+    if not deltas:
+        return
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            'user_id': user_id,
+            'contractor_id': contractor_id,
+            'tax_year': tax_year,
+            'total_amount': amount,
+            'payment_count': count,
+            'updated_at': now,
+        }
+        for (contractor_id, tax_year), (amount, count) in deltas.items()
+    ]
+
+    upsert_totals(ContractorPaymentRollup, _ROLLUP_KEY, rows, 'payment_count')
+
+    refresh_contractor_totals({contractor_id for contractor_id, _ in deltas})
+    mark_contractors_changed(user_id)
+
+
+def record_payment(payment):
+    """Add a new payment to its contractor's rollup (the caller commits)"""
+    apply_payment_deltas(payment.user_id, {
+        (payment.contractor_id, payment.payment_date.year): (Decimal(str(payment.amount)), 1)
+    })
+
+
+def refresh_contractor_totals(contractor_ids, tax_year=None):
+    """
+    Copy the current year's rollup onto Contractor.total_paid_ytd and needs_1099
+
+    The Contractor columns are kept as a denormalized view of the current
+    tax year so existing templates and queries keep working.
+
+    Args:
+        contractor_ids: Contractor IDs to refresh
+        tax_year: Year treated as "year to date" (defaults to the current year)
+    """
+    if not contractor_ids:
+        return
+
+    year_total = (
+        select(func.coalesce(func.sum(ContractorPaymentRollup.total_amount), 0))
+        .where(
+            ContractorPaymentRollup.contractor_id == Contractor.id,
+            ContractorPaymentRollup.tax_year == (tax_year or date.today().year)
+        )
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(Contractor)
+        .where(Contractor.id.in_(list(contractor_ids)))
+        .values(total_paid_ytd=year_total, needs_1099=year_total >= FORM_1099_THRESHOLD)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rebuild_rollups(user_id=None):
+    """
+    Rebuild rollups from ContractorPayment with one aggregate query
+
+    Args:
+        user_id: Optional user ID to limit the rebuild to
+
+    Returns:
+        Number of rollup rows written
+    """
+    delete = ContractorPaymentRollup.__table__.delete()
+    payments = select(
+        ContractorPayment.user_id,
+        ContractorPayment.contractor_id,
+        cast(extract('year', ContractorPayment.payment_date), Integer).label('tax_year'),
+        func.sum(ContractorPayment.amount),
+        func.count(ContractorPayment.id),
+        func.current_timestamp()
+    )
+    if user_id is not None:
+        delete = delete.where(ContractorPaymentRollup.user_id == user_id)
+        payments = payments.where(ContractorPayment.user_id == user_id)
+    payments = payments.group_by(
+        ContractorPayment.user_id, ContractorPayment.contractor_id, 'tax_year'
+    )
+
+    try:
+        db.session.execute(delete)
+        result = db.session.execute(ContractorPaymentRollup.__table__.insert().from_select(
+            ['user_id', 'contractor_id', 'tax_year', 'total_amount', 'payment_count', 'updated_at'],
+            payments
+        ))
+
+        contractor_ids = db.session.query(Contractor.id)
+        if user_id is not None:
+            contractor_ids = contractor_ids.filter(Contractor.user_id == user_id)
+        refresh_contractor_totals([row.id for row in contractor_ids])
+
+        mark_contractors_changed(ALL_USERS if user_id is None else user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result.rowcount
+
+
+def get_year_totals(user_id, tax_year, contractor_ids=None):
+    """
+    Get each contractor's total for a tax year
+
+    Args:
+        user_id: User ID
+        tax_year: Tax year
+        contractor_ids: Optional contractor IDs to limit the lookup to
+
+    Returns:
+        Dictionary of contractor_id -> Decimal total
+    """
+    rows = db.session.query(
+        ContractorPaymentRollup.contractor_id, ContractorPaymentRollup.total_amount
+    ).filter_by(user_id=user_id, tax_year=tax_year)
+    if contractor_ids is not None:
+        rows = rows.filter(ContractorPaymentRollup.contractor_id.in_(list(contractor_ids)))
+    return {contractor_id: total for contractor_id, total in rows}
+
+
+def get_contractor_year_total(user_id, contractor_id, tax_year):
+    """Get one contractor's total for a tax year (0 if there were no payments)"""
+    total = db.session.query(ContractorPaymentRollup.total_amount).filter_by(
+        user_id=user_id, contractor_id=contractor_id, tax_year=tax_year
+    ).scalar()
+    return total or Decimal('0')
+
+
+def get_user_year_summary(user_id, tax_year):
+    """
+    Summarize a user's contractor payments for a tax year from the rollups
+
+    Returns:
+        Dictionary with total_paid, payment_count and contractors_need_1099
+    """
+    total_paid, payment_count, need_1099 = db.session.query(
+        func.coalesce(func.sum(ContractorPaymentRollup.total_amount), 0),
+        func.coalesce(func.sum(ContractorPaymentRollup.payment_count), 0),
+        func.count(ContractorPaymentRollup.id).filter(
+            ContractorPaymentRollup.total_amount >= FORM_1099_THRESHOLD
+        )
+    ).filter_by(user_id=user_id, tax_year=tax_year).one()
+    return {
+        'total_paid': total_paid,
+        'payment_count': payment_count,
+        'contractors_need_1099': need_1099,
+    }
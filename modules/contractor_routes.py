@@ -5,31 +5,53 @@ This module handles contractor management, payment tracking, and 1099-NEC form g
 Premium feature that helps build business credit through Net-30 reporting.
 """
 
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, send_from_directory
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, send_from_directory, send_file, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, date
 from decimal import Decimal
-from sqlalchemy import func
 import os
 
 from app import db
-from app.models import Contractor, ContractorPayment, Form1099, User
+from app.models import Contractor, ContractorPayment, ContractorPaymentRollup, Form1099, User
 from app.access_control import requires_access_level
-from modules.pdf_utils import generate_tax_form_pdf
+from modules.pdf_utils import generate_tax_form_pdf, tax_form_pdf_filename
+from modules.pdf_jobs import submit_pdf_job, job_response
+from modules.contractor_rollups import (
+    record_payment, get_contractor_year_total, get_year_totals, mark_contractors_changed, FORM_1099_THRESHOLD
+)
+from modules.contractor_summary import (
+    get_contractor_summary, get_year_summary, list_contractors, DEFAULT_PAGE_SIZE
+)
+from modules.form_1099_batch import (
+    build_1099_form_data, start_1099_batch, read_manifest, get_batch_paths, is_batch_running
+)
+from modules.contractor_payment_import import import_payments, PaymentImportError, SUPPORTED_EXTENSIONS
+from modules.fire_export import export_1099_nec, FireValidationError
+from modules.contractor_tin_validation import validate_contractors
 
 # Create blueprint
 contractor_bp = Blueprint('contractors', __name__, url_prefix='/contractors')
 
 
+def _render_1099_pdf(form_id):
+    """PDF job: render a 1099-NEC and store its filename in form_data"""
+    form_1099 = db.session.get(Form1099, form_id)
+    pdf_filename = generate_tax_form_pdf(form_1099)
+    if pdf_filename:
+        # Re-assigning to trigger SQLAlchemy update for JSON field
+        form_data = dict(form_1099.form_data)
+        form_data['pdf_file'] = pdf_filename
+        form_1099.form_data = form_data
+        db.session.commit()
+    return pdf_filename
+
+
 @contractor_bp.route('/dashboard')
 @login_required
 def dashboard():
     """Contractor management dashboard with subscription gate"""
     # Check if user has contractor management access
-    has_access = (
-        current_user.has_feature('contractor_management') or
-        current_user.has_feature('contractor_management_addon')
-    )
+    has_access = current_user.has_any_feature('contractor_management', 'contractor_management_addon')
 
     if not has_access:
         # Show upgrade prompt
@@ -40,27 +62,42 @@ def dashboard():
                              contractors_need_1099=0,
                              total_paid_ytd=0)
 
-    # User has access - show full dashboard
-    contractors = Contractor.query.filter_by(user_id=current_user.id).all()
+    # User has access - show one sorted page of contractors
+    sort = request.args.get('sort', 'name')
+    direction = request.args.get('dir', 'asc')
+    pagination = list_contractors(
+        current_user.id,
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int),
+        sort=sort,
+        direction=direction
+    )
+    contractors = pagination.items
 
-    # Calculate summary stats
-    total_paid_ytd = db.session.query(
-        func.sum(Contractor.total_paid_ytd)
-    ).filter(
-        Contractor.user_id == current_user.id
-    ).scalar() or 0
+    # Summary stats come from the cached rollup summary
+    current_year = datetime.now().year
+    summary = get_contractor_summary(current_user.id)
+    year_summary = get_year_summary(summary, current_year)
 
-    contractors_need_1099 = Contractor.query.filter_by(
-        user_id=current_user.id,
-        needs_1099=True
-    ).count()
+    # 1099s are filed for the previous year
+    filing_year = current_year - 1
 
     return render_template('contractors/dashboard.html',
                          contractors=contractors,
+                         pagination=pagination,
+                         sort=sort,
+                         direction=direction,
                          needs_upgrade=False,
-                         total_contractors=len(contractors),
-                         contractors_need_1099=contractors_need_1099,
-                         total_paid_ytd=total_paid_ytd)
+                         total_contractors=summary['total_contractors'],
+                         contractors_need_1099=year_summary['contractors_need_1099'],
+                         total_paid_ytd=year_summary['total_paid'],
+                         top_payees=year_summary['top_payees'],
+                         filing_year=filing_year,
+                         filing_year_summary=get_year_summary(summary, filing_year),
+                         filing_year_totals=get_year_totals(
+                             current_user.id, filing_year, [contractor.id for contractor in contractors]
+                         ),
+                         form_1099_threshold=FORM_1099_THRESHOLD)
 
 
 @contractor_bp.route('/add', methods=['GET', 'POST'])
@@ -89,6 +126,7 @@ def add_contractor():
             )
 
             db.session.add(contractor)
+            mark_contractors_changed(current_user.id)
             db.session.commit()
 
             flash(f'Contractor {contractor.name} added successfully!', 'success')
@@ -138,12 +176,8 @@ def add_payment():
 
         db.session.add(payment)
 
-        # Update contractor's total_paid_ytd
-        contractor.total_paid_ytd = (contractor.total_paid_ytd or 0) + amount
-
-        # Check if contractor needs 1099 (>$600)
-        if contractor.total_paid_ytd >= 600:
-            contractor.needs_1099 = True
+        # Update the per-year rollup (also refreshes total_paid_ytd and needs_1099)
+        record_payment(payment)
 
         db.session.commit()
 
@@ -171,6 +205,45 @@ def add_payment():
             return redirect(url_for('contractors.dashboard'))
 
 
+@contractor_bp.route('/payments/import', methods=['POST'])
+@login_required
+@requires_access_level('contractor_management')
+def import_payments_file():
+    """Bulk import payments from a CSV or XLSX export"""
+    wants_json = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.args.get('format') == 'json'
+    dry_run = str(request.values.get('dry_run', '')).lower() in ('1', 'true', 'yes', 'on')
+
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            raise PaymentImportError('No file uploaded')
+
+        file_extension = upload.filename.rsplit('.', 1)[-1].lower() if '.' in upload.filename else ''
+        if file_extension not in SUPPORTED_EXTENSIONS:
+            raise PaymentImportError('Upload a .csv or .xlsx file')
+
+        report = import_payments(current_user.id, upload.stream, file_extension, dry_run=dry_run)
+
+        if wants_json:
+            return jsonify(dict(report, success=report['error_count'] == 0))
+
+        if report['error_count']:
+            first_errors = '; '.join(f"line {error['line']}: {error['error']}" for error in report['errors'][:5])
+            flash(f"Import failed with {report['error_count']} invalid rows ({first_errors}). No payments were saved.", 'danger')
+        elif dry_run:
+            flash(f"Dry run OK: {report['valid_rows']} payments totaling ${report['total_amount']:,.2f} are ready to import", 'info')
+        else:
+            flash(f"Imported {report['valid_rows']} payments totaling ${report['total_amount']:,.2f}", 'success')
+        return redirect(url_for('contractors.dashboard'))
+
+    except Exception as e:
+        db.session.rollback()
+        if wants_json:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        flash(f'Error importing payments: {str(e)}', 'danger')
+        return redirect(url_for('contractors.dashboard'))
+
+
 @contractor_bp.route('/1099/generate/<int:contractor_id>')
 @login_required
 @requires_access_level('contractor_management')
@@ -182,15 +255,16 @@ def generate_1099(contractor_id):
             user_id=current_user.id
         ).first_or_404()
 
-        # Check if contractor needs 1099
-        if not contractor.needs_1099:
-            flash(f'{contractor.name} has not reached $600 threshold for 1099', 'warning')
-            return redirect(url_for('contractors.dashboard'))
-
         # Get current tax year
         current_year = datetime.now().year
         tax_year = current_year - 1  # Previous year
 
+        # Check if contractor needs 1099 for that year
+        total_paid = get_contractor_year_total(current_user.id, contractor.id, tax_year)
+        if total_paid < FORM_1099_THRESHOLD:
+            flash(f'{contractor.name} has not reached $600 threshold for 1099 in {tax_year}', 'warning')
+            return redirect(url_for('contractors.dashboard'))
+
         # Check if 1099 already exists
         existing_1099 = Form1099.query.filter_by(
             user_id=current_user.id,
@@ -207,39 +281,28 @@ def generate_1099(contractor_id):
             user_id=current_user.id,
             contractor_id=contractor.id,
             tax_year=tax_year,
-            total_amount=contractor.total_paid_ytd,
-            form_data={
-                'payer_name': current_user.username,
-                'payer_ein': 'TO_BE_FILLED',
-                'recipient_name': contractor.name,
-                'recipient_ein': contractor.ein,
-                'recipient_address': f"{contractor.address_line1}, {contractor.city}, {contractor.state} {contractor.zip_code}",
-                'nonemployee_compensation': float(contractor.total_paid_ytd),
-                'federal_tax_withheld': 0,
-                'state_tax_withheld': 0
-            },
+            total_amount=total_paid,
+            form_data=build_1099_form_data(contractor, current_user.username, total_paid),
             status='draft'
         )
 
         db.session.add(form_1099)
         db.session.commit()
         
-        # Generate PDF
-        pdf_filename = generate_tax_form_pdf(form_1099)
-        
-        if pdf_filename:
-            # Store PDF filename in form_data
-            # Re-assigning to trigger SQLAlchemy update for JSON field
-            form_data = dict(form_1099.form_data)
-            form_data['pdf_file'] = pdf_filename
-            form_1099.form_data = form_data
-            db.session.commit()
-            
-            flash(f'1099-NEC generated for {contractor.name} (Tax Year {tax_year}). API File: {pdf_filename}', 'success')
-        else:
-            flash(f'1099-NEC generated for {contractor.name} (Tax Year {tax_year}), but PDF generation failed.', 'warning')
-            
-        return redirect(url_for('contractors.dashboard'))
+        # Render the PDF in the background
+        form_id = form_1099.id
+        job = submit_pdf_job(
+            current_user.id,
+            ('form_1099', form_id, tax_form_pdf_filename(form_1099)),
+            lambda: _render_1099_pdf(form_id),
+            f"1099-NEC_{tax_year}_{contractor.name.replace(' ', '_')}.pdf"
+        )
+
+        if request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return job_response(job, wants_json=True)
+
+        flash(f'1099-NEC generated for {contractor.name} (Tax Year {tax_year}). The PDF is being prepared.', 'success')
+        return redirect(url_for('pdf_jobs.wait', job_id=job.id))
 
     except Exception as e:
         db.session.rollback()
@@ -247,16 +310,140 @@ def generate_1099(contractor_id):
         return redirect(url_for('contractors.dashboard'))
 
 
+@contractor_bp.route('/1099/batch', methods=['POST'])
+@login_required
+@requires_access_level('contractor_management')
+def start_1099_batch_job():
+    """Start generating every eligible contractor's 1099-NEC for a tax year"""
+    tax_year = request.values.get('tax_year', datetime.now().year - 1, type=int)
+
+    started = start_1099_batch(current_app._get_current_object(), current_user.id, tax_year, current_user.username)
+    status_url = url_for('contractors.batch_1099_status', tax_year=tax_year)
+
+    if request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({'success': True, 'started': started, 'status_url': status_url}), 202
+
+    if started:
+        flash(f'Generating 1099-NEC forms for {tax_year}. This may take a few minutes.', 'info')
+    else:
+        flash(f'1099-NEC generation for {tax_year} is already in progress', 'info')
+    return redirect(url_for('contractors.dashboard'))
+
+
+@contractor_bp.route('/1099/batch/<int:tax_year>/status')
+@login_required
+@requires_access_level('contractor_management')
+def batch_1099_status(tax_year):
+    """Progress of a 1099-NEC batch"""
+    manifest = read_manifest(current_user.id, tax_year)
+    if not manifest:
+        return jsonify({'success': False, 'error': 'No batch found for this tax year'}), 404
+
+    finished = manifest['status'] != 'running'
+    return jsonify({
+        'success': True,
+        'status': manifest['status'] if finished or is_batch_running(manifest) else 'interrupted',
+        'total': manifest['total'],
+        'rendered': manifest['rendered'],
+        'failed': len(manifest['failed']),
+        'percent': round(100 * manifest['rendered'] / manifest['total']) if manifest['total'] else 0,
+        'zip_url': url_for('contractors.download_1099_batch', tax_year=tax_year, kind='zip') if finished else None,
+        'combined_pdf_url': url_for('contractors.download_1099_batch', tax_year=tax_year, kind='pdf') if finished else None
+    })
+
+
+@contractor_bp.route('/1099/batch/<int:tax_year>/download/<kind>')
+@login_required
+@requires_access_level('contractor_management')
+def download_1099_batch(tax_year, kind):
+    """Download a finished batch as a ZIP archive or combined PDF"""
+    paths = get_batch_paths(current_user.id, tax_year)
+    path = paths['zip'] if kind == 'zip' else paths['combined_pdf']
+
+    if kind not in ('zip', 'pdf') or not os.path.exists(path):
+        flash('Batch output not found. Generate the 1099 batch first.', 'warning')
+        return redirect(url_for('contractors.dashboard'))
+
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=f"1099-NEC_{tax_year}.zip" if kind == 'zip' else f"1099-NEC_{tax_year}_print.pdf"
+    )
+
+
+@contractor_bp.route('/1099/fire/<int:tax_year>', methods=['POST'])
+@login_required
+@requires_access_level('contractor_management')
+def export_1099_fire(tax_year):
+    """Export a tax year's 1099-NEC forms as an IRS FIRE (Publication 1220) file"""
+    data = request.get_json(silent=True) or request.form
+    wants_json = request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+    transmitter = {
+        'tin': data.get('transmitter_tin'),
+        'tcc': data.get('transmitter_control_code'),
+        'name': data.get('transmitter_name'),
+        'address': data.get('transmitter_address'),
+        'city': data.get('transmitter_city'),
+        'state': data.get('transmitter_state'),
+        'zip': data.get('transmitter_zip'),
+        'contact_name': data.get('contact_name'),
+        'contact_phone': data.get('contact_phone'),
+        'contact_email': data.get('contact_email'),
+    }
+    # Self-transmitting payers can leave the payer fields out
+    payer = {
+        key: data.get(f'payer_{key}') or transmitter.get(key)
+        for key in ('tin', 'name', 'address', 'city', 'state', 'zip')
+    }
+    payer['phone'] = data.get('payer_phone') or transmitter['contact_phone']
+
+    try:
+        report = export_1099_nec(
+            current_user.id, tax_year, transmitter, payer,
+            test_file=str(data.get('test_file', '')).lower() in ('1', 'true', 'on', 'yes'),
+            combined_federal_state=str(data.get('combined_federal_state', '')).lower() in ('1', 'true', 'on', 'yes')
+        )
+    except FireValidationError as e:
+        if wants_json:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        flash(f'Cannot create FIRE file: {e}', 'danger')
+        return redirect(url_for('contractors.dashboard'))
+
+    if not report['valid']:
+        error = (f"{len(report['errors'])} forms failed validation" if report['errors']
+                 else f'No 1099-NEC forms found for {tax_year}')
+        if wants_json:
+            return jsonify({'success': False, 'error': error, 'report': report}), 422
+        flash(f'Cannot create FIRE file: {error}', 'danger')
+        return redirect(url_for('contractors.dashboard'))
+
+    return send_file(
+        report['output_path'],
+        as_attachment=True,
+        mimetype='text/plain',
+        download_name=os.path.basename(report['output_path'])
+    )
+
+
+@contractor_bp.route('/api/tin-check')
+@login_required
+@requires_access_level('contractor_management')
+def api_tin_check():
+    """Validate the user's contractor TINs and list likely duplicate payees"""
+    try:
+        return jsonify(dict(validate_contractors(current_user.id), success=True))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @contractor_bp.route('/api/summary')
 @login_required
 def api_summary():
     """API endpoint for contractor summary stats"""
     try:
         # Check access
-        has_access = (
-            current_user.has_feature('contractor_management') or
-            current_user.has_feature('contractor_management_addon')
-        )
+        has_access = current_user.has_any_feature('contractor_management', 'contractor_management_addon')
 
         if not has_access:
             return jsonify({
@@ -269,24 +456,32 @@ def api_summary():
             }), 403
 
         # Calculate summary
-        total_contractors = Contractor.query.filter_by(user_id=current_user.id).count()
+        summary = get_contractor_summary(current_user.id)
 
-        contractors_need_1099 = Contractor.query.filter_by(
-            user_id=current_user.id,
-            needs_1099=True
-        ).count()
-
-        total_paid = db.session.query(
-            func.sum(Contractor.total_paid_ytd)
-        ).filter(
-            Contractor.user_id == current_user.id
-        ).scalar() or 0
+        current_year = datetime.now().year
+        year_summary = get_year_summary(summary, current_year)
+        filing_summary = get_year_summary(summary, current_year - 1)
 
         return jsonify({
             'success': True,
-            'total_contractors': total_contractors,
-            'contractors_need_1099': contractors_need_1099,
-            'total_paid_ytd': float(total_paid)
+            'total_contractors': summary['total_contractors'],
+            'contractors_need_1099': year_summary['contractors_need_1099'],
+            'total_paid_ytd': year_summary['total_paid'],
+            'top_payees': year_summary['top_payees'],
+            'filing_year': {
+                'tax_year': current_year - 1,
+                'total_paid': filing_summary['total_paid'],
+                'contractors_need_1099': filing_summary['contractors_need_1099'],
+                'top_payees': filing_summary['top_payees']
+            },
+            'years': {
+                str(tax_year): {
+                    'total_paid': year['total_paid'],
+                    'payment_count': year['payment_count'],
+                    'contractors_need_1099': year['contractors_need_1099']
+                }
+                for tax_year, year in sorted(summary['years'].items())
+            }
         })
 
     except Exception as e:
@@ -306,14 +501,16 @@ def delete_contractor(contractor_id):
 
         contractor_name = contractor.name
 
-        # Delete associated payments
+        # Delete associated payments and their rollups
         ContractorPayment.query.filter_by(contractor_id=contractor.id).delete()
+        ContractorPaymentRollup.query.filter_by(contractor_id=contractor.id).delete()
 
         # Delete associated 1099 forms
         Form1099.query.filter_by(contractor_id=contractor.id).delete()
 
         # Delete contractor
         db.session.delete(contractor)
+        mark_contractors_changed(current_user.id)
         db.session.commit()
 
         flash(f'Contractor {contractor_name} deleted successfully', 'success')
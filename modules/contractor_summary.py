@@ -0,0 +1,149 @@
+"""
+Contractor Summary Module
+
+This module computes the contractor dashboard statistics (contractor count,
+per-year totals, contractors needing a 1099 and top payees) from the payment
+rollups in a single grouped query, and caches the result per user. Cached
+summaries are keyed on the contractor version stored in the database, so a
+write committed by any worker process discards them, and otherwise expire
+after a short TTL. The contractor list itself is paginated and sorted in the
+database.
+"""
+
+import threading
+import time
+
+from sqlalchemy import case, func, select
+
+from app import db
+from app.models import Contractor, ContractorPaymentRollup
+from modules.contractor_rollups import FORM_1099_THRESHOLD, get_rollup_version
+
+# Seconds a cached summary may be served without re-querying
+SUMMARY_CACHE_TTL = 60
+
+# Payees listed per tax year
+TOP_PAYEES = 5
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+# Sortable list columns
+SORT_COLUMNS = {
+    'name': Contractor.name,
+    'business_name': Contractor.business_name,
+    'email': Contractor.email,
+    'total_paid_ytd': Contractor.total_paid_ytd,
+    'created_at': Contractor.created_at,
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _empty_year():
+    return {'total_paid': 0.0, 'payment_count': 0, 'contractors_need_1099': 0, 'top_payees': []}
+
+
+def _compute_summary(user_id):
+    """Build a user's summary with one windowed query over the rollups"""
+    rollup = ContractorPaymentRollup
+    by_year = {'partition_by': rollup.tax_year}
+
+    contractor_count = select(func.count(Contractor.id)).where(Contractor.user_id == user_id).scalar_subquery()
+    ranked = select(
+        rollup.tax_year,
+        rollup.contractor_id,
+        Contractor.name,
+        rollup.total_amount,
+        func.sum(rollup.total_amount).over(**by_year).label('year_total'),
+        func.sum(rollup.payment_count).over(**by_year).label('year_payments'),
+        func.sum(case((rollup.total_amount >= FORM_1099_THRESHOLD, 1), else_=0)).over(**by_year).label('year_need_1099'),
+        func.row_number().over(
+            partition_by=rollup.tax_year, order_by=(rollup.total_amount.desc(), rollup.contractor_id)
+        ).label('payee_rank'),
+        contractor_count.label('contractor_count'),
+    ).join(
+        Contractor, Contractor.id == rollup.contractor_id
+    ).where(rollup.user_id == user_id).subquery()
+
+    # Every year keeps at least its top-ranked row, which carries the year totals
+    rows = db.session.execute(
+        select(ranked).where(ranked.c.payee_rank <= TOP_PAYEES).order_by(ranked.c.tax_year, ranked.c.payee_rank)
+    ).all()
+
+    if rows:
+        total_contractors = rows[0].contractor_count
+    else:
+        total_contractors = db.session.scalar(select(contractor_count))
+
+    years = {}
+    for row in rows:
+        year = years.get(row.tax_year)
+        if year is None:
+            year = years[row.tax_year] = {
+                'total_paid': float(row.year_total or 0),
+                'payment_count': int(row.year_payments or 0),
+                'contractors_need_1099': int(row.year_need_1099 or 0),
+                'top_payees': [],
+            }
+        year['top_payees'].append({
+            'contractor_id': row.contractor_id,
+            'name': row.name,
+            'total_paid': float(row.total_amount or 0),
+        })
+
+    return {'total_contractors': total_contractors or 0, 'years': years}
+
+
+def get_contractor_summary(user_id):
+    """
+    Get a user's contractor summary, from cache when it is still current
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        Dictionary with total_contractors and 'years': tax_year ->
+        {total_paid, payment_count, contractors_need_1099, top_payees}
+    """
+    version = get_rollup_version(user_id)
+    now = time.monotonic()
+
+    with _cache_lock:
+        cached = _cache.get(user_id)
+    if cached and cached['version'] == version and now - cached['cached_at'] < SUMMARY_CACHE_TTL:
+        return cached['summary']
+
+    summary = _compute_summary(user_id)
+    with _cache_lock:
+        _cache[user_id] = {'version': version, 'cached_at': now, 'summary': summary}
+    return summary
+
+
+def get_year_summary(summary, tax_year):
+    """Get one tax year's figures from a summary (zeros if there were no payments)"""
+    return summary['years'].get(tax_year) or _empty_year()
+
+
+def list_contractors(user_id, page=1, per_page=DEFAULT_PAGE_SIZE, sort='name', direction='asc'):
+    """
+    Get one page of a user's contractors, sorted in the database
+
+    Args:
+        user_id: User ID
+        page: 1-based page number
+        per_page: Contractors per page (capped at MAX_PAGE_SIZE)
+        sort: Column name from SORT_COLUMNS
+        direction: 'asc' or 'desc'
+
+    Returns:
+        Flask-SQLAlchemy Pagination object
+    """
+    column = SORT_COLUMNS.get(sort, Contractor.name)
+    order = column.desc() if direction == 'desc' else column.asc()
+    per_page = max(1, min(per_page or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+    return Contractor.query.filter_by(user_id=user_id).order_by(order, Contractor.id).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
@@ -0,0 +1,291 @@
+"""
+Contractor TIN Validation Module
+
+This module checks contractor TINs before 1099 filing and finds duplicate
+payees. TINs are normalized to digits and checked offline against the IRS
+format rules (EIN campus prefixes, SSN area/group/serial ranges and ITIN
+group ranges). Duplicates are found by bucketing each user's contractors in
+hash indexes keyed on normalized TIN and normalized name, then joining
+buckets that share a contractor, so a sweep is linear in the number of
+contractors rather than pairwise.
+
+The result includes a merge plan: one entry per cluster of duplicates naming
+the contractor to keep and the ones to fold into it. Only clusters that share
+a single TIN are marked for merge; clusters matched by name alone, or whose
+TINs disagree, are marked for review.
+"""
+
+import re
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Contractor, ContractorPaymentRollup
+from modules.contractor_payment_import import normalize_tin
+
+# Contractors fetched per round trip during a sweep
+SWEEP_BATCH_SIZE = 2000
+
+# EIN prefixes assigned by IRS campuses and the online application
+VALID_EIN_PREFIXES = frozenset(
+    [f"{prefix:02d}" for prefix in range(1, 7)] +
+    [f"{prefix:02d}" for prefix in range(10, 17)] +
+    [f"{prefix:02d}" for prefix in range(20, 28)] +
+    [f"{prefix:02d}" for prefix in range(30, 49)] +
+    [f"{prefix:02d}" for prefix in range(50, 69)] +
+    [f"{prefix:02d}" for prefix in range(71, 78)] +
+    [f"{prefix:02d}" for prefix in range(80, 89)] +
+    [f"{prefix:02d}" for prefix in range(90, 96)] +
+    ['98', '99']
+)
+
+# Middle digits used by ITINs (which start with 9)
+VALID_ITIN_GROUPS = frozenset(
+    list(range(50, 66)) + list(range(70, 89)) + [90, 91, 92] + list(range(94, 100))
+)
+
+# Values people type when they don't have the real number
+PLACEHOLDER_TINS = frozenset(['123456789', '987654321'] + [str(digit) * 9 for digit in range(10)])
+
+# Entity suffixes ignored when comparing names
+_NAME_SUFFIXES = frozenset(['llc', 'inc', 'corp', 'corporation', 'co', 'company', 'ltd', 'lp', 'llp', 'pc', 'pllc'])
+
+_EIN_FORMAT = re.compile(r'^\d{2}-\d{7}$')
+_SSN_FORMAT = re.compile(r'^\d{3}-\d{2}-\d{4}$')
+_NAME_WORD = re.compile(r'[a-z0-9]+')
+
+
+def normalize_name(value):
+    """Lower-case a name and drop punctuation and entity suffixes for matching"""
+    words = [word for word in _NAME_WORD.findall(str(value or '').lower()) if word not in _NAME_SUFFIXES]
+    return ' '.join(words)
+
+
+def mask_tin(tin):
+    """Show only the last four digits of a TIN"""
+    return f"***-**-{tin[-4:]}" if len(tin) >= 4 else ''
+
+
+def _ssn_errors(digits):
+    area, group, serial = digits[:3], digits[3:5], digits[5:]
+    if area.startswith('9'):
+        if int(group) not in VALID_ITIN_GROUPS:
+            return ["ITIN group digits are not in an issued range"]
+        return []
+    errors = []
+    if area in ('000', '666'):
+        errors.append(f"SSN area {area} is never issued")
+    if group == '00':
+        errors.append("SSN group 00 is never issued")
+    if serial == '0000':
+        errors.append("SSN serial 0000 is never issued")
+    return errors
+
+
+def _ein_errors(digits):
+    if digits[:2] not in VALID_EIN_PREFIXES:
+        return [f"EIN prefix {digits[:2]} is not assigned by the IRS"]
+    return []
+
+
+def validate_tin(value):
+    """
+    Check a contractor TIN offline
+
+    Dashed values are checked as the type their format implies; bare 9-digit
+    values are accepted if they are valid as either an EIN or an SSN/ITIN.
+
+    Args:
+        value: TIN as entered
+
+    Returns:
+        Tuple of (normalized digits, tin type 'ein'/'ssn'/None, list of errors)
+    """
+    raw = str(value or '').strip()
+    digits = normalize_tin(raw)
+
+    if not raw:
+        return digits, None, ["TIN is missing"]
+    if len(digits) != 9:
+        return digits, None, [f"TIN must have 9 digits (found {len(digits)})"]
+    if digits in PLACEHOLDER_TINS:
+        return digits, None, ["TIN is a placeholder value"]
+
+    if _EIN_FORMAT.match(raw):
+        return digits, 'ein', _ein_errors(digits)
+    if _SSN_FORMAT.match(raw):
+        return digits, 'ssn', _ssn_errors(digits)
+
+    ein_errors = _ein_errors(digits)
+    ssn_errors = _ssn_errors(digits)
+    if not ein_errors and not ssn_errors:
+        return digits, None, []
+    if not ein_errors:
+        return digits, 'ein', []
+    if not ssn_errors:
+        return digits, 'ssn', []
+    return digits, None, ein_errors + ssn_errors
+
+
+class _Clusters:
+    """Union-find over contractor IDs"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, items):
+        items = list(items)
+        root = self.find(items[0])
+        for item in items[1:]:
+            other = self.find(item)
+            if other != root:
+                self.parent[other] = root
+        return root
+
+
+def _plan_user(user_id, contractors, paid_totals):
+    """
+    Build merge plan entries for one user's contractors
+
+    Args:
+        user_id: User ID
+        contractors: Dict of contractor_id -> info dict (tin, valid, names)
+        paid_totals: Dict of contractor_id -> lifetime total paid
+
+    Returns:
+        List of merge plan entries
+    """
+    by_tin = {}
+    by_name = {}
+    for contractor_id, info in contractors.items():
+        if info['tin']:
+            by_tin.setdefault(info['tin'], set()).add(contractor_id)
+        for name in info['names']:
+            by_name.setdefault(name, set()).add(contractor_id)
+
+    tin_groups = [ids for ids in by_tin.values() if len(ids) > 1]
+    name_groups = [ids for ids in by_name.values() if len(ids) > 1]
+    if not tin_groups and not name_groups:
+        return []
+
+    clusters = _Clusters()
+    for ids in tin_groups + name_groups:
+        clusters.union(ids)
+
+    members = {}
+    for ids in tin_groups + name_groups:
+        for contractor_id in ids:
+            members.setdefault(clusters.find(contractor_id), set()).add(contractor_id)
+
+    tin_matched = set().union(*tin_groups) if tin_groups else set()
+    name_matched = set().union(*name_groups) if name_groups else set()
+
+    plan = []
+    for ids in members.values():
+        # Keep the contractor with a valid TIN that has been paid the most
+        survivor = max(ids, key=lambda cid: (contractors[cid]['valid'], paid_totals.get(cid, 0), -cid))
+        merge_ids = sorted(ids - {survivor})
+        distinct_tins = {contractors[cid]['tin'] for cid in ids if contractors[cid]['tin']}
+
+        reasons = []
+        if ids & tin_matched:
+            reasons.append('same_tin')
+        if ids & name_matched:
+            reasons.append('same_name')
+
+        plan.append({
+            'user_id': user_id,
+            'action': 'merge' if 'same_tin' in reasons and len(distinct_tins) == 1 else 'review',
+            'reasons': reasons,
+            'survivor_id': survivor,
+            'survivor_name': contractors[survivor]['name'],
+            'merge_ids': merge_ids,
+            'merge_names': [contractors[cid]['name'] for cid in merge_ids],
+            'distinct_tins': len(distinct_tins),
+            'combined_total_paid': float(sum(paid_totals.get(cid, 0) for cid in ids)),
+        })
+    return plan
+
+
+def validate_contractors(user_id=None):
+    """
+    Validate TINs and find duplicate payees for one user or every user
+
+    Contractors are streamed in user order, so only one user's contractors
+    are held in memory at a time.
+
+    Args:
+        user_id: Optional user ID to limit the sweep to
+
+    Returns:
+        Dictionary with contractors_checked, invalid (per-contractor errors)
+        and merge_plan (duplicate clusters)
+    """
+    paid = select(
+        ContractorPaymentRollup.contractor_id,
+        func.sum(ContractorPaymentRollup.total_amount).label('total_paid')
+    ).group_by(ContractorPaymentRollup.contractor_id)
+    if user_id is not None:
+        paid = paid.where(ContractorPaymentRollup.user_id == user_id)
+    paid = paid.subquery()
+
+    query = select(
+        Contractor.id, Contractor.user_id, Contractor.name, Contractor.business_name, Contractor.ein,
+        func.coalesce(paid.c.total_paid, 0)
+    ).outerjoin(paid, paid.c.contractor_id == Contractor.id)
+    if user_id is not None:
+        query = query.where(Contractor.user_id == user_id)
+    query = query.order_by(Contractor.user_id, Contractor.id).execution_options(
+        stream_results=True, yield_per=SWEEP_BATCH_SIZE
+    )
+
+    checked = 0
+    invalid = []
+    merge_plan = []
+    current_user_id = None
+    contractors = {}
+    paid_totals = {}
+
+    for contractor_id, owner_id, name, business_name, ein, total_paid in db.session.execute(query):
+        if owner_id != current_user_id:
+            if contractors:
+                merge_plan.extend(_plan_user(current_user_id, contractors, paid_totals))
+            current_user_id, contractors, paid_totals = owner_id, {}, {}
+
+        checked += 1
+        tin, _, errors = validate_tin(ein)
+        if errors:
+            invalid.append({
+                'user_id': owner_id,
+                'contractor_id': contractor_id,
+                'name': name,
+                'tin': mask_tin(tin),
+                'errors': errors,
+            })
+
+        names = {normalize_name(name), normalize_name(business_name)} - {''}
+        contractors[contractor_id] = {
+            'name': name,
+            'tin': tin if len(tin) == 9 and tin not in PLACEHOLDER_TINS else None,
+            'valid': not errors,
+            'names': names,
+        }
+        paid_totals[contractor_id] = total_paid
+
+    if contractors:
+        merge_plan.extend(_plan_user(current_user_id, contractors, paid_totals))
+
+    return {
+        'contractors_checked': checked,
+        'invalid_count': len(invalid),
+        'invalid': invalid,
+        'duplicate_groups': len(merge_plan),
+        'merge_plan': merge_plan,
+    }
@@ -0,0 +1,118 @@
+"""
+Database Utilities Module
+
+This module holds small helpers shared by the modules that write through
+db.session: picking the dialect's upsert-capable INSERT, adding deltas onto
+running-total rows, and keeping the per-user data versions that caches are
+keyed on.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import DataVersion
+
+# DataVersion user_id for changes that touch every user's data (full rebuilds)
+ALL_USERS = 0
+
+
+def dialect_insert():
+    """Return the dialect's INSERT supporting ON CONFLICT, or None"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def upsert_totals(model, key_columns, rows, count_column):
+    """
+    Add deltas onto running-total rows, creating missing ones
+
+    All rows are applied in one upsert statement where the database supports
+    it. Totals whose count drops to zero or below are then deleted, since
+    they carry no information. The caller commits.
+
+    Args:
+        model: Totals model with a user_id column and a unique key on key_columns
+        key_columns: Column names identifying a totals row
+        rows: Dictionaries of key columns, delta columns and updated_at
+        count_column: Delta column counting the rows behind each total
+    """
+    if not rows:
+        return
+    delta_columns = [column for column in rows[0] if column not in key_columns and column != 'updated_at']
+
+    insert = dialect_insert()
+    if insert is not None:
+        statement = insert(model).values(rows)
+        set_ = {column: getattr(model, column) + statement.excluded[column] for column in delta_columns}
+        set_['updated_at'] = statement.excluded.updated_at
+        db.session.execute(statement.on_conflict_do_update(index_elements=key_columns, set_=set_))
+    else:
+        for row in rows:
+            total = model.query.filter_by(
+                **{column: row[column] for column in key_columns}
+            ).with_for_update().first()
+            if total is None:
+                db.session.add(model(**row))
+            else:
+                for column in delta_columns:
+                    setattr(total, column, (getattr(total, column) or 0) + row[column])
+                total.updated_at = row['updated_at']
+
+    db.session.execute(
+        model.__table__.delete().where(
+            model.user_id.in_({row['user_id'] for row in rows}),
+            getattr(model, count_column) <= 0
+        )
+    )
+
+
+def bump_data_version(user_id, scope):
+    """
+    Increment a user's version of a scope in the current transaction
+
+    The bump commits or rolls back together with the writes it describes, so
+    every worker process reads a version that matches the data. The caller
+    commits.
+
+    Args:
+        user_id: User ID, or ALL_USERS to move every user's version
+        scope: Name of the data the version covers
+    """
+    now = datetime.utcnow()
+    insert = dialect_insert()
+    if insert is not None:
+        statement = insert(DataVersion).values(user_id=user_id, scope=scope, version=1, updated_at=now)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['user_id', 'scope'],
+            set_={'version': DataVersion.version + 1, 'updated_at': now}
+        ))
+    else:
+        row = DataVersion.query.filter_by(user_id=user_id, scope=scope).with_for_update().first()
+        if row is None:
+            db.session.add(DataVersion(user_id=user_id, scope=scope, version=1, updated_at=now))
+        else:
+            row.version += 1
+            row.updated_at = now
+
+
+def get_data_version(user_id, scope):
+    """
+    Version token for a user's data in a scope, read from the database
+
+    Sums the user's own counter and the ALL_USERS one; both only grow, so the
+    token changes whenever either is bumped.
+    """
+    return db.session.scalar(
+        select(func.coalesce(func.sum(DataVersion.version), 0)).where(
+            DataVersion.scope == scope,
+            DataVersion.user_id.in_((user_id, ALL_USERS))
+        )
+    )
@@ -0,0 +1,247 @@
+"""
+Document Field Extraction Module
+
+This module detects tax document types and extracts their fields using
+declarative extraction specs. Specs are compiled once at import: detection
+lowercases the text a single time and checks each distinct phrase at most
+once, and field patterns are precompiled rather than rebuilt per document.
+Large batches can be spread across a process pool.
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.process_pools import MP_CONTEXT
+
+# Reusable value patterns
+AMOUNT = r'[0-9,.]+'
+TEXT = r'[A-Za-z0-9 ,\-/]+'
+EIN = r'\d{2}-\d{7}'
+TIN = r'\d{2}-\d{7}|\d{3}-\d{2}-\d{4}'
+
+_FORM_1099_FIELDS = {
+    "payer_tin": (r'PAYER\'?S?\s*(?:TIN|taxpayer\s*identification\s*number)\s*', EIN),
+    "recipient_tin": (r'RECIPIENT\'?S?\s*(?:TIN|taxpayer\s*identification\s*number)\s*', TIN),
+}
+
+# Extraction specs in detection priority order.
+#
+# detect:   the type matches if any of these phrases appears
+# requires: every one of these phrases must also appear
+# fields:   field name -> (label pattern, value pattern); the value is captured
+DOCUMENT_SPECS = [
+    {
+        "type": "w2",
+        "detect": [r'form w-2', r'wage and tax statement'],
+        "fields": {
+            "employer_ein": (r'Employer identification number\s*(?:\(EIN\))?\s*', EIN),
+            "wages": (r'Wages, tips, other comp\.?\s*\$?', AMOUNT),
+            "federal_income_tax": (r'Federal income tax withheld\s*\$?', AMOUNT),
+            "social_security_wages": (r'Social security wages\s*\$?', AMOUNT),
+            "social_security_tax": (r'Social security tax withheld\s*\$?', AMOUNT),
+            "medicare_wages": (r'Medicare wages and tips\s*\$?', AMOUNT),
+            "medicare_tax": (r'Medicare tax withheld\s*\$?', AMOUNT),
+        },
+    },
+    {
+        "type": "1099_misc",
+        "detect": [r'1099-misc', r'miscellaneous income'],
+        "requires": [r'form 1099-'],
+        "fields": dict(_FORM_1099_FIELDS, **{
+            "rents": (r'Rents\s*\$?', AMOUNT),
+            "royalties": (r'Royalties\s*\$?', AMOUNT),
+            "other_income": (r'Other income\s*\$?', AMOUNT),
+        }),
+    },
+    {
+        "type": "1099_nec",
+        "detect": [r'1099-nec', r'nonemployee compensation'],
+        "requires": [r'form 1099-'],
+        "fields": dict(_FORM_1099_FIELDS, **{
+            "nonemployee_compensation": (r'Nonemployee compensation\s*\$?', AMOUNT),
+        }),
+    },
+    {
+        "type": "1099",
+        "detect": [r'form 1099-'],
+        "fields": dict(_FORM_1099_FIELDS),
+    },
+    {
+        "type": "schedule_c",
+        "detect": [r'schedule c', r'profit or loss from business'],
+        "fields": {},
+    },
+    {
+        "type": "bank_statement",
+        "detect": [r'bank statement', r'account statement'],
+        "fields": {
+            "account_number": (r'Account\s*(?:Number|#)\s*[:.]\s*(?:[X*]+)?', r'\d{4,}'),
+            "statement_period": (r'Statement\s*Period\s*[:.]\s*', TEXT),
+            "opening_balance": (r'(?:Opening|Beginning)\s*Balance\s*[:.]\s*\$?', AMOUNT),
+            "closing_balance": (r'(?:Closing|Ending)\s*Balance\s*[:.]\s*\$?', AMOUNT),
+        },
+    },
+    {
+        "type": "invoice",
+        "detect": [r'invoice', r'bill to'],
+        "fields": {
+            "invoice_number": (r'(?:Invoice|Bill|Reference)\s*(?:Number|No|#)\s*[:.]\s*', r'[A-Za-z0-9\-]+'),
+            "invoice_date": (r'(?:Invoice|Bill)\s*Date\s*[:.]\s*', TEXT),
+            "due_date": (r'(?:Due|Payment)\s*Date\s*[:.]\s*', TEXT),
+            "total_amount": (r'(?:Total|Amount Due|Balance Due)\s*[:.]\s*\$?', AMOUNT),
+        },
+    },
+    {
+        "type": "receipt",
+        "detect": [r'receipt', r'payment received'],
+        "fields": {
+            "receipt_date": (r'(?:Date|Receipt Date)\s*[:.]\s*', TEXT),
+            "total_amount": (r'(?:Total|Amount|Total Amount|Grand Total)\s*[:.]\s*\$?', AMOUNT),
+            "payment_method": (r'(?:Payment Method|Paid By|Method)\s*[:.]\s*', r'[A-Za-z0-9 ]+'),
+        },
+    },
+    {
+        "type": "expense_report",
+        "detect": [r'expense report'],
+        "fields": {},
+    },
+]
+
+# Below this many documents a batch is processed in-process
+BATCH_PARALLEL_THRESHOLD = 64
+
+
+class DocumentExtractor:
+    """Compiled document type detector and field extractor"""
+
+    def __init__(self, specs=None):
+        self.specs = specs if specs is not None else DOCUMENT_SPECS
+
+        # Detection phrases are matched against lowercased text
+        self._detectors = [
+            (spec["type"],
+             tuple(phrase.lower() for phrase in spec["detect"]),
+             tuple(phrase.lower() for phrase in spec.get("requires", [])))
+            for spec in self.specs
+        ]
+
+        # Field patterns are compiled once per type rather than on every search
+        self._field_patterns = {
+            spec["type"]: [
+                (field_name, re.compile(f"{label}({value})", re.IGNORECASE))
+                for field_name, (label, value) in spec["fields"].items()
+            ]
+            for spec in self.specs
+            if spec["fields"]
+        }
+
+    def detect(self, text):
+        """
+        Detect the type of document based on its content
+
+        Args:
+            text: Extracted text from the document
+
+        Returns:
+            String indicating the document type ("unknown" if none match)
+        """
+        if not text:
+            return "unknown"
+
+        text_lower = text.lower()
+        present = {}
+
+        def _contains(phrase):
+            # Phrases shared between specs are only searched for once
+            if phrase not in present:
+                present[phrase] = phrase in text_lower
+            return present[phrase]
+
+        for document_type, detect, requires in self._detectors:
+            if any(_contains(phrase) for phrase in detect) and all(_contains(phrase) for phrase in requires):
+                return document_type
+
+        return "unknown"
+
+    def extract_fields(self, text, document_type):
+        """
+        Extract all fields for a document type
+
+        Args:
+            text: Extracted text from the document
+            document_type: Detected document type
+
+        Returns:
+            Dictionary with every field for the type (None when not found)
+        """
+        fields = {}
+        for field_name, pattern in self._field_patterns.get(document_type, []):
+            match = pattern.search(text or "")
+            fields[field_name] = match.group(1).strip() if match else None
+        return fields
+
+    def extract(self, text):
+        """
+        Detect the document type and extract its fields
+
+        Args:
+            text: Extracted text from the document
+
+        Returns:
+            Dictionary with detected_type and extracted_data
+        """
+        document_type = self.detect(text)
+        return {
+            "detected_type": document_type,
+            "extracted_data": self.extract_fields(text, document_type)
+        }
+
+    def extract_batch(self, texts, max_workers=None):
+        """
+        Detect and extract many documents
+
+        Small batches, and any batch on a single-CPU host, run in-process;
+        larger ones are spread across a spawned process pool since regex
+        scanning is CPU bound.
+
+        Args:
+            texts: Iterable of document texts
+            max_workers: Maximum worker processes for large batches
+
+        Returns:
+            List of extraction results in input order
+        """
+        texts = list(texts)
+        workers = max_workers or os.cpu_count() or 1
+        # Workers use the module-level extractor, so custom specs stay in-process
+        if len(texts) < BATCH_PARALLEL_THRESHOLD or workers < 2 or self is not default_extractor:
+            return [self.extract(text) for text in texts]
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=MP_CONTEXT) as executor:
+            chunksize = max(1, len(texts) // (workers * 4))
+            return list(executor.map(extract_document, texts, chunksize=chunksize))
+
+
+# Compiled once per process (spawned pool workers compile it on import)
+default_extractor = DocumentExtractor()
+
+
+def detect_document_type(text):
+    """Detect a document's type with the default specs"""
+    return default_extractor.detect(text)
+
+
+def extract_fields(text, document_type):
+    """Extract a document's fields with the default specs"""
+    return default_extractor.extract_fields(text, document_type)
+
+
+def extract_document(text):
+    """Detect and extract a single document with the default specs"""
+    return default_extractor.extract(text)
+
+
+def extract_documents(texts, max_workers=None):
+    """Detect and extract a batch of documents with the default specs"""
+    return default_extractor.extract_batch(texts, max_workers=max_workers)
@@ -0,0 +1,334 @@
+"""
+Document Search Module
+
+This module provides full-text search over uploaded documents. Postgres
+databases use a tsvector column with a GIN index, SQLite databases use an FTS5
+virtual table, and any other database falls back to substring matching. All
+backends share one interface, and documents are indexed one at a time as their
+extraction or analysis completes.
+"""
+
+import logging
+import re
+from abc import ABC, abstractmethod
+
+from markupsafe import escape, Markup
+from sqlalchemy import text
+
+from app import db
+from app.models import Document
+
+# Snippet highlight markers; swapped for <mark> tags after HTML escaping
+_HIGHLIGHT_START = "\x02"
+_HIGHLIGHT_END = "\x03"
+
+# Words kept from a user query
+_QUERY_TERM = re.compile(r"\w+")
+
+# Filler words dropped from queries so "that 1099 from acme" still matches
+_STOPWORDS = {
+    "a", "an", "and", "the", "that", "this", "from", "for", "of", "to", "in",
+    "on", "with", "my", "by", "at", "or", "is", "it",
+}
+
+DEFAULT_RESULT_LIMIT = 20
+
+# Postgres headline source: the title followed by build_search_content, so
+# snippets cover every field a match can come from
+_HEADLINE_SOURCE = (
+    "concat_ws(E'\\n', original_filename, replace(nullif(detected_type, 'unknown'), '_', ' '), "
+    "coalesce(extracted_text, extracted_data->>'extracted_text'), ai_analysis->>'document_summary')"
+)
+
+
+def _query_terms(query):
+    """Split a user query into search terms, dropping operators and punctuation"""
+    terms = [term.lower() for term in _QUERY_TERM.findall(query or "")]
+    return [term for term in terms if term not in _STOPWORDS][:16]
+
+
+def build_search_content(document):
+    """
+    Build the searchable body of a document
+
+    Args:
+        document: Document model instance
+
+    Returns:
+        Text combining the detected type, extracted text and AI summary
+    """
+    parts = []
+    if document.detected_type and document.detected_type != 'unknown':
+        parts.append(document.detected_type.replace('_', ' '))
+    if document.extracted_text:
+        parts.append(document.extracted_text)
+    elif document.extracted_data:
+        parts.append(document.extracted_data.get('extracted_text') or '')
+    summary = (document.ai_analysis or {}).get('document_summary')
+    if summary:
+        parts.append(summary)
+    return "\n".join(parts)
+
+
+def _like_pattern(term):
+    """LIKE pattern matching a term anywhere, with % and _ taken literally"""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def highlight_snippet(snippet):
+    """Escape a snippet and turn highlight markers into <mark> tags"""
+    escaped = str(escape(snippet or ""))
+    return Markup(escaped.replace(_HIGHLIGHT_START, "<mark>").replace(_HIGHLIGHT_END, "</mark>"))
+
+
+class DocumentSearchBackend(ABC):
+    """Interface shared by the search backends"""
+
+    def ensure_schema(self):
+        """Create any index structures the backend needs"""
+
+    def index_document(self, document, commit=True):
+        """Add or refresh a single document in the index"""
+
+    def remove_document(self, doc_id):
+        """Remove a document from the index"""
+
+    @abstractmethod
+    def search(self, user_id, query, category=None, limit=DEFAULT_RESULT_LIMIT):
+        """
+        Search a user's documents
+
+        Args:
+            user_id: User ID
+            query: Free-text query
+            category: Optional category filter
+            limit: Maximum number of results
+
+        Returns:
+            List of (Document, rank, snippet) tuples, best match first
+        """
+
+    def _load_documents(self, rows):
+        """Load Document rows for (doc_id, rank, snippet) results, keeping their order"""
+        ids = [row[0] for row in rows]
+        if not ids:
+            return []
+        documents = {document.id: document for document in Document.query.filter(Document.id.in_(ids))}
+        return [
+            (documents[doc_id], rank, highlight_snippet(snippet))
+            for doc_id, rank, snippet in rows
+            if doc_id in documents
+        ]
+
+
+class SQLiteFTSBackend(DocumentSearchBackend):
+    """SQLite FTS5 backend with BM25 ranking"""
+
+    def ensure_schema(self):
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+            "document_id UNINDEXED, title, content, tokenize='porter unicode61')"
+        ))
+        db.session.commit()
+
+    def index_document(self, document, commit=True):
+        db.session.execute(text("DELETE FROM documents_fts WHERE document_id = :doc_id"), {"doc_id": document.id})
+        db.session.execute(
+            text("INSERT INTO documents_fts (document_id, title, content) VALUES (:doc_id, :title, :content)"),
+            {"doc_id": document.id, "title": document.original_filename, "content": build_search_content(document)}
+        )
+        if commit:
+            db.session.commit()
+
+    def remove_document(self, doc_id):
+        db.session.execute(text("DELETE FROM documents_fts WHERE document_id = :doc_id"), {"doc_id": doc_id})
+        db.session.commit()
+
+    def search(self, user_id, query, category=None, limit=DEFAULT_RESULT_LIMIT):
+        terms = _query_terms(query)
+        if not terms:
+            return []
+
+        # Each term is quoted so user input cannot inject FTS5 syntax; the
+        # trailing * makes the last term match as a prefix while typing
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        rows = db.session.execute(text(
+            "SELECT f.document_id, bm25(documents_fts, 0.0, 5.0, 1.0) AS rank, "
+            # Column -1 lets FTS5 take the snippet from whichever column matched
+            f"snippet(documents_fts, -1, '{_HIGHLIGHT_START}', '{_HIGHLIGHT_END}', '...', 16) "
+            "FROM documents_fts f JOIN documents d ON d.id = f.document_id "
+            "WHERE documents_fts MATCH :match AND d.user_id = :user_id "
+            "AND (:category IS NULL OR d.category = :category) "
+            "ORDER BY rank LIMIT :limit"
+        ), {"match": match, "user_id": user_id, "category": category, "limit": limit}).fetchall()
+
+        # bm25 scores are lower-is-better; negate so higher ranks are better
+        return self._load_documents([(row[0], -row[1], row[2]) for row in rows])
+
+
+class PostgresFTSBackend(DocumentSearchBackend):
+    """Postgres tsvector backend with ts_rank ranking"""
+
+    def ensure_schema(self):
+        db.session.execute(text("ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_documents_search_vector ON documents USING gin (search_vector)"
+        ))
+        db.session.commit()
+
+    def index_document(self, document, commit=True):
+        # The filename is weighted above the body text
+        db.session.execute(text(
+            "UPDATE documents SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(:title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(:content, '')), 'B') "
+            "WHERE id = :doc_id"
+        ), {"doc_id": document.id, "title": document.original_filename, "content": build_search_content(document)})
+        if commit:
+            db.session.commit()
+
+    def remove_document(self, doc_id):
+        # The vector is stored on the document row and is deleted with it
+        pass
+
+    def search(self, user_id, query, category=None, limit=DEFAULT_RESULT_LIMIT):
+        terms = _query_terms(query)
+        if not terms:
+            return []
+
+        tsquery = " & ".join(terms) + ":*"
+        # Headlines are only generated for the rows that survive the LIMIT
+        rows = db.session.execute(text(
+            "SELECT ranked.id, ranked.rank, "
+            f"ts_headline('english', {_HEADLINE_SOURCE}, to_tsquery('english', :tsquery), "
+            f"'StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_END}, MaxWords=30, MinWords=10') "
+            "FROM ("
+            "  SELECT id, original_filename, detected_type, extracted_text, extracted_data, ai_analysis, "
+            "  ts_rank(search_vector, to_tsquery('english', :tsquery)) AS rank "
+            "  FROM documents "
+            "  WHERE user_id = :user_id AND search_vector @@ to_tsquery('english', :tsquery) "
+            "  AND (CAST(:category AS VARCHAR) IS NULL OR category = :category) "
+            "  ORDER BY rank DESC LIMIT :limit"
+            ") AS ranked ORDER BY ranked.rank DESC"
+        ), {"tsquery": tsquery, "user_id": user_id, "category": category, "limit": limit}).fetchall()
+
+        return self._load_documents(rows)
+
+
+class SubstringSearchBackend(DocumentSearchBackend):
+    """Fallback for databases without full-text support; matches every term as a substring"""
+
+    def search(self, user_id, query, category=None, limit=DEFAULT_RESULT_LIMIT):
+        terms = _query_terms(query)
+        if not terms:
+            return []
+
+        documents = Document.query.filter_by(user_id=user_id)
+        if category:
+            documents = documents.filter_by(category=category)
+        for term in terms:
+            pattern = _like_pattern(term)
+            documents = documents.filter(db.or_(
+                Document.original_filename.ilike(pattern, escape="\\"),
+                Document.extracted_text.ilike(pattern, escape="\\")
+            ))
+
+        results = []
+        for document in documents.order_by(Document.upload_date.desc()).limit(limit):
+            snippet = (document.extracted_text or "")[:200]
+            results.append((document, 0.0, highlight_snippet(snippet)))
+        return results
+
+
+_BACKENDS = {
+    "sqlite": SQLiteFTSBackend,
+    "postgresql": PostgresFTSBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Get the search backend for the configured database"""
+    global _backend
+    if _backend is None:
+        _backend = _BACKENDS.get(db.engine.dialect.name, SubstringSearchBackend)()
+    return _backend
+
+
+def index_document(doc_id):
+    """
+    Index or re-index a document after extraction or analysis completes
+
+    Indexing failures are logged rather than raised so they never block an
+    upload.
+
+    Args:
+        doc_id: Document ID
+
+    Returns:
+        True if the document was indexed, False otherwise
+    """
+    try:
+        document = Document.query.get(doc_id)
+        if document is None:
+            return False
+        get_search_backend().index_document(document)
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error indexing document {doc_id}: {e}")
+        return False
+
+
+def remove_document(doc_id):
+    """Remove a deleted document from the search index"""
+    try:
+        get_search_backend().remove_document(doc_id)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error removing document {doc_id} from search index: {e}")
+
+
+def search_documents(user_id, query, category=None, limit=DEFAULT_RESULT_LIMIT):
+    """
+    Search a user's documents with the configured backend
+
+    Args:
+        user_id: User ID
+        query: Free-text query
+        category: Optional category filter
+        limit: Maximum number of results
+
+    Returns:
+        List of (Document, rank, snippet) tuples, best match first
+    """
+    return get_search_backend().search(user_id, query, category=category, limit=limit)
+
+
+def rebuild_index(user_id=None, batch_size=200):
+    """
+    Rebuild the search index for all documents, or one user's documents
+
+    Args:
+        user_id: Optional user ID to limit the rebuild to
+        batch_size: Documents indexed per commit
+
+    Returns:
+        Number of documents indexed
+    """
+    backend = get_search_backend()
+    backend.ensure_schema()
+
+    ids = db.session.query(Document.id)
+    if user_id is not None:
+        ids = ids.filter_by(user_id=user_id)
+    ids = [row.id for row in ids]
+
+    for start in range(0, len(ids), batch_size):
+        batch = Document.query.filter(Document.id.in_(ids[start:start + batch_size])).all()
+        for document in batch:
+            backend.index_document(document, commit=False)
+        db.session.commit()
+    return len(ids)
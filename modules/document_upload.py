@@ -5,10 +5,12 @@ This module provides document upload functionality with AI-powered OCR to extrac
 tax-relevant information from uploaded documents.
 """
 
-from flask import Blueprint, render_template, redirect, url_for, request, flash, session, jsonify, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, session, jsonify, current_app, send_file, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from app.models import User, BusinessProfile
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import User, BusinessProfile, Document
 from app.access_control import requires_access_level
 from ai.openai_interface import get_openai_response, analyze_image
 import os
@@ -16,12 +18,14 @@ import json
 import logging
 import uuid
 import base64
+import hashlib
 from datetime import datetime
-import pytesseract
 from PIL import Image
 import io
-import re
-import fitz  # PyMuPDF for PDF processing
+from modules.pdf_extraction import extract_pdf, ocr_image
+from modules import document_extraction
+from modules import document_search
+from modules.image_preprocessing import prepare_for_ocr, encode_for_vision, create_thumbnail
 
 # Create blueprint
 documents_bp = Blueprint("documents", __name__, url_prefix="/documents")
@@ -39,6 +43,33 @@ def get_user_folder(user_id):
         os.makedirs(user_folder)
     return user_folder
 
+def get_thumbnail_path(user_id, unique_filename):
+    """Get the path of a document's list-view thumbnail"""
+    thumbnail_name = f"{unique_filename.rsplit('.', 1)[0]}.jpg"
+    return os.path.join(get_user_folder(user_id), "thumbnails", thumbnail_name)
+
+def generate_thumbnail(user_id, unique_filename, file_path, file_extension):
+    """
+    Generate a document thumbnail, logging rather than raising on failure
+    
+    Returns:
+        The thumbnail path or None if it could not be created
+    """
+    try:
+        return create_thumbnail(file_path, file_extension, get_thumbnail_path(user_id, unique_filename))
+    except Exception as e:
+        logging.error(f"Error generating thumbnail for {file_path}: {e}")
+        return None
+
+# Characters of extracted text kept in extracted_data for display
+EXTRACTED_TEXT_PREVIEW_LENGTH = 1000
+
+def text_preview(text):
+    """Shorten extracted text to the preview stored alongside the extracted fields"""
+    if text and len(text) > EXTRACTED_TEXT_PREVIEW_LENGTH:
+        return text[:EXTRACTED_TEXT_PREVIEW_LENGTH] + "..."
+    return text
+
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp'}
 
@@ -50,13 +81,12 @@ def allowed_file(filename):
 @login_required
 def index():
     """Document upload and management page"""
-    uploads = get_user_documents(current_user.id)
-    recent_uploads = uploads[:5] if uploads else []
+    recent_uploads = get_user_documents(current_user.id, limit=5)
     
     return render_template(
         "documents/index.html",
         recent_uploads=recent_uploads,
-        document_count=len(uploads),
+        document_count=count_user_documents(current_user.id),
         document_categories=get_document_categories()
     )
 
@@ -96,11 +126,13 @@ def upload():
             # Save the file
             file.save(file_path)
             
+            generate_thumbnail(current_user.id, unique_filename, file_path, file_extension)
+            
             # Process the document and extract information
             document_data = process_document(file_path, file_extension)
             
-            # Save document metadata
-            save_document_metadata(
+            # Save document metadata and index its full text for search
+            doc_id = save_document_metadata(
                 user_id=current_user.id,
                 original_filename=original_filename,
                 unique_filename=unique_filename,
@@ -109,6 +141,7 @@ def upload():
                 file_path=file_path,
                 extracted_data=document_data
             )
+            document_search.index_document(doc_id)
             
             flash(f'File {original_filename} uploaded successfully!', 'success')
             
@@ -117,7 +150,7 @@ def upload():
                 return jsonify({
                     'success': True, 
                     'message': f'File {original_filename} uploaded successfully!',
-                    'document_data': document_data
+                    'document_data': dict(document_data, extracted_text=text_preview(document_data['extracted_text']))
                 })
             
             return redirect(url_for('documents.index'))
@@ -145,6 +178,25 @@ def view_document(doc_id):
         document=document
     )
 
+@documents_bp.route("/thumbnail/<string:doc_id>")
+@login_required
+def document_thumbnail(doc_id):
+    """Serve a document's thumbnail, generating it for older uploads"""
+    document = get_document_metadata(doc_id, current_user.id)
+    
+    if not document:
+        abort(404)
+    
+    thumbnail_path = get_thumbnail_path(current_user.id, document['unique_filename'])
+    if not os.path.exists(thumbnail_path):
+        thumbnail_path = generate_thumbnail(
+            current_user.id, document['unique_filename'], document['file_path'], document['file_extension']
+        )
+        if not thumbnail_path:
+            abort(404)
+    
+    return send_file(thumbnail_path, mimetype='image/jpeg', max_age=86400)
+
 @documents_bp.route("/delete/<string:doc_id>", methods=["POST"])
 @login_required
 def delete_document(doc_id):
@@ -155,12 +207,17 @@ def delete_document(doc_id):
         flash('Document not found', 'danger')
         return redirect(url_for('documents.index'))
     
-    # Delete the file
+    # Delete the file and its thumbnail
     if os.path.exists(document['file_path']):
         os.remove(document['file_path'])
     
-    # Remove metadata
+    thumbnail_path = get_thumbnail_path(current_user.id, document['unique_filename'])
+    if os.path.exists(thumbnail_path):
+        os.remove(thumbnail_path)
+    
+    # Remove metadata and search index entry
     delete_document_metadata(doc_id, current_user.id)
+    document_search.remove_document(doc_id)
     
     flash('Document deleted successfully', 'success')
     
@@ -183,6 +240,52 @@ def category_documents(category):
         category_info=get_document_categories().get(category, {'name': category.title()})
     )
 
+@documents_bp.route("/search")
+@login_required
+def search_documents():
+    """Full-text search over the user's documents"""
+    query = request.args.get('q', '').strip()
+    category = request.args.get('category') or None
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    
+    results = []
+    if query:
+        try:
+            results = document_search.search_documents(current_user.id, query, category=category, limit=limit)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error searching documents: {e}")
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({'success': False, 'error': 'Search is unavailable'}), 500
+            flash('Search is unavailable right now', 'danger')
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': [
+                {
+                    'id': document.id,
+                    'original_filename': document.original_filename,
+                    'category': document.category,
+                    'detected_type': document.detected_type,
+                    'upload_date': document.upload_date.isoformat() if document.upload_date else None,
+                    'rank': rank,
+                    'snippet': str(snippet),
+                    'url': url_for('documents.view_document', doc_id=document.id)
+                }
+                for document, rank, snippet in results
+            ]
+        })
+    
+    return render_template(
+        "documents/search.html",
+        query=query,
+        category=category,
+        results=results,
+        document_categories=get_document_categories()
+    )
+
 @documents_bp.route("/analyze/<string:doc_id>")
 @login_required
 @requires_access_level("ai_sorted_uploads")
@@ -203,6 +306,9 @@ def analyze_document(doc_id):
         'analyzed_at': datetime.now().isoformat()
     })
     
+    # The AI summary is searchable too
+    document_search.index_document(doc_id)
+    
     flash('Document analysis completed', 'success')
     return redirect(url_for('documents.view_document', doc_id=doc_id))
 
@@ -215,7 +321,7 @@ def process_document(file_path, file_extension):
         file_extension: File extension
         
     Returns:
-        Dictionary with extracted information
+        Dictionary with extracted information, including the full extracted text
     """
     extracted_text = ""
     detected_type = "unknown"
@@ -239,38 +345,31 @@ def process_document(file_path, file_extension):
         extracted_data = {"error": str(e)}
     
     return {
-        "extracted_text": extracted_text[:1000] + "..." if len(extracted_text) > 1000 else extracted_text,
+        "extracted_text": extracted_text,
         "detected_type": detected_type,
         "extracted_data": extracted_data
     }
 
-def extract_text_from_pdf(file_path):
+def extract_text_from_pdf(file_path, stop_when=None):
     """
     Extract text from a PDF file
     
+    Pages with an embedded text layer are read directly; scanned pages are
+    rendered and OCR'd. Large documents are processed in parallel page chunks.
+    
     Args:
         file_path: Path to the PDF file
+        stop_when: Optional callable taking the text so far and returning True
+                   when no further pages are needed
         
     Returns:
         Extracted text as a string
     """
-    extracted_text = ""
-    
     try:
-        # Open the PDF
-        pdf_document = fitz.open(file_path)
-        
-        # Extract text from each page
-        for page_num in range(len(pdf_document)):
-            page = pdf_document.load_page(page_num)
-            extracted_text += page.get_text()
-        
-        pdf_document.close()
+        return extract_pdf(file_path, stop_when=stop_when)["text"]
     except Exception as e:
         logging.error(f"Error extracting text from PDF: {e}")
         raise
-    
-    return extracted_text
 
 def extract_text_from_image(file_path):
     """
@@ -283,13 +382,10 @@ def extract_text_from_image(file_path):
         Extracted text as a string
     """
     try:
-        # Open the image using PIL
-        image = Image.open(file_path)
+        # Rotate, grayscale, downscale and binarize before OCR
+        image = prepare_for_ocr(file_path)
         
-        # Use pytesseract for OCR
-        extracted_text = pytesseract.image_to_string(image)
-        
-        return extracted_text
+        return ocr_image(image)
     except Exception as e:
         logging.error(f"Error extracting text from image: {e}")
         raise
@@ -304,36 +400,15 @@ def detect_document_type(text):
     Returns:
         String indicating the document type
     """
-    text_lower = text.lower()
-    
-    # Check for various document types
-    if "form w-2" in text_lower or "wage and tax statement" in text_lower:
-        return "w2"
-    elif "form 1099-" in text_lower:
-        if "1099-misc" in text_lower or "miscellaneous income" in text_lower:
-            return "1099_misc"
-        elif "1099-nec" in text_lower or "nonemployee compensation" in text_lower:
-            return "1099_nec"
-        else:
-            return "1099"
-    elif "schedule c" in text_lower or "profit or loss from business" in text_lower:
-        return "schedule_c"
-    elif "bank statement" in text_lower or "account statement" in text_lower:
-        return "bank_statement"
-    elif "invoice" in text_lower or "bill to" in text_lower:
-        return "invoice"
-    elif "receipt" in text_lower or "payment received" in text_lower:
-        return "receipt"
-    elif "expense report" in text_lower:
-        return "expense_report"
-    
-    # Default to unknown
-    return "unknown"
+    return document_extraction.detect_document_type(text)
 
 def extract_information(text, document_type):
     """
     Extract relevant information based on the document type
     
+    Fields are extracted with the precompiled specs in
+    modules.document_extraction.
+    
     Args:
         text: Extracted text from the document
         document_type: Detected document type
@@ -341,67 +416,7 @@ def extract_information(text, document_type):
     Returns:
         Dictionary with extracted information
     """
-    extracted_info = {}
-    
-    if document_type == "w2":
-        # Extract W-2 information
-        extracted_info["employer_ein"] = extract_pattern(text, r'Employer identification number\s*(?:\(EIN\))?\s*(\d{2}-\d{7})')
-        extracted_info["wages"] = extract_pattern(text, r'Wages, tips, other comp\.?\s*\$?([0-9,.]+)')
-        extracted_info["federal_income_tax"] = extract_pattern(text, r'Federal income tax withheld\s*\$?([0-9,.]+)')
-        extracted_info["social_security_wages"] = extract_pattern(text, r'Social security wages\s*\$?([0-9,.]+)')
-        extracted_info["social_security_tax"] = extract_pattern(text, r'Social security tax withheld\s*\$?([0-9,.]+)')
-        extracted_info["medicare_wages"] = extract_pattern(text, r'Medicare wages and tips\s*\$?([0-9,.]+)')
-        extracted_info["medicare_tax"] = extract_pattern(text, r'Medicare tax withheld\s*\$?([0-9,.]+)')
-        
-    elif document_type in ["1099_misc", "1099_nec", "1099"]:
-        # Extract 1099 information
-        extracted_info["payer_tin"] = extract_pattern(text, r'PAYER\'?S?\s*(?:TIN|taxpayer\s*identification\s*number)\s*(\d{2}-\d{7})')
-        extracted_info["recipient_tin"] = extract_pattern(text, r'RECIPIENT\'?S?\s*(?:TIN|taxpayer\s*identification\s*number)\s*(\d{2}-\d{7}|\d{3}-\d{2}-\d{4})')
-        
-        if document_type == "1099_nec":
-            extracted_info["nonemployee_compensation"] = extract_pattern(text, r'Nonemployee compensation\s*\$?([0-9,.]+)')
-        elif document_type == "1099_misc":
-            extracted_info["rents"] = extract_pattern(text, r'Rents\s*\$?([0-9,.]+)')
-            extracted_info["royalties"] = extract_pattern(text, r'Royalties\s*\$?([0-9,.]+)')
-            extracted_info["other_income"] = extract_pattern(text, r'Other income\s*\$?([0-9,.]+)')
-        
-    elif document_type == "bank_statement":
-        # Extract bank statement information
-        extracted_info["account_number"] = extract_pattern(text, r'Account\s*(?:Number|#)\s*[:.]\s*(?:[X*]+)?(\d{4,})')
-        extracted_info["statement_period"] = extract_pattern(text, r'Statement\s*Period\s*[:.]\s*([A-Za-z0-9 ,\-/]+)')
-        extracted_info["opening_balance"] = extract_pattern(text, r'(?:Opening|Beginning)\s*Balance\s*[:.]\s*\$?([0-9,.]+)')
-        extracted_info["closing_balance"] = extract_pattern(text, r'(?:Closing|Ending)\s*Balance\s*[:.]\s*\$?([0-9,.]+)')
-        
-    elif document_type == "invoice":
-        # Extract invoice information
-        extracted_info["invoice_number"] = extract_pattern(text, r'(?:Invoice|Bill|Reference)\s*(?:Number|No|#)\s*[:.]\s*([A-Za-z0-9\-]+)')
-        extracted_info["invoice_date"] = extract_pattern(text, r'(?:Invoice|Bill)\s*Date\s*[:.]\s*([A-Za-z0-9 ,\-/]+)')
-        extracted_info["due_date"] = extract_pattern(text, r'(?:Due|Payment)\s*Date\s*[:.]\s*([A-Za-z0-9 ,\-/]+)')
-        extracted_info["total_amount"] = extract_pattern(text, r'(?:Total|Amount Due|Balance Due)\s*[:.]\s*\$?([0-9,.]+)')
-        
-    elif document_type == "receipt":
-        # Extract receipt information
-        extracted_info["receipt_date"] = extract_pattern(text, r'(?:Date|Receipt Date)\s*[:.]\s*([A-Za-z0-9 ,\-/]+)')
-        extracted_info["total_amount"] = extract_pattern(text, r'(?:Total|Amount|Total Amount|Grand Total)\s*[:.]\s*\$?([0-9,.]+)')
-        extracted_info["payment_method"] = extract_pattern(text, r'(?:Payment Method|Paid By|Method)\s*[:.]\s*([A-Za-z0-9 ]+)')
-    
-    return extracted_info
-
-def extract_pattern(text, pattern):
-    """
-    Extract information using a regex pattern
-    
-    Args:
-        text: Text to search
-        pattern: Regex pattern with one capturing group
-        
-    Returns:
-        Extracted string or None
-    """
-    match = re.search(pattern, text, re.IGNORECASE)
-    if match:
-        return match.group(1).strip()
-    return None
+    return document_extraction.extract_fields(text, document_type)
 
 def run_ai_analysis(file_path, file_extension):
     """
@@ -417,18 +432,22 @@ def run_ai_analysis(file_path, file_extension):
     try:
         # For image files, use OpenAI Vision API
         if file_extension in ['png', 'jpg', 'jpeg', 'tiff', 'bmp']:
-            with open(file_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-                analysis = analyze_image(base64_image)
-                
-                return {
-                    "ai_description": analysis,
-                    "document_summary": extract_document_summary_from_analysis(analysis)
-                }
+            # Send a downscaled, size-capped JPEG rather than the original file
+            base64_image = base64.b64encode(encode_for_vision(file_path)).decode('utf-8')
+            analysis = analyze_image(base64_image)
+            
+            return {
+                "ai_description": analysis,
+                "document_summary": extract_document_summary_from_analysis(analysis)
+            }
         
         # For PDF files, extract text and use OpenAI text analysis
         elif file_extension == 'pdf':
-            extracted_text = extract_text_from_pdf(file_path)
+            # Only the first 4,000 characters are sent, so stop extracting there
+            extracted_text = extract_text_from_pdf(
+                file_path,
+                stop_when=lambda text_so_far: len(text_so_far) >= 4000
+            )
             
             # Use OpenAI to analyze the document content
             system_message = """
@@ -532,10 +551,10 @@ def get_document_categories():
 
 def save_document_metadata(user_id, original_filename, unique_filename, category, file_extension, file_path, extracted_data):
     """
-    Save document metadata to storage
+    Save document metadata to the documents table
     
-    In a production environment, this would save to a database.
-    For simplicity, we'll use a JSON file-based storage.
+    Each upload is a single row insert, so concurrent uploads for the same
+    user no longer race on a shared metadata file.
     
     Args:
         user_id: User ID
@@ -545,74 +564,192 @@ def save_document_metadata(user_id, original_filename, unique_filename, category
         file_extension: File extension
         file_path: Path to the stored file
         extracted_data: Data extracted from the document
+        
+    Returns:
+        The new document ID
     """
-    # Create metadata
     doc_id = str(uuid.uuid4())
-    metadata = {
-        "id": doc_id,
-        "user_id": user_id,
-        "original_filename": original_filename,
-        "unique_filename": unique_filename,
-        "category": category,
-        "file_extension": file_extension,
-        "file_path": file_path,
-        "upload_date": datetime.now().isoformat(),
-        "extracted_data": extracted_data
-    }
-    
-    # Get the metadata storage file
-    metadata_file = get_metadata_file(user_id)
-    
-    # Load existing metadata
-    all_metadata = []
-    if os.path.exists(metadata_file):
-        try:
-            with open(metadata_file, 'r') as f:
-                all_metadata = json.load(f)
-        except:
-            all_metadata = []
-    
-    # Add new metadata
-    all_metadata.append(metadata)
+    extracted_data = dict(extracted_data or {})
+    extracted_text = extracted_data.get('extracted_text')
+    # The full text lives in its own column; the JSON keeps a short preview
+    if extracted_text is not None:
+        extracted_data['extracted_text'] = text_preview(extracted_text)
+    
+    document = Document(
+        id=doc_id,
+        user_id=user_id,
+        original_filename=original_filename,
+        unique_filename=unique_filename,
+        category=category,
+        file_extension=file_extension,
+        file_path=file_path,
+        content_hash=compute_file_hash(file_path),
+        detected_type=extracted_data.get('detected_type', 'unknown'),
+        extracted_text=extracted_text,
+        extracted_data=extracted_data,
+        upload_date=datetime.now()
+    )
     
-    # Save updated metadata
-    with open(metadata_file, 'w') as f:
-        json.dump(all_metadata, f, indent=2)
+    db.session.add(document)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
     
     return doc_id
 
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 hash of a file's contents
+    
+    Args:
+        file_path: Path to the file
+        chunk_size: Bytes read per iteration
+        
+    Returns:
+        Hex digest string or None if the file cannot be read
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError as e:
+        logging.error(f"Error hashing document {file_path}: {e}")
+        return None
+    return digest.hexdigest()
+
 def get_metadata_file(user_id):
-    """Get the path to the user's metadata file"""
+    """Get the path to the user's legacy metadata file"""
     user_folder = get_user_folder(user_id)
     return os.path.join(user_folder, "metadata.json")
 
-def get_user_documents(user_id, category=None):
+def migrate_legacy_metadata(user_id):
     """
-    Get all documents for a user
+    Import a user's legacy metadata.json into the documents table
+    
+    Rows that already exist (by document ID) are skipped, so the import is
+    safe to repeat. The JSON file is renamed to metadata.json.migrated once
+    its entries are stored.
     
     Args:
         user_id: User ID
-        category: Optional category filter
         
     Returns:
-        List of document metadata
+        Number of documents imported
     """
     metadata_file = get_metadata_file(user_id)
     
     if not os.path.exists(metadata_file):
-        return []
+        return 0
     
     try:
         with open(metadata_file, 'r') as f:
-            all_metadata = json.load(f)
+            legacy_docs = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error reading legacy metadata for user {user_id}: {e}")
+        return 0
+    
+    legacy_ids = [doc['id'] for doc in legacy_docs if doc.get('id')]
+    existing_ids = set()
+    if legacy_ids:
+        existing_ids = {
+            row.id for row in db.session.query(Document.id).filter(Document.id.in_(legacy_ids))
+        }
+    
+    known_keys = {
+        'id', 'user_id', 'original_filename', 'unique_filename', 'category',
+        'file_extension', 'file_path', 'upload_date', 'extracted_data',
+        'ai_analysis', 'analyzed_at'
+    }
+    
+    new_rows = []
+    for doc in legacy_docs:
+        if not doc.get('id') or doc['id'] in existing_ids:
+            continue
+        extracted_data = doc.get('extracted_data') or {}
+        new_rows.append({
+            'id': doc['id'],
+            'user_id': user_id,
+            'original_filename': doc.get('original_filename', ''),
+            'unique_filename': doc.get('unique_filename', ''),
+            'category': doc.get('category', 'other'),
+            'file_extension': doc.get('file_extension'),
+            'file_path': doc.get('file_path', ''),
+            'content_hash': compute_file_hash(doc['file_path']) if doc.get('file_path') and os.path.exists(doc['file_path']) else None,
+            'detected_type': extracted_data.get('detected_type', 'unknown'),
+            'extracted_text': extracted_data.get('extracted_text'),
+            'extracted_data': extracted_data,
+            'ai_analysis': doc.get('ai_analysis'),
+            'analyzed_at': _parse_iso_datetime(doc.get('analyzed_at')),
+            'upload_date': _parse_iso_datetime(doc.get('upload_date')) or datetime.now(),
+            'data': {key: value for key, value in doc.items() if key not in known_keys} or None,
+        })
+    
+    if new_rows:
+        try:
+            db.session.bulk_insert_mappings(Document, new_rows)
+            db.session.commit()
+        except IntegrityError:
+            # Another request migrated the same file concurrently
+            db.session.rollback()
+            return 0
+        
+        for row in new_rows:
+            document_search.index_document(row['id'])
+    
+    os.replace(metadata_file, metadata_file + ".migrated")
+    return len(new_rows)
+
+def _parse_iso_datetime(value):
+    """Parse an ISO-8601 timestamp string, returning None when absent or invalid"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def _user_documents_query(user_id, category=None):
+    """Build the indexed query for a user's documents, newest first"""
+    migrate_legacy_metadata(user_id)
+    
+    query = Document.query.filter_by(user_id=user_id)
+    if category:
+        query = query.filter_by(category=category)
+    return query.order_by(Document.upload_date.desc())
+
+def get_user_documents(user_id, category=None, limit=None):
+    """
+    Get all documents for a user
+    
+    Args:
+        user_id: User ID
+        category: Optional category filter
+        limit: Optional maximum number of documents to return
         
-        # Apply category filter if specified
-        if category:
-            return [doc for doc in all_metadata if doc['category'] == category]
+    Returns:
+        List of document metadata, newest first
+    """
+    query = _user_documents_query(user_id, category)
+    if limit:
+        query = query.limit(limit)
+    
+    return [document.to_dict() for document in query.all()]
+
+def count_user_documents(user_id, category=None):
+    """
+    Count a user's documents without loading them
+    
+    Args:
+        user_id: User ID
+        category: Optional category filter
         
-        return all_metadata
-    except:
-        return []
+    Returns:
+        Number of documents
+    """
+    return _user_documents_query(user_id, category).order_by(None).count()
 
 def get_document_metadata(doc_id, user_id):
     """
@@ -625,18 +762,18 @@ def get_document_metadata(doc_id, user_id):
     Returns:
         Document metadata or None if not found
     """
-    all_docs = get_user_documents(user_id)
-    
-    for doc in all_docs:
-        if doc['id'] == doc_id and doc['user_id'] == user_id:
-            return doc
+    migrate_legacy_metadata(user_id)
     
-    return None
+    document = Document.query.filter_by(id=doc_id, user_id=user_id).first()
+    return document.to_dict() if document else None
 
 def update_document_metadata(doc_id, user_id, updates):
     """
     Update metadata for a specific document
     
+    Fields that map to table columns are stored there; anything else is kept
+    in the document's extended data.
+    
     Args:
         doc_id: Document ID
         user_id: User ID (for security)
@@ -645,30 +782,30 @@ def update_document_metadata(doc_id, user_id, updates):
     Returns:
         True if successful, False otherwise
     """
-    metadata_file = get_metadata_file(user_id)
+    document = Document.query.filter_by(id=doc_id, user_id=user_id).first()
     
-    if not os.path.exists(metadata_file):
+    if not document:
         return False
     
     try:
-        with open(metadata_file, 'r') as f:
-            all_metadata = json.load(f)
-        
-        # Find and update the document
-        for i, doc in enumerate(all_metadata):
-            if doc['id'] == doc_id and doc['user_id'] == user_id:
-                # Update fields
-                for key, value in updates.items():
-                    all_metadata[i][key] = value
-                
-                # Save updated metadata
-                with open(metadata_file, 'w') as f:
-                    json.dump(all_metadata, f, indent=2)
-                
-                return True
-        
-        return False
-    except:
+        extra_data = dict(document.data or {})
+        for key, value in updates.items():
+            if key in ('id', 'user_id'):
+                continue
+            if key in ('analyzed_at', 'upload_date') and isinstance(value, str):
+                value = _parse_iso_datetime(value)
+            if key in Document.__table__.columns:
+                setattr(document, key, value)
+            else:
+                extra_data[key] = value
+        
+        # Re-assigning to trigger SQLAlchemy update for JSON field
+        document.data = extra_data or None
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error updating document {doc_id}: {e}")
         return False
 
 def delete_document_metadata(doc_id, user_id):
@@ -682,22 +819,11 @@ def delete_document_metadata(doc_id, user_id):
     Returns:
         True if successful, False otherwise
     """
-    metadata_file = get_metadata_file(user_id)
-    
-    if not os.path.exists(metadata_file):
-        return False
-    
     try:
-        with open(metadata_file, 'r') as f:
-            all_metadata = json.load(f)
-        
-        # Filter out the document to delete
-        updated_metadata = [doc for doc in all_metadata if not (doc['id'] == doc_id and doc['user_id'] == user_id)]
-        
-        # Save updated metadata
-        with open(metadata_file, 'w') as f:
-            json.dump(updated_metadata, f, indent=2)
-        
-        return True
-    except:
-        return False
\ No newline at end of file
+        deleted = Document.query.filter_by(id=doc_id, user_id=user_id).delete()
+        db.session.commit()
+        return deleted > 0
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error deleting document {doc_id}: {e}")
+        return False
@@ -3,14 +3,100 @@ Export Utilities Module
 
 This module provides functions for exporting tax strategies, forms,
 and other data in various formats (PDF, JSON, HTML).
+
+Rendered HTML is cached in memory under a hash of the record's columns and
+the template version, and PDFs are rendered from it in memory and kept in the
+PDF cache, so repeat exports of an unchanged record skip both Jinja and
+WeasyPrint. WeasyPrint's font configuration is built once per process.
 """
 
 from flask import render_template, make_response, jsonify, send_file
+import io
 import json
+import threading
+import zipfile
+from collections import OrderedDict
 from datetime import datetime
-import tempfile
+from functools import lru_cache
 import os
 from weasyprint import HTML
+from weasyprint.text.fonts import FontConfiguration
+
+from modules.pdf_utils import pdf_cache_key, pdf_file_path, store_pdf
+from modules.pdf_jobs import submit_pdf_job, job_response
+
+# Bump whenever the export templates change so cached HTML and PDFs are re-rendered
+EXPORT_TEMPLATE_VERSION = '1'
+
+# Rendered HTML documents kept in memory per process
+HTML_CACHE_SIZE = 256
+
+_html_cache = OrderedDict()
+_html_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_font_config():
+    """WeasyPrint font configuration, built once per process"""
+    return FontConfiguration()
+
+
+def _record_key(kind, template, record):
+    """Hash of a record's columns and the template that renders it"""
+    columns = {column.name: getattr(record, column.name) for column in record.__table__.columns}
+    return pdf_cache_key(kind, template, EXPORT_TEMPLATE_VERSION, columns)
+
+
+def _render_cached(key, template, **context):
+    """Render a template, reusing the HTML already rendered for the same key"""
+    with _html_cache_lock:
+        html_content = _html_cache.get(key)
+        if html_content is not None:
+            _html_cache.move_to_end(key)
+            return html_content
+
+    html_content = render_template(template, **context)
+    with _html_cache_lock:
+        _html_cache[key] = html_content
+        while len(_html_cache) > HTML_CACHE_SIZE:
+            _html_cache.popitem(last=False)
+    return html_content
+
+
+def _write_pdf(html_content):
+    """Render HTML to PDF bytes in memory"""
+    return HTML(string=html_content).write_pdf(font_config=get_font_config())
+
+
+def _strategy_html(strategy):
+    """Rendered export HTML for a strategy and its cache key"""
+    template = 'export/strategy_html.html'
+    key = _record_key('strategy', template, strategy)
+    return key, _render_cached(key, template, strategy=strategy)
+
+
+def _strategy_pdf_filename(strategy, key):
+    return f"strategy_{strategy.user_id}_{key[:24]}.pdf"
+
+
+def _queue_html_pdf(user_id, kind, record_id, filename, html_content, download_name):
+    """
+    Serve an HTML document as a PDF, rendering it with WeasyPrint off the request thread
+
+    The PDF is cached under a content-addressed filename, so an unchanged
+    document is sent straight away; otherwise a PDF job is queued and the
+    client is sent to its status page.
+    """
+    if os.path.exists(pdf_file_path(filename)):
+        return send_file(pdf_file_path(filename), as_attachment=True, download_name=download_name)
+
+    job = submit_pdf_job(
+        user_id,
+        (kind, record_id, filename),
+        lambda: store_pdf(filename, lambda: _write_pdf(html_content)),
+        download_name
+    )
+    return job_response(job)
 
 def export_strategy_as_pdf(strategy):
     """
@@ -20,29 +106,15 @@ def export_strategy_as_pdf(strategy):
         strategy: The TaxStrategy object to export
         
     Returns:
-        Flask response with PDF attachment
+        Flask response with the PDF attachment, or the PDF job's status
+        response while WeasyPrint renders it
     """
     # Generate HTML content first
-    html_content = render_template('export/strategy_html.html', 
-                                  strategy=strategy)
-    
-    # Create a temporary file for the PDF
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-        temp_path = temp_file.name
+    key, html_content = _strategy_html(strategy)
     
-    # Convert HTML to PDF
-    HTML(string=html_content).write_pdf(temp_path)
-    
-    # Create response with PDF attachment
     filename = f"tax_strategy_{strategy.strategy_name.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d')}.pdf"
-    
-    response = make_response(send_file(temp_path, as_attachment=True, 
-                                      download_name=filename))
-    
-    # Clean up the temporary file (will be deleted when the request is complete)
-    os.unlink(temp_path)
-    
-    return response
+    return _queue_html_pdf(strategy.user_id, 'strategy', strategy.id, _strategy_pdf_filename(strategy, key),
+                           html_content, filename)
 
 def export_strategy_as_json(strategy):
     """
@@ -100,8 +172,7 @@ def export_strategy_as_html(strategy):
         Flask response with HTML attachment
     """
     # Generate HTML content
-    html_content = render_template('export/strategy_html.html', 
-                                  strategy=strategy)
+    _, html_content = _strategy_html(strategy)
     
     # Create response with HTML attachment
     response = make_response(html_content)
@@ -118,29 +189,17 @@ def export_form_as_pdf(form):
         form: The TaxForm object to export
         
     Returns:
-        Flask response with PDF attachment
+        Flask response with the PDF attachment, or the PDF job's status
+        response while WeasyPrint renders it
     """
     # Generate HTML content first
-    html_content = render_template('export/form_html.html', 
-                                  form=form)
-    
-    # Create a temporary file for the PDF
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-        temp_path = temp_file.name
-    
-    # Convert HTML to PDF
-    HTML(string=html_content).write_pdf(temp_path)
+    template = 'export/form_html.html'
+    key = _record_key('tax_form_export', template, form)
+    html_content = _render_cached(key, template, form=form)
     
-    # Create response with PDF attachment
     filename = f"tax_form_{form.form_type.name.lower()}_{datetime.now().strftime('%Y%m%d')}.pdf"
-    
-    response = make_response(send_file(temp_path, as_attachment=True, 
-                                      download_name=filename))
-    
-    # Clean up the temporary file (will be deleted when the request is complete)
-    os.unlink(temp_path)
-    
-    return response
+    return _queue_html_pdf(form.user_id, 'tax_form_export', form.id, f"tax_form_export_{form.user_id}_{key[:24]}.pdf",
+                           html_content, filename)
 
 def export_form_as_json(form):
     """
@@ -167,4 +226,71 @@ def export_form_as_json(form):
     response = jsonify(form_data)
     response.headers['Content-Disposition'] = f'attachment; filename=tax_form_{form.form_type.name.lower()}_{datetime.now().strftime("%Y%m%d")}.json'
     
-    return response
\ No newline at end of file
+    return response
+
+def _strategy_archive_entries(strategies):
+    """(PDF filename, archive member name, HTML) for each strategy"""
+    entries = []
+    used_names = set()
+    for strategy in strategies:
+        key, html_content = _strategy_html(strategy)
+        name = f"{strategy.tax_year}_{strategy.strategy_name.replace(' ', '_').replace('/', '_').lower()}"
+        if name in used_names:
+            name = f"{name}_{strategy.id}"
+        used_names.add(name)
+        entries.append((_strategy_pdf_filename(strategy, key), f"{name}.pdf", html_content))
+    return entries
+
+def build_strategy_archive(archive_name, entries):
+    """
+    Render strategies to PDF and package them in one ZIP archive
+
+    Strategy PDFs already in the PDF cache are reused. The archive is built
+    in memory and stored in the PDF cache.
+
+    Args:
+        archive_name: Filename for the archive in PDF_DIR
+        entries: List from _strategy_archive_entries
+
+    Returns:
+        The archive's filename
+    """
+    def _render():
+        buffer = io.BytesIO()
+        # PDFs are already compressed, so they are stored rather than deflated
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+            for filename, member_name, html_content in entries:
+                store_pdf(filename, lambda: _write_pdf(html_content))
+                archive.write(pdf_file_path(filename), member_name)
+        return buffer.getvalue()
+
+    return store_pdf(archive_name, _render)
+
+def export_all_strategies(user_id, strategies):
+    """
+    Export all of a user's tax strategies as one ZIP archive of PDFs
+    
+    Args:
+        user_id: Owner of the strategies
+        strategies: The user's TaxStrategy objects
+        
+    Returns:
+        Flask response with the archive attachment, or the PDF job's status
+        response while the strategies are rendered
+    """
+    # HTML is rendered here, where the request's template context is available
+    entries = _strategy_archive_entries(strategies)
+    archive_key = pdf_cache_key('strategy_archive', user_id, [filename for filename, _, _ in entries])
+    archive_name = f"strategies_{user_id}_{archive_key[:24]}.zip"
+    download_name = f"tax_strategies_{datetime.now().strftime('%Y%m%d')}.zip"
+
+    if os.path.exists(pdf_file_path(archive_name)):
+        return send_file(pdf_file_path(archive_name), as_attachment=True, download_name=download_name)
+
+    job = submit_pdf_job(
+        user_id,
+        ('strategy_archive', archive_name),
+        lambda: build_strategy_archive(archive_name, entries),
+        download_name
+    )
+    return job_response(job)
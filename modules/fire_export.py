@@ -0,0 +1,470 @@
+"""
+IRS FIRE Export Module
+
+This module writes 1099-NEC information returns in the IRS Publication 1220
+fixed-width format used by the FIRE (Filing Information Returns
+Electronically) system: a T (transmitter) record, an A (payer) record, one B
+(payee) record per form, a C (end of payer) record, optional K (state totals)
+records for the Combined Federal/State Filing program, and an F (end of
+transmission) record. Every record is 750 characters.
+
+Forms are read through a server-side cursor and written straight to the
+output file, so memory use does not grow with the number of recipients. Counts
+that appear before the payee records (the T record's payee total and the A
+record's amount codes) are patched in place once streaming finishes.
+"""
+
+import logging
+import os
+import re
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import select
+
+from app import db
+from app.models import Contractor, Form1099
+
+RECORD_LENGTH = 750
+
+# Output directory for generated FIRE files (kept out of the public static folder)
+EXPORT_FOLDER = os.path.join(os.getcwd(), "exports", "fire")
+
+# Rows fetched per round trip from the server-side cursor
+STREAM_BATCH_SIZE = 1000
+
+# Type of return code and the payment amount fields used for 1099-NEC
+RETURN_TYPE_1099_NEC = "NE"
+AMOUNT_CODE_COMPENSATION = "1"
+AMOUNT_CODE_FEDERAL_WITHHELD = "4"
+
+# Payment amount / control total slots in record order (1-9, A-H, J)
+AMOUNT_SLOTS = "123456789ABCDEFGHJ"
+
+# Combined Federal/State Filing program codes for participating states
+COMBINED_FEDERAL_STATE_CODES = {
+    "AL": "01", "AZ": "04", "AR": "05", "CA": "06", "CO": "07", "CT": "08",
+    "DE": "10", "GA": "13", "HI": "15", "ID": "16", "IN": "18", "KS": "20",
+    "LA": "22", "ME": "23", "MD": "24", "MA": "25", "MI": "26", "MN": "27",
+    "MS": "28", "MO": "29", "MT": "30", "NE": "31", "NJ": "34", "NM": "35",
+    "NC": "37", "ND": "38", "OH": "39", "OK": "40", "SC": "45", "WI": "55",
+}
+
+_NON_DIGITS = re.compile(r'\D')
+_ALLOWED_TEXT = re.compile(r'[^A-Z0-9 &\-,./#]')
+_EIN_FORMAT = re.compile(r'^\d{2}-\d{7}$')
+_SSN_FORMAT = re.compile(r'^\d{3}-\d{2}-\d{4}$')
+
+
+class FireValidationError(ValueError):
+    """Raised when transmitter or payer information cannot produce a valid file"""
+
+
+# Record layouts: (start position, length, field name, kind). Positions are
+# 1-based as printed in Publication 1220; unlisted positions are blank.
+T_RECORD = [
+    (1, 1, 'record_type', 'text'),
+    (2, 4, 'payment_year', 'number'),
+    (6, 1, 'prior_year', 'text'),
+    (7, 9, 'transmitter_tin', 'number'),
+    (16, 5, 'transmitter_control_code', 'text'),
+    (28, 1, 'test_file', 'text'),
+    (30, 40, 'transmitter_name', 'text'),
+    (110, 40, 'company_name', 'text'),
+    (190, 40, 'company_address', 'text'),
+    (230, 40, 'company_city', 'text'),
+    (270, 2, 'company_state', 'text'),
+    (272, 9, 'company_zip', 'text'),
+    (296, 8, 'total_payees', 'number'),
+    (304, 40, 'contact_name', 'text'),
+    (344, 15, 'contact_phone', 'text'),
+    (359, 50, 'contact_email', 'raw'),
+    (500, 8, 'sequence_number', 'number'),
+    (518, 1, 'vendor_indicator', 'text'),
+]
+
+A_RECORD = [
+    (1, 1, 'record_type', 'text'),
+    (2, 4, 'payment_year', 'number'),
+    (6, 1, 'combined_federal_state', 'text'),
+    (12, 9, 'payer_tin', 'number'),
+    (21, 4, 'payer_name_control', 'text'),
+    (25, 1, 'last_filing', 'text'),
+    (26, 2, 'return_type', 'text'),
+    (28, 18, 'amount_codes', 'text'),
+    (53, 40, 'payer_name', 'text'),
+    (133, 1, 'transfer_agent', 'text'),
+    (134, 40, 'payer_address', 'text'),
+    (174, 40, 'payer_city', 'text'),
+    (214, 2, 'payer_state', 'text'),
+    (216, 9, 'payer_zip', 'text'),
+    (225, 15, 'payer_phone', 'text'),
+    (500, 8, 'sequence_number', 'number'),
+]
+
+B_RECORD = [
+    (1, 1, 'record_type', 'text'),
+    (2, 4, 'payment_year', 'number'),
+    (6, 1, 'corrected', 'text'),
+    (7, 4, 'payee_name_control', 'text'),
+    (11, 1, 'tin_type', 'text'),
+    (12, 9, 'payee_tin', 'number'),
+    (21, 20, 'account_number', 'text'),
+    (55, 12, 'amount_1', 'number'),
+    (91, 12, 'amount_4', 'number'),
+    (288, 40, 'payee_name', 'text'),
+    (328, 40, 'payee_name_2', 'text'),
+    (368, 40, 'payee_address', 'text'),
+    (448, 40, 'payee_city', 'text'),
+    (488, 2, 'payee_state', 'text'),
+    (490, 9, 'payee_zip', 'text'),
+    (500, 8, 'sequence_number', 'number'),
+    (723, 12, 'state_tax_withheld', 'number'),
+    (747, 2, 'combined_federal_state_code', 'text'),
+]
+
+# C and K records carry 18 control totals of 18 digits starting at position 16
+_CONTROL_TOTALS = [(16 + index * 18, 18, f'total_{slot}', 'number') for index, slot in enumerate(AMOUNT_SLOTS)]
+
+C_RECORD = [
+    (1, 1, 'record_type', 'text'),
+    (2, 8, 'payee_count', 'number'),
+] + _CONTROL_TOTALS + [
+    (500, 8, 'sequence_number', 'number'),
+]
+
+K_RECORD = [
+    (1, 1, 'record_type', 'text'),
+    (2, 8, 'payee_count', 'number'),
+] + _CONTROL_TOTALS + [
+    (500, 8, 'sequence_number', 'number'),
+    (707, 18, 'state_tax_withheld_total', 'number'),
+    (747, 2, 'combined_federal_state_code', 'text'),
+]
+
+F_RECORD = [
+    (1, 1, 'record_type', 'text'),
+    (2, 8, 'a_record_count', 'number'),
+    (10, 21, 'zero', 'number'),
+    (50, 8, 'total_payees', 'number'),
+    (500, 8, 'sequence_number', 'number'),
+]
+
+
+def _field_offset(layout, name):
+    """0-based offset and length of a field in a record layout"""
+    for start, length, field_name, _ in layout:
+        if field_name == name:
+            return start - 1, length
+    raise KeyError(name)
+
+
+def _format_field(value, length, kind):
+    """Format one field: numbers right-justified and zero-filled, text upper-cased and blank-filled"""
+    if kind == 'number':
+        digits = _NON_DIGITS.sub('', str(value or 0))
+        if len(digits) > length:
+            raise FireValidationError(f"Value {value} does not fit in {length} digits")
+        return digits.rjust(length, '0')
+    if kind == 'text':
+        value = _ALLOWED_TEXT.sub('', str(value or '').upper())
+    return str(value or '')[:length].ljust(length)
+
+
+def format_record(layout, values):
+    """
+    Build a fixed-width record from a layout and field values
+
+    Returns:
+        750-character record ending in CR/LF (positions 749-750)
+    """
+    record = [' '] * (RECORD_LENGTH - 2)
+    for start, length, name, kind in layout:
+        record[start - 1:start - 1 + length] = _format_field(values.get(name), length, kind)
+    return ''.join(record) + '\r\n'
+
+
+def to_cents(amount):
+    """Convert a dollar amount to whole cents"""
+    return int((Decimal(str(amount or 0)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def normalize_tin(value):
+    """Reduce an EIN/SSN to digits"""
+    return _NON_DIGITS.sub('', str(value or ''))
+
+
+def tin_type(value):
+    """FIRE type of TIN: '1' for an EIN, '2' for an SSN, blank if unknown"""
+    value = str(value or '').strip()
+    if _EIN_FORMAT.match(value):
+        return '1'
+    if _SSN_FORMAT.match(value):
+        return '2'
+    return ' '
+
+
+def _zip_code(value):
+    """ZIP codes are 5 or 9 digits without the hyphen"""
+    return normalize_tin(value)
+
+
+def _validate_filer(info, prefix):
+    """Validate transmitter/payer fields shared by the T and A records"""
+    errors = []
+    if len(normalize_tin(info.get('tin'))) != 9:
+        errors.append(f"{prefix} TIN must be 9 digits")
+    if not str(info.get('name') or '').strip():
+        errors.append(f"{prefix} name is required")
+    if not str(info.get('address') or '').strip() or not str(info.get('city') or '').strip():
+        errors.append(f"{prefix} address and city are required")
+    if len(str(info.get('state') or '').strip()) != 2:
+        errors.append(f"{prefix} state must be a 2-letter code")
+    if len(_zip_code(info.get('zip'))) not in (5, 9):
+        errors.append(f"{prefix} ZIP must be 5 or 9 digits")
+    return errors
+
+
+def validate_payee(row):
+    """
+    Validate one 1099-NEC payee row
+
+    Args:
+        row: Mapping with form and contractor fields
+
+    Returns:
+        List of error messages (empty when valid)
+    """
+    errors = []
+    if len(normalize_tin(row['recipient_ein'])) != 9:
+        errors.append("payee TIN must be 9 digits")
+    elif normalize_tin(row['recipient_ein']) in ('000000000', '111111111', '123456789'):
+        errors.append("payee TIN is a placeholder value")
+    if not str(row['name'] or '').strip():
+        errors.append("payee name is required")
+    if not str(row['address_line1'] or '').strip() or not str(row['city'] or '').strip():
+        errors.append("payee address and city are required")
+    if len(str(row['state'] or '').strip()) != 2:
+        errors.append("payee state must be a 2-letter code")
+    if len(_zip_code(row['zip_code'])) not in (5, 9):
+        errors.append("payee ZIP must be 5 or 9 digits")
+    if to_cents(row['total_amount']) <= 0:
+        errors.append("nonemployee compensation must be positive")
+    return errors
+
+
+def _stream_payees(user_id, tax_year):
+    """Yield payee rows for a user's 1099-NEC forms through a server-side cursor"""
+    query = select(
+        Form1099.id.label('form_id'),
+        Form1099.total_amount,
+        Form1099.form_data,
+        Contractor.id.label('contractor_id'),
+        Contractor.name,
+        Contractor.business_name,
+        Contractor.ein.label('recipient_ein'),
+        Contractor.address_line1,
+        Contractor.address_line2,
+        Contractor.city,
+        Contractor.state,
+        Contractor.zip_code,
+    ).join(
+        Contractor, Contractor.id == Form1099.contractor_id
+    ).where(
+        Form1099.user_id == user_id,
+        Form1099.tax_year == tax_year
+    ).order_by(Form1099.id).execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+
+    for row in db.session.execute(query):
+        yield row._mapping
+
+
+def export_1099_nec(user_id, tax_year, transmitter, payer, output_path=None, test_file=False,
+                    combined_federal_state=False):
+    """
+    Write a Publication 1220 file for a user's 1099-NEC forms
+
+    Args:
+        user_id: User ID whose Form1099 rows are exported
+        tax_year: Payment (tax) year
+        transmitter: Dict with tin, tcc, name, address, city, state, zip,
+                     contact_name, contact_phone, contact_email
+        payer: Dict with tin, name, address, city, state, zip, phone
+        output_path: File to write (defaults to EXPORT_FOLDER)
+        test_file: Mark the file as a FIRE test submission
+        combined_federal_state: Add state codes and K records for the
+                                Combined Federal/State Filing program
+
+    Returns:
+        Report dictionary with the output path, control totals and any
+        per-form validation errors. When any form is invalid the partial file
+        is removed and 'valid' is False.
+    """
+    errors = _validate_filer(transmitter, "Transmitter") + _validate_filer(payer, "Payer")
+    if not re.match(r'^[A-Za-z0-9]{5}$', str(transmitter.get('tcc') or '')):
+        errors.append("Transmitter Control Code must be 5 characters")
+    if not str(transmitter.get('contact_name') or '').strip() or not transmitter.get('contact_phone'):
+        errors.append("Transmitter contact name and phone are required")
+    if errors:
+        raise FireValidationError("; ".join(errors))
+
+    if output_path is None:
+        os.makedirs(EXPORT_FOLDER, exist_ok=True)
+        output_path = os.path.join(
+            EXPORT_FOLDER, f"IRS_1099NEC_{user_id}_{tax_year}_{datetime.now().strftime('%Y%m%d%H%M%S')}.txt"
+        )
+
+    sequence = 0
+    payee_count = 0
+    total_compensation = 0
+    total_federal_withheld = 0
+    state_totals = {}
+    form_errors = []
+
+    def _next_sequence():
+        nonlocal sequence
+        sequence += 1
+        return sequence
+
+    with open(output_path, 'w', encoding='ascii', errors='replace', newline='') as output:
+        t_offset = output.tell()
+        output.write(format_record(T_RECORD, {
+            'record_type': 'T',
+            'payment_year': tax_year,
+            'transmitter_tin': normalize_tin(transmitter['tin']),
+            'transmitter_control_code': transmitter['tcc'],
+            'test_file': 'T' if test_file else '',
+            'transmitter_name': transmitter['name'],
+            'company_name': transmitter.get('company_name') or transmitter['name'],
+            'company_address': transmitter['address'],
+            'company_city': transmitter['city'],
+            'company_state': transmitter['state'],
+            'company_zip': _zip_code(transmitter['zip']),
+            'total_payees': 0,  # patched after streaming
+            'contact_name': transmitter['contact_name'],
+            'contact_phone': normalize_tin(transmitter['contact_phone']),
+            'contact_email': transmitter.get('contact_email'),
+            'sequence_number': _next_sequence(),
+            'vendor_indicator': 'I',
+        }))
+
+        a_offset = output.tell()
+        output.write(format_record(A_RECORD, {
+            'record_type': 'A',
+            'payment_year': tax_year,
+            'combined_federal_state': '1' if combined_federal_state else '',
+            'payer_tin': normalize_tin(payer['tin']),
+            'return_type': RETURN_TYPE_1099_NEC,
+            'amount_codes': AMOUNT_CODE_COMPENSATION,  # patched after streaming
+            'payer_name': payer['name'],
+            'transfer_agent': '0',
+            'payer_address': payer['address'],
+            'payer_city': payer['city'],
+            'payer_state': payer['state'],
+            'payer_zip': _zip_code(payer['zip']),
+            'payer_phone': normalize_tin(payer.get('phone')),
+            'sequence_number': _next_sequence(),
+        }))
+
+        for row in _stream_payees(user_id, tax_year):
+            row_errors = validate_payee(row)
+            if row_errors:
+                form_errors.append({'form_id': row['form_id'], 'contractor_id': row['contractor_id'],
+                                    'errors': row_errors})
+                continue
+
+            form_data = row['form_data'] or {}
+            compensation = to_cents(row['total_amount'])
+            federal_withheld = to_cents(form_data.get('federal_tax_withheld'))
+            state_withheld = to_cents(form_data.get('state_tax_withheld'))
+            state_code = COMBINED_FEDERAL_STATE_CODES.get(str(row['state']).upper()) if combined_federal_state else None
+
+            output.write(format_record(B_RECORD, {
+                'record_type': 'B',
+                'payment_year': tax_year,
+                'tin_type': tin_type(row['recipient_ein']),
+                'payee_tin': normalize_tin(row['recipient_ein']),
+                'account_number': f"C{row['contractor_id']}",
+                'amount_1': compensation,
+                'amount_4': federal_withheld,
+                'payee_name': row['name'],
+                'payee_name_2': row['business_name'],
+                'payee_address': row['address_line1'],
+                'payee_city': row['city'],
+                'payee_state': row['state'],
+                'payee_zip': _zip_code(row['zip_code']),
+                'sequence_number': _next_sequence(),
+                'state_tax_withheld': state_withheld if state_code else 0,
+                'combined_federal_state_code': state_code,
+            }))
+
+            payee_count += 1
+            total_compensation += compensation
+            total_federal_withheld += federal_withheld
+            if state_code:
+                state = state_totals.setdefault(state_code, {'payees': 0, 'compensation': 0,
+                                                             'federal_withheld': 0, 'state_withheld': 0})
+                state['payees'] += 1
+                state['compensation'] += compensation
+                state['federal_withheld'] += federal_withheld
+                state['state_withheld'] += state_withheld
+
+        output.write(format_record(C_RECORD, {
+            'record_type': 'C',
+            'payee_count': payee_count,
+            'total_1': total_compensation,
+            'total_4': total_federal_withheld,
+            'sequence_number': _next_sequence(),
+        }))
+
+        for state_code, state in sorted(state_totals.items()):
+            output.write(format_record(K_RECORD, {
+                'record_type': 'K',
+                'payee_count': state['payees'],
+                'total_1': state['compensation'],
+                'total_4': state['federal_withheld'],
+                'sequence_number': _next_sequence(),
+                'state_tax_withheld_total': state['state_withheld'],
+                'combined_federal_state_code': state_code,
+            }))
+
+        output.write(format_record(F_RECORD, {
+            'record_type': 'F',
+            'a_record_count': 1,
+            'zero': 0,
+            'total_payees': payee_count,
+            'sequence_number': _next_sequence(),
+        }))
+
+        # Patch the fields that depend on the streamed payees
+        offset, length = _field_offset(T_RECORD, 'total_payees')
+        output.seek(t_offset + offset)
+        output.write(_format_field(payee_count, length, 'number'))
+        if total_federal_withheld:
+            offset, length = _field_offset(A_RECORD, 'amount_codes')
+            output.seek(a_offset + offset)
+            output.write(_format_field(AMOUNT_CODE_COMPENSATION + AMOUNT_CODE_FEDERAL_WITHHELD, length, 'text'))
+
+    valid = not form_errors and payee_count > 0
+    if not valid:
+        os.remove(output_path)
+        if not form_errors:
+            logging.error(f"No 1099-NEC forms to export for user {user_id} ({tax_year})")
+
+    return {
+        'valid': valid,
+        'output_path': output_path if valid else None,
+        'tax_year': tax_year,
+        'record_count': sequence,
+        'control_totals': {
+            'payee_count': payee_count,
+            'nonemployee_compensation': total_compensation / 100,
+            'federal_tax_withheld': total_federal_withheld / 100,
+            'states': {
+                code: {'payees': state['payees'], 'nonemployee_compensation': state['compensation'] / 100,
+                       'state_tax_withheld': state['state_withheld'] / 100}
+                for code, state in state_totals.items()
+            },
+        },
+        'errors': form_errors,
+    }
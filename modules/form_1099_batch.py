@@ -0,0 +1,364 @@
+"""
+Batch 1099-NEC Generation Module
+
+This module generates every eligible contractor's 1099-NEC for a tax year in
+one job. Eligible contractors are selected from the tax year's payment rollups
+with a single query, missing forms are created with one bulk insert, PDFs are
+rendered across a process pool, and the results are packaged as a ZIP archive
+plus one combined print-ready PDF.
+
+Progress is written to a manifest file next to the outputs. Each rendered PDF
+is recorded on its Form1099 row as soon as it finishes, so a job that is
+interrupted (or loses a worker process) resumes where it stopped. The batch's
+PDFs are pinned against cache eviction while it runs, and any that still go
+missing before packaging are rendered again.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import fitz  # PyMuPDF for merging PDFs
+
+from app import db
+from app.models import Contractor, ContractorPaymentRollup, Form1099, User
+from modules.contractor_rollups import FORM_1099_THRESHOLD
+from modules.pdf_utils import (
+    PDF_DIR, generate_tax_form_pdf, pin_pdfs, tax_form_pdf_filename, touch_pdf_pins, unpin_pdfs
+)
+from modules.process_pools import MP_CONTEXT
+
+# Where batch archives and manifests are written
+BATCH_DIR = os.path.join(PDF_DIR, 'batches')
+
+# Upper bound on PDF rendering processes
+MAX_WORKERS = int(os.environ.get("PDF_BATCH_WORKERS", os.cpu_count() or 1))
+
+# Times a batch restarts its pool after a worker process dies
+MAX_POOL_RESTARTS = 2
+
+# A running manifest not updated for this long belongs to a dead job
+STALE_JOB_AFTER = timedelta(minutes=10)
+
+_SLUG = re.compile(r'[^A-Za-z0-9]+')
+
+
+def build_1099_form_data(contractor, payer_name, total_amount):
+    """
+    Build the form_data payload for a contractor's 1099-NEC
+
+    Args:
+        contractor: Contractor instance
+        payer_name: Name printed as the payer
+        total_amount: Nonemployee compensation for the year
+
+    Returns:
+        Dictionary stored in Form1099.form_data
+    """
+    return {
+        'payer_name': payer_name,
+        'payer_ein': 'TO_BE_FILLED',
+        'recipient_name': contractor.name,
+        'recipient_ein': contractor.ein,
+        'recipient_address': f"{contractor.address_line1}, {contractor.city}, {contractor.state} {contractor.zip_code}",
+        'nonemployee_compensation': float(total_amount or 0),
+        'federal_tax_withheld': 0,
+        'state_tax_withheld': 0
+    }
+
+
+def get_batch_paths(user_id, tax_year):
+    """Get the manifest, ZIP and combined PDF paths for a user's batch"""
+    prefix = os.path.join(BATCH_DIR, f"1099-NEC_{user_id}_{tax_year}")
+    return {
+        'manifest': f"{prefix}.json",
+        'zip': f"{prefix}.zip",
+        'combined_pdf': f"{prefix}_combined.pdf",
+    }
+
+
+def _pin_owner(user_id, tax_year):
+    """Name the batch's PDF pins are held under"""
+    return f"1099-NEC_{user_id}_{tax_year}"
+
+
+def read_manifest(user_id, tax_year):
+    """Read a batch manifest, or None if no batch has been started"""
+    try:
+        with open(get_batch_paths(user_id, tax_year)['manifest'], 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(user_id, tax_year, manifest):
+    """Write a manifest atomically so pollers never read a partial file"""
+    path = get_batch_paths(user_id, tax_year)['manifest']
+    manifest['updated_at'] = datetime.utcnow().isoformat()
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(manifest, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def is_batch_running(manifest):
+    """Whether a manifest belongs to a job that is still alive"""
+    if not manifest or manifest.get('status') != 'running':
+        return False
+    updated_at = datetime.fromisoformat(manifest['updated_at'])
+    return datetime.utcnow() - updated_at < STALE_JOB_AFTER
+
+
+def _render_form(form_id, user_id, tax_year, form_data):
+    """
+    Worker task: render one 1099-NEC PDF
+
+    Returns:
+        (form_id, filename or None)
+    """
+    form_1099 = Form1099(id=form_id, user_id=user_id, tax_year=tax_year, form_data=form_data)
+    return form_id, generate_tax_form_pdf(form_1099)
+
+
+def create_missing_forms(user_id, tax_year, payer_name):
+    """
+    Create draft 1099-NEC rows for every eligible contractor without one
+
+    Eligibility and amounts come from the tax year's payment rollups.
+
+    Args:
+        user_id: User ID
+        tax_year: Tax year
+        payer_name: Name printed as the payer
+
+    Returns:
+        Number of forms created
+    """
+    existing = db.session.query(Form1099.contractor_id).filter(
+        Form1099.user_id == user_id,
+        Form1099.tax_year == tax_year
+    )
+    contractors = db.session.query(Contractor, ContractorPaymentRollup.total_amount).join(
+        ContractorPaymentRollup, ContractorPaymentRollup.contractor_id == Contractor.id
+    ).filter(
+        Contractor.user_id == user_id,
+        ContractorPaymentRollup.user_id == user_id,
+        ContractorPaymentRollup.tax_year == tax_year,
+        ContractorPaymentRollup.total_amount >= FORM_1099_THRESHOLD,
+        Contractor.id.notin_(existing)
+    ).all()
+
+    created_at = datetime.utcnow()
+    db.session.bulk_insert_mappings(Form1099, [
+        {
+            'user_id': user_id,
+            'contractor_id': contractor.id,
+            'tax_year': tax_year,
+            'total_amount': total_amount,
+            'form_data': build_1099_form_data(contractor, payer_name, total_amount),
+            'status': 'draft',
+            'created_at': created_at,
+        }
+        for contractor, total_amount in contractors
+    ])
+    db.session.commit()
+    return len(contractors)
+
+
+def _record_pdf(form_id, filename):
+    """Store a rendered PDF's filename on its form"""
+    form_1099 = db.session.get(Form1099, form_id)
+    # Re-assigning to trigger SQLAlchemy update for JSON field
+    form_data = dict(form_1099.form_data or {})
+    form_data['pdf_file'] = filename
+    form_1099.form_data = form_data
+    db.session.commit()
+
+
+def _render_pending(pending, user_id, tax_year, manifest, max_workers):
+    """
+    Render forms across a process pool, recording each as it completes
+
+    Returns:
+        Form IDs that were not rendered because the pool broke
+    """
+    remaining = {form.id: form for form in pending}
+    workers = max(1, min(max_workers or MAX_WORKERS, len(remaining)))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=MP_CONTEXT) as executor:
+            futures = [
+                executor.submit(_render_form, form.id, user_id, tax_year, dict(form.form_data or {}))
+                for form in pending
+            ]
+            for future in as_completed(futures):
+                form_id, filename = future.result()
+                remaining.pop(form_id, None)
+                if filename:
+                    _record_pdf(form_id, filename)
+                    manifest['rendered'] += 1
+                else:
+                    manifest['failed'].append(form_id)
+                _write_manifest(user_id, tax_year, manifest)
+                touch_pdf_pins(_pin_owner(user_id, tax_year))
+    except BrokenProcessPool:
+        logging.error(f"1099 batch worker died for user {user_id} ({tax_year}); {len(remaining)} forms pending")
+
+    return list(remaining)
+
+
+def _package(forms, user_id, tax_year, manifest):
+    """
+    Write the ZIP archive and combined PDF for rendered forms
+
+    A rendered PDF that has disappeared since it was recorded is rendered
+    again; if that fails the form is moved to the manifest's failed list.
+    """
+    paths = get_batch_paths(user_id, tax_year)
+    combined = fitz.open()
+
+    with zipfile.ZipFile(f"{paths['zip']}.tmp", 'w', zipfile.ZIP_DEFLATED) as archive:
+        for form in forms:
+            if form.id in manifest['failed']:
+                continue
+            filename = (form.form_data or {}).get('pdf_file')
+            if not filename or not os.path.exists(os.path.join(PDF_DIR, filename)):
+                _, filename = _render_form(form.id, user_id, tax_year, dict(form.form_data or {}))
+                if not filename:
+                    logging.error(f"1099 batch for user {user_id} ({tax_year}): form {form.id} PDF missing and could not be re-rendered")
+                    manifest['rendered'] -= 1
+                    manifest['failed'].append(form.id)
+                    continue
+                _record_pdf(form.id, filename)
+            pdf_path = os.path.join(PDF_DIR, filename)
+            recipient = _SLUG.sub('_', (form.form_data or {}).get('recipient_name') or 'recipient').strip('_')
+            archive.write(pdf_path, f"1099-NEC_{tax_year}_{recipient}_{form.id}.pdf")
+            with fitz.open(pdf_path) as pdf:
+                combined.insert_pdf(pdf)
+
+    os.replace(f"{paths['zip']}.tmp", paths['zip'])
+    if combined.page_count:
+        combined.save(f"{paths['combined_pdf']}.tmp", garbage=3, deflate=True)
+        os.replace(f"{paths['combined_pdf']}.tmp", paths['combined_pdf'])
+    combined.close()
+
+
+def run_1099_batch(user_id, tax_year, payer_name=None, max_workers=None):
+    """
+    Generate, render and package every eligible 1099-NEC for a tax year
+
+    Safe to call again after an interruption: forms that already have a
+    rendered PDF are skipped.
+
+    Args:
+        user_id: User ID
+        tax_year: Tax year
+        payer_name: Name printed as the payer (defaults to the username)
+        max_workers: Maximum rendering processes
+
+    Returns:
+        The final manifest dictionary
+    """
+    if payer_name is None:
+        user = db.session.get(User, user_id)
+        payer_name = user.username if user else ''
+
+    manifest = {
+        'user_id': user_id,
+        'tax_year': tax_year,
+        'status': 'running',
+        'started_at': datetime.utcnow().isoformat(),
+        'created': 0,
+        'total': 0,
+        'rendered': 0,
+        'failed': [],
+    }
+    _write_manifest(user_id, tax_year, manifest)
+
+    try:
+        manifest['created'] = create_missing_forms(user_id, tax_year, payer_name)
+
+        forms = Form1099.query.filter_by(user_id=user_id, tax_year=tax_year).order_by(Form1099.id).all()
+        manifest['total'] = len(forms)
+
+        # Keep the batch's PDFs, recorded or about to be rendered, out of cache eviction
+        pin_pdfs(_pin_owner(user_id, tax_year), [
+            filename
+            for form in forms
+            for filename in ((form.form_data or {}).get('pdf_file'), tax_form_pdf_filename(form))
+        ])
+
+        # Forms rendered by an earlier, interrupted run are kept
+        pending = []
+        for form in forms:
+            filename = (form.form_data or {}).get('pdf_file')
+            if filename and os.path.exists(os.path.join(PDF_DIR, filename)):
+                manifest['rendered'] += 1
+            else:
+                pending.append(form)
+        _write_manifest(user_id, tax_year, manifest)
+
+        restarts = 0
+        while pending:
+            unfinished = _render_pending(pending, user_id, tax_year, manifest, max_workers)
+            if not unfinished:
+                break
+            if restarts >= MAX_POOL_RESTARTS:
+                manifest['failed'].extend(unfinished)
+                break
+            restarts += 1
+            pending = Form1099.query.filter(Form1099.id.in_(unfinished)).all()
+
+        db.session.expire_all()
+        _package(Form1099.query.filter_by(user_id=user_id, tax_year=tax_year).order_by(Form1099.id).all(),
+                 user_id, tax_year, manifest)
+
+        manifest['status'] = 'completed' if not manifest['failed'] else 'completed_with_errors'
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error generating 1099 batch for user {user_id} ({tax_year}): {e}")
+        manifest['status'] = 'failed'
+        manifest['error'] = str(e)
+    finally:
+        unpin_pdfs(_pin_owner(user_id, tax_year))
+
+    manifest['finished_at'] = datetime.utcnow().isoformat()
+    _write_manifest(user_id, tax_year, manifest)
+    return manifest
+
+
+def start_1099_batch(app, user_id, tax_year, payer_name=None):
+    """
+    Run a 1099 batch in a background thread unless one is already running
+
+    Args:
+        app: Flask application (the thread needs its own app context)
+        user_id: User ID
+        tax_year: Tax year
+        payer_name: Name printed as the payer
+
+    Returns:
+        True if a new batch was started, False if one is already running
+    """
+    if is_batch_running(read_manifest(user_id, tax_year)):
+        return False
+
+    # Claim the batch before the thread starts so a double submit can't race it
+    _write_manifest(user_id, tax_year, {
+        'user_id': user_id, 'tax_year': tax_year, 'status': 'running',
+        'started_at': datetime.utcnow().isoformat(),
+        'created': 0, 'total': 0, 'rendered': 0, 'failed': [],
+    })
+
+    def _run():
+        with app.app_context():
+            run_1099_batch(user_id, tax_year, payer_name)
+
+    threading.Thread(target=_run, daemon=True).start()
+    return True
@@ -15,11 +15,34 @@ from app.models import TaxForm, TaxFormType, BusinessProfile, AuditLog
 from app.session import FormSession
 from app.access_control import requires_access_level, requires_legal_acknowledgment
 from modules.form_library import get_form_template
-from modules.pdf_utils import generate_tax_form_pdf
+from modules.pdf_utils import generate_tax_form_pdf, pdf_file_path, tax_form_pdf_filename
+from modules.pdf_jobs import submit_pdf_job, job_response, PdfQueueFull
 
 # Create blueprint
 forms_bp = Blueprint('forms', __name__, url_prefix='/forms')
 
+
+def _render_form_pdf(form_id):
+    """PDF job: render a tax form and record its PDF path"""
+    form = db.session.get(TaxForm, form_id)
+    pdf_path = generate_tax_form_pdf(form)
+    if pdf_path and pdf_path != form.pdf_path:
+        form.pdf_path = pdf_path
+        db.session.commit()
+    return pdf_path
+
+
+def _queue_form_pdf(form):
+    """Queue a form's PDF render (joining one already in flight)"""
+    form_id = form.id
+    filename = tax_form_pdf_filename(form)
+    return submit_pdf_job(
+        current_user.id,
+        ('tax_form', form_id, filename),
+        lambda: _render_form_pdf(form_id),
+        f"{form.form_type.name}_{form.tax_year}.pdf"
+    )
+
 @forms_bp.route('/')
 @login_required
 @requires_legal_acknowledgment
@@ -205,17 +228,12 @@ def edit_form(form_type_id):
             data={'form_id': form.id, 'form_type': form_template.metadata['tax_form_type'], 'tax_year': tax_year}
         )
         
-        # Generate PDF
+        # Generate PDF in the background; the download picks it up when ready
         try:
-            pdf_path = generate_tax_form_pdf(form)
-            
-            # Update form with PDF path
-            form.pdf_path = pdf_path
-            db.session.commit()
-            
-            flash("Form completed and PDF generated successfully.", "success")
-        except Exception as e:
-            flash(f"Form saved, but PDF generation failed: {str(e)}", "warning")
+            _queue_form_pdf(form)
+            flash("Form completed. Your PDF is being generated.", "success")
+        except PdfQueueFull as e:
+            flash(f"Form saved, but PDF generation is busy: {str(e)}", "warning")
         
         # Redirect to view form
         return redirect(url_for('forms.view_form', form_id=form.id))
@@ -283,23 +301,25 @@ def download_form(form_id):
     # Get form
     form = TaxForm.query.filter_by(id=form_id, user_id=current_user.id).first_or_404()
     
-    # Check if PDF exists
-    if not form.pdf_path or not os.path.exists(form.pdf_path):
-        # Generate PDF
+    # Serve the PDF for the form's current data from the PDF cache when it
+    # has already been rendered; otherwise render it in the background
+    filename = tax_form_pdf_filename(form)
+    if not os.path.exists(pdf_file_path(filename)):
         try:
-            pdf_path = generate_tax_form_pdf(form)
-            
-            # Update form with PDF path
-            form.pdf_path = pdf_path
-            db.session.commit()
-        except Exception as e:
-            flash(f"Failed to generate PDF: {str(e)}", "danger")
+            return job_response(_queue_form_pdf(form))
+        except PdfQueueFull as e:
+            flash(str(e), "warning")
             return redirect(url_for('forms.view_form', form_id=form.id))
+
+    if filename != form.pdf_path:
+        # Update form with PDF path
+        form.pdf_path = filename
+        db.session.commit()
     
     # Send PDF file
     from flask import send_file
     return send_file(
-        form.pdf_path,
+        pdf_file_path(form.pdf_path),
         as_attachment=True,
         download_name=f"{form.form_type.name}_{form.tax_year}.pdf"
     )
@@ -311,9 +331,8 @@ def delete_form(form_id):
     # Get form
     form = TaxForm.query.filter_by(id=form_id, user_id=current_user.id).first_or_404()
     
-    # Delete PDF if exists
-    if form.pdf_path and os.path.exists(form.pdf_path):
-        os.remove(form.pdf_path)
+    # The PDF is content-addressed and may be shared with identical forms,
+    # so it is left for the cache eviction sweep rather than deleted here
     
     # Log this action
     AuditLog.log_action(
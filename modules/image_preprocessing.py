@@ -0,0 +1,183 @@
+"""
+Image Preprocessing Module
+
+This module prepares uploaded images before they are sent to OCR or the
+Vision API. Phone photos of receipts are often 12MP and rotated through EXIF
+metadata only, so images are transposed upright, reduced to a resolution that
+suits the consumer, and re-encoded. It also generates the thumbnails shown in
+the document list.
+"""
+
+import io
+import os
+
+import fitz  # PyMuPDF for rendering PDF thumbnails
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+# Longest edge for OCR input; roughly a letter page at 300 DPI
+OCR_MAX_DIMENSION = 2500
+
+# Box blur radius for the local mean used by adaptive thresholding
+THRESHOLD_RADIUS = 15
+
+# How far below the local mean a pixel must be to count as ink
+THRESHOLD_OFFSET = 10
+
+# Vision uploads are downscaled to this longest edge and kept under this size
+VISION_MAX_DIMENSION = 2048
+VISION_MAX_BYTES = 1024 * 1024
+VISION_JPEG_QUALITIES = (85, 75, 65, 50)
+
+# Document list thumbnails
+THUMBNAIL_SIZE = (200, 200)
+THUMBNAIL_PDF_DPI = 36
+
+
+def load_image(file_path, target_size=None, mode=None):
+    """
+    Open an image and rotate it upright according to its EXIF orientation
+
+    For JPEGs, passing a target size lets the decoder skip full-resolution
+    decoding, which is most of the cost for large phone photos.
+
+    Args:
+        file_path: Path to the image file
+        target_size: Optional (width, height) the image will be reduced to
+        mode: Optional mode hint for the JPEG decoder (e.g. "L")
+
+    Returns:
+        PIL Image instance
+    """
+    image = Image.open(file_path)
+    if target_size and image.format == "JPEG":
+        image.draft(mode or image.mode, target_size)
+    return ImageOps.exif_transpose(image)
+
+
+def downscale(image, max_dimension):
+    """
+    Shrink an image so its longest edge is at most max_dimension
+
+    Args:
+        image: PIL Image instance
+        max_dimension: Maximum width or height in pixels
+
+    Returns:
+        The resized image, or the original if it is already small enough
+    """
+    if max(image.size) <= max_dimension:
+        return image
+    scale = max_dimension / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+
+def adaptive_threshold(image, radius=THRESHOLD_RADIUS, offset=THRESHOLD_OFFSET):
+    """
+    Binarize a grayscale image against its local mean brightness
+
+    Unlike a global threshold this copes with uneven lighting and shadows
+    across a photographed page.
+
+    Args:
+        image: Grayscale (mode "L") PIL image
+        radius: Box blur radius used for the local mean
+        offset: Minimum darkness below the local mean for a pixel to be ink
+
+    Returns:
+        Black and white image in mode "L"
+    """
+    local_mean = image.filter(ImageFilter.BoxBlur(radius))
+    # Pixels darker than their surroundings become positive differences
+    darkness = ImageChops.subtract(local_mean, image)
+    return darkness.point(lambda value: 0 if value > offset else 255)
+
+
+def prepare_for_ocr(file_path, max_dimension=OCR_MAX_DIMENSION, threshold=True):
+    """
+    Load an image and preprocess it for OCR
+
+    Applies EXIF rotation, grayscale conversion, downscaling to an OCR
+    friendly resolution and (optionally) adaptive thresholding.
+
+    Args:
+        file_path: Path to the image file
+        max_dimension: Longest edge in pixels after downscaling
+        threshold: Whether to binarize the image
+
+    Returns:
+        Preprocessed PIL image
+    """
+    image = load_image(file_path, target_size=(max_dimension, max_dimension), mode="L")
+    image = downscale(ImageOps.grayscale(image), max_dimension)
+    if threshold:
+        image = adaptive_threshold(image)
+    return image
+
+
+def encode_for_vision(file_path, max_dimension=VISION_MAX_DIMENSION, max_bytes=VISION_MAX_BYTES):
+    """
+    Re-encode an image as a size-capped JPEG for the Vision API
+
+    The image is rotated upright and downscaled, then saved at decreasing JPEG
+    quality until it fits within max_bytes. If even the lowest quality is too
+    large the image is halved and the process repeats.
+
+    Args:
+        file_path: Path to the image file
+        max_dimension: Longest edge in pixels
+        max_bytes: Maximum encoded size in bytes
+
+    Returns:
+        JPEG bytes
+    """
+    image = load_image(file_path, target_size=(max_dimension, max_dimension), mode="RGB")
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image = downscale(image, max_dimension)
+
+    while True:
+        for quality in VISION_JPEG_QUALITIES:
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality, optimize=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue()
+        if max(image.size) <= 256:
+            return buffer.getvalue()
+        image = downscale(image, max(image.size) // 2)
+
+
+def create_thumbnail(file_path, file_extension, thumbnail_path, size=THUMBNAIL_SIZE):
+    """
+    Create a JPEG thumbnail for an uploaded document
+
+    Images are reduced directly; PDFs have their first page rendered at a low
+    resolution.
+
+    Args:
+        file_path: Path to the uploaded file
+        file_extension: File extension
+        thumbnail_path: Where to write the thumbnail
+        size: Maximum (width, height) of the thumbnail
+
+    Returns:
+        The thumbnail path
+    """
+    if file_extension == 'pdf':
+        pdf_document = fitz.open(file_path)
+        try:
+            pixmap = pdf_document.load_page(0).get_pixmap(dpi=THUMBNAIL_PDF_DPI)
+            image = Image.open(io.BytesIO(pixmap.tobytes("png")))
+            image.load()
+        finally:
+            pdf_document.close()
+    else:
+        image = load_image(file_path, target_size=size)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail(size, Image.LANCZOS)
+
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    image.save(thumbnail_path, format="JPEG", quality=80)
+    return thumbnail_path
@@ -0,0 +1,359 @@
+"""
+Ledger Analytics Module
+
+This module computes the figures behind the Smart Ledger's tax insights:
+income, expense and deductible totals per category, how confidently the
+transactions were categorized, deductible expenses still missing a receipt,
+and month-over-month trends. For a stored ledger they come from one query
+grouped by month plus the category rollups; transaction lists that aren't
+stored are summarized column by column with NumPy, or in one pure-Python
+pass when NumPy isn't installed. Results are cached per user and tax year
+until the ledger changes.
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import and_, case, cast, extract, func, select, Integer
+
+from app import db
+from app.models import LedgerTransaction
+from modules.ledger_store import (
+    AI_REVIEW_CONFIDENCE, NON_INCOME_CATEGORIES, get_category_rollups, get_ledger_version
+)
+
+# NumPy vectorizes summaries of in-memory transaction lists; without it they are summed in Python
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+# Confidence at or above which a categorization counts as high confidence
+# (below AI_REVIEW_CONFIDENCE it is low and queued for AI review)
+HIGH_CONFIDENCE = 85
+
+# Expenses from this amount need a receipt to substantiate the deduction
+RECEIPT_THRESHOLD = 75
+
+# Seconds cached analytics may be served without re-querying
+ANALYTICS_CACHE_TTL = 300
+
+# Per-month aggregates, in the order the monthly query returns them
+MONTH_FIELDS = (
+    'count', 'income', 'expenses', 'deductible',
+    'confidence_sum', 'confidence_count', 'low_confidence', 'medium_confidence', 'high_confidence',
+    'user_confirmed', 'missing_receipts', 'missing_receipts_over_threshold', 'missing_receipt_deductible',
+)
+
+# (month, day, description, type) of a tax year's deadlines; months past 12 fall in the next year
+TAX_DEADLINES = (
+    (4, 15, 'Q1 {year} estimated tax payment due', 'payment'),
+    (6, 15, 'Q2 {year} estimated tax payment due', 'payment'),
+    (9, 15, 'Q3 {year} estimated tax payment due', 'payment'),
+    (13, 15, 'Q4 {year} estimated tax payment due', 'payment'),
+    (16, 15, 'File {year} tax return or request an extension', 'filing'),
+    (22, 15, 'File {year} tax return (with extension)', 'filing'),
+)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _empty_month():
+    return dict.fromkeys(MONTH_FIELDS, 0)
+
+
+def query_month_aggregates(user_id, tax_year):
+    """
+    Aggregate a user's transactions for a tax year by month in one grouped query
+
+    Returns:
+        Dictionary of month number -> dict of MONTH_FIELDS
+    """
+    txn = LedgerTransaction
+    expense = txn.amount < 0
+    missing_receipt = and_(expense, txn.deductible_amount > 0, txn.receipt_path.is_(None))
+
+    def _count(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    def _total(condition, value):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    month = cast(extract('month', txn.date), Integer).label('month')
+    query = select(
+        month,
+        func.count(txn.id),
+        _total(and_(txn.amount > 0, txn.category.notin_(NON_INCOME_CATEGORIES)), txn.amount),
+        _total(expense, -txn.amount),
+        func.coalesce(func.sum(txn.deductible_amount), 0),
+        _total(and_(expense, txn.confidence.isnot(None)), txn.confidence),
+        _count(and_(expense, txn.confidence.isnot(None))),
+        _count(and_(expense, txn.confidence < AI_REVIEW_CONFIDENCE)),
+        _count(and_(expense, txn.confidence >= AI_REVIEW_CONFIDENCE, txn.confidence < HIGH_CONFIDENCE)),
+        _count(and_(expense, txn.confidence >= HIGH_CONFIDENCE)),
+        _count(and_(expense, txn.categorized_by == 'user')),
+        _count(missing_receipt),
+        _count(and_(missing_receipt, txn.amount <= -RECEIPT_THRESHOLD)),
+        _total(missing_receipt, txn.deductible_amount),
+    ).where(txn.user_id == user_id, txn.tax_year == tax_year).group_by('month')
+
+    return {
+        row[0]: {field: value or 0 for field, value in zip(MONTH_FIELDS, row[1:])}
+        for row in db.session.execute(query)
+    }
+
+
+def _summarize_python(transactions):
+    """summarize_transactions without NumPy: one pass accumulating per month and category"""
+    months = {}
+    categories = {}
+    for t in transactions:
+        amount = float(t.get('amount') or 0)
+        confidence = t.get('confidence')
+        expense = amount < 0
+        expenses = -amount if expense else 0.0
+        deductible = round(expenses * float(t.get('deductible_percentage') or 0) / 100, 2)
+        rated = expense and confidence is not None
+        confidence = float(confidence) if rated else 0.0
+        missing = expense and deductible > 0 and not (t.get('receipt_path') or t.get('has_receipt'))
+        values = {
+            'count': 1,
+            'income': amount if amount > 0 and t.get('category') not in NON_INCOME_CATEGORIES else 0.0,
+            'expenses': expenses,
+            'deductible': deductible,
+            'confidence_sum': confidence,
+            'confidence_count': rated,
+            'low_confidence': rated and confidence < AI_REVIEW_CONFIDENCE,
+            'medium_confidence': rated and AI_REVIEW_CONFIDENCE <= confidence < HIGH_CONFIDENCE,
+            'high_confidence': rated and confidence >= HIGH_CONFIDENCE,
+            'user_confirmed': expense and t.get('categorized_by') == 'user',
+            'missing_receipts': missing,
+            'missing_receipts_over_threshold': missing and expenses >= RECEIPT_THRESHOLD,
+            'missing_receipt_deductible': deductible if missing else 0.0,
+        }
+
+        month = months.setdefault(str(t.get('date') or '')[:7], dict.fromkeys(MONTH_FIELDS, 0.0))
+        for field in MONTH_FIELDS:
+            month[field] += values[field]
+
+        category = categories.setdefault(
+            t.get('category') or 'uncategorized',
+            {'income': 0.0, 'expenses': 0.0, 'deductible': 0.0, 'count': 0}
+        )
+        category['income'] += values['income']
+        category['expenses'] += expenses
+        category['deductible'] += deductible
+        category['count'] += 1
+
+    return (
+        {key or 'undated': months[key] for key in sorted(months)},
+        {key: categories[key] for key in sorted(categories)},
+    )
+
+
+def summarize_transactions(transactions):
+    """
+    Aggregate in-memory transactions column by column with NumPy (or in
+    Python when NumPy isn't installed)
+
+    Args:
+        transactions: Dicts with amount (negative for expenses), category,
+                      deductible_percentage, confidence and optionally date
+                      (YYYY-MM-DD), categorized_by and receipt_path/has_receipt
+
+    Returns:
+        Tuple of (dict of 'YYYY-MM' -> MONTH_FIELDS dict, dict of category ->
+        {income, expenses, deductible, count})
+    """
+    if not transactions:
+        return {}, {}
+    if not HAS_NUMPY:
+        return _summarize_python(transactions)
+
+    amounts = np.array([float(t.get('amount') or 0) for t in transactions])
+    percentages = np.array([float(t.get('deductible_percentage') or 0) for t in transactions])
+    confidences = np.array([np.nan if t.get('confidence') is None else float(t['confidence']) for t in transactions])
+    user_confirmed = np.array([t.get('categorized_by') == 'user' for t in transactions])
+    has_receipt = np.array([bool(t.get('receipt_path') or t.get('has_receipt')) for t in transactions])
+    month_keys, month_codes = np.unique([str(t.get('date') or '')[:7] for t in transactions], return_inverse=True)
+    category_keys, category_codes = np.unique([t.get('category') or 'uncategorized' for t in transactions], return_inverse=True)
+
+    expense = amounts < 0
+    earned = np.array([t.get('category') not in NON_INCOME_CATEGORIES for t in transactions])
+    income = np.where((amounts > 0) & earned, amounts, 0)
+    expenses = np.where(expense, -amounts, 0)
+    deductible = np.round(expenses * percentages / 100, 2)
+    rated = expense & ~np.isnan(confidences)
+    rated_confidence = np.where(rated, confidences, 0)
+    missing = expense & (deductible > 0) & ~has_receipt
+
+    columns = {
+        'count': np.ones(len(amounts)),
+        'income': income,
+        'expenses': expenses,
+        'deductible': deductible,
+        'confidence_sum': rated_confidence,
+        'confidence_count': rated,
+        'low_confidence': rated & (rated_confidence < AI_REVIEW_CONFIDENCE),
+        'medium_confidence': rated & (rated_confidence >= AI_REVIEW_CONFIDENCE) & (rated_confidence < HIGH_CONFIDENCE),
+        'high_confidence': rated & (rated_confidence >= HIGH_CONFIDENCE),
+        'user_confirmed': expense & user_confirmed,
+        'missing_receipts': missing,
+        'missing_receipts_over_threshold': missing & (expenses >= RECEIPT_THRESHOLD),
+        'missing_receipt_deductible': np.where(missing, deductible, 0),
+    }
+    by_month = {field: np.bincount(month_codes, weights=values, minlength=len(month_keys)) for field, values in columns.items()}
+    months = {
+        str(key) or 'undated': {field: float(by_month[field][index]) for field in MONTH_FIELDS}
+        for index, key in enumerate(month_keys)
+    }
+
+    def _by_category(values):
+        return np.bincount(category_codes, weights=values, minlength=len(category_keys))
+
+    category_income, category_expenses = _by_category(income), _by_category(expenses)
+    category_deductible, category_count = _by_category(deductible), _by_category(columns['count'])
+    categories = {
+        str(key): {
+            'income': float(category_income[index]),
+            'expenses': float(category_expenses[index]),
+            'deductible': float(category_deductible[index]),
+            'count': int(category_count[index]),
+        }
+        for index, key in enumerate(category_keys)
+    }
+    return months, categories
+
+
+def combine_analytics(months, categories):
+    """
+    Turn per-month and per-category aggregates into the insights figures
+
+    Args:
+        months: Dictionary of month label -> MONTH_FIELDS dict, in display order
+        categories: Dictionary of category -> {income, expenses, deductible, count}
+
+    Returns:
+        Analytics dictionary with totals, category_totals,
+        deductible_by_category, confidence_distribution, missing_receipts
+        and monthly_trends
+    """
+    totals = _empty_month()
+    for month in months.values():
+        for field in MONTH_FIELDS:
+            totals[field] += month[field]
+
+    trends = []
+    previous = None
+    for label, month in months.items():
+        if label == 'undated':
+            continue
+        expenses = float(month['expenses'])
+        change = None
+        if previous:
+            change = round((expenses - previous) / previous * 100, 1)
+        trends.append({
+            'month': label,
+            'transactions': int(month['count']),
+            'income': round(float(month['income']), 2),
+            'expenses': round(expenses, 2),
+            'deductible': round(float(month['deductible']), 2),
+            'expense_change_pct': change,
+        })
+        previous = expenses
+
+    rated = int(totals['confidence_count'])
+    return {
+        'totals': {
+            'transaction_count': int(totals['count']),
+            'income': round(float(totals['income']), 2),
+            'expenses': round(float(totals['expenses']), 2),
+            'deductible': round(float(totals['deductible']), 2),
+        },
+        'category_totals': {
+            category: round(float(values['income'] + values['expenses']), 2)
+            for category, values in categories.items()
+        },
+        'deductible_by_category': {
+            category: round(float(values['deductible']), 2)
+            for category, values in categories.items() if values['deductible']
+        },
+        'confidence_distribution': {
+            'average': round(float(totals['confidence_sum']) / rated, 1) if rated else None,
+            'low': int(totals['low_confidence']),
+            'medium': int(totals['medium_confidence']),
+            'high': int(totals['high_confidence']),
+            'user_confirmed': int(totals['user_confirmed']),
+        },
+        'missing_receipts': {
+            'count': int(totals['missing_receipts']),
+            'over_threshold': int(totals['missing_receipts_over_threshold']),
+            'deductible_amount': round(float(totals['missing_receipt_deductible']), 2),
+        },
+        'monthly_trends': trends,
+    }
+
+
+def compute_ledger_analytics(user_id, tax_year, today=None):
+    """
+    Compute a tax year's analytics from the stored ledger
+
+    Months run from January through the current month (or December for
+    past years), with empty months included so trends line up.
+    """
+    today = today or date.today()
+    by_month = query_month_aggregates(user_id, tax_year)
+    last_month = 12 if tax_year < today.year else (today.month if tax_year == today.year else 0)
+    last_month = max([last_month] + list(by_month))
+    months = {
+        f"{tax_year}-{month:02d}": by_month.get(month) or _empty_month()
+        for month in range(1, last_month + 1)
+    }
+    return combine_analytics(months, get_category_rollups(user_id, tax_year))
+
+
+def get_ledger_analytics(user_id, tax_year):
+    """
+    Get a tax year's analytics, from cache while the ledger hasn't changed
+
+    Returns:
+        Analytics dictionary as returned by combine_analytics
+    """
+    version = (get_ledger_version(user_id), date.today())
+    now = time.monotonic()
+
+    with _cache_lock:
+        cached = _cache.get((user_id, tax_year))
+    if cached and cached['version'] == version and now - cached['cached_at'] < ANALYTICS_CACHE_TTL:
+        return cached['analytics']
+
+    analytics = compute_ledger_analytics(user_id, tax_year)
+    with _cache_lock:
+        _cache[(user_id, tax_year)] = {'version': version, 'cached_at': now, 'analytics': analytics}
+    return analytics
+
+
+def upcoming_deadlines(tax_year, today=None):
+    """
+    Estimated-payment and filing deadlines for a tax year that haven't passed
+
+    Deadlines falling on a weekend move to the following Monday.
+    """
+    today = today or date.today()
+    deadlines = []
+    for month, day, description, deadline_type in TAX_DEADLINES:
+        deadline = date(tax_year + (month - 1) // 12, (month - 1) % 12 + 1, day)
+        while deadline.weekday() >= 5:
+            deadline += timedelta(days=1)
+        if deadline >= today:
+            deadlines.append({
+                'date': deadline.isoformat(),
+                'description': description.format(year=tax_year),
+                'type': deadline_type,
+                'days_remaining': (deadline - today).days,
+            })
+    return deadlines
@@ -0,0 +1,322 @@
+"""
+Ledger Duplicate Detection Module
+
+This module finds transactions that were recorded more than once, e.g. the
+same charge arriving from a bank statement, an accounting-platform import and
+a manual entry. Transactions are streamed in date order through the
+(user_id, tax_year, date) index and bucketed by exact amount; each bucket
+keeps a sliding window of the last DATE_WINDOW_DAYS days, so a transaction is
+only compared with same-amount transactions close to it in time rather than
+with every other transaction.
+
+Exact duplicates (the same bank transaction ID imported twice, or the same
+amount, merchant and date arriving from different sources) are merged
+automatically. Looser matches are stored as LedgerDuplicateCandidate rows for
+the user to merge or dismiss. A merge never loses a receipt: copies with one
+are preferred as survivors, and a receipt on a merged-away copy is moved onto
+the survivor when it has none.
+"""
+
+import re
+from collections import deque
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from sqlalchemy import select, update
+
+from app import db
+from app.models import LedgerDuplicateCandidate, LedgerTransaction
+from modules.ledger_import import normalize_merchant
+from modules.ledger_store import delete_transactions
+
+# Days either side of a transaction searched for duplicates
+DATE_WINDOW_DAYS = 3
+
+# Merchant similarity (0-1) at which a same-amount match is queued for review
+FUZZY_MERCHANT_SIMILARITY = 0.5
+
+# Transactions fetched per round trip during a scan
+SCAN_BATCH_SIZE = 2000
+
+# Which copy survives a merge: one with a receipt, then the one the user
+# categorized, then the AI, then the rules
+_CATEGORIZED_RANK = {'user': 2, 'ai': 1}
+
+_MERCHANT_WORD = re.compile(r'[a-z]+')
+
+
+@lru_cache(maxsize=8192)
+def merchant_key(merchant, description=None):
+    """Words of a normalized merchant name (or the description when there is no merchant)"""
+    text = normalize_merchant(merchant or description or '').lower()
+    return frozenset(word for word in _MERCHANT_WORD.findall(text) if len(word) > 1)
+
+
+def merchant_similarity(left, right):
+    """Jaccard similarity of two merchant keys"""
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def _entry_key(entry):
+    """Merchant key of a scan entry, computed the first time it is compared"""
+    if entry['key'] is None:
+        entry['key'] = merchant_key(entry['merchant'], entry['description'])
+    return entry['key']
+
+
+def _classify(entry, other):
+    """
+    Compare two same-amount transactions within the date window
+
+    Returns:
+        ('exact' | 'fuzzy' | None, similarity score, reason)
+    """
+    if entry['external_id'] and entry['external_id'] == other['external_id'] and entry['source'] == other['source']:
+        return 'exact', 1.0, 'same_external_id'
+
+    score = merchant_similarity(_entry_key(entry), _entry_key(other))
+    if score == 1.0 and entry['date'] == other['date'] and entry['source'] != other['source']:
+        return 'exact', score, 'same_charge_different_source'
+    if score >= FUZZY_MERCHANT_SIMILARITY:
+        if entry['date'] == other['date']:
+            return 'fuzzy', score, 'same_day'
+        return 'fuzzy', score, 'nearby_date'
+    return None, score, None
+
+
+def _survivor(entry, other):
+    """Pick which of two exact duplicates to keep"""
+    def rank(item):
+        return bool(item['receipt_path']), _CATEGORIZED_RANK.get(item['categorized_by'], 0), -item['id']
+    return entry if rank(entry) > rank(other) else other
+
+
+def _move_receipts(user_id, pairs):
+    """
+    Copy receipts from transactions about to be merged away onto their survivors
+
+    A survivor that already has a receipt keeps its own. The caller deletes
+    the duplicates and commits.
+
+    Args:
+        user_id: User ID
+        pairs: Iterable of (duplicate_id, survivor_id)
+    """
+    pairs = list(pairs)
+    receipts = {
+        row.id: row for row in db.session.execute(
+            select(LedgerTransaction.id, LedgerTransaction.receipt_path, LedgerTransaction.receipt_matched_by)
+            .where(
+                LedgerTransaction.user_id == user_id,
+                LedgerTransaction.id.in_([drop_id for drop_id, _ in pairs]),
+                LedgerTransaction.receipt_path.isnot(None)
+            )
+        )
+    }
+    for drop_id, keep_id in pairs:
+        receipt = receipts.get(drop_id)
+        if receipt is None:
+            continue
+        db.session.execute(
+            update(LedgerTransaction)
+            .where(
+                LedgerTransaction.id == keep_id,
+                LedgerTransaction.user_id == user_id,
+                LedgerTransaction.receipt_path.is_(None)
+            )
+            .values(receipt_path=receipt.receipt_path, receipt_matched_by=receipt.receipt_matched_by)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def scan_duplicates(user_id, tax_years=None):
+    """
+    Find duplicate transactions in a user's ledger
+
+    Args:
+        user_id: User ID
+        tax_years: Optional tax years to limit the scan to
+
+    Returns:
+        Tuple of (exact, fuzzy): exact is a list of (duplicate_id, survivor_id);
+        fuzzy is a list of (transaction_id, duplicate_of_id, score, reason)
+    """
+    query = select(
+        LedgerTransaction.id, LedgerTransaction.date, LedgerTransaction.amount,
+        LedgerTransaction.merchant, LedgerTransaction.description, LedgerTransaction.source,
+        LedgerTransaction.external_id, LedgerTransaction.categorized_by, LedgerTransaction.receipt_path
+    ).where(LedgerTransaction.user_id == user_id)
+    if tax_years:
+        query = query.where(LedgerTransaction.tax_year.in_(list(tax_years)))
+    query = query.order_by(LedgerTransaction.date, LedgerTransaction.id).execution_options(
+        stream_results=True, yield_per=SCAN_BATCH_SIZE
+    )
+
+    window = timedelta(days=DATE_WINDOW_DAYS)
+    buckets = {}
+    exact = []
+    fuzzy = []
+
+    for row in db.session.execute(query):
+        entry = {
+            'id': row.id,
+            'date': row.date,
+            'merchant': row.merchant,
+            'description': row.description,
+            'key': None,
+            'source': row.source,
+            'external_id': row.external_id,
+            'categorized_by': row.categorized_by,
+            'receipt_path': row.receipt_path,
+        }
+        bucket = buckets.setdefault(row.amount, deque())
+        while bucket and row.date - bucket[0]['date'] > window:
+            bucket.popleft()
+
+        merged = False
+        for other in bucket:
+            match, score, reason = _classify(entry, other)
+            if match == 'exact':
+                keep = _survivor(entry, other)
+                drop = other if keep is entry else entry
+                exact.append((drop['id'], keep['id']))
+                if drop is other:
+                    bucket.remove(other)
+                    bucket.append(entry)
+                merged = True
+                break
+            if match == 'fuzzy':
+                fuzzy.append((entry['id'], other['id'], round(score, 3), reason))
+
+        if not merged:
+            bucket.append(entry)
+
+    return exact, fuzzy
+
+
+def find_duplicates(user_id, tax_years=None, auto_merge=True):
+    """
+    Scan a user's ledger, merge exact duplicates and queue fuzzy ones for review
+
+    Pairs the user already merged or dismissed are not queued again.
+
+    Args:
+        user_id: User ID
+        tax_years: Optional tax years to limit the scan to
+        auto_merge: Delete exact duplicates (otherwise they are queued too)
+
+    Returns:
+        Dictionary with merged and queued counts
+    """
+    exact, fuzzy = scan_duplicates(user_id, tax_years)
+
+    if not auto_merge:
+        fuzzy = [(drop_id, keep_id, 1.0, 'exact') for drop_id, keep_id in exact] + fuzzy
+        exact = []
+
+    try:
+        merged_ids = {drop_id for drop_id, _ in exact}
+        merged = 0
+        if merged_ids:
+            _move_receipts(user_id, exact)
+            merged = delete_transactions(user_id, merged_ids)
+
+        known = set()
+        if fuzzy:
+            known = set(db.session.execute(
+                select(LedgerDuplicateCandidate.transaction_id, LedgerDuplicateCandidate.duplicate_of_id)
+                .where(LedgerDuplicateCandidate.user_id == user_id)
+            ).all())
+
+        created_at = datetime.utcnow()
+        pending = [
+            {
+                'user_id': user_id,
+                'transaction_id': transaction_id,
+                'duplicate_of_id': duplicate_of_id,
+                'score': score,
+                'reason': reason,
+                'status': 'pending',
+                'created_at': created_at,
+            }
+            for transaction_id, duplicate_of_id, score, reason in fuzzy
+            if (transaction_id, duplicate_of_id) not in known
+            and transaction_id not in merged_ids and duplicate_of_id not in merged_ids
+        ]
+        if pending:
+            db.session.bulk_insert_mappings(LedgerDuplicateCandidate, pending)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {'merged': merged, 'queued': len(pending)}
+
+
+def get_pending_duplicates(user_id, limit=100):
+    """
+    Get duplicate candidates waiting for review with both transactions
+
+    Returns:
+        List of dicts with the candidate and both transactions
+    """
+    candidates = LedgerDuplicateCandidate.query.filter_by(
+        user_id=user_id, status='pending'
+    ).order_by(LedgerDuplicateCandidate.score.desc(), LedgerDuplicateCandidate.id).limit(limit).all()
+
+    ids = {c.transaction_id for c in candidates} | {c.duplicate_of_id for c in candidates}
+    transactions = {
+        transaction.id: transaction
+        for transaction in LedgerTransaction.query.filter(LedgerTransaction.id.in_(ids)).all()
+    } if ids else {}
+
+    return [
+        {
+            'id': candidate.id,
+            'score': candidate.score,
+            'reason': candidate.reason,
+            'transaction': transactions[candidate.transaction_id].to_dict(),
+            'duplicate_of': transactions[candidate.duplicate_of_id].to_dict(),
+        }
+        for candidate in candidates
+    ]
+
+
+def resolve_duplicate(user_id, candidate_id, action):
+    """
+    Merge or dismiss a queued duplicate
+
+    Merging deletes the candidate's transaction (and its other candidates),
+    moving its receipt onto the kept transaction if that has none; dismissing
+    keeps both and stops the pair from being queued again.
+
+    Args:
+        user_id: User ID
+        candidate_id: LedgerDuplicateCandidate ID
+        action: 'merge' or 'dismiss'
+
+    Returns:
+        True if the candidate was resolved, False if it wasn't found or is
+        no longer pending
+    """
+    if action not in ('merge', 'dismiss'):
+        raise ValueError(f"Unknown action: {action}")
+
+    candidate = LedgerDuplicateCandidate.query.filter_by(id=candidate_id, user_id=user_id, status='pending').first()
+    if candidate is None:
+        return False
+
+    try:
+        if action == 'merge':
+            _move_receipts(user_id, [(candidate.transaction_id, candidate.duplicate_of_id)])
+            delete_transactions(user_id, [candidate.transaction_id])
+        else:
+            candidate.status = 'dismissed'
+            candidate.resolved_at = datetime.utcnow()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return True
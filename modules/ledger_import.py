@@ -0,0 +1,326 @@
+"""
+Bank Statement Import Module
+
+This module imports bank and card statements (OFX, QFX or CSV) into the
+Smart Ledger. Files are streamed: OFX/QFX is tokenized a block at a time and
+CSV is read row by row, so memory stays flat regardless of statement size.
+Dates, amounts and merchant names are normalized, each row goes through the
+rule-based categorizer, and transactions are written with chunked bulk
+inserts followed by one rollup upsert. Money coming in is only booked as
+income when it isn't a card payment, transfer or refund. Rows the rules are unsure about are
+left for the deferred AI categorization batch rather than calling the API
+during the upload.
+"""
+
+import html
+import io
+import re
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+
+from app.models import LedgerTransaction
+from modules.bulk_import import BulkImport, iter_csv_rows
+from modules.ledger_store import (
+    AI_REVIEW_CONFIDENCE, INSERT_CHUNK_SIZE, NON_INCOME_CATEGORIES, add_row_to_deltas, apply_ledger_deltas,
+    build_transaction_row
+)
+
+SUPPORTED_EXTENSIONS = {'csv', 'ofx', 'qfx'}
+
+# Bytes read from an OFX/QFX upload at a time
+OFX_READ_SIZE = 64 * 1024
+
+# Accepted header spellings for each CSV column
+COLUMN_ALIASES = {
+    'date': {'date', 'transaction_date', 'posted_date', 'posting_date', 'post_date', 'trans_date'},
+    'amount': {'amount', 'transaction_amount'},
+    'debit': {'debit', 'withdrawal', 'withdrawals', 'debit_amount'},
+    'credit': {'credit', 'deposit', 'deposits', 'credit_amount'},
+    'type': {'type', 'transaction_type', 'dr/cr'},
+    'merchant': {'merchant', 'payee', 'name', 'merchant_name'},
+    'description': {'description', 'memo', 'details', 'transaction_description'},
+    'external_id': {'id', 'transaction_id', 'reference', 'fitid'},
+    'category': {'category'},
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y', '%Y%m%d', '%d-%b-%Y', '%b %d, %Y')
+
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+# OFX TRNTYPE / CSV type values for money moved between accounts or returned rather than earned
+TRANSFER_TYPES = {'PAYMENT', 'XFER', 'TRANSFER'}
+REFUND_TYPES = {'REFUND', 'RETURN'}
+
+# Card network and processor noise in front of or behind merchant names.
+# Words that also start real names (Web Services, Visa, ACH Foods) only count
+# as noise next to another noise word, a separator or a run of digits
+_PREFIX_NOISE = r'(?:pos|dbt\s+crd|checkcard|check\s+card|debit\s+card)'
+_PREFIX_TOKEN = rf'(?:{_PREFIX_NOISE}|visa|purchase|recurring|ach|web|debit)'
+_MERCHANT_PREFIXES = re.compile(
+    rf'^(?:(?={_PREFIX_NOISE}\b|{_PREFIX_TOKEN}\s+{_PREFIX_TOKEN}\b|{_PREFIX_TOKEN}\s*[*:#]|{_PREFIX_TOKEN}\s+\d{{2}}[\d/]*\s)'
+    rf'(?:{_PREFIX_TOKEN}\b(?:\s*[*:#]\s*|\s+)(?:\d{{2}}[\d/]*\s+)?)+)?'
+    r'(?:sq\s*\*|tst\s*\*|sp\s*\*|paypal\s*\*|pp\s*\*)?',
+    re.IGNORECASE
+)
+
+# Wording of card payments, transfers between accounts and refunds on statements
+_TRANSFER_WORDS = re.compile(
+    r'\b(?:payment\s*-?\s*thank\s*you|thank\s*you\s*for\s*your\s*payment|autopay|auto\s+pay|'
+    r'(?:online|internal|mobile|account|funds)\s+transfer|'
+    r'transfer\s+(?:from|to)\s+(?:chk|checking|sav|savings|share|acct|account)|xfer)\b',
+    re.IGNORECASE
+)
+_REFUND_WORDS = re.compile(r'\b(?:refund|returned|return|reversal|chargeback|credit\s+adjustment|merchandise\s+credit)\b', re.IGNORECASE)
+_MERCHANT_SUFFIXES = re.compile(r'(?:\s+#?\d{3,}|\s+x{2,}\d+|\s+\d{2}/\d{2})+$', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+class StatementImportError(Exception):
+    """Raised when a statement cannot be read at all (as opposed to bad rows)"""
+
+
+def normalize_merchant(value):
+    """Strip processor prefixes, store numbers and card digits from a merchant name"""
+    text = _WHITESPACE.sub(' ', str(value or '')).strip()
+    text = _MERCHANT_PREFIXES.sub('', text)
+    text = _MERCHANT_SUFFIXES.sub('', text).strip(' *-')
+    return text.title() if text.isupper() else text
+
+
+def _parse_amount(value):
+    """Parse a signed amount like '-1,250.00', '(45.10)' or '$300'"""
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    cleaned = str(value or '').strip().replace('$', '').replace(',', '')
+    if not cleaned:
+        raise ValueError('Missing amount')
+    negative = cleaned.startswith('(') and cleaned.endswith(')')
+    try:
+        amount = Decimal(cleaned.strip('()'))
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value}')
+    return (-amount if negative else amount).quantize(Decimal('0.01'))
+
+
+def _parse_date(value):
+    """Parse a statement date (OFX timestamps keep only their date part)"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or '').strip()
+    if not text:
+        raise ValueError('Missing date')
+    # OFX: YYYYMMDD[HHMMSS[.XXX]][[offset:TZ]]
+    if len(text) >= 8 and text[:8].isdigit():
+        text = text[:8]
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f'Invalid date: {value}')
+
+
+def _check_csv_headers(columns):
+    if 'date' not in columns or not ({'amount', 'debit', 'credit'} & columns):
+        raise StatementImportError('CSV needs a date column and an amount (or debit/credit) column')
+
+
+def _csv_to_row(row):
+    """Map a CSV row onto a raw transaction dict with a signed amount"""
+    if str(row.get('amount') or '').strip():
+        amount = _parse_amount(row['amount'])
+        # Some banks export unsigned amounts with a separate debit/credit flag
+        if amount > 0 and str(row.get('type') or '').strip().lower() in ('debit', 'dr', 'withdrawal'):
+            amount = -amount
+    elif str(row.get('debit') or '').strip():
+        amount = -abs(_parse_amount(row['debit']))
+    elif str(row.get('credit') or '').strip():
+        amount = abs(_parse_amount(row['credit']))
+    else:
+        raise ValueError('Missing amount')
+
+    return {
+        'date': row.get('date'),
+        'amount': amount,
+        'merchant': row.get('merchant') or row.get('description'),
+        'description': row.get('description') or '',
+        'external_id': row.get('external_id'),
+        'category': row.get('category'),
+        'transaction_type': row.get('type'),
+    }
+
+
+def _iter_ofx_rows(stream):
+    """
+    Yield (transaction number, raw row dict) from an OFX/QFX stream
+
+    Handles both SGML (OFX 1.x, unclosed leaf tags) and XML (OFX 2.x)
+    statements by tokenizing tags block by block. Transactions from a credit
+    card statement (CCSTMTRS) are flagged with card_statement.
+    """
+    reader = io.TextIOWrapper(stream, encoding='utf-8', errors='replace')
+    buffer = ''
+    current = None
+    card_statement = False
+    number = 0
+
+    while True:
+        block = reader.read(OFX_READ_SIZE)
+        buffer += block
+        # Keep a possibly incomplete trailing tag (and its value) for the next block
+        cut = buffer.rfind('<') if block else -1
+        if cut == -1:
+            cut = len(buffer)
+        text, buffer = buffer[:cut], buffer[cut:]
+
+        for closing, tag, value in _OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == 'CCSTMTRS':
+                card_statement = not closing
+            elif tag == 'STMTTRN':
+                if closing:
+                    if current is not None:
+                        number += 1
+                        yield number, current
+                    current = None
+                else:
+                    current = {'card_statement': card_statement}
+            elif current is not None and not closing:
+                current[tag] = html.unescape(value.strip())
+
+        if not block:
+            break
+
+    if current:
+        number += 1
+        yield number, current
+
+
+def _ofx_to_row(fields):
+    """Map an OFX STMTTRN's fields onto a raw transaction dict"""
+    name = fields.get('NAME') or fields.get('PAYEE') or ''
+    memo = fields.get('MEMO') or ''
+    if 'TRNAMT' not in fields:
+        raise ValueError('Missing TRNAMT')
+    return {
+        'date': fields.get('DTPOSTED') or fields.get('DTUSER'),
+        'amount': _parse_amount(fields['TRNAMT']),
+        'merchant': name or memo,
+        'description': memo or name,
+        'external_id': fields.get('FITID'),
+        'category': None,
+        'transaction_type': fields.get('TRNTYPE'),
+        'card_statement': fields.get('card_statement', False),
+    }
+
+
+def iter_statement_rows(stream, file_extension):
+    """
+    Stream rows from an uploaded statement
+
+    Args:
+        stream: Binary file-like object
+        file_extension: 'csv', 'ofx' or 'qfx'
+
+    Returns:
+        Tuple of (iterator of (line or transaction number, fields), converter
+        turning fields into a dict with date, signed amount, merchant,
+        description, external_id, category and transaction_type)
+    """
+    if file_extension == 'csv':
+        return iter_csv_rows(stream, COLUMN_ALIASES, _check_csv_headers), _csv_to_row
+    if file_extension in ('ofx', 'qfx'):
+        return _iter_ofx_rows(stream), _ofx_to_row
+    raise StatementImportError(f'Unsupported file type: {file_extension}')
+
+
+def _credit_category(row):
+    """
+    Category for money coming in: card payments and transfers between
+    accounts are 'transfer', refunds are 'refund', anything else is 'income'
+    """
+    transaction_type = str(row.get('transaction_type') or '').strip().upper()
+    text = f"{row.get('merchant') or ''} {row.get('description') or ''}"
+    if transaction_type in REFUND_TYPES or _REFUND_WORDS.search(text):
+        return 'refund'
+    if transaction_type in TRANSFER_TYPES or _TRANSFER_WORDS.search(text):
+        return 'transfer'
+    # Credits on a card statement are payments or refunds, never earnings
+    if row.get('card_statement'):
+        return 'refund' if transaction_type == 'CREDIT' else 'transfer'
+    return 'income'
+
+
+def _categorize(row, categorize, categories):
+    """Apply the rule-based categorizer (money coming in is categorized without it)"""
+    if row['amount'] > 0:
+        return _credit_category(row), 0, 95
+    category = row.get('category')
+    if category and category in categories:
+        return category, categories[category].get('percentage', 0), 100
+    analysis = categorize(dict(row, amount=float(row['amount'])))
+    return analysis['category'], analysis['deductible_percentage'], analysis['confidence']
+
+
+def import_statement(user_id, stream, file_extension, categorize, categories, dry_run=False):
+    """
+    Import a bank or card statement into the ledger
+
+    Nothing is saved if any row is invalid.
+
+    Args:
+        user_id: User ID that owns the ledger
+        stream: Binary file-like object
+        file_extension: 'csv', 'ofx' or 'qfx'
+        categorize: Rule-based categorizer taking a transaction dict and
+                    returning category, deductible_percentage and confidence
+        categories: Known categories (name -> info with 'percentage'), used
+                    for rows that arrive with a category already
+        dry_run: Validate only, without saving anything
+
+    Returns:
+        Dictionary report with counts, totals and per-line errors
+    """
+    created_at = datetime.utcnow()
+    batch = BulkImport(LedgerTransaction, dry_run, INSERT_CHUNK_SIZE)
+    low_confidence = 0
+    total_income = Decimal('0')
+    total_expenses = Decimal('0')
+    deltas = {}
+    tax_years = set()
+
+    rows, to_row = iter_statement_rows(stream, file_extension)
+
+    def _build_row(fields):
+        nonlocal low_confidence, total_income, total_expenses
+        row = to_row(fields)
+        row['merchant'] = normalize_merchant(row['merchant'])
+        category, percentage, confidence = _categorize(row, categorize, categories)
+        mapping = build_transaction_row(user_id, dict(
+            row,
+            date=_parse_date(row['date']),
+            category=category,
+            deductible_percentage=percentage,
+            confidence=confidence,
+            categorized_by='rules'
+        ), created_at, source='import')
+
+        if confidence < AI_REVIEW_CONFIDENCE:
+            low_confidence += 1
+        if mapping['amount'] < 0:
+            total_expenses -= mapping['amount']
+        elif mapping['category'] not in NON_INCOME_CATEGORIES:
+            total_income += mapping['amount']
+        add_row_to_deltas(deltas, mapping)
+        tax_years.add(mapping['tax_year'])
+        return mapping
+
+    batch.run(rows, _build_row, lambda: apply_ledger_deltas(user_id, deltas))
+    return batch.report(
+        total_income=float(total_income),
+        total_expenses=float(total_expenses),
+        low_confidence=low_confidence,
+        tax_years=sorted(tax_years),
+    )
@@ -0,0 +1,282 @@
+"""
+Ledger Snapshot Module
+
+This module exports a user's full Smart Ledger for offline analysis and
+restores it again. Rows are streamed from a server-side cursor in chunks of
+SNAPSHOT_CHUNK_SIZE and written as they arrive, so memory use doesn't grow
+with the size of the ledger. Snapshots are Parquet or Arrow IPC files when
+pyarrow is installed and gzipped CSV otherwise.
+
+Restores read a snapshot chunk by chunk and write each chunk with one
+executemany insert, updating the category rollups once at the end. The format is
+detected from the file itself. Restoring without replace appends every row as
+is; nothing is deduplicated against the existing ledger.
+"""
+
+import csv
+import gzip
+import io
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from app import db
+from app.models import LedgerTransaction
+from modules.ledger_store import (
+    add_row_to_deltas, apply_ledger_deltas, build_transaction_row, clear_transactions
+)
+
+# pyarrow is only needed for Parquet and Arrow snapshots
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    pa = None
+    pq = None
+    HAS_PYARROW = False
+
+# Rows fetched from the cursor and written per batch (export) or inserted per statement (restore)
+SNAPSHOT_CHUNK_SIZE = 5000
+
+# format -> (file extension, mimetype)
+SNAPSHOT_FORMATS = {
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+    'csv': ('csv.gz', 'application/gzip'),
+}
+
+# Exported columns, in file order; tax_year and deductible_amount are
+# recomputed on restore
+SNAPSHOT_COLUMNS = (
+    'tax_year', 'date', 'amount', 'merchant', 'description', 'category',
+    'deductible_percentage', 'deductible_amount', 'confidence', 'categorized_by',
+    'source', 'external_id', 'receipt_path', 'receipt_matched_by', 'created_at',
+)
+
+
+class LedgerSnapshotError(Exception):
+    """Raised when a snapshot can't be written or read"""
+
+
+def _arrow_schema():
+    amount = pa.decimal128(12, 2)
+    return pa.schema([
+        ('tax_year', pa.int32()),
+        ('date', pa.date32()),
+        ('amount', amount),
+        ('merchant', pa.string()),
+        ('description', pa.string()),
+        ('category', pa.string()),
+        ('deductible_percentage', pa.int32()),
+        ('deductible_amount', amount),
+        ('confidence', pa.int32()),
+        ('categorized_by', pa.string()),
+        ('source', pa.string()),
+        ('external_id', pa.string()),
+        ('receipt_path', pa.string()),
+        ('receipt_matched_by', pa.string()),
+        ('created_at', pa.timestamp('us')),
+    ])
+
+
+def default_format():
+    """Most compact snapshot format available"""
+    return 'parquet' if HAS_PYARROW else 'csv'
+
+
+def _iter_chunks(user_id):
+    """Yield lists of a user's transaction rows (tuples in SNAPSHOT_COLUMNS order) from a server-side cursor"""
+    query = select(
+        *(getattr(LedgerTransaction, column) for column in SNAPSHOT_COLUMNS)
+    ).where(
+        LedgerTransaction.user_id == user_id
+    ).order_by(
+        LedgerTransaction.tax_year, LedgerTransaction.date, LedgerTransaction.id
+    ).execution_options(stream_results=True, yield_per=SNAPSHOT_CHUNK_SIZE)
+
+    # Executed on the session's connection so rows skip ORM processing
+    result = db.session.connection().execute(query)
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def _write_arrow(user_id, fileobj, snapshot_format):
+    schema = _arrow_schema()
+    if snapshot_format == 'parquet':
+        writer = pq.ParquetWriter(fileobj, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(fileobj, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+
+    count = 0
+    try:
+        for chunk in _iter_chunks(user_id):
+            columns = list(zip(*chunk))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            count += len(chunk)
+    finally:
+        writer.close()
+    return count
+
+
+def _write_csv(user_id, fileobj):
+    count = 0
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as compressed:
+        text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(SNAPSHOT_COLUMNS)
+        for chunk in _iter_chunks(user_id):
+            # csv writes None as an empty field and dates in ISO format
+            writer.writerows(chunk)
+            count += len(chunk)
+        text.flush()
+        text.detach()
+    return count
+
+
+def export_ledger_snapshot(user_id, fileobj, snapshot_format=None):
+    """
+    Write a user's whole ledger to a binary file object
+
+    Args:
+        user_id: User ID
+        fileobj: Writable binary file object
+        snapshot_format: 'parquet', 'arrow' or 'csv' (defaults to the most
+                         compact available); Parquet and Arrow fall back to
+                         gzipped CSV when pyarrow isn't installed
+
+    Returns:
+        Dictionary with the format written and the number of rows
+
+    Raises:
+        LedgerSnapshotError: If the format is unknown
+    """
+    snapshot_format = snapshot_format or default_format()
+    if snapshot_format not in SNAPSHOT_FORMATS:
+        raise LedgerSnapshotError(f'Unsupported snapshot format: {snapshot_format}')
+    if snapshot_format != 'csv' and not HAS_PYARROW:
+        snapshot_format = 'csv'
+
+    if snapshot_format == 'csv':
+        count = _write_csv(user_id, fileobj)
+    else:
+        count = _write_arrow(user_id, fileobj, snapshot_format)
+    return {'format': snapshot_format, 'rows': count}
+
+
+def _detect_format(fileobj):
+    """Snapshot format from a file's magic bytes (the file is rewound)"""
+    magic = fileobj.read(6)
+    fileobj.seek(0)
+    if magic[:2] == b'\x1f\x8b':
+        return 'csv'
+    if magic[:4] == b'PAR1':
+        return 'parquet'
+    if magic == b'ARROW1':
+        return 'arrow'
+    raise LedgerSnapshotError('Not a ledger snapshot (expected Parquet, Arrow or gzipped CSV)')
+
+
+def _iter_arrow_records(fileobj, snapshot_format):
+    if snapshot_format == 'parquet':
+        for batch in pq.ParquetFile(fileobj).iter_batches(batch_size=SNAPSHOT_CHUNK_SIZE):
+            yield from batch.to_pylist()
+    else:
+        reader = pa.ipc.open_file(fileobj)
+        for index in range(reader.num_record_batches):
+            yield from reader.get_batch(index).to_pylist()
+
+
+def _iter_csv_records(fileobj):
+    with gzip.GzipFile(fileobj=fileobj, mode='rb') as compressed:
+        for record in csv.DictReader(io.TextIOWrapper(compressed, encoding='utf-8', newline='')):
+            yield {column: None if value == '' else value for column, value in record.items()}
+
+
+def _snapshot_row(user_id, record, restored_at, keep_receipts):
+    """LedgerTransaction insert mapping for a snapshot record"""
+    if isinstance(record.get('date'), str):
+        record = dict(record, date=date.fromisoformat(record['date']))
+    row = build_transaction_row(user_id, record, restored_at, source='import')
+    confidence = record.get('confidence')
+    created_at = record.get('created_at')
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    row.update(
+        confidence=None if confidence is None else int(confidence),
+        created_at=created_at or restored_at,
+    )
+    if keep_receipts:
+        row.update(
+            receipt_path=record.get('receipt_path') or None,
+            receipt_matched_by=record.get('receipt_matched_by') or None,
+        )
+    return row
+
+
+def import_ledger_snapshot(user_id, fileobj, replace=False, keep_receipts=False):
+    """
+    Restore transactions from a snapshot into a user's ledger (the caller commits)
+
+    Rows are added to the existing ledger unless replace is set, in which
+    case the user's transactions are deleted first. Added rows are not
+    deduplicated, so restoring the same snapshot twice without replace
+    doubles those transactions. On error nothing should be committed.
+
+    Receipt links are dropped unless keep_receipts is set: receipts are
+    files under the shared uploads/ folder, so a path taken from an uploaded
+    snapshot could point at another user's receipt. Only trusted snapshots
+    (the admin CLI) should keep them.
+
+    Args:
+        user_id: User ID to restore into
+        fileobj: Seekable binary file object written by export_ledger_snapshot
+        replace: Delete the user's existing transactions first
+        keep_receipts: Restore receipt_path and receipt_matched_by from the file
+
+    Returns:
+        Number of transactions restored
+
+    Raises:
+        LedgerSnapshotError: If the file isn't a snapshot or a row is invalid
+    """
+    snapshot_format = _detect_format(fileobj)
+    if snapshot_format != 'csv' and not HAS_PYARROW:
+        raise LedgerSnapshotError(f'Restoring {snapshot_format} snapshots requires pyarrow')
+    if snapshot_format == 'csv':
+        records = _iter_csv_records(fileobj)
+    else:
+        records = _iter_arrow_records(fileobj, snapshot_format)
+
+    if replace:
+        clear_transactions(user_id)
+
+    # Every row has the same keys, so each chunk is one executemany
+    insert_rows = LedgerTransaction.__table__.insert()
+    restored_at = datetime.utcnow()
+    deltas = {}
+    chunk = []
+    count = 0
+    for line_number, record in enumerate(records, start=1):
+        try:
+            row = _snapshot_row(user_id, record, restored_at, keep_receipts)
+        except (ValueError, TypeError) as e:
+            raise LedgerSnapshotError(f'Row {line_number}: {e}')
+        chunk.append(row)
+        add_row_to_deltas(deltas, row)
+        if len(chunk) >= SNAPSHOT_CHUNK_SIZE:
+            db.session.execute(insert_rows, chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert_rows, chunk)
+        count += len(chunk)
+
+    apply_ledger_deltas(user_id, deltas)
+    return count
@@ -0,0 +1,380 @@
+"""
+Smart Ledger Store Module
+
+This module persists Smart Ledger transactions and maintains
+LedgerCategoryRollup rows: one per (user, tax year, category) holding the
+income, expense and deductible totals and the transaction count. Rollups are
+adjusted in the same transaction as every insert or delete, so tax insights
+read a handful of rollup rows instead of rescanning a user's transactions.
+They can be rebuilt from LedgerTransaction with one aggregate query.
+"""
+
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import and_, case, func, select
+
+from app import db
+from app.models import LedgerCategoryRollup, LedgerDuplicateCandidate, LedgerTransaction
+from modules.db_utils import ALL_USERS, bump_data_version, get_data_version, upsert_totals
+
+# Transactions written per bulk insert statement
+INSERT_CHUNK_SIZE = 1000
+
+# Rule-categorized transactions below this confidence are queued for AI review
+AI_REVIEW_CONFIDENCE = 60
+
+# Categories for money coming in that wasn't earned (card payments and
+# transfers between accounts, refunds of purchases); never counted as income
+NON_INCOME_CATEGORIES = ('transfer', 'refund')
+
+_ROLLUP_KEY = ['user_id', 'tax_year', 'category']
+
+# DataVersion scope moved by every ledger write
+LEDGER_SCOPE = 'ledger'
+
+
+def get_ledger_version(user_id):
+    """Version token that changes whenever a user's ledger is written"""
+    return get_data_version(user_id, LEDGER_SCOPE)
+
+
+def mark_ledger_changed(user_id):
+    """
+    Bump a user's ledger version in the current transaction
+
+    The version is stored in the database and commits with the ledger writes,
+    so caches in every worker process see it move together with the data.
+    Writes that don't go through the rollups (receipt links, for instance)
+    call this directly.
+    """
+    bump_data_version(user_id, LEDGER_SCOPE)
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value or '').strip()[:10], '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Invalid transaction date: {value!r}")
+
+
+def _parse_amount(value):
+    try:
+        return Decimal(str(value).replace('$', '').replace(',', '').strip()).quantize(Decimal('0.01'))
+    except (InvalidOperation, AttributeError):
+        raise ValueError(f"Invalid transaction amount: {value!r}")
+
+
+def deductible_amount(amount, deductible_percentage):
+    """Deductible portion of a transaction (income is never deductible)"""
+    if amount >= 0:
+        return Decimal('0')
+    return (-amount * Decimal(deductible_percentage or 0) / 100).quantize(Decimal('0.01'))
+
+
+def build_transaction_row(user_id, transaction, created_at=None, source='manual'):
+    """
+    Turn a categorized transaction dict into a LedgerTransaction insert mapping
+
+    Args:
+        user_id: User ID
+        transaction: Dict with date, amount, merchant, description, category,
+                     deductible_percentage and optionally confidence and source
+        created_at: Timestamp to record (defaults to now)
+        source: Source recorded when the transaction doesn't name one
+
+    Returns:
+        Dictionary of column values
+
+    Raises:
+        ValueError: If the date or amount can't be parsed
+    """
+    transaction_date = _parse_date(transaction.get('date'))
+    amount = _parse_amount(transaction.get('amount'))
+    percentage = max(0, min(100, int(transaction.get('deductible_percentage') or 0)))
+    return {
+        'user_id': user_id,
+        'tax_year': transaction_date.year,
+        'date': transaction_date,
+        'amount': amount,
+        'merchant': str(transaction.get('merchant') or '').strip()[:255],
+        'description': str(transaction.get('description') or '').strip(),
+        'category': str(transaction.get('category') or 'uncategorized')[:50],
+        'deductible_percentage': percentage,
+        'deductible_amount': deductible_amount(amount, percentage),
+        'confidence': transaction.get('confidence'),
+        'categorized_by': transaction.get('categorized_by') or 'rules',
+        'source': transaction.get('source') or source,
+        'external_id': str(transaction.get('external_id') or '')[:64] or None,
+        'created_at': created_at or datetime.utcnow(),
+    }
+
+
+def add_row_to_deltas(deltas, row, sign=1):
+    """Accumulate one transaction row into per-(tax_year, category) rollup deltas"""
+    key = (row['tax_year'], row['category'])
+    income, expense, deductible, count = deltas.get(key, (Decimal('0'), Decimal('0'), Decimal('0'), 0))
+    amount = row['amount']
+    if amount < 0:
+        expense += sign * -amount
+    elif row['category'] not in NON_INCOME_CATEGORIES:
+        income += sign * amount
+    deltas[key] = (income, expense, deductible + sign * row['deductible_amount'], count + sign)
+
+
+def apply_ledger_deltas(user_id, deltas):
+    """
+    Adjust category rollups by per-(tax_year, category) deltas
+
+    All deltas are applied in one upsert statement where the database
+    supports it. The caller commits.
+
+    Args:
+        user_id: User ID
+        deltas: Dictionary of (tax_year, category) ->
+                (income_delta, expense_delta, deductible_delta, count_delta)
+    """
+    if not deltas:
+        return
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            'user_id': user_id,
+            'tax_year': tax_year,
+            'category': category,
+            'income_amount': income,
+            'expense_amount': expense,
+            'deductible_amount': deductible,
+            'transaction_count': count,
+            'updated_at': now,
+        }
+        for (tax_year, category), (income, expense, deductible, count) in deltas.items()
+    ]
+
+    upsert_totals(LedgerCategoryRollup, _ROLLUP_KEY, rows, 'transaction_count')
+    mark_ledger_changed(user_id)
+
+
+def add_transactions(user_id, transactions, source='manual'):
+    """
+    Bulk insert categorized transactions and update their rollups
+
+    Every transaction is validated before anything is written. The caller
+    commits.
+
+    Args:
+        user_id: User ID
+        transactions: Iterable of categorized transaction dicts
+        source: Source recorded on transactions that don't name one
+
+    Returns:
+        Tuple of (number of transactions inserted, sorted tax years they fall in)
+
+    Raises:
+        ValueError: If any transaction has an invalid date or amount
+    """
+    created_at = datetime.utcnow()
+    rows = [build_transaction_row(user_id, transaction, created_at, source) for transaction in transactions]
+
+    deltas = {}
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+        db.session.bulk_insert_mappings(LedgerTransaction, chunk)
+        for row in chunk:
+            add_row_to_deltas(deltas, row)
+
+    apply_ledger_deltas(user_id, deltas)
+    return len(rows), sorted({row['tax_year'] for row in rows})
+
+
+def delete_transactions(user_id, transaction_ids):
+    """
+    Delete a user's transactions and remove them from their rollups
+
+    The caller commits.
+
+    Returns:
+        Number of transactions deleted
+    """
+    transaction_ids = list(transaction_ids)
+    if not transaction_ids:
+        return 0
+
+    rows = db.session.execute(
+        select(
+            LedgerTransaction.tax_year, LedgerTransaction.category,
+            LedgerTransaction.amount, LedgerTransaction.deductible_amount
+        ).where(LedgerTransaction.user_id == user_id, LedgerTransaction.id.in_(transaction_ids))
+    ).mappings().all()
+
+    deltas = {}
+    for row in rows:
+        add_row_to_deltas(deltas, row, sign=-1)
+
+    db.session.execute(
+        LedgerDuplicateCandidate.__table__.delete().where(
+            LedgerDuplicateCandidate.user_id == user_id,
+            (LedgerDuplicateCandidate.transaction_id.in_(transaction_ids) |
+             LedgerDuplicateCandidate.duplicate_of_id.in_(transaction_ids))
+        )
+    )
+    db.session.execute(
+        LedgerTransaction.__table__.delete().where(
+            LedgerTransaction.user_id == user_id,
+            LedgerTransaction.id.in_(transaction_ids)
+        )
+    )
+    apply_ledger_deltas(user_id, deltas)
+    return len(rows)
+
+
+def clear_transactions(user_id):
+    """
+    Delete all of a user's transactions, duplicate candidates and rollups (the caller commits)
+
+    Returns:
+        Number of transactions deleted
+    """
+    db.session.execute(
+        LedgerDuplicateCandidate.__table__.delete().where(LedgerDuplicateCandidate.user_id == user_id)
+    )
+    db.session.execute(
+        LedgerCategoryRollup.__table__.delete().where(LedgerCategoryRollup.user_id == user_id)
+    )
+    result = db.session.execute(
+        LedgerTransaction.__table__.delete().where(LedgerTransaction.user_id == user_id)
+    )
+    mark_ledger_changed(user_id)
+    return result.rowcount
+
+
+def get_low_confidence_transactions(user_id, limit):
+    """Oldest rule-categorized transactions whose confidence is below AI_REVIEW_CONFIDENCE"""
+    return LedgerTransaction.query.filter(
+        LedgerTransaction.user_id == user_id,
+        LedgerTransaction.categorized_by == 'rules',
+        LedgerTransaction.confidence < AI_REVIEW_CONFIDENCE
+    ).order_by(LedgerTransaction.id).limit(limit).all()
+
+
+def recategorize_transactions(user_id, updates):
+    """
+    Change the category of existing transactions and move their totals between rollups
+
+    The caller commits.
+
+    Args:
+        user_id: User ID
+        updates: Dictionary of transaction_id -> dict with category,
+                 deductible_percentage, confidence and categorized_by
+
+    Returns:
+        Number of transactions updated
+    """
+    if not updates:
+        return 0
+
+    transactions = LedgerTransaction.query.filter(
+        LedgerTransaction.user_id == user_id,
+        LedgerTransaction.id.in_(list(updates))
+    ).all()
+
+    deltas = {}
+    for transaction in transactions:
+        update = updates[transaction.id]
+        old = {
+            'tax_year': transaction.tax_year, 'category': transaction.category,
+            'amount': transaction.amount, 'deductible_amount': transaction.deductible_amount,
+        }
+        add_row_to_deltas(deltas, old, sign=-1)
+
+        percentage = max(0, min(100, int(update.get('deductible_percentage') or 0)))
+        transaction.category = str(update.get('category') or transaction.category)[:50]
+        transaction.deductible_percentage = percentage
+        transaction.deductible_amount = deductible_amount(transaction.amount, percentage)
+        transaction.confidence = update.get('confidence', transaction.confidence)
+        transaction.categorized_by = update.get('categorized_by') or 'user'
+
+        add_row_to_deltas(deltas, {
+            'tax_year': transaction.tax_year, 'category': transaction.category,
+            'amount': transaction.amount, 'deductible_amount': transaction.deductible_amount,
+        })
+
+    # Moves within the same category cancel out
+    apply_ledger_deltas(user_id, {key: delta for key, delta in deltas.items() if any(delta)})
+    return len(transactions)
+
+
+def rebuild_ledger_rollups(user_id=None):
+    """
+    Rebuild category rollups from LedgerTransaction with one aggregate query
+
+    Args:
+        user_id: Optional user ID to limit the rebuild to
+
+    Returns:
+        Number of rollup rows written
+    """
+    delete = LedgerCategoryRollup.__table__.delete()
+    totals = select(
+        LedgerTransaction.user_id,
+        LedgerTransaction.tax_year,
+        LedgerTransaction.category,
+        func.sum(case((and_(
+            LedgerTransaction.amount > 0, LedgerTransaction.category.notin_(NON_INCOME_CATEGORIES)
+        ), LedgerTransaction.amount), else_=0)),
+        func.sum(case((LedgerTransaction.amount < 0, -LedgerTransaction.amount), else_=0)),
+        func.sum(LedgerTransaction.deductible_amount),
+        func.count(LedgerTransaction.id),
+        func.current_timestamp()
+    )
+    if user_id is not None:
+        delete = delete.where(LedgerCategoryRollup.user_id == user_id)
+        totals = totals.where(LedgerTransaction.user_id == user_id)
+    totals = totals.group_by(LedgerTransaction.user_id, LedgerTransaction.tax_year, LedgerTransaction.category)
+
+    try:
+        db.session.execute(delete)
+        result = db.session.execute(LedgerCategoryRollup.__table__.insert().from_select(
+            ['user_id', 'tax_year', 'category', 'income_amount', 'expense_amount',
+             'deductible_amount', 'transaction_count', 'updated_at'],
+            totals
+        ))
+        mark_ledger_changed(ALL_USERS if user_id is None else user_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result.rowcount
+
+
+def get_category_rollups(user_id, tax_year):
+    """
+    Get a user's per-category totals for a tax year
+
+    Returns:
+        Dictionary of category -> {income, expenses, deductible, count}
+        with Decimal amounts
+    """
+    rows = db.session.query(
+        LedgerCategoryRollup.category,
+        LedgerCategoryRollup.income_amount,
+        LedgerCategoryRollup.expense_amount,
+        LedgerCategoryRollup.deductible_amount,
+        LedgerCategoryRollup.transaction_count
+    ).filter_by(user_id=user_id, tax_year=tax_year)
+    return {
+        category: {'income': income, 'expenses': expenses, 'deductible': deductible, 'count': count}
+        for category, income, expenses, deductible, count in rows
+    }
+
+
+def get_ledger_years(user_id):
+    """Tax years that have ledger transactions, newest first"""
+    rows = db.session.query(LedgerCategoryRollup.tax_year).filter_by(user_id=user_id).distinct()
+    return sorted((tax_year for tax_year, in rows), reverse=True)
@@ -0,0 +1,382 @@
+"""
+Mileage Log Module
+
+This module records vehicle trips and maintains MileageYearTotal rows: one per
+(user, tax year) holding the trip count, business and personal miles and the
+number of business trips with no purpose recorded. Totals are adjusted in the
+same transaction as every trip insert or delete, so standard-mileage
+deductions, tax savings and audit-risk checks read one row instead of scanning
+a user's trips. They can be rebuilt from MileageTrip with one aggregate query.
+
+Trips can be bulk imported from the CSV exports of trip-tracking apps
+(MileIQ, Everlance, TripLog and similar). Imports stream the file, insert in
+chunks and skip trips that are already in the log.
+"""
+
+import re
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import and_, case, func, select
+
+from app import db
+from app.models import MileageTrip, MileageYearTotal
+from app.services.tax_engine import standard_mileage_deduction, get_standard_mileage_rate
+from modules.bulk_import import BulkImport, iter_csv_rows
+from modules.db_utils import upsert_totals
+
+# Trips inserted per bulk statement
+INSERT_CHUNK_SIZE = 1000
+
+# Longest single trip accepted (catches odometer readings in the miles column)
+MAX_TRIP_MILES = Decimal('2000')
+
+# Accepted header spellings for each column, covering the common trip-app exports
+COLUMN_ALIASES = {
+    'date': {'date', 'trip_date', 'start_date', 'started', 'start_time', 'drive_date'},
+    'miles': {'miles', 'distance', 'distance_(mi)', 'distance_(miles)', 'mileage', 'total_miles'},
+    'classification': {'classification', 'category', 'type', 'trip_type', 'drive_type'},
+    'purpose': {'purpose', 'business_purpose', 'notes', 'description', 'memo'},
+    'origin': {'origin', 'from', 'start', 'start_location', 'start_address'},
+    'destination': {'destination', 'to', 'end', 'end_location', 'end_address'},
+    'vehicle': {'vehicle', 'car', 'vehicle_name'},
+}
+
+# Classifications counted as business miles; anything else named (personal,
+# commute, unclassified, ...) is not deductible. Rows without one are business.
+BUSINESS_CLASSIFICATIONS = {'business', 'work', 'biz'}
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y')
+
+_TOTAL_KEY = ['user_id', 'tax_year']
+
+_NON_NUMERIC = re.compile(r'[^\d.\-]')
+
+
+class MileageImportError(Exception):
+    """Raised when a trip export cannot be read at all (as opposed to bad rows)"""
+
+
+def _parse_date(value):
+    """Parse a trip date, ignoring any time of day"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or '').strip().replace('T', ' ').split(' ')[0]
+    if not text:
+        raise ValueError('Missing trip date')
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f'Invalid trip date: {value}')
+
+
+def _parse_miles(value):
+    """Parse a trip distance like '12.4' or '1,204.5 mi'"""
+    text = str(value if value is not None else '').strip()
+    if not text:
+        raise ValueError('Missing miles')
+    cleaned = _NON_NUMERIC.sub('', text)
+    if not cleaned:
+        raise ValueError(f'Invalid miles: {value}')
+    try:
+        miles = Decimal(cleaned).quantize(Decimal('0.1'))
+    except InvalidOperation:
+        raise ValueError(f'Invalid miles: {value}')
+    if miles <= 0:
+        raise ValueError(f'Miles must be positive: {value}')
+    if miles > MAX_TRIP_MILES:
+        raise ValueError(f'Trip of {miles} miles is longer than {MAX_TRIP_MILES}; check the miles column')
+    return miles
+
+
+def _is_business(trip):
+    """Whether a trip counts as business mileage"""
+    if 'business' in trip and trip['business'] is not None:
+        value = trip['business']
+        return value if isinstance(value, bool) else str(value).strip().lower() in ('1', 'true', 'yes')
+    classification = str(trip.get('classification') or '').strip().lower()
+    return not classification or classification in BUSINESS_CLASSIFICATIONS
+
+
+def _text(value, length):
+    return str(value or '').strip()[:length] or None
+
+
+def build_trip_row(user_id, trip, created_at=None, source='manual'):
+    """
+    Turn a trip dict into a MileageTrip insert mapping
+
+    Args:
+        user_id: User ID
+        trip: Dict with date, miles and optionally business (or
+              classification), purpose, origin, destination and vehicle
+        created_at: Timestamp to record (defaults to now)
+        source: Source recorded on the trip
+
+    Returns:
+        Dictionary of column values
+
+    Raises:
+        ValueError: If the date or miles can't be parsed
+    """
+    trip_date = _parse_date(trip.get('date'))
+    return {
+        'user_id': user_id,
+        'tax_year': trip_date.year,
+        'date': trip_date,
+        'miles': _parse_miles(trip.get('miles')),
+        'business': _is_business(trip),
+        'purpose': _text(trip.get('purpose'), 255),
+        'origin': _text(trip.get('origin'), 255),
+        'destination': _text(trip.get('destination'), 255),
+        'vehicle': _text(trip.get('vehicle'), 100),
+        'source': source,
+        'created_at': created_at or datetime.utcnow(),
+    }
+
+
+def add_trip_to_deltas(deltas, row, sign=1):
+    """Accumulate one trip row into per-tax-year total deltas"""
+    count, business, personal, undocumented = deltas.get(row['tax_year'], (0, Decimal('0'), Decimal('0'), 0))
+    if row['business']:
+        business += sign * row['miles']
+        undocumented += sign * (0 if row['purpose'] else 1)
+    else:
+        personal += sign * row['miles']
+    deltas[row['tax_year']] = (count + sign, business, personal, undocumented)
+
+
+def apply_mileage_deltas(user_id, deltas):
+    """
+    Adjust yearly mileage totals by per-tax-year deltas
+
+    All deltas are applied in one upsert statement where the database
+    supports it. The caller commits.
+
+    Args:
+        user_id: User ID
+        deltas: Dictionary of tax_year ->
+                (trip_count_delta, business_miles_delta, personal_miles_delta, undocumented_delta)
+    """
+    if not deltas:
+        return
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            'user_id': user_id,
+            'tax_year': tax_year,
+            'trip_count': count,
+            'business_miles': business,
+            'personal_miles': personal,
+            'undocumented_trips': undocumented,
+            'updated_at': now,
+        }
+        for tax_year, (count, business, personal, undocumented) in deltas.items()
+    ]
+
+    upsert_totals(MileageYearTotal, _TOTAL_KEY, rows, 'trip_count')
+
+
+def add_trips(user_id, trips, source='manual'):
+    """
+    Bulk insert trips and update their yearly totals
+
+    Every trip is validated before anything is written. The caller commits.
+
+    Returns:
+        Number of trips inserted
+
+    Raises:
+        ValueError: If any trip has an invalid date or miles
+    """
+    created_at = datetime.utcnow()
+    rows = [build_trip_row(user_id, trip, created_at, source) for trip in trips]
+
+    deltas = {}
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+        db.session.bulk_insert_mappings(MileageTrip, chunk)
+        for row in chunk:
+            add_trip_to_deltas(deltas, row)
+
+    apply_mileage_deltas(user_id, deltas)
+    return len(rows)
+
+
+def delete_trips(user_id, trip_ids):
+    """
+    Delete a user's trips and remove them from their yearly totals
+
+    The caller commits.
+
+    Returns:
+        Number of trips deleted
+    """
+    trip_ids = list(trip_ids)
+    if not trip_ids:
+        return 0
+
+    rows = db.session.execute(
+        select(MileageTrip.tax_year, MileageTrip.miles, MileageTrip.business, MileageTrip.purpose)
+        .where(MileageTrip.user_id == user_id, MileageTrip.id.in_(trip_ids))
+    ).mappings().all()
+
+    deltas = {}
+    for row in rows:
+        add_trip_to_deltas(deltas, row, sign=-1)
+
+    db.session.execute(
+        MileageTrip.__table__.delete().where(MileageTrip.user_id == user_id, MileageTrip.id.in_(trip_ids))
+    )
+    apply_mileage_deltas(user_id, deltas)
+    return len(rows)
+
+
+def get_trips(user_id, tax_year, limit=100):
+    """A tax year's trips, newest first"""
+    return MileageTrip.query.filter_by(user_id=user_id, tax_year=tax_year).order_by(
+        MileageTrip.date.desc(), MileageTrip.id.desc()
+    ).limit(limit).all()
+
+
+def _trip_key(row):
+    """Identity of a trip for skipping re-imported ones"""
+    return (row['date'], row['miles'], (row['origin'] or '').lower(), (row['destination'] or '').lower())
+
+
+def _logged_trip_keys(user_id, tax_year):
+    """Keys of the trips already logged for a tax year"""
+    rows = db.session.execute(
+        select(MileageTrip.date, MileageTrip.miles, MileageTrip.origin, MileageTrip.destination)
+        .where(MileageTrip.user_id == user_id, MileageTrip.tax_year == tax_year)
+    ).mappings()
+    return {_trip_key(row) for row in rows}
+
+
+def _check_trip_headers(columns):
+    if 'date' not in columns or 'miles' not in columns:
+        raise MileageImportError('The file needs a date and a miles (or distance) column')
+
+
+def iter_trip_rows(stream):
+    """Yield (line_number, row dict) keyed by normalized column names from a binary CSV stream"""
+    return iter_csv_rows(stream, COLUMN_ALIASES, _check_trip_headers)
+
+
+def import_trips(user_id, stream, dry_run=False):
+    """
+    Validate and import trips from a trip-tracking app's CSV export
+
+    Every row is validated. Valid rows are inserted in chunks as the file is
+    read, and the import is all-or-nothing: if any row fails (or this is a dry
+    run) the transaction is rolled back and only the report is returned.
+    Trips already in the log (same date, miles, origin and destination) are
+    skipped, so an export can be imported again after new trips were added.
+
+    Args:
+        user_id: User ID
+        stream: Binary file-like object
+        dry_run: Validate only, without saving anything
+
+    Returns:
+        Dictionary report with counts, miles and per-line errors
+    """
+    created_at = datetime.utcnow()
+    batch = BulkImport(MileageTrip, dry_run)
+    duplicates_skipped = 0
+    business_miles = Decimal('0')
+    deltas = {}
+    logged = {}
+
+    def _build_row(trip):
+        nonlocal duplicates_skipped, business_miles
+        row = build_trip_row(user_id, trip, created_at, source='import')
+
+        if row['tax_year'] not in logged:
+            logged[row['tax_year']] = _logged_trip_keys(user_id, row['tax_year'])
+        key = _trip_key(row)
+        if key in logged[row['tax_year']]:
+            duplicates_skipped += 1
+            return None
+        logged[row['tax_year']].add(key)
+
+        add_trip_to_deltas(deltas, row)
+        if row['business']:
+            business_miles += row['miles']
+        return row
+
+    batch.run(iter_trip_rows(stream), _build_row, lambda: apply_mileage_deltas(user_id, deltas))
+    return batch.report(
+        duplicates_skipped=duplicates_skipped,
+        business_miles=float(business_miles),
+        tax_years=sorted(deltas),
+    )
+
+
+def rebuild_mileage_totals(user_id=None):
+    """
+    Rebuild yearly mileage totals from MileageTrip with one aggregate query
+
+    Args:
+        user_id: Optional user ID to limit the rebuild to
+
+    Returns:
+        Number of total rows written
+    """
+    trip = MileageTrip
+    delete = MileageYearTotal.__table__.delete()
+    totals = select(
+        trip.user_id,
+        trip.tax_year,
+        func.count(trip.id),
+        func.coalesce(func.sum(case((trip.business.is_(True), trip.miles), else_=0)), 0),
+        func.coalesce(func.sum(case((trip.business.is_(True), 0), else_=trip.miles)), 0),
+        func.sum(case((and_(trip.business.is_(True), func.coalesce(trip.purpose, '') == ''), 1), else_=0)),
+        func.current_timestamp()
+    )
+    if user_id is not None:
+        delete = delete.where(MileageYearTotal.user_id == user_id)
+        totals = totals.where(trip.user_id == user_id)
+    totals = totals.group_by(trip.user_id, trip.tax_year)
+
+    try:
+        db.session.execute(delete)
+        result = db.session.execute(MileageYearTotal.__table__.insert().from_select(
+            ['user_id', 'tax_year', 'trip_count', 'business_miles', 'personal_miles',
+             'undocumented_trips', 'updated_at'],
+            totals
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result.rowcount
+
+
+def get_mileage_summary(user_id, tax_year):
+    """
+    Mileage totals and standard-mileage deduction for a tax year
+
+    Returns:
+        Dictionary with trip_count, business_miles, personal_miles,
+        business_use_percentage, undocumented_trips, rate (None for years
+        without a published rate) and deduction
+    """
+    total = MileageYearTotal.query.filter_by(user_id=user_id, tax_year=tax_year).first()
+    business = float(total.business_miles) if total else 0.0
+    personal = float(total.personal_miles) if total else 0.0
+    return {
+        'tax_year': tax_year,
+        'trip_count': total.trip_count if total else 0,
+        'business_miles': business,
+        'personal_miles': personal,
+        'business_use_percentage': round(business / (business + personal) * 100, 1) if business + personal else None,
+        'undocumented_trips': total.undocumented_trips if total else 0,
+        'rate': get_standard_mileage_rate(tax_year),
+        'deduction': standard_mileage_deduction(business, tax_year),
+    }
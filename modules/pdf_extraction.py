@@ -0,0 +1,163 @@
+"""
+PDF Text Extraction Module
+
+This module extracts text from PDF documents page by page. Pages are processed
+in chunks across a spawned process pool, each page is checked for an embedded
+text layer, and only pages without one are rendered and sent through OCR.
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF for PDF processing
+import pytesseract
+from PIL import Image
+
+from modules.process_pools import MP_CONTEXT
+
+# Minimum characters of embedded text for a page to count as having a text layer
+MIN_TEXT_LAYER_CHARS = 25
+
+# Resolution used when rendering scanned pages for OCR
+DEFAULT_OCR_DPI = 300
+
+# Pages handled by one worker task
+DEFAULT_CHUNK_SIZE = 16
+
+# Upper bound on extraction worker processes
+MAX_WORKERS = int(os.environ.get("PDF_EXTRACTION_WORKERS", os.cpu_count() or 1))
+
+
+def ocr_image(image):
+    """
+    Run OCR on a PIL image
+
+    Args:
+        image: PIL Image instance
+
+    Returns:
+        Extracted text as a string
+    """
+    return pytesseract.image_to_string(image)
+
+
+def _extract_page(page, ocr_dpi, enable_ocr):
+    """
+    Extract text from a single page, falling back to OCR for scanned pages
+
+    Returns:
+        Dictionary with page text and how it was obtained
+    """
+    text = page.get_text()
+    has_text_layer = len(text.strip()) >= MIN_TEXT_LAYER_CHARS
+    used_ocr = False
+
+    if not has_text_layer and enable_ocr:
+        pixmap = page.get_pixmap(dpi=ocr_dpi, colorspace=fitz.csGRAY)
+        image = Image.open(io.BytesIO(pixmap.tobytes("png")))
+        ocr_text = ocr_image(image)
+        if len(ocr_text.strip()) > len(text.strip()):
+            text = ocr_text
+            used_ocr = True
+
+    return {
+        "page_number": page.number + 1,
+        "text": text,
+        "has_text_layer": has_text_layer,
+        "ocr": used_ocr
+    }
+
+
+def _extract_page_range(file_path, start, end, ocr_dpi, enable_ocr):
+    """
+    Worker task: extract pages [start, end) from a PDF
+
+    Each worker opens its own handle because PyMuPDF documents cannot be
+    shared across processes.
+    """
+    pages = []
+    pdf_document = fitz.open(file_path)
+    try:
+        for page_num in range(start, end):
+            pages.append(_extract_page(pdf_document.load_page(page_num), ocr_dpi, enable_ocr))
+    finally:
+        pdf_document.close()
+    return pages
+
+
+def _page_chunks(page_count, chunk_size):
+    """Split a page count into (start, end) ranges"""
+    return [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+
+
+def extract_pdf(file_path, ocr_dpi=DEFAULT_OCR_DPI, enable_ocr=True, stop_when=None,
+                chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None):
+    """
+    Extract text from a PDF with per-page text-layer detection and OCR fallback
+
+    Small documents (a single chunk) are processed in-process. Larger documents
+    are split into page chunks and processed across a process pool. Chunks are
+    consumed in page order; if ``stop_when`` returns True for the text gathered
+    so far, remaining chunks are cancelled.
+
+    Args:
+        file_path: Path to the PDF file
+        ocr_dpi: Resolution for rendering pages without a text layer
+        enable_ocr: Whether to OCR pages without a text layer
+        stop_when: Optional callable taking the text so far and returning True
+                   once enough has been extracted (e.g. document type detected)
+        chunk_size: Pages per worker task
+        max_workers: Maximum worker processes (defaults to MAX_WORKERS)
+
+    Returns:
+        Dictionary with extracted text, per-page details, and counters
+    """
+    pdf_document = fitz.open(file_path)
+    page_count = len(pdf_document)
+    pdf_document.close()
+
+    chunks = _page_chunks(page_count, chunk_size)
+    pages = []
+    stopped_early = False
+
+    def _should_stop():
+        return stop_when is not None and stop_when("\n".join(p["text"] for p in pages))
+
+    if chunks:
+        if stop_when is not None or len(chunks) == 1:
+            # The first chunk runs in-process: it covers small documents entirely
+            # and usually identifies the document type before any pool starts.
+            first_start, first_end = chunks[0]
+            pages.extend(_extract_page_range(file_path, first_start, first_end, ocr_dpi, enable_ocr))
+            remaining = chunks[1:]
+        else:
+            remaining = chunks
+
+        if remaining and pages and _should_stop():
+            stopped_early = True
+        elif remaining:
+            workers = max(1, min(max_workers or MAX_WORKERS, len(remaining)))
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=MP_CONTEXT)
+            try:
+                futures = [
+                    executor.submit(_extract_page_range, file_path, start, end, ocr_dpi, enable_ocr)
+                    for start, end in remaining
+                ]
+                for index, future in enumerate(futures):
+                    pages.extend(future.result())
+                    if index < len(futures) - 1 and _should_stop():
+                        stopped_early = True
+                        break
+            finally:
+                # Don't wait on chunks that are no longer needed
+                executor.shutdown(wait=not stopped_early, cancel_futures=True)
+
+    return {
+        "text": "\n".join(page["text"] for page in pages),
+        "pages": [{key: value for key, value in page.items() if key != "text"} for page in pages],
+        "page_count": page_count,
+        "pages_processed": len(pages),
+        "ocr_pages": sum(1 for page in pages if page["ocr"]),
+        "stopped_early": stopped_early
+    }
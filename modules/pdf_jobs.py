@@ -0,0 +1,343 @@
+"""
+PDF Job Queue Module
+
+This module moves PDF rendering (ReportLab forms, WeasyPrint exports) off the
+request thread. A route enqueues a render and immediately gets a job back;
+renders run in a bounded thread pool inside their own app context, and the
+browser polls the job's status before downloading the finished file.
+
+Job state is kept in a JSON manifest per job under JOB_DIR rather than in
+process memory, so any gunicorn worker can answer status and download
+requests for a job queued by another. Requests for a render that is already
+queued or running get the same job instead of starting a second one; the
+in-flight claim is an exclusively created file per render key. Finished jobs
+are forgotten after JOB_RETENTION; the rendered files themselves live in
+PDF_DIR and are reused through the PDF cache.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, jsonify, redirect, render_template, request, send_file, url_for, flash
+from flask_login import login_required, current_user
+
+from app import db
+from modules.pdf_utils import PDF_DIR, pdf_file_path
+
+pdf_jobs_bp = Blueprint('pdf_jobs', __name__, url_prefix='/pdf-jobs')
+
+# Where job manifests and in-flight claims are written
+JOB_DIR = os.path.join(PDF_DIR, 'jobs')
+
+# Concurrent renders per process
+MAX_WORKERS = int(os.environ.get("PDF_JOB_WORKERS", 2))
+
+# Queued plus running jobs accepted before new submissions are refused
+MAX_PENDING_JOBS = int(os.environ.get("PDF_JOB_MAX_PENDING", 100))
+
+# How long finished jobs stay available for polling and download
+JOB_RETENTION = timedelta(minutes=30)
+
+# An unfinished job not updated for this long belongs to a dead worker
+STALE_JOB_AFTER = timedelta(minutes=10)
+
+# Times a submission retries claiming a render key that another worker just released
+CLAIM_ATTEMPTS = 3
+
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='pdf-job')
+
+
+class PdfQueueFull(Exception):
+    """Raised when the queue already holds MAX_PENDING_JOBS unfinished jobs"""
+
+
+def _write_json(path, data):
+    """Write a JSON file atomically so pollers never read a partial file"""
+    os.makedirs(JOB_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class PdfJob:
+    """A queued PDF render and its outcome, persisted as a manifest in JOB_DIR"""
+
+    def __init__(self, user_id, key, download_name, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.key = key
+        self.download_name = download_name
+        self.status = 'queued'
+        self.filename = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.updated_at = self.created_at
+        self.finished_at = None
+
+    @staticmethod
+    def manifest_path(job_id):
+        return os.path.join(JOB_DIR, f"{job_id}.json")
+
+    @classmethod
+    def load(cls, job_id):
+        """Read a job's manifest, or None if there is no such job"""
+        if not _JOB_ID.fullmatch(job_id or ''):
+            return None
+        try:
+            with open(cls.manifest_path(job_id), 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        job = cls(data['user_id'], data['key'], data['download_name'], job_id=job_id)
+        job.status = data['status']
+        job.filename = data.get('filename')
+        job.error = data.get('error')
+        job.created_at = datetime.fromisoformat(data['created_at'])
+        job.updated_at = datetime.fromisoformat(data['updated_at'])
+        job.finished_at = datetime.fromisoformat(data['finished_at']) if data.get('finished_at') else None
+        return job
+
+    def save(self):
+        """Write the job's manifest"""
+        self.updated_at = datetime.utcnow()
+        _write_json(self.manifest_path(self.id), {
+            'user_id': self.user_id,
+            'key': self.key,
+            'download_name': self.download_name,
+            'status': self.status,
+            'filename': self.filename,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        })
+
+    @property
+    def finished(self):
+        return self.status in ('completed', 'failed')
+
+    @property
+    def stale(self):
+        """Whether an unfinished job's worker has stopped updating it"""
+        return not self.finished and datetime.utcnow() - self.updated_at >= STALE_JOB_AFTER
+
+    def to_dict(self):
+        """Job status for the polling endpoint"""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'download_url': url_for('pdf_jobs.download', job_id=self.id) if self.status == 'completed' else None,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def _claim_path(key):
+    """In-flight claim file for a render key"""
+    digest = hashlib.sha256(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+    return os.path.join(JOB_DIR, f"inflight_{digest}")
+
+
+def _claimed_job_id(claim_path):
+    try:
+        with open(claim_path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _release_claim(claim_path, job_id):
+    """Remove a render key's claim if it still belongs to job_id"""
+    if _claimed_job_id(claim_path) == job_id:
+        try:
+            os.remove(claim_path)
+        except OSError:
+            pass
+
+
+def _prune_jobs():
+    """Forget finished jobs older than JOB_RETENTION and release claims held by dead jobs"""
+    cutoff = datetime.utcnow() - JOB_RETENTION
+    try:
+        names = os.listdir(JOB_DIR)
+    except OSError:
+        return
+
+    for name in names:
+        path = os.path.join(JOB_DIR, name)
+        if name.startswith('inflight_'):
+            job = PdfJob.load(_claimed_job_id(path))
+            if job is None or job.finished or job.stale:
+                _release_claim(path, job.id if job else _claimed_job_id(path))
+        elif name.endswith('.json'):
+            job = PdfJob.load(name[:-len('.json')])
+            if job is not None and (job.finished or job.stale) and job.updated_at < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _pending_count():
+    try:
+        return sum(1 for name in os.listdir(JOB_DIR) if name.startswith('inflight_'))
+    except OSError:
+        return 0
+
+
+def _run_job(app, job, render, claim_path):
+    """Worker: render inside an app context and record the outcome"""
+    job.status = 'running'
+    job.save()
+    with app.app_context():
+        try:
+            job.filename = render()
+            if not job.filename:
+                raise RuntimeError('Renderer did not produce a PDF')
+            job.status = 'completed'
+        except Exception as e:
+            logging.error(f"PDF job {job.id} ({job.key}) failed: {e}")
+            job.error = 'PDF generation failed'
+            job.status = 'failed'
+        finally:
+            db.session.remove()
+
+    job.finished_at = datetime.utcnow()
+    job.save()
+    _release_claim(claim_path, job.id)
+
+
+def submit_pdf_job(user_id, key, render, download_name):
+    """
+    Queue a PDF render, or join the one already in flight for the same key
+
+    Args:
+        user_id: Owner of the job
+        key: JSON-serializable identity of the render (e.g. ('tax_form', form_id, content hash));
+             repeat submissions with the same key while it is pending share a job,
+             whichever worker process they reach
+        render: Callable run in a worker with an app context; returns the
+                filename of the rendered PDF in PDF_DIR. It must load anything
+                it needs from the database itself.
+        download_name: Filename offered to the browser
+
+    Returns:
+        PdfJob
+
+    Raises:
+        PdfQueueFull: If too many jobs are already pending
+    """
+    app = current_app._get_current_object()
+    key = [user_id] + list(key)
+    claim_path = _claim_path(key)
+
+    _prune_jobs()
+    job = None
+    for _ in range(CLAIM_ATTEMPTS):
+        claimed_id = _claimed_job_id(claim_path)
+        if claimed_id is not None:
+            existing = PdfJob.load(claimed_id)
+            if existing is not None and not existing.finished and not existing.stale:
+                return existing
+            _release_claim(claim_path, claimed_id)
+            continue
+
+        if _pending_count() >= MAX_PENDING_JOBS:
+            raise PdfQueueFull('Too many PDFs are being generated; please try again shortly')
+
+        job = PdfJob(user_id, key, download_name)
+        job.save()
+        # Linking a finished temp file claims the key atomically, with its job id already written
+        tmp_path = f"{claim_path}.{job.id}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(job.id)
+        try:
+            os.link(tmp_path, claim_path)
+        except FileExistsError:
+            # Another worker claimed the key first; join its job
+            os.remove(job.manifest_path(job.id))
+            job = None
+            continue
+        finally:
+            os.remove(tmp_path)
+        break
+
+    if job is None:
+        raise PdfQueueFull('That PDF is already being generated; please try again shortly')
+
+    _executor.submit(_run_job, app, job, render, claim_path)
+    return job
+
+
+def get_job(job_id, user_id):
+    """Get a job by id if it belongs to the user, else None"""
+    job = PdfJob.load(job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    if job.stale:
+        job.status = 'failed'
+        job.error = 'PDF generation was interrupted'
+    return job
+
+
+def job_response(job, wants_json=None):
+    """
+    Respond to a request that queued a PDF job
+
+    JSON/XHR clients get 202 with the job's status URL to poll; browsers are
+    sent to a page that polls the job and then starts the download.
+    """
+    if wants_json is None:
+        wants_json = request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    if wants_json:
+        return jsonify(dict(
+            job.to_dict(),
+            success=True,
+            status_url=url_for('pdf_jobs.status', job_id=job.id)
+        )), 202
+    return redirect(url_for('pdf_jobs.wait', job_id=job.id))
+
+
+@pdf_jobs_bp.route('/<job_id>')
+@login_required
+def status(job_id):
+    """Poll a job's status"""
+    job = get_job(job_id, current_user.id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(dict(job.to_dict(), success=True))
+
+
+@pdf_jobs_bp.route('/<job_id>/wait')
+@login_required
+def wait(job_id):
+    """Page that polls a job and then downloads the PDF"""
+    job = get_job(job_id, current_user.id)
+    if job is None:
+        flash('That PDF is no longer available. Please request it again.', 'warning')
+        return redirect(url_for('main.index'))
+    return render_template('pdf_jobs/wait.html', job=job,
+                           status_url=url_for('pdf_jobs.status', job_id=job.id),
+                           return_url=request.referrer)
+
+
+@pdf_jobs_bp.route('/<job_id>/download')
+@login_required
+def download(job_id):
+    """Download a finished job's PDF"""
+    job = get_job(job_id, current_user.id)
+    if job is None or job.status != 'completed' or not os.path.exists(pdf_file_path(job.filename)):
+        flash('That PDF is not ready or is no longer available.', 'warning')
+        return redirect(url_for('main.index'))
+    return send_file(pdf_file_path(job.filename), as_attachment=True, download_name=job.download_name)
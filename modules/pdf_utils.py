@@ -1,9 +1,25 @@
+"""
+PDF Rendering Utilities
+
+Tax forms and IRS letters are rendered with ReportLab into memory and stored
+in PDF_DIR under a content-addressed filename: a hash of the document type,
+its data and TEMPLATE_VERSION. Rendering the same unchanged form again reuses
+the stored file instead of writing a new one, and the directory is kept under
+PDF_CACHE_MAX_BYTES by evicting the least recently used files. Files an
+unfinished job still needs (such as a 1099 batch's forms) can be pinned so
+eviction skips them.
+"""
+
 import os
 import io
+import json
+import hashlib
 import logging
+import threading
+import time
+from functools import lru_cache
 from datetime import datetime
 from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
@@ -13,488 +29,742 @@ from app.models import TaxForm, Form1099
 PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'pdfs')
 os.makedirs(PDF_DIR, exist_ok=True)
 
-def generate_tax_form_pdf(tax_form):
-    """Generate a PDF for a tax form"""
+# Bump whenever the layout below changes so cached PDFs are re-rendered
+TEMPLATE_VERSION = '2'
+
+# Size budget for rendered PDFs in PDF_DIR; eviction trims to PDF_CACHE_TARGET_RATIO of it
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+PDF_CACHE_TARGET_RATIO = 0.8
+
+# Cached file types (PDFs and export archives)
+CACHE_EXTENSIONS = ('.pdf', '.zip')
+
+# Pin lists of files that eviction must keep, one per owning job
+PIN_DIR = os.path.join(PDF_DIR, 'pins')
+
+# Seconds after its last refresh that a pin list is treated as left behind by a dead job
+PDF_PIN_TTL = 3600
+
+# Page size (IRS letters are passed around as `letter`, which shadows the ReportLab name)
+PAGE_SIZE = letter
+
+# Form data keys that record where a PDF was stored rather than what it shows
+_NON_CONTENT_KEYS = {'pdf_file'}
+
+# Two-column label/value tables
+LABEL_TABLE_STYLE = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
+])
+
+# 1099-NEC box layout with shaded caption rows
+FORM_1099_TABLE_STYLE = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
+    ('BACKGROUND', (0, 0), (1, 0), colors.lightgrey),
+    ('BACKGROUND', (0, 2), (-1, 2), colors.lightgrey),
+    ('BACKGROUND', (0, 4), (-1, 4), colors.lightgrey),
+    ('BACKGROUND', (0, 6), (-1, 6), colors.lightgrey),
+    ('BACKGROUND', (0, 8), (-1, 8), colors.lightgrey),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('PADDING', (0, 0), (-1, -1), 6),
+])
+
+DISCLAIMER_STYLE = ParagraphStyle(name='Disclaimer', fontName='Helvetica', fontSize=8, textColor=colors.red)
+
+_cache_lock = threading.Lock()
+_cache_bytes = None
+
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """ReportLab's sample stylesheet, built once per process"""
+    return getSampleStyleSheet()
+
+
+def pdf_cache_key(document_type, *parts):
+    """
+    Content hash identifying a rendered PDF
+
+    Args:
+        document_type: Form or letter type
+        parts: JSON-serializable values that determine the PDF's content
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps([TEMPLATE_VERSION, document_type, parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def pdf_file_path(filename):
+    """Absolute path of a stored PDF (filenames are stored without a directory)"""
+    return os.path.join(PDF_DIR, os.path.basename(filename))
+
+
+def render_pdf(elements):
+    """
+    Render flowables into PDF bytes without touching the filesystem
+
+    Args:
+        elements: List of ReportLab flowables
+
+    Returns:
+        PDF document as bytes
+    """
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=PAGE_SIZE,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=72
+    )
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def _scan_cache():
+    """List (mtime, size, path) for the files stored directly in PDF_DIR"""
+    entries = []
+    with os.scandir(PDF_DIR) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(CACHE_EXTENSIONS):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def _pin_path(owner):
+    return os.path.join(PIN_DIR, f"{owner}.json")
+
+
+def pin_pdfs(owner, filenames):
+    """
+    Keep files in PDF_DIR from being evicted until unpin_pdfs(owner)
+
+    Pins are shared between processes through PIN_DIR. A pin list that isn't
+    refreshed with touch_pdf_pins within PDF_PIN_TTL is ignored.
+
+    Args:
+        owner: Name of the job holding the pins (one list per owner)
+        filenames: Filenames in PDF_DIR
+    """
+    os.makedirs(PIN_DIR, exist_ok=True)
+    path = _pin_path(owner)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(sorted(set(filename for filename in filenames if filename)), f)
+    os.replace(tmp_path, path)
+
+
+def touch_pdf_pins(owner):
+    """Refresh an owner's pins so they don't expire while its job runs"""
     try:
-        # Create a unique filename
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        
-        # Determine form type and data source
-        form_type_value = ""
-        form_data = {}
-        
-        if isinstance(tax_form, Form1099):
-            form_type_value = "1099-NEC"
-            form_data = tax_form.form_data
-            filename = f"form_1099-NEC_{tax_form.user_id}_{timestamp}.pdf"
-        else:
-            form_type_value = tax_form.form_type.value
-            form_data = tax_form.data
-            filename = f"form_{form_type_value}_{tax_form.user_id}_{timestamp}.pdf"
-            
-        filepath = os.path.join(PDF_DIR, filename)
-        
-        # Create the PDF document
-        doc = SimpleDocTemplate(
-            filepath,
-            pagesize=letter,
-            rightMargin=72,
-            leftMargin=72,
-            topMargin=72,
-            bottomMargin=72
-        )
-        
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = styles['Heading1']
-        heading_style = styles['Heading2']
-        normal_style = styles['Normal']
-        
-        # Build the PDF content
-        elements = []
-        
-        # Add title
-        form_title = f"Form {form_type_value} - Tax Year {tax_form.tax_year}"
-        elements.append(Paragraph(form_title, title_style))
-        elements.append(Spacer(1, 12))
-        
-        # Add generation info
-        elements.append(Paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal_style))
-        elements.append(Spacer(1, 24))
-        
-        # Add form data
-        if form_data:
-            # Group data by section (assuming it's organized somehow)
-            if form_type_value == "1120":
-                # Process 1120 form
-                elements.append(Paragraph("U.S. Corporation Income Tax Return", heading_style))
-                elements.append(Spacer(1, 12))
-                
-                # Basic info section
-                elements.append(Paragraph("Basic Information", heading_style))
-                data = [
-                    ["Company Name:", form_data.get("company_name", "")],
-                    ["EIN:", form_data.get("ein", "")],
-                    ["Address:", form_data.get("address", "")],
-                    ["Date of Incorporation:", form_data.get("incorporation_date", "")],
-                    ["Tax Year:", form_data.get("tax_year", "")]
-                ]
-                t = Table(data, colWidths=[150, 300])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-                ]))
-                elements.append(t)
-                elements.append(Spacer(1, 24))
-                
-                # Income section
-                elements.append(Paragraph("Income", heading_style))
-                data = [
-                    ["Gross Receipts or Sales:", f"${form_data.get('gross_receipts', '0')}"],
-                    ["Returns and Allowances:", f"${form_data.get('returns_allowances', '0')}"],
-                    ["Other Income:", f"${form_data.get('other_income', '0')}"]
-                ]
-                t = Table(data, colWidths=[200, 250])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-                ]))
-                elements.append(t)
-                elements.append(Spacer(1, 24))
-                
-                # Deductions section
-                elements.append(Paragraph("Deductions", heading_style))
-                data = [
-                    ["Salaries and Wages:", f"${form_data.get('salaries_wages', '0')}"],
-                    ["Repairs and Maintenance:", f"${form_data.get('repairs_maintenance', '0')}"],
-                    ["Rents:", f"${form_data.get('rents', '0')}"],
-                    ["Taxes and Licenses:", f"${form_data.get('taxes_licenses', '0')}"],
-                    ["Interest:", f"${form_data.get('interest', '0')}"],
-                    ["Depreciation:", f"${form_data.get('depreciation', '0')}"],
-                    ["Other Deductions:", f"${form_data.get('other_deductions', '0')}"]
-                ]
-                t = Table(data, colWidths=[200, 250])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-                ]))
-                elements.append(t)
-                
-            elif form_type_value == "1065":
-                # Process 1065 form
-                elements.append(Paragraph("U.S. Return of Partnership Income", heading_style))
-                elements.append(Spacer(1, 12))
-                
-                # Partnership info section
-                elements.append(Paragraph("Partnership Information", heading_style))
-                data = [
-                    ["Partnership Name:", form_data.get("partnership_name", "")],
-                    ["EIN:", form_data.get("ein", "")],
-                    ["Address:", form_data.get("address", "")],
-                    ["Date Partnership Formed:", form_data.get("formation_date", "")],
-                    ["Tax Year:", form_data.get("tax_year", "")]
-                ]
-                t = Table(data, colWidths=[150, 300])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-                ]))
-                elements.append(t)
-                elements.append(Spacer(1, 24))
-                
-                # Income section
-                elements.append(Paragraph("Income", heading_style))
-                data = [
-                    ["Gross Receipts or Sales:", f"${form_data.get('gross_receipts', '0')}"],
-                    ["Cost of Goods Sold:", f"${form_data.get('cost_of_goods', '0')}"],
-                    ["Other Income:", f"${form_data.get('other_income', '0')}"]
-                ]
-                t = Table(data, colWidths=[200, 250])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-                ]))
-                elements.append(t)
-                elements.append(Spacer(1, 24))
-                
-                # Deductions section
-                elements.append(Paragraph("Deductions", heading_style))
-                data = [
-                    ["Salaries and Wages:", f"${form_data.get('salaries_wages', '0')}"],
-                    ["Guaranteed Payments to Partners:", f"${form_data.get('guaranteed_payments', '0')}"],
-                    ["Repairs and Maintenance:", f"${form_data.get('repairs_maintenance', '0')}"],
-                    ["Rent:", f"${form_data.get('rent', '0')}"],
-                    ["Taxes and Licenses:", f"${form_data.get('taxes_licenses', '0')}"],
-                    ["Interest:", f"${form_data.get('interest', '0')}"],
-                    ["Depreciation:", f"${form_data.get('depreciation', '0')}"],
-                    ["Other Deductions:", f"${form_data.get('other_deductions', '0')}"]
-                ]
-                t = Table(data, colWidths=[200, 250])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-                ]))
-                elements.append(t)
-                
-            elif form_type_value == "Schedule C":
-                # Process Schedule C form
-                elements.append(Paragraph("Profit or Loss From Business (Sole Proprietorship)", heading_style))
-                elements.append(Spacer(1, 12))
-                
-                # Business info section
-                elements.append(Paragraph("Business Information", heading_style))
-                data = [
-                    ["Business Name:", form_data.get("business_name", "")],
-                    ["Business Code:", form_data.get("business_code", "")],
-                    ["SSN:", form_data.get("ssn", "")],
-                    ["Address:", form_data.get("address", "")],
-                    ["Tax Year:", form_data.get("tax_year", "")]
-                ]
-                t = Table(data, colWidths=[150, 300])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-                ]))
-                elements.append(t)
-                elements.append(Spacer(1, 24))
-                
-                # Income section
-                elements.append(Paragraph("Income", heading_style))
-                data = [
-                    ["Gross Receipts or Sales:", f"${form_data.get('gross_receipts', '0')}"],
-                    ["Returns and Allowances:", f"${form_data.get('returns_allowances', '0')}"],
-                    ["Other Income:", f"${form_data.get('other_income', '0')}"]
-                ]
-                t = Table(data, colWidths=[200, 250])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-                ]))
-                elements.append(t)
-                elements.append(Spacer(1, 24))
-                
-                # Expenses section
-                elements.append(Paragraph("Expenses", heading_style))
-                data = [
-                    ["Advertising:", f"${form_data.get('advertising', '0')}"],
-                    ["Car and Truck Expenses:", f"${form_data.get('car_expenses', '0')}"],
-                    ["Commissions and Fees:", f"${form_data.get('commissions', '0')}"],
-                    ["Depreciation:", f"${form_data.get('depreciation', '0')}"],
-                    ["Insurance:", f"${form_data.get('insurance', '0')}"],
-                    ["Legal and Professional Services:", f"${form_data.get('professional_fees', '0')}"],
-                    ["Office Expenses:", f"${form_data.get('office_expenses', '0')}"],
-                    ["Rent - Equipment:", f"${form_data.get('rent_equipment', '0')}"],
-                    ["Rent - Property:", f"${form_data.get('rent_property', '0')}"],
-                    ["Supplies:", f"${form_data.get('supplies', '0')}"],
-                    ["Taxes and Licenses:", f"${form_data.get('taxes_licenses', '0')}"],
-                    ["Travel:", f"${form_data.get('travel', '0')}"],
-                    ["Meals:", f"${form_data.get('meals', '0')}"],
-                    ["Utilities:", f"${form_data.get('utilities', '0')}"],
-                    ["Wages:", f"${form_data.get('wages', '0')}"],
-                    ["Other Expenses:", f"${form_data.get('other_expenses', '0')}"]
-                ]
-                t = Table(data, colWidths=[200, 250])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-                ]))
-                elements.append(t)
-        
-            elif form_type_value == "1099-NEC":
-                # Process 1099-NEC form
-                elements.append(Paragraph(f"Form 1099-NEC (Tax Year {form_data.get('tax_year', '')})", heading_style))
-                elements.append(Paragraph("Nonemployee Compensation", title_style))
-                elements.append(Spacer(1, 24))
-                
-                # Main 1099 Table
-                data = [
-                    ["PAYER'S name, street address, city or town, state or province, country, ZIP or foreign postal code, and telephone no.", "1 Nonemployee compensation"],
-                    [Paragraph(f"{form_data.get('payer_name', '')}<br/>{form_data.get('payer_address', '')}<br/>{form_data.get('payer_city', '')}, {form_data.get('payer_state', '')} {form_data.get('payer_zip', '')}<br/>{form_data.get('payer_phone', '')}", normal_style), f"${form_data.get('nonemployee_compensation', '0.00')}"],
-                    ["PAYER'S TIN", "RECIPIENT'S TIN"],
-                    [form_data.get('payer_ein', ''), form_data.get('recipient_ein', '')],
-                    ["RECIPIENT'S name", "4 Federal income tax withheld"],
-                    [form_data.get('recipient_name', ''), f"${form_data.get('federal_tax_withheld', '0.00')}"],
-                    ["Street address", "5 State tax withheld"],
-                    [form_data.get('recipient_address', ''), f"${form_data.get('state_tax_withheld', '0.00')}"],
-                    ["City or town, state or province, country, and ZIP or foreign postal code", "7 State/Payer's state no."],
-                    [f"{form_data.get('recipient_city', '')}, {form_data.get('recipient_state', '')} {form_data.get('recipient_zip', '')}", form_data.get('state_id', '')]
-                ]
-                
-                t = Table(data, colWidths=[300, 200])
-                t.setStyle(TableStyle([
-                    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
-                    ('BACKGROUND', (0, 0), (1, 0), colors.lightgrey),
-                    ('BACKGROUND', (0, 2), (-1, 2), colors.lightgrey),
-                    ('BACKGROUND', (0, 4), (-1, 4), colors.lightgrey),
-                    ('BACKGROUND', (0, 6), (-1, 6), colors.lightgrey),
-                    ('BACKGROUND', (0, 8), (-1, 8), colors.lightgrey),
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                    ('PADDING', (0, 0), (-1, -1), 6),
-                ]))
-                elements.append(t)
-                
-                # Copy Distribution Info
-                elements.append(Spacer(1, 12))
-                elements.append(Paragraph("Copy B For Recipient", styles['Italic']))
-                elements.append(Paragraph("This is important tax information and is being furnished to the IRS. If you are required to file a return, a negligence penalty or other sanction may be imposed on you if this income is taxable and the IRS determines that it has not been reported.", styles['Italic']))
-
-        # Add disclaimer
-        elements.append(Spacer(1, 36))
-        disclaimer_text = "DISCLAIMER: This document is for informational purposes only and is not an official IRS form. Please use this as a guide to complete your official tax filing. Consult a tax professional for tax advice."
-        elements.append(Paragraph(disclaimer_text, ParagraphStyle(name='Disclaimer', fontName='Helvetica', fontSize=8, textColor=colors.red)))
-        
-        # Build the PDF
-        doc.build(elements)
-        
+        os.utime(_pin_path(owner))
+    except OSError:
+        pass
+
+
+def unpin_pdfs(owner):
+    """Release an owner's pins"""
+    try:
+        os.remove(_pin_path(owner))
+    except OSError:
+        pass
+
+
+def _pinned_filenames():
+    """Filenames pinned by any live owner"""
+    pinned = set()
+    expired = time.time() - PDF_PIN_TTL
+    try:
+        entries = list(os.scandir(PIN_DIR))
+    except OSError:
+        return pinned
+    for entry in entries:
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            if entry.stat().st_mtime < expired:
+                continue
+            with open(entry.path, 'r') as f:
+                pinned.update(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return pinned
+
+
+def evict_pdf_cache(max_bytes=None):
+    """
+    Delete least recently used PDFs once PDF_DIR grows past its size budget
+
+    Batch archives in subdirectories and pinned files are left alone.
+
+    Args:
+        max_bytes: Size budget (defaults to PDF_CACHE_MAX_BYTES)
+
+    Returns:
+        Number of files removed
+    """
+    global _cache_bytes
+    max_bytes = PDF_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    with _cache_lock:
+        entries = _scan_cache()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if total > max_bytes:
+            target = max_bytes * PDF_CACHE_TARGET_RATIO
+            pinned = _pinned_filenames()
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                if os.path.basename(path) in pinned:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+        _cache_bytes = total
+    return removed
+
+
+def store_pdf_file(filename, write, reuse=True):
+    """
+    Store a PDF that is written straight to disk under filename, reusing an
+    existing copy when allowed
+
+    Args:
+        filename: Filename in PDF_DIR
+        write: Callable that writes the PDF to the temporary path it is given
+        reuse: Serve an existing file with this name instead of re-rendering
+
+    Returns:
+        The filename
+    """
+    global _cache_bytes
+    path = pdf_file_path(filename)
+
+    if reuse and os.path.exists(path):
+        # Refresh the mtime so eviction treats the file as recently used
+        os.utime(path)
         return filename
-    except Exception as e:
-        import traceback
-        logging.error(f"Error generating tax form PDF: {str(e)}\n{traceback.format_exc()}")
-        return None
 
-def generate_irs_letter_pdf(letter):
-    """Generate a PDF for an IRS letter"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        # Create a unique filename
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = f"letter_{letter.letter_type.value}_{letter.user_id}_{timestamp}.pdf"
-        filepath = os.path.join(PDF_DIR, filename)
-        
-        # Create the PDF document
-        doc = SimpleDocTemplate(
-            filepath,
-            pagesize=letter,
-            rightMargin=72,
-            leftMargin=72,
-            topMargin=72,
-            bottomMargin=72
-        )
-        
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = styles['Heading1']
-        heading_style = styles['Heading2']
-        normal_style = styles['Normal']
-        
-        # Build the PDF content
-        elements = []
-        
-        # Get letter data
-        letter_data = letter.data
-        
-        if letter.letter_type.value == "penalty_abatement":
-            # Penalty Abatement Letter
-            elements.append(Paragraph("Request for Penalty Abatement", title_style))
-            elements.append(Spacer(1, 24))
-            
-            # Sender info
-            elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
-            elements.append(Paragraph(letter_data.get("taxpayer_address", ""), normal_style))
-            elements.append(Paragraph(f"EIN/SSN: {letter_data.get('taxpayer_ein', '')}", normal_style))
-            elements.append(Spacer(1, 24))
-            
-            # Date
-            elements.append(Paragraph(f"Date: {letter_data.get('date', '')}", normal_style))
-            elements.append(Spacer(1, 12))
-            
-            # Recipient - IRS
-            elements.append(Paragraph("Internal Revenue Service", normal_style))
-            elements.append(Paragraph("Penalty Abatement Request", normal_style))
-            elements.append(Paragraph("[IRS Address Placeholder]", normal_style))
-            elements.append(Spacer(1, 24))
-            
-            # Subject
-            elements.append(Paragraph(f"Subject: Request for Abatement of Penalty - Tax Year {letter_data.get('tax_year', '')}", heading_style))
-            elements.append(Spacer(1, 12))
-            
-            # Greeting
-            elements.append(Paragraph("To Whom It May Concern:", normal_style))
+        write(tmp_path)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan_cache())
+        else:
+            _cache_bytes += size
+        over_budget = _cache_bytes > PDF_CACHE_MAX_BYTES
+    if over_budget:
+        evict_pdf_cache()
+    return filename
+
+
+def store_pdf(filename, render, reuse=True):
+    """
+    Store a rendered PDF under filename, reusing an existing copy when allowed
+
+    Args:
+        filename: Filename in PDF_DIR
+        render: Callable returning the PDF bytes
+        reuse: Serve an existing file with this name instead of re-rendering
+
+    Returns:
+        The filename
+    """
+    def _write(tmp_path):
+        pdf_bytes = render()
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf_bytes)
+
+    return store_pdf_file(filename, _write, reuse)
+
+
+def _tax_form_elements(form_type_value, tax_year, form_data):
+    """Build the flowables for a tax form"""
+    styles = get_styles()
+    title_style = styles['Heading1']
+    heading_style = styles['Heading2']
+    normal_style = styles['Normal']
+
+    elements = []
+
+    # Add title
+    form_title = f"Form {form_type_value} - Tax Year {tax_year}"
+    elements.append(Paragraph(form_title, title_style))
+    elements.append(Spacer(1, 12))
+
+    # Add generation info
+    elements.append(Paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal_style))
+    elements.append(Spacer(1, 24))
+
+    # Add form data
+    if form_data:
+        # Group data by section (assuming it's organized somehow)
+        if form_type_value == "1120":
+            # Process 1120 form
+            elements.append(Paragraph("U.S. Corporation Income Tax Return", heading_style))
             elements.append(Spacer(1, 12))
-            
-            # Body
-            body_text = f"""I am writing to request an abatement of the penalty in the amount of ${letter_data.get('penalty_amount', '0')} 
-            assessed for the tax year {letter_data.get('tax_year', '')} due to {letter_data.get('reason', '')}.
-
-            {letter_data.get('explanation', '')}
-
-            I have a history of compliance with tax filing and payment requirements, and this was an isolated incident 
-            due to the circumstances described above. I have since taken steps to ensure all future filings will be 
-            timely and accurate.
-
-            I request that the penalty be abated based on the reasonable cause explained above. If you need any additional 
-            information or documentation to support this request, please contact me at [Contact Information].
-
-            Thank you for your consideration of this matter.
-            """
-            for paragraph in body_text.split('\n\n'):
-                elements.append(Paragraph(paragraph.strip(), normal_style))
-                elements.append(Spacer(1, 12))
-            
-            # Closing
-            elements.append(Spacer(1, 24))
-            elements.append(Paragraph("Sincerely,", normal_style))
-            elements.append(Spacer(1, 36))
-            elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
-            
-        elif letter.letter_type.value == "reasonable_cause":
-            # Reasonable Cause Letter
-            elements.append(Paragraph("Reasonable Cause Explanation", title_style))
+
+            # Basic info section
+            elements.append(Paragraph("Basic Information", heading_style))
+            data = [
+                ["Company Name:", form_data.get("company_name", "")],
+                ["EIN:", form_data.get("ein", "")],
+                ["Address:", form_data.get("address", "")],
+                ["Date of Incorporation:", form_data.get("incorporation_date", "")],
+                ["Tax Year:", form_data.get("tax_year", "")]
+            ]
+            t = Table(data, colWidths=[150, 300])
+            t.setStyle(LABEL_TABLE_STYLE)
+            elements.append(t)
             elements.append(Spacer(1, 24))
-            
-            # Sender info
-            elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
-            elements.append(Paragraph(letter_data.get("taxpayer_address", ""), normal_style))
-            elements.append(Paragraph(f"EIN/SSN: {letter_data.get('taxpayer_ein', '')}", normal_style))
+
+            # Income section
+            elements.append(Paragraph("Income", heading_style))
+            data = [
+                ["Gross Receipts or Sales:", f"${form_data.get('gross_receipts', '0')}"],
+                ["Returns and Allowances:", f"${form_data.get('returns_allowances', '0')}"],
+                ["Other Income:", f"${form_data.get('other_income', '0')}"]
+            ]
+            t = Table(data, colWidths=[200, 250])
+            t.setStyle(LABEL_TABLE_STYLE)
+            elements.append(t)
             elements.append(Spacer(1, 24))
-            
-            # Date
-            elements.append(Paragraph(f"Date: {letter_data.get('date', '')}", normal_style))
+
+            # Deductions section
+            elements.append(Paragraph("Deductions", heading_style))
+            data = [
+                ["Salaries and Wages:", f"${form_data.get('salaries_wages', '0')}"],
+                ["Repairs and Maintenance:", f"${form_data.get('repairs_maintenance', '0')}"],
+                ["Rents:", f"${form_data.get('rents', '0')}"],
+                ["Taxes and Licenses:", f"${form_data.get('taxes_licenses', '0')}"],
+                ["Interest:", f"${form_data.get('interest', '0')}"],
+                ["Depreciation:", f"${form_data.get('depreciation', '0')}"],
+                ["Other Deductions:", f"${form_data.get('other_deductions', '0')}"]
+            ]
+            t = Table(data, colWidths=[200, 250])
+            t.setStyle(LABEL_TABLE_STYLE)
+            elements.append(t)
+
+        elif form_type_value == "1065":
+            # Process 1065 form
+            elements.append(Paragraph("U.S. Return of Partnership Income", heading_style))
             elements.append(Spacer(1, 12))
-            
-            # Recipient - IRS
-            elements.append(Paragraph("Internal Revenue Service", normal_style))
-            elements.append(Paragraph("[IRS Address Placeholder]", normal_style))
+
+            # Partnership info section
+            elements.append(Paragraph("Partnership Information", heading_style))
+            data = [
+                ["Partnership Name:", form_data.get("partnership_name", "")],
+                ["EIN:", form_data.get("ein", "")],
+                ["Address:", form_data.get("address", "")],
+                ["Date Partnership Formed:", form_data.get("formation_date", "")],
+                ["Tax Year:", form_data.get("tax_year", "")]
+            ]
+            t = Table(data, colWidths=[150, 300])
+            t.setStyle(LABEL_TABLE_STYLE)
+            elements.append(t)
             elements.append(Spacer(1, 24))
-            
-            # Subject
-            elements.append(Paragraph(f"Subject: Reasonable Cause Explanation - Tax Year {letter_data.get('tax_year', '')}", heading_style))
-            elements.append(Spacer(1, 12))
-            
-            # Greeting
-            elements.append(Paragraph("To Whom It May Concern:", normal_style))
+
+            # Income section
+            elements.append(Paragraph("Income", heading_style))
+            data = [
+                ["Gross Receipts or Sales:", f"${form_data.get('gross_receipts', '0')}"],
+                ["Cost of Goods Sold:", f"${form_data.get('cost_of_goods', '0')}"],
+                ["Other Income:", f"${form_data.get('other_income', '0')}"]
+            ]
+            t = Table(data, colWidths=[200, 250])
+            t.setStyle(LABEL_TABLE_STYLE)
+            elements.append(t)
+            elements.append(Spacer(1, 24))
+
+            # Deductions section
+            elements.append(Paragraph("Deductions", heading_style))
+            data = [
+                ["Salaries and Wages:", f"${form_data.get('salaries_wages', '0')}"],
+                ["Guaranteed Payments to Partners:", f"${form_data.get('guaranteed_payments', '0')}"],
+                ["Repairs and Maintenance:", f"${form_data.get('repairs_maintenance', '0')}"],
+                ["Rent:", f"${form_data.get('rent', '0')}"],
+                ["Taxes and Licenses:", f"${form_data.get('taxes_licenses', '0')}"],
+                ["Interest:", f"${form_data.get('interest', '0')}"],
+                ["Depreciation:", f"${form_data.get('depreciation', '0')}"],
+                ["Other Deductions:", f"${form_data.get('other_deductions', '0')}"]
+            ]
+            t = Table(data, colWidths=[200, 250])
+            t.setStyle(LABEL_TABLE_STYLE)
+            elements.append(t)
+
+        elif form_type_value == "Schedule C":
+            # Process Schedule C form
+            elements.append(Paragraph("Profit or Loss From Business (Sole Proprietorship)", heading_style))
             elements.append(Spacer(1, 12))
-            
-            # Body
-            body_text = f"""I am writing to explain the reasonable cause for the {letter_data.get('issue_type', '')} for 
-            tax year {letter_data.get('tax_year', '')}.
-
-            Circumstances:
-            {letter_data.get('circumstances', '')}
-
-            Resolution Steps:
-            {letter_data.get('resolution', '')}
-
-            I have taken all necessary steps to resolve this issue and ensure future compliance with all tax obligations. 
-            I respectfully request that you consider these circumstances as reasonable cause and waive any associated penalties.
-
-            If you require any additional information or documentation, please do not hesitate to contact me.
-            """
-            for paragraph in body_text.split('\n\n'):
-                elements.append(Paragraph(paragraph.strip(), normal_style))
-                elements.append(Spacer(1, 12))
-            
-            # Closing
+
+            # Business info section
+            elements.append(Paragraph("Business Information", heading_style))
+            data = [
+                ["Business Name:", form_data.get("business_name", "")],
+                ["Business Code:", form_data.get("business_code", "")],
+                ["SSN:", form_data.get("ssn", "")],
+                ["Address:", form_data.get("address", "")],
+                ["Tax Year:", form_data.get("tax_year", "")]
+            ]
+            t = Table(data, colWidths=[150, 300])
+            t.setStyle(LABEL_TABLE_STYLE)
+            elements.append(t)
             elements.append(Spacer(1, 24))
-            elements.append(Paragraph("Sincerely,", normal_style))
-            elements.append(Spacer(1, 36))
-            elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
-            
-        elif letter.letter_type.value == "late_filing_relief":
-            # Late Filing Relief Letter
-            elements.append(Paragraph("Request for Late Filing Relief", title_style))
+
+            # Income section
+            elements.append(Paragraph("Income", heading_style))
+            data = [
+                ["Gross Receipts or Sales:", f"${form_data.get('gross_receipts', '0')}"],
+                ["Returns and Allowances:", f"${form_data.get('returns_allowances', '0')}"],
+                ["Other Income:", f"${form_data.get('other_income', '0')}"]
+            ]
+            t = Table(data, colWidths=[200, 250])
+            t.setStyle(LABEL_TABLE_STYLE)
+            elements.append(t)
             elements.append(Spacer(1, 24))
-            
-            # Sender info
-            elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
-            elements.append(Paragraph(letter_data.get("taxpayer_address", ""), normal_style))
-            elements.append(Paragraph(f"EIN/SSN: {letter_data.get('taxpayer_ein', '')}", normal_style))
+
+            # Expenses section
+            elements.append(Paragraph("Expenses", heading_style))
+            data = [
+                ["Advertising:", f"${form_data.get('advertising', '0')}"],
+                ["Car and Truck Expenses:", f"${form_data.get('car_expenses', '0')}"],
+                ["Commissions and Fees:", f"${form_data.get('commissions', '0')}"],
+                ["Depreciation:", f"${form_data.get('depreciation', '0')}"],
+                ["Insurance:", f"${form_data.get('insurance', '0')}"],
+                ["Legal and Professional Services:", f"${form_data.get('professional_fees', '0')}"],
+                ["Office Expenses:", f"${form_data.get('office_expenses', '0')}"],
+                ["Rent - Equipment:", f"${form_data.get('rent_equipment', '0')}"],
+                ["Rent - Property:", f"${form_data.get('rent_property', '0')}"],
+                ["Supplies:", f"${form_data.get('supplies', '0')}"],
+                ["Taxes and Licenses:", f"${form_data.get('taxes_licenses', '0')}"],
+                ["Travel:", f"${form_data.get('travel', '0')}"],
+                ["Meals:", f"${form_data.get('meals', '0')}"],
+                ["Utilities:", f"${form_data.get('utilities', '0')}"],
+                ["Wages:", f"${form_data.get('wages', '0')}"],
+                ["Other Expenses:", f"${form_data.get('other_expenses', '0')}"]
+            ]
+            t = Table(data, colWidths=[200, 250])
+            t.setStyle(LABEL_TABLE_STYLE)
+            elements.append(t)
+
+        elif form_type_value == "1099-NEC":
+            # Process 1099-NEC form
+            elements.append(Paragraph(f"Form 1099-NEC (Tax Year {form_data.get('tax_year', '')})", heading_style))
+            elements.append(Paragraph("Nonemployee Compensation", title_style))
             elements.append(Spacer(1, 24))
-            
-            # Date
-            elements.append(Paragraph(f"Date: {letter_data.get('date', '')}", normal_style))
+
+            # Main 1099 Table
+            data = [
+                ["PAYER'S name, street address, city or town, state or province, country, ZIP or foreign postal code, and telephone no.", "1 Nonemployee compensation"],
+                [Paragraph(f"{form_data.get('payer_name', '')}<br/>{form_data.get('payer_address', '')}<br/>{form_data.get('payer_city', '')}, {form_data.get('payer_state', '')} {form_data.get('payer_zip', '')}<br/>{form_data.get('payer_phone', '')}", normal_style), f"${form_data.get('nonemployee_compensation', '0.00')}"],
+                ["PAYER'S TIN", "RECIPIENT'S TIN"],
+                [form_data.get('payer_ein', ''), form_data.get('recipient_ein', '')],
+                ["RECIPIENT'S name", "4 Federal income tax withheld"],
+                [form_data.get('recipient_name', ''), f"${form_data.get('federal_tax_withheld', '0.00')}"],
+                ["Street address", "5 State tax withheld"],
+                [form_data.get('recipient_address', ''), f"${form_data.get('state_tax_withheld', '0.00')}"],
+                ["City or town, state or province, country, and ZIP or foreign postal code", "7 State/Payer's state no."],
+                [f"{form_data.get('recipient_city', '')}, {form_data.get('recipient_state', '')} {form_data.get('recipient_zip', '')}", form_data.get('state_id', '')]
+            ]
+
+            t = Table(data, colWidths=[300, 200])
+            t.setStyle(FORM_1099_TABLE_STYLE)
+            elements.append(t)
+
+            # Copy Distribution Info
             elements.append(Spacer(1, 12))
-            
-            # Recipient - IRS
-            elements.append(Paragraph("Internal Revenue Service", normal_style))
-            elements.append(Paragraph("Penalty Abatement Department", normal_style))
-            elements.append(Paragraph("[IRS Address Placeholder]", normal_style))
-            elements.append(Spacer(1, 24))
-            
-            # Subject
-            elements.append(Paragraph(f"Subject: Request for First-Time Penalty Abatement - Tax Year {letter_data.get('tax_year', '')}", heading_style))
+            elements.append(Paragraph("Copy B For Recipient", styles['Italic']))
+            elements.append(Paragraph("This is important tax information and is being furnished to the IRS. If you are required to file a return, a negligence penalty or other sanction may be imposed on you if this income is taxable and the IRS determines that it has not been reported.", styles['Italic']))
+
+    # Add disclaimer
+    elements.append(Spacer(1, 36))
+    disclaimer_text = "DISCLAIMER: This document is for informational purposes only and is not an official IRS form. Please use this as a guide to complete your official tax filing. Consult a tax professional for tax advice."
+    elements.append(Paragraph(disclaimer_text, DISCLAIMER_STYLE))
+
+    return elements
+
+
+def _tax_form_content(tax_form):
+    """Form type label and the data that determines a form's PDF"""
+    if isinstance(tax_form, Form1099):
+        form_type_value = "1099-NEC"
+        form_data = tax_form.form_data
+    else:
+        form_type_value = tax_form.form_type.value
+        form_data = tax_form.data
+    form_data = {key: value for key, value in (form_data or {}).items() if key not in _NON_CONTENT_KEYS}
+    return form_type_value, form_data
+
+
+def render_tax_form_pdf(tax_form):
+    """
+    Render a tax form to PDF bytes in memory
+
+    Args:
+        tax_form: TaxForm or Form1099 instance
+
+    Returns:
+        PDF document as bytes
+    """
+    form_type_value, form_data = _tax_form_content(tax_form)
+    return render_pdf(_tax_form_elements(form_type_value, tax_form.tax_year, form_data))
+
+
+def tax_form_pdf_filename(tax_form):
+    """Content-addressed filename for a tax form's PDF"""
+    form_type_value, form_data = _tax_form_content(tax_form)
+    key = pdf_cache_key(form_type_value, tax_form.tax_year, form_data)
+    return f"form_{form_type_value.replace(' ', '_')}_{tax_form.user_id}_{key[:24]}.pdf"
+
+
+def generate_tax_form_pdf(tax_form, filename=None):
+    """
+    Generate a PDF for a tax form
+
+    The PDF is stored under a filename derived from the form's content, so an
+    unchanged form is rendered once and then served from PDF_DIR.
+
+    Args:
+        tax_form: TaxForm or Form1099 instance
+        filename: Optional output filename in PDF_DIR; an explicit filename is
+                  always re-rendered
+
+    Returns:
+        Filename in PDF_DIR, or None if rendering failed
+    """
+    try:
+        form_type_value, form_data = _tax_form_content(tax_form)
+        return store_pdf(
+            filename or tax_form_pdf_filename(tax_form),
+            lambda: render_pdf(_tax_form_elements(form_type_value, tax_form.tax_year, form_data)),
+            reuse=filename is None
+        )
+    except Exception as e:
+        import traceback
+        logging.error(f"Error generating tax form PDF: {str(e)}\n{traceback.format_exc()}")
+        return None
+
+
+def _letter_elements(letter_type_value, letter_data):
+    """Build the flowables for an IRS letter"""
+    styles = get_styles()
+    title_style = styles['Heading1']
+    heading_style = styles['Heading2']
+    normal_style = styles['Normal']
+
+    elements = []
+
+    if letter_type_value == "penalty_abatement":
+        # Penalty Abatement Letter
+        elements.append(Paragraph("Request for Penalty Abatement", title_style))
+        elements.append(Spacer(1, 24))
+
+        # Sender info
+        elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
+        elements.append(Paragraph(letter_data.get("taxpayer_address", ""), normal_style))
+        elements.append(Paragraph(f"EIN/SSN: {letter_data.get('taxpayer_ein', '')}", normal_style))
+        elements.append(Spacer(1, 24))
+
+        # Date
+        elements.append(Paragraph(f"Date: {letter_data.get('date', '')}", normal_style))
+        elements.append(Spacer(1, 12))
+
+        # Recipient - IRS
+        elements.append(Paragraph("Internal Revenue Service", normal_style))
+        elements.append(Paragraph("Penalty Abatement Request", normal_style))
+        elements.append(Paragraph("[IRS Address Placeholder]", normal_style))
+        elements.append(Spacer(1, 24))
+
+        # Subject
+        elements.append(Paragraph(f"Subject: Request for Abatement of Penalty - Tax Year {letter_data.get('tax_year', '')}", heading_style))
+        elements.append(Spacer(1, 12))
+
+        # Greeting
+        elements.append(Paragraph("To Whom It May Concern:", normal_style))
+        elements.append(Spacer(1, 12))
+
+        # Body
+        body_text = f"""I am writing to request an abatement of the penalty in the amount of ${letter_data.get('penalty_amount', '0')} 
+        assessed for the tax year {letter_data.get('tax_year', '')} due to {letter_data.get('reason', '')}.
+
+        {letter_data.get('explanation', '')}
+
+        I have a history of compliance with tax filing and payment requirements, and this was an isolated incident 
+        due to the circumstances described above. I have since taken steps to ensure all future filings will be 
+        timely and accurate.
+
+        I request that the penalty be abated based on the reasonable cause explained above. If you need any additional 
+        information or documentation to support this request, please contact me at [Contact Information].
+
+        Thank you for your consideration of this matter.
+        """
+        for paragraph in body_text.split('\n\n'):
+            elements.append(Paragraph(paragraph.strip(), normal_style))
+            elements.append(Spacer(1, 12))
+
+        # Closing
+        elements.append(Spacer(1, 24))
+        elements.append(Paragraph("Sincerely,", normal_style))
+        elements.append(Spacer(1, 36))
+        elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
+
+    elif letter_type_value == "reasonable_cause":
+        # Reasonable Cause Letter
+        elements.append(Paragraph("Reasonable Cause Explanation", title_style))
+        elements.append(Spacer(1, 24))
+
+        # Sender info
+        elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
+        elements.append(Paragraph(letter_data.get("taxpayer_address", ""), normal_style))
+        elements.append(Paragraph(f"EIN/SSN: {letter_data.get('taxpayer_ein', '')}", normal_style))
+        elements.append(Spacer(1, 24))
+
+        # Date
+        elements.append(Paragraph(f"Date: {letter_data.get('date', '')}", normal_style))
+        elements.append(Spacer(1, 12))
+
+        # Recipient - IRS
+        elements.append(Paragraph("Internal Revenue Service", normal_style))
+        elements.append(Paragraph("[IRS Address Placeholder]", normal_style))
+        elements.append(Spacer(1, 24))
+
+        # Subject
+        elements.append(Paragraph(f"Subject: Reasonable Cause Explanation - Tax Year {letter_data.get('tax_year', '')}", heading_style))
+        elements.append(Spacer(1, 12))
+
+        # Greeting
+        elements.append(Paragraph("To Whom It May Concern:", normal_style))
+        elements.append(Spacer(1, 12))
+
+        # Body
+        body_text = f"""I am writing to explain the reasonable cause for the {letter_data.get('issue_type', '')} for 
+        tax year {letter_data.get('tax_year', '')}.
+
+        Circumstances:
+        {letter_data.get('circumstances', '')}
+
+        Resolution Steps:
+        {letter_data.get('resolution', '')}
+
+        I have taken all necessary steps to resolve this issue and ensure future compliance with all tax obligations. 
+        I respectfully request that you consider these circumstances as reasonable cause and waive any associated penalties.
+
+        If you require any additional information or documentation, please do not hesitate to contact me.
+        """
+        for paragraph in body_text.split('\n\n'):
+            elements.append(Paragraph(paragraph.strip(), normal_style))
             elements.append(Spacer(1, 12))
-            
-            # Greeting
-            elements.append(Paragraph("To Whom It May Concern:", normal_style))
+
+        # Closing
+        elements.append(Spacer(1, 24))
+        elements.append(Paragraph("Sincerely,", normal_style))
+        elements.append(Spacer(1, 36))
+        elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
+
+    elif letter_type_value == "late_filing_relief":
+        # Late Filing Relief Letter
+        elements.append(Paragraph("Request for Late Filing Relief", title_style))
+        elements.append(Spacer(1, 24))
+
+        # Sender info
+        elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
+        elements.append(Paragraph(letter_data.get("taxpayer_address", ""), normal_style))
+        elements.append(Paragraph(f"EIN/SSN: {letter_data.get('taxpayer_ein', '')}", normal_style))
+        elements.append(Spacer(1, 24))
+
+        # Date
+        elements.append(Paragraph(f"Date: {letter_data.get('date', '')}", normal_style))
+        elements.append(Spacer(1, 12))
+
+        # Recipient - IRS
+        elements.append(Paragraph("Internal Revenue Service", normal_style))
+        elements.append(Paragraph("Penalty Abatement Department", normal_style))
+        elements.append(Paragraph("[IRS Address Placeholder]", normal_style))
+        elements.append(Spacer(1, 24))
+
+        # Subject
+        elements.append(Paragraph(f"Subject: Request for First-Time Penalty Abatement - Tax Year {letter_data.get('tax_year', '')}", heading_style))
+        elements.append(Spacer(1, 12))
+
+        # Greeting
+        elements.append(Paragraph("To Whom It May Concern:", normal_style))
+        elements.append(Spacer(1, 12))
+
+        # Body
+        body_text = f"""I am writing to request first-time penalty abatement for the late filing of my tax return for 
+        the year {letter_data.get('tax_year', '')}.
+
+        My return was due on {letter_data.get('due_date', '')} but was filed on {letter_data.get('filing_date', '')}.
+
+        Compliance History:
+        {letter_data.get('compliance_history', '')}
+
+        Explanation for Late Filing:
+        {letter_data.get('explanation', '')}
+
+        I understand the importance of timely filing and have taken steps to ensure that all future returns will be filed 
+        on time. As this is my first instance of late filing, I respectfully request that you waive the penalties under the 
+        IRS First-Time Penalty Abatement policy.
+
+        Thank you for your consideration of this request. Please contact me if you need any additional information.
+        """
+        for paragraph in body_text.split('\n\n'):
+            elements.append(Paragraph(paragraph.strip(), normal_style))
             elements.append(Spacer(1, 12))
-            
-            # Body
-            body_text = f"""I am writing to request first-time penalty abatement for the late filing of my tax return for 
-            the year {letter_data.get('tax_year', '')}.
-
-            My return was due on {letter_data.get('due_date', '')} but was filed on {letter_data.get('filing_date', '')}.
-
-            Compliance History:
-            {letter_data.get('compliance_history', '')}
-
-            Explanation for Late Filing:
-            {letter_data.get('explanation', '')}
-
-            I understand the importance of timely filing and have taken steps to ensure that all future returns will be filed 
-            on time. As this is my first instance of late filing, I respectfully request that you waive the penalties under the 
-            IRS First-Time Penalty Abatement policy.
-
-            Thank you for your consideration of this request. Please contact me if you need any additional information.
-            """
-            for paragraph in body_text.split('\n\n'):
-                elements.append(Paragraph(paragraph.strip(), normal_style))
-                elements.append(Spacer(1, 12))
-            
-            # Closing
-            elements.append(Spacer(1, 24))
-            elements.append(Paragraph("Sincerely,", normal_style))
-            elements.append(Spacer(1, 36))
-            elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
-        
-        # Add disclaimer
+
+        # Closing
+        elements.append(Spacer(1, 24))
+        elements.append(Paragraph("Sincerely,", normal_style))
         elements.append(Spacer(1, 36))
-        disclaimer_text = "DISCLAIMER: This letter is a template provided for informational purposes only. Consult with a tax professional before submitting to the IRS. Federal Funding Club does not guarantee acceptance of penalty abatement requests."
-        elements.append(Paragraph(disclaimer_text, ParagraphStyle(name='Disclaimer', fontName='Helvetica', fontSize=8, textColor=colors.red)))
-        
-        # Build the PDF
-        doc.build(elements)
-        
-        return filename
+        elements.append(Paragraph(letter_data.get("taxpayer_name", ""), normal_style))
+
+    # Add disclaimer
+    elements.append(Spacer(1, 36))
+    disclaimer_text = "DISCLAIMER: This letter is a template provided for informational purposes only. Consult with a tax professional before submitting to the IRS. Federal Funding Club does not guarantee acceptance of penalty abatement requests."
+    elements.append(Paragraph(disclaimer_text, DISCLAIMER_STYLE))
+
+    return elements
+
+
+def irs_letter_pdf_filename(letter):
+    """Content-addressed filename for an IRS letter's PDF"""
+    key = pdf_cache_key(letter.letter_type.value, letter.data or {})
+    return f"letter_{letter.letter_type.value}_{letter.user_id}_{key[:24]}.pdf"
+
+
+def generate_irs_letter_pdf(letter):
+    """
+    Generate a PDF for an IRS letter
+
+    Args:
+        letter: IRSLetter instance
+
+    Returns:
+        Content-addressed filename in PDF_DIR, or None if rendering failed
+    """
+    try:
+        letter_type_value = letter.letter_type.value
+        letter_data = letter.data or {}
+        return store_pdf(
+            irs_letter_pdf_filename(letter),
+            lambda: render_pdf(_letter_elements(letter_type_value, letter_data))
+        )
     except Exception as e:
         logging.error(f"Error generating IRS letter PDF: {str(e)}")
         return None
@@ -0,0 +1,15 @@
+"""
+Process Pools Module
+
+This module holds the multiprocessing context shared by every process pool
+the app starts (PDF extraction, document extraction, 1099 and return packet
+rendering). It has no app imports so pool workers can load it cheaply.
+"""
+
+import multiprocessing
+
+# Pool processes are spawned rather than forked: pools start inside
+# multithreaded web workers (request threads, the PDF job pool, the 1099 batch
+# thread), and a forked child can inherit locks (DB pool, logging) held by
+# other threads and deadlock on them
+MP_CONTEXT = multiprocessing.get_context('spawn')
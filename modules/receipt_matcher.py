@@ -0,0 +1,324 @@
+"""
+Receipt Matching Module
+
+This module links uploaded receipts to the ledger transactions they document.
+A receipt's candidates are the expenses still missing a receipt whose amount
+is within AMOUNT_TOLERANCE and whose date is within DATE_WINDOW_DAYS. A single
+receipt is looked up through the partial (user_id, amount, date) index on
+unmatched transactions; a batch loads the unmatched expenses for its date
+range once and buckets them by (rounded amount, date bucket), so each receipt
+only probes its neighbouring buckets.
+
+Candidates are scored on merchant similarity, amount and date closeness. The
+best one is linked automatically when it scores at least AUTO_LINK_SCORE and
+clearly beats the runner-up; otherwise the candidates are returned for the
+user to pick from.
+"""
+
+import os
+from datetime import timedelta
+from decimal import Decimal, ROUND_FLOOR
+
+from sqlalchemy import select, update
+
+from app import db
+from app.models import LedgerTransaction
+from modules.ledger_dedupe import merchant_key, merchant_similarity
+from modules.ledger_import import _parse_amount, _parse_date
+from modules.ledger_store import mark_ledger_changed
+
+# Largest difference between a receipt total and the charge it matches
+AMOUNT_TOLERANCE = Decimal('1.00')
+
+# Days either side of the receipt date searched (card charges post a few days late)
+DATE_WINDOW_DAYS = 5
+
+# Score (0-1) at which the best candidate is linked without asking
+AUTO_LINK_SCORE = 0.85
+
+# Lead the best candidate needs over the runner-up to be linked automatically
+AUTO_LINK_MARGIN = 0.1
+
+# Candidates below this score are not offered at all
+MIN_CANDIDATE_SCORE = 0.5
+
+MAX_CANDIDATES = 5
+
+# Weights of the merchant, amount and date components of a score
+SCORE_WEIGHTS = (0.5, 0.3, 0.2)
+
+RECEIPT_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff', 'tif', 'webp', 'pdf'}
+
+
+def _amount_bucket(amount):
+    """Whole-dollar bucket of an absolute amount"""
+    return int(abs(amount).to_integral_value(rounding=ROUND_FLOOR))
+
+
+def _date_bucket(day):
+    """Bucket of DATE_WINDOW_DAYS consecutive days a date falls in"""
+    return day.toordinal() // DATE_WINDOW_DAYS
+
+
+def _parse_receipt(receipt):
+    """Receipt dict with a Decimal amount (positive) and a date, or raise ValueError"""
+    amount = abs(_parse_amount(receipt.get('amount')))
+    if not amount:
+        raise ValueError('Receipt has no total')
+    return dict(receipt, amount=amount, date=_parse_date(receipt.get('date')))
+
+
+def _score(receipt, row):
+    """Score a candidate transaction row against a parsed receipt"""
+    amount_diff = abs(abs(row.amount) - receipt['amount'])
+    days = abs((row.date - receipt['date']).days)
+    if amount_diff > AMOUNT_TOLERANCE or days > DATE_WINDOW_DAYS:
+        return 0.0
+
+    merchant = merchant_similarity(
+        merchant_key(receipt.get('merchant'), receipt.get('description')),
+        merchant_key(row.merchant, row.description)
+    )
+    amount_score = 1 - float(amount_diff / (AMOUNT_TOLERANCE + Decimal('0.01')))
+    date_score = 1 - days / (DATE_WINDOW_DAYS + 1)
+    merchant_weight, amount_weight, date_weight = SCORE_WEIGHTS
+    return round(merchant_weight * merchant + amount_weight * amount_score + date_weight * date_score, 3)
+
+
+def _rank_candidates(receipt, rows):
+    """Candidates worth offering for a receipt, best first, as (score, row)"""
+    scored = [(_score(receipt, row), row) for row in rows]
+    scored = [(score, row) for score, row in scored if score >= MIN_CANDIDATE_SCORE]
+    scored.sort(key=lambda item: (-item[0], abs((item[1].date - receipt['date']).days), item[1].id))
+    return scored[:MAX_CANDIDATES]
+
+
+def _is_confident(candidates):
+    """Whether the best of the remaining candidates should be linked automatically"""
+    if not candidates or candidates[0][0] < AUTO_LINK_SCORE:
+        return False
+    return len(candidates) == 1 or candidates[0][0] - candidates[1][0] >= AUTO_LINK_MARGIN
+
+
+def _candidate_dict(score, row):
+    """Serialize a candidate for the API"""
+    return {
+        'transaction_id': row.id,
+        'score': score,
+        'date': row.date.isoformat(),
+        'amount': float(row.amount),
+        'merchant': row.merchant,
+        'description': row.description,
+    }
+
+
+def _unmatched_columns():
+    """Columns of a transaction needed for scoring"""
+    return select(
+        LedgerTransaction.id, LedgerTransaction.date, LedgerTransaction.amount,
+        LedgerTransaction.merchant, LedgerTransaction.description
+    )
+
+
+def link_receipt(user_id, transaction_id, receipt_path, matched_by='user'):
+    """
+    Attach a receipt to a transaction that doesn't have one yet (the caller commits)
+
+    A link moves the user's ledger version in the same transaction, so cached
+    analytics (receipt coverage) are recomputed.
+
+    Returns:
+        True if the transaction was linked, False if it wasn't found or
+        already has a receipt
+    """
+    result = db.session.execute(
+        update(LedgerTransaction)
+        .where(
+            LedgerTransaction.id == transaction_id,
+            LedgerTransaction.user_id == user_id,
+            LedgerTransaction.receipt_path.is_(None)
+        )
+        .values(receipt_path=receipt_path, receipt_matched_by=matched_by)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    mark_ledger_changed(user_id)
+    return True
+
+
+def find_receipt_candidates(user_id, receipt):
+    """
+    Find the unmatched expenses a single receipt could belong to
+
+    Args:
+        user_id: User ID
+        receipt: Dict with amount, date and optionally merchant and description
+
+    Returns:
+        List of (score, row) best first
+    """
+    receipt = _parse_receipt(receipt)
+    amount = -receipt['amount']
+    window = timedelta(days=DATE_WINDOW_DAYS)
+    rows = db.session.execute(
+        _unmatched_columns().where(
+            LedgerTransaction.user_id == user_id,
+            LedgerTransaction.receipt_path.is_(None),
+            LedgerTransaction.amount.between(amount - AMOUNT_TOLERANCE, amount + AMOUNT_TOLERANCE),
+            LedgerTransaction.date.between(receipt['date'] - window, receipt['date'] + window)
+        )
+    ).all()
+    return _rank_candidates(receipt, rows)
+
+
+def build_unmatched_index(user_id, start_date, end_date):
+    """
+    Bucket a user's unmatched expenses in a date range by (rounded amount, date bucket)
+
+    Returns:
+        Dictionary of (amount bucket, date bucket) -> list of rows
+    """
+    years = list(range(start_date.year, end_date.year + 1))
+    query = _unmatched_columns().where(
+        LedgerTransaction.user_id == user_id,
+        LedgerTransaction.tax_year.in_(years),
+        LedgerTransaction.date.between(start_date, end_date),
+        LedgerTransaction.amount < 0,
+        LedgerTransaction.receipt_path.is_(None)
+    ).execution_options(stream_results=True, yield_per=2000)
+
+    index = {}
+    for row in db.session.execute(query):
+        index.setdefault((_amount_bucket(row.amount), _date_bucket(row.date)), []).append(row)
+    return index
+
+
+def _probe(index, receipt):
+    """Rows in the buckets neighbouring a receipt's amount and date"""
+    amount_bucket = _amount_bucket(receipt['amount'])
+    date_bucket = _date_bucket(receipt['date'])
+    tolerance = int(AMOUNT_TOLERANCE) + 1
+    rows = []
+    for amount_key in range(amount_bucket - tolerance, amount_bucket + tolerance + 1):
+        for date_key in (date_bucket - 1, date_bucket, date_bucket + 1):
+            rows.extend(index.get((amount_key, date_key), ()))
+    return rows
+
+
+def match_receipts(user_id, receipts, auto_link=True):
+    """
+    Match a batch of receipts to the user's unmatched expenses
+
+    Receipts with the most confident matches are linked first, and each
+    transaction is linked to at most one receipt.
+
+    Args:
+        user_id: User ID
+        receipts: List of dicts with path, amount, date and optionally
+                  merchant and description (as extracted from the receipt)
+        auto_link: Link confident matches (otherwise only report candidates)
+
+    Returns:
+        List of result dicts in input order, each with the receipt path, a
+        status (linked, candidates, unmatched or unreadable), the linked
+        transaction_id and the candidates
+    """
+    results = []
+    parsed = []
+    for receipt in receipts:
+        result = {'receipt': receipt.get('path'), 'status': 'unmatched', 'transaction_id': None, 'candidates': []}
+        results.append(result)
+        try:
+            parsed.append((result, _parse_receipt(receipt)))
+        except ValueError as e:
+            result.update(status='unreadable', error=str(e))
+
+    if not parsed:
+        return results
+
+    window = timedelta(days=DATE_WINDOW_DAYS)
+    index = build_unmatched_index(
+        user_id,
+        min(receipt['date'] for _, receipt in parsed) - window,
+        max(receipt['date'] for _, receipt in parsed) + window
+    )
+
+    ranked = [(result, receipt, _rank_candidates(receipt, _probe(index, receipt))) for result, receipt in parsed]
+    ranked.sort(key=lambda item: -(item[2][0][0] if item[2] else 0))
+
+    linked_ids = set()
+    try:
+        for result, receipt, candidates in ranked:
+            candidates = [(score, row) for score, row in candidates if row.id not in linked_ids]
+            if auto_link and receipt.get('path') and _is_confident(candidates):
+                transaction_id = candidates[0][1].id
+                if link_receipt(user_id, transaction_id, receipt['path'], matched_by='auto'):
+                    linked_ids.add(transaction_id)
+                    result.update(status='linked', transaction_id=transaction_id)
+            result['candidates'] = [_candidate_dict(score, row) for score, row in candidates]
+            if result['status'] != 'linked' and candidates:
+                result['status'] = 'candidates'
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return results
+
+
+def match_receipt(user_id, receipt, auto_link=True):
+    """
+    Match one receipt (e.g. right after it was uploaded)
+
+    Args:
+        user_id: User ID
+        receipt: Dict with path, amount, date and optionally merchant and description
+        auto_link: Link a confident match
+
+    Returns:
+        Result dict as in match_receipts
+    """
+    result = {'receipt': receipt.get('path'), 'status': 'unmatched', 'transaction_id': None, 'candidates': []}
+    try:
+        candidates = find_receipt_candidates(user_id, receipt)
+    except ValueError as e:
+        result.update(status='unreadable', error=str(e))
+        return result
+
+    try:
+        if auto_link and receipt.get('path') and _is_confident(candidates):
+            transaction_id = candidates[0][1].id
+            if link_receipt(user_id, transaction_id, receipt['path'], matched_by='auto'):
+                result.update(status='linked', transaction_id=transaction_id)
+                db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    result['candidates'] = [_candidate_dict(score, row) for score, row in candidates]
+    if result['status'] != 'linked' and candidates:
+        result['status'] = 'candidates'
+    return result
+
+
+def match_receipt_folder(user_id, folder, extract, auto_link=True):
+    """
+    Extract and match every receipt file in a folder (e.g. after a bulk upload)
+
+    Args:
+        user_id: User ID
+        folder: Directory containing receipt images or PDFs
+        extract: Callable taking a file path and returning a dict with
+                 merchant, description, amount and date (or None)
+        auto_link: Link confident matches (otherwise only report candidates)
+
+    Returns:
+        List of result dicts as in match_receipts
+    """
+    receipts = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path) and name.rsplit('.', 1)[-1].lower() in RECEIPT_EXTENSIONS:
+            receipts.append(dict(extract(path) or {}, path=path))
+    return match_receipts(user_id, receipts, auto_link)
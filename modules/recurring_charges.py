@@ -0,0 +1,318 @@
+"""
+Recurring Charge Detection Module
+
+This module finds subscriptions and other recurring charges (SaaS, utilities,
+memberships) in a user's ledger. Expenses are grouped by normalized merchant
+and the whole history is analysed at once: rows are sorted by (merchant,
+date), the day gaps between consecutive charges and the charge amounts are
+reduced per merchant (with NumPy's bincount when NumPy is installed, in one
+pure-Python pass otherwise), and each merchant is tested against the weekly,
+monthly and annual cadences.
+
+Detected charges come with their cadence, the predicted next charge and
+projected deductions, which feed the Smart Ledger's tax-savings estimate.
+Results are cached per user until the ledger changes.
+"""
+
+import calendar
+import math
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import Float, cast, select
+
+from app import db
+from app.models import LedgerTransaction
+from modules.ledger_dedupe import merchant_key
+from modules.ledger_store import get_ledger_version
+
+# NumPy vectorizes the per-merchant statistics; without it they are computed in Python
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+# (name, period in days, allowed jitter in days, minimum charges seen,
+#  largest coefficient of variation of the amounts)
+# Annual renewals are matched on two charges, so their amounts must agree closely;
+# weekly and monthly bills (utilities, usage-based SaaS) may vary more
+CADENCES = (
+    ('weekly', 7.0, 1.0, 4, 0.25),
+    ('monthly', 30.44, 3.5, 3, 0.25),
+    ('annual', 365.25, 15.0, 2, 0.01),
+)
+
+# Share of a merchant's gaps that must match the cadence (tolerates a skipped or late charge)
+MIN_REGULARITY = 0.75
+
+# Years of history analysed (the current one and the one before)
+LOOKBACK_YEARS = 2
+
+# Seconds a cached result may be served without re-analysing
+RECURRING_CACHE_TTL = 300
+
+# Per-process cache, keyed on the ledger version stored in the database so
+# writes committed by any worker invalidate it
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _add_months(day, months):
+    """Same day of the month `months` later, clamped to the month's length"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _next_occurrence(day, cadence):
+    """Date of the charge after `day` for a cadence"""
+    if cadence == 'monthly':
+        return _add_months(day, 1)
+    if cadence == 'annual':
+        return _add_months(day, 12)
+    return day + timedelta(days=7)
+
+
+def _group_stats(codes, days, amounts, group_count):
+    """
+    Per-merchant statistics over rows sorted by (code, day)
+
+    Returns:
+        Dictionary of arrays indexed by merchant code: count, last (row
+        index of the latest charge), median_gap, regularity per cadence
+        and amount_cv
+    """
+    counts = np.bincount(codes, minlength=group_count)
+    last = np.cumsum(counts) - 1
+
+    same = codes[1:] == codes[:-1]
+    gap_codes = codes[1:][same]
+    gaps = np.diff(days)[same].astype(np.float64)
+    gap_counts = np.bincount(gap_codes, minlength=group_count)
+
+    # Median gap per merchant: gaps sorted within each merchant, middle element(s)
+    sorted_gaps = gaps[np.lexsort((gaps, gap_codes))]
+    starts = np.cumsum(gap_counts) - gap_counts
+    has_gaps = gap_counts > 0
+    median_gap = np.full(group_count, np.nan)
+    low = starts[has_gaps] + (gap_counts[has_gaps] - 1) // 2
+    high = starts[has_gaps] + gap_counts[has_gaps] // 2
+    median_gap[has_gaps] = (sorted_gaps[low] + sorted_gaps[high]) / 2
+
+    regularity = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name, period, jitter, _, _ in CADENCES:
+            on_cadence = np.bincount(gap_codes, weights=np.abs(gaps - period) <= jitter, minlength=group_count)
+            regularity[name] = np.where(has_gaps, on_cadence / gap_counts, 0.0)
+
+        amount_mean = np.bincount(codes, weights=amounts, minlength=group_count) / counts
+        amount_square = np.bincount(codes, weights=amounts * amounts, minlength=group_count) / counts
+        amount_cv = np.sqrt(np.maximum(amount_square - amount_mean ** 2, 0)) / amount_mean
+
+    return {
+        'count': counts,
+        'last': last,
+        'median_gap': median_gap,
+        'regularity': regularity,
+        'amount_cv': amount_cv,
+    }
+
+
+def _group_stats_python(codes, days, amounts, group_count):
+    """_group_stats without NumPy, over the same sorted rows (returns lists)"""
+    counts = [0] * group_count
+    last = [0] * group_count
+    amount_sums = [0.0] * group_count
+    amount_squares = [0.0] * group_count
+    gaps = [[] for _ in range(group_count)]
+    for index, code in enumerate(codes):
+        if counts[code]:
+            gaps[code].append(float(days[index] - days[index - 1]))
+        counts[code] += 1
+        last[code] = index
+        amount_sums[code] += amounts[index]
+        amount_squares[code] += amounts[index] * amounts[index]
+
+    regularity = {
+        name: [
+            sum(abs(gap - period) <= jitter for gap in merchant_gaps) / len(merchant_gaps) if merchant_gaps else 0.0
+            for merchant_gaps in gaps
+        ]
+        for name, period, jitter, _, _ in CADENCES
+    }
+
+    amount_cv = []
+    for count, amount_sum, amount_square in zip(counts, amount_sums, amount_squares):
+        mean = amount_sum / count
+        amount_cv.append(math.sqrt(max(amount_square / count - mean ** 2, 0)) / mean if mean else math.inf)
+
+    return {
+        'count': counts,
+        'last': last,
+        'median_gap': [statistics.median(merchant_gaps) if merchant_gaps else math.nan for merchant_gaps in gaps],
+        'regularity': regularity,
+        'amount_cv': amount_cv,
+    }
+
+
+def _match_cadence(stats, code):
+    """Cadence a merchant satisfies on its median gap, regularity and amounts (the longest if several), or None"""
+    for cadence in reversed(CADENCES):
+        name, period, jitter, min_count, max_cv = cadence
+        if (
+            stats['count'][code] >= min_count
+            and abs(stats['median_gap'][code] - period) <= jitter
+            and stats['regularity'][name][code] >= MIN_REGULARITY
+            and stats['amount_cv'][code] <= max_cv
+        ):
+            return cadence
+    return None
+
+
+def find_recurring(rows, as_of=None):
+    """
+    Detect recurring charges in a list of expense rows
+
+    Args:
+        rows: Iterable of (date, amount, merchant, description, category,
+              deductible_percentage); amounts may be signed
+        as_of: Date the projection starts from (defaults to today)
+
+    Returns:
+        List of recurring charge dicts, largest annual amount first
+    """
+    as_of = as_of or date.today()
+    rows = list(rows)
+    if not rows:
+        return []
+
+    row_dates, row_amounts, merchants, descriptions, categories, percentages = zip(*rows)
+
+    # Normalize each distinct merchant name once, then code rows by lookup
+    names = list(zip(merchants, descriptions))
+    key_codes = {}
+    name_codes = {
+        name: key_codes.setdefault(merchant_key(*name), len(key_codes))
+        for name in dict.fromkeys(names)
+    }
+    if HAS_NUMPY:
+        codes = np.fromiter(map(name_codes.__getitem__, names), dtype=np.int64, count=len(rows))
+        days = np.fromiter(map(date.toordinal, row_dates), dtype=np.int64, count=len(rows))
+        amounts = np.abs(np.asarray(row_amounts, dtype=np.float64))
+        order = np.lexsort((days, codes))
+        codes, days, amounts = codes[order], days[order], amounts[order]
+        stats = _group_stats(codes, days, amounts, len(key_codes))
+    else:
+        codes = [name_codes[name] for name in names]
+        days = [row_date.toordinal() for row_date in row_dates]
+        order = sorted(range(len(rows)), key=lambda index: (codes[index], days[index]))
+        codes = [codes[index] for index in order]
+        days = [days[index] for index in order]
+        amounts = [abs(float(row_amounts[index])) for index in order]
+        stats = _group_stats_python(codes, days, amounts, len(key_codes))
+
+    # Rows without a usable merchant name can't be grouped
+    unnamed = key_codes.get(frozenset())
+
+    charges = []
+    for code in range(len(key_codes)):
+        cadence = _match_cadence(stats, code) if code != unnamed else None
+        if cadence is None:
+            continue
+        name, period, jitter, _, _ = cadence
+        last_row = stats['last'][code]
+        source_row = order[last_row]
+        merchant = merchants[source_row] or descriptions[source_row]
+        category = categories[source_row]
+        percentage = percentages[source_row] or 0
+        last_date = date.fromordinal(int(days[last_row]))
+        amount = float(amounts[last_row])
+        annual_amount = amount * 365.25 / period
+        active = (as_of - last_date).days <= period + 2 * jitter
+
+        # Charges still to come this calendar year
+        remaining = 0
+        next_date = _next_occurrence(last_date, name)
+        if active:
+            upcoming = next_date
+            while upcoming <= date(as_of.year, 12, 31):
+                if upcoming > as_of:
+                    remaining += 1
+                upcoming = _next_occurrence(upcoming, name)
+
+        charges.append({
+            'merchant': merchant,
+            'category': category,
+            'cadence': name,
+            'occurrences': int(stats['count'][code]),
+            'amount': round(amount, 2),
+            'last_date': last_date.isoformat(),
+            'next_date': next_date.isoformat() if active else None,
+            'active': active,
+            'deductible_percentage': percentage,
+            'annual_amount': round(annual_amount, 2),
+            'projected_annual_deduction': round(annual_amount * percentage / 100, 2) if active else 0.0,
+            'remaining_this_year': remaining,
+            'projected_remaining_deduction': round(remaining * amount * percentage / 100, 2),
+        })
+
+    charges.sort(key=lambda charge: -charge['annual_amount'])
+    return charges
+
+
+def detect_recurring_charges(user_id, as_of=None):
+    """
+    Detect a user's recurring charges from their recent ledger history
+
+    Args:
+        user_id: User ID
+        as_of: Date the projection starts from (defaults to today)
+
+    Returns:
+        Dictionary with charges and projected annual and rest-of-year deductions
+    """
+    as_of = as_of or date.today()
+    rows = db.session.execute(
+        select(
+            # Read amounts as floats; Decimal conversion would dominate the analysis
+            LedgerTransaction.date, cast(LedgerTransaction.amount, Float), LedgerTransaction.merchant,
+            LedgerTransaction.description, LedgerTransaction.category, LedgerTransaction.deductible_percentage
+        ).where(
+            LedgerTransaction.user_id == user_id,
+            LedgerTransaction.tax_year.in_(list(range(as_of.year - LOOKBACK_YEARS + 1, as_of.year + 1))),
+            LedgerTransaction.amount < 0
+        )
+    ).all()
+
+    charges = find_recurring(rows, as_of)
+    return {
+        'as_of': as_of.isoformat(),
+        'charges': charges,
+        'projected_annual_deduction': round(sum(c['projected_annual_deduction'] for c in charges), 2),
+        'projected_remaining_deduction': round(sum(c['projected_remaining_deduction'] for c in charges), 2),
+    }
+
+
+def get_recurring_charges(user_id):
+    """
+    Get a user's recurring charges, from cache while the ledger hasn't changed
+
+    Returns:
+        Dictionary as returned by detect_recurring_charges
+    """
+    version = (get_ledger_version(user_id), date.today())
+    now = time.monotonic()
+
+    with _cache_lock:
+        cached = _cache.get(user_id)
+    if cached and cached['version'] == version and now - cached['cached_at'] < RECURRING_CACHE_TTL:
+        return cached['result']
+
+    result = detect_recurring_charges(user_id)
+    with _cache_lock:
+        _cache[user_id] = {'version': version, 'cached_at': now, 'result': result}
+    return result
@@ -0,0 +1,304 @@
+"""
+Return Packet Module
+
+This module assembles every form a user has for a tax year (business and
+self-employment schedules, payroll and information returns, and the 1099-NEC
+forms issued to contractors) into one print-ready PDF with a table of
+contents and bookmarks.
+
+Per-form PDFs are content-addressed in the PDF cache, so forms that have not
+changed since they were last rendered are reused as they are. Only missing
+forms are rendered, in parallel across a process pool. The packet itself is
+saved straight to disk under a name derived from its component files, so
+downloading the same packet again is served straight from the cache.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF for merging PDFs
+from flask import Blueprint, flash, redirect, request, send_file, url_for, jsonify
+from flask_login import login_required, current_user
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+from app import db
+from app.access_control import requires_access_level
+from app.models import Form1099, TaxForm, TaxFormType
+from modules.form_1099_batch import MAX_WORKERS
+from modules.pdf_jobs import PdfQueueFull, job_response, submit_pdf_job
+from modules.pdf_utils import (
+    generate_tax_form_pdf, get_styles, pdf_cache_key, pdf_file_path, render_pdf, store_pdf_file,
+    tax_form_pdf_filename
+)
+from modules.process_pools import MP_CONTEXT
+
+packet_bp = Blueprint('return_packet', __name__, url_prefix='/packets')
+
+# Order of the packet's sections; form types not listed go last
+SECTION_ORDER = [
+    (TaxFormType.FORM_1120, "Form 1120"),
+    (TaxFormType.FORM_1120S, "Form 1120-S"),
+    (TaxFormType.FORM_1065, "Form 1065"),
+    (TaxFormType.SCHEDULE_C, "Schedule C"),
+    (TaxFormType.SCHEDULE_SE, "Schedule SE"),
+    (TaxFormType.FORM_4562, "Form 4562"),
+    (TaxFormType.FORM_8825, "Form 8825"),
+    (TaxFormType.FORM_8832, "Form 8832"),
+    (TaxFormType.FORM_2553, "Form 2553"),
+    (TaxFormType.FORM_941, "Form 941"),
+    (TaxFormType.FORM_940, "Form 940"),
+    (TaxFormType.FORM_W2, "Form W-2"),
+    (TaxFormType.FORM_W3, "Form W-3"),
+    (TaxFormType.FORM_1096, "Form 1096"),
+    (TaxFormType.FORM_1099MISC, "Form 1099-MISC"),
+    (TaxFormType.FORM_1099NEC, "Form 1099-NEC"),
+]
+
+_SECTION_RANK = {form_type: rank for rank, (form_type, _) in enumerate(SECTION_ORDER)}
+_SECTION_TITLES = dict(SECTION_ORDER)
+
+TOC_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('LINEBELOW', (0, 0), (-1, 0), 0.5, (0, 0, 0)),
+    ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+])
+
+
+def _render_component(kind, user_id, tax_year, form_type_name, data):
+    """
+    Worker task: render one form's PDF into the cache
+
+    Returns:
+        Filename in PDF_DIR, or None if rendering failed
+    """
+    if kind == 'form_1099':
+        form = Form1099(user_id=user_id, tax_year=tax_year, form_data=data)
+    else:
+        form = TaxForm(user_id=user_id, tax_year=tax_year, form_type=TaxFormType[form_type_name], data=data)
+    return generate_tax_form_pdf(form)
+
+
+def collect_packet_forms(user_id, tax_year):
+    """
+    List the forms that make up a user's packet for a tax year, in packet order
+
+    Args:
+        user_id: User ID
+        tax_year: Tax year
+
+    Returns:
+        List of component dicts (kind, section, title, form_type_name, data, filename)
+    """
+    components = []
+
+    tax_forms = TaxForm.query.filter_by(user_id=user_id, tax_year=tax_year).all()
+    tax_forms.sort(key=lambda form: (_SECTION_RANK.get(form.form_type, len(SECTION_ORDER)), form.id))
+    for form in tax_forms:
+        section = _SECTION_TITLES.get(form.form_type, form.form_type.value.upper())
+        components.append({
+            'kind': 'tax_form',
+            'section': section,
+            'title': section,
+            'form_type_name': form.form_type.name,
+            'data': dict(form.data or {}),
+            'filename': tax_form_pdf_filename(form),
+        })
+
+    forms_1099 = Form1099.query.filter_by(user_id=user_id, tax_year=tax_year).order_by(Form1099.id).all()
+    forms_1099.sort(key=lambda form: ((form.form_data or {}).get('recipient_name') or '').lower())
+    for form in forms_1099:
+        components.append({
+            'kind': 'form_1099',
+            'section': "Form 1099-NEC",
+            'title': (form.form_data or {}).get('recipient_name') or f"Recipient {form.contractor_id}",
+            'form_type_name': None,
+            'data': dict(form.form_data or {}),
+            'filename': tax_form_pdf_filename(form),
+        })
+
+    return components
+
+
+def render_missing_components(components, user_id, tax_year, max_workers=None):
+    """
+    Render the components whose PDFs are not in the cache
+
+    A single missing form is rendered inline; more are spread across a
+    process pool. Packets are built inside a PDF job thread, so the pool's
+    processes are spawned rather than forked (see MP_CONTEXT). Anything a
+    broken pool left unrendered is retried inline.
+
+    Returns:
+        Number of components rendered
+    """
+    missing = [component for component in components if not os.path.exists(pdf_file_path(component['filename']))]
+    if not missing:
+        return 0
+
+    args = [(c['kind'], user_id, tax_year, c['form_type_name'], c['data']) for c in missing]
+    rendered = set()
+
+    workers = max(1, min(max_workers or MAX_WORKERS, len(missing)))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=MP_CONTEXT) as executor:
+                for filename in executor.map(_render_component, *zip(*args)):
+                    if filename:
+                        rendered.add(filename)
+        except BrokenProcessPool:
+            logging.error(f"Return packet worker died for user {user_id} ({tax_year}); rendering inline")
+
+    for component, component_args in zip(missing, args):
+        if component['filename'] not in rendered:
+            if _render_component(*component_args):
+                rendered.add(component['filename'])
+
+    return len(rendered)
+
+
+def _toc_elements(user_label, tax_year, entries):
+    """Build the table of contents flowables; entries are (section, title, page)"""
+    styles = get_styles()
+    rows = [['Form', 'Page']]
+    current_section = None
+    for section, title, page in entries:
+        if section != current_section:
+            current_section = section
+            if title != section:
+                rows.append([Paragraph(f"<b>{section}</b>", styles['Normal']), ''])
+        label = title if title == section else f"&nbsp;&nbsp;&nbsp;&nbsp;{title}"
+        rows.append([Paragraph(label, styles['Normal']), str(page)])
+
+    table = Table(rows, colWidths=[5.5 * inch, 1 * inch], repeatRows=1)
+    table.setStyle(TOC_TABLE_STYLE)
+    return [
+        Paragraph(f"Tax Year {tax_year} Return Packet", styles['Heading1']),
+        Paragraph(user_label, styles['Normal']),
+        Spacer(1, 0.25 * inch),
+        Paragraph("Contents", styles['Heading2']),
+        table,
+    ]
+
+
+def merge_packet(components, user_label, tax_year, output_path):
+    """
+    Merge rendered components into one PDF with a table of contents and bookmarks
+
+    The packet is saved directly to output_path rather than serialized in memory.
+
+    Args:
+        components: Component dicts from collect_packet_forms, already rendered
+        user_label: Name printed on the contents page
+        tax_year: Tax year
+        output_path: File to write the packet to
+    """
+    documents = []
+    try:
+        for component in components:
+            path = pdf_file_path(component['filename'])
+            if os.path.exists(path):
+                documents.append((component, fitz.open(path)))
+
+        # Page numbers depend on the contents page's length, which doesn't
+        # depend on the numbers, so lay it out once to count its pages
+        def _entries(offset):
+            entries = []
+            page = offset + 1
+            for component, pdf in documents:
+                entries.append((component['section'], component['title'], page))
+                page += pdf.page_count
+            return entries
+
+        toc_pages = fitz.open(stream=render_pdf(_toc_elements(user_label, tax_year, _entries(0))), filetype='pdf').page_count
+        entries = _entries(toc_pages)
+
+        packet = fitz.open(stream=render_pdf(_toc_elements(user_label, tax_year, entries)), filetype='pdf')
+        bookmarks = [[1, "Contents", 1]]
+        current_section = None
+        for (component, pdf), (section, title, page) in zip(documents, entries):
+            packet.insert_pdf(pdf)
+            if section != current_section:
+                current_section = section
+                bookmarks.append([1, section, page])
+            if title != section:
+                bookmarks.append([2, title, page])
+        packet.set_toc(bookmarks)
+        packet.save(output_path, garbage=3, deflate=True)
+        packet.close()
+    finally:
+        for _, pdf in documents:
+            pdf.close()
+
+
+def packet_filename(user_id, tax_year, components):
+    """Filename for a packet, derived from the component PDFs it contains"""
+    key = pdf_cache_key('return_packet', user_id, tax_year, [c['filename'] for c in components])
+    return f"packet_{user_id}_{tax_year}_{key[:24]}.pdf"
+
+
+def build_return_packet(user_id, tax_year, user_label=None, max_workers=None):
+    """
+    Build (or reuse) a user's combined return packet for a tax year
+
+    Args:
+        user_id: User ID
+        tax_year: Tax year
+        user_label: Name printed on the contents page
+        max_workers: Maximum rendering processes
+
+    Returns:
+        Filename in PDF_DIR, or None if the user has no forms for the year
+    """
+    components = collect_packet_forms(user_id, tax_year)
+    if not components:
+        return None
+
+    filename = packet_filename(user_id, tax_year, components)
+
+    def _write(tmp_path):
+        render_missing_components(components, user_id, tax_year, max_workers)
+        merge_packet(components, user_label or '', tax_year, tmp_path)
+
+    return store_pdf_file(filename, _write)
+
+
+@packet_bp.route('/<int:tax_year>')
+@login_required
+@requires_access_level('export_forms')
+def download_packet(tax_year):
+    """Download every form for a tax year as one PDF"""
+    try:
+        components = collect_packet_forms(current_user.id, tax_year)
+        if not components:
+            message = f'You have no forms for tax year {tax_year}.'
+            if request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({'success': False, 'error': message}), 404
+            flash(message, 'warning')
+            return redirect(request.referrer or url_for('main.index'))
+
+        download_name = f"return_packet_{tax_year}.pdf"
+        filename = packet_filename(current_user.id, tax_year, components)
+        if os.path.exists(pdf_file_path(filename)):
+            return send_file(pdf_file_path(filename), as_attachment=True, download_name=download_name)
+
+        user_id = current_user.id
+        user_label = current_user.username
+        job = submit_pdf_job(
+            user_id,
+            ('return_packet', tax_year, filename),
+            lambda: build_return_packet(user_id, tax_year, user_label),
+            download_name
+        )
+        return job_response(job)
+    except PdfQueueFull as e:
+        flash(str(e), 'warning')
+        return redirect(request.referrer or url_for('main.index'))
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error building return packet for user {current_user.id} ({tax_year}): {str(e)}")
+        flash('Error building return packet. Please try again.', 'danger')
+        return redirect(request.referrer or url_for('main.index'))
@@ -10,15 +10,38 @@ import json
 import logging
 from datetime import datetime, timedelta
 from decimal import Decimal
+from functools import wraps
 from typing import List, Dict, Optional, Tuple
+import tempfile
+import threading
 import uuid
 
-from flask import Blueprint, render_template, request, jsonify, current_app, session
+from flask import Blueprint, render_template, request, jsonify, current_app, session, send_file
 from flask_login import current_user
 from werkzeug.utils import secure_filename
 
 from ai.openai_interface import get_openai_response
-from app.models import User
+from app import db
+from app.models import ReceiptUpload, User
+from modules.ledger_analytics import (
+    RECEIPT_THRESHOLD, combine_analytics, get_ledger_analytics, summarize_transactions,
+    upcoming_deadlines
+)
+from modules.ledger_dedupe import find_duplicates, get_pending_duplicates, resolve_duplicate
+from modules.ledger_import import StatementImportError, import_statement
+from modules.ledger_import import SUPPORTED_EXTENSIONS as STATEMENT_EXTENSIONS
+from modules.ledger_snapshot import (
+    SNAPSHOT_FORMATS, LedgerSnapshotError, export_ledger_snapshot, import_ledger_snapshot
+)
+from modules.ledger_store import (
+    NON_INCOME_CATEGORIES, add_transactions, get_ledger_years, get_low_confidence_transactions,
+    recategorize_transactions
+)
+from modules.mileage_log import (
+    MileageImportError, add_trips, delete_trips, get_mileage_summary, get_trips, import_trips
+)
+from modules.receipt_matcher import link_receipt, match_receipt, match_receipts
+from modules.recurring_charges import get_recurring_charges
 
 class SmartLedger:
     """AI-powered transaction categorization and tax optimization engine"""
@@ -88,6 +111,23 @@ class SmartLedger:
                 'name': 'Personal Expense',
                 'deductible': False,
                 'percentage': 0
+            },
+            'income': {
+                'name': 'Income',
+                'deductible': False,
+                'percentage': 0
+            },
+            'transfer': {
+                'name': 'Transfer / Card Payment',
+                'deductible': False,
+                'percentage': 0,
+                'note': 'Not income'
+            },
+            'refund': {
+                'name': 'Refund',
+                'deductible': False,
+                'percentage': 0,
+                'note': 'Not income'
             }
         }
     
@@ -166,6 +206,50 @@ class SmartLedger:
             logging.error(f"Error analyzing transaction: {str(e)}")
             return self._rule_based_categorization(transaction_data)
     
+    def categorize_batch(self, transactions: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Categorize several transactions with a single AI request
+        
+        Args:
+            transactions: Transaction dicts with merchant, description and amount
+            
+        Returns:
+            One dict per transaction (category, deductible_percentage,
+            confidence), or None if the AI is unavailable
+        """
+        lines = "\n".join(
+            f"{index}. Merchant: {t.get('merchant', '')} | Description: {t.get('description', '')} | Amount: ${t.get('amount', 0)}"
+            for index, t in enumerate(transactions)
+        )
+        prompt = f"""
+        Categorize each of these business transactions for tax purposes.
+        
+        {lines}
+        
+        Categories: {', '.join(name for name in self.categories if name not in ('income',) + NON_INCOME_CATEGORIES)}
+        
+        Respond in JSON as {{"results": [{{"index": 0, "category": "...", "deductibility_percentage": 0-100, "confidence": 0-100}}, ...]}}
+        with one entry per transaction.
+        """
+        
+        system_msg = "You are an expert tax accountant AI assistant specialized in US tax law for freelancers and small businesses."
+        ai_response = get_openai_response(system_msg, prompt, json_response=True)
+        if not ai_response or not isinstance(ai_response.get('results'), list):
+            return None
+        
+        results = [None] * len(transactions)
+        for result in ai_response['results']:
+            index = result.get('index')
+            category = result.get('category')
+            if not isinstance(index, int) or not 0 <= index < len(transactions) or category not in self.categories:
+                continue
+            results[index] = {
+                'category': category,
+                'deductible_percentage': max(0, min(100, int(result.get('deductibility_percentage') or 0))),
+                'confidence': max(0, min(100, int(result.get('confidence') or 0))),
+            }
+        return results
+    
     def _rule_based_categorization(self, transaction_data: Dict) -> Dict:
         """
         Fallback rule-based categorization when AI is unavailable
@@ -252,82 +336,228 @@ class SmartLedger:
     
     def get_tax_insights(self, transactions: List[Dict]) -> Dict:
         """
-        Generate comprehensive tax insights from transaction history
+        Generate tax insights from a list of transactions that isn't stored in a ledger
+        
+        Transactions without a category are categorized by the keyword rules
+        (no AI calls), then the list is aggregated column by column.
         """
-        total_expenses = sum(t.get('amount', 0) for t in transactions if t.get('amount', 0) < 0)
-        total_income = sum(t.get('amount', 0) for t in transactions if t.get('amount', 0) > 0)
+        prepared = []
+        for transaction in transactions:
+            if not transaction.get('category'):
+                analysis = self._rule_based_categorization(transaction)
+                transaction = dict(
+                    transaction,
+                    category=analysis['category'],
+                    deductible_percentage=analysis['deductible_percentage'],
+                    confidence=analysis['confidence']
+                )
+            prepared.append(transaction)
         
-        # Categorize transactions
-        category_totals = {}
-        total_deductible = 0
-        total_savings = 0
+        months, categories = summarize_transactions(prepared)
+        return self._build_insights(combine_analytics(months, categories), datetime.now().year)
+    
+    def get_ledger_insights(self, user_id: int, tax_year: int) -> Dict:
+        """
+        Generate tax insights for a tax year from the stored ledger
         
-        for transaction in transactions:
-            analysis = self.analyze_transaction(transaction)
-            category = analysis['category']
-            amount = abs(transaction.get('amount', 0))
-            
-            if category not in category_totals:
-                category_totals[category] = 0
-            category_totals[category] += amount
+        Args:
+            user_id: User ID
+            tax_year: Tax year
             
-            if analysis['deductible']:
-                deductible_amount = amount * (analysis['deductible_percentage'] / 100)
-                total_deductible += deductible_amount
-                total_savings += analysis['tax_savings_estimate']
+        Returns:
+            Insights in the same shape as get_tax_insights
+        """
+        insights = self._build_insights(get_ledger_analytics(user_id, tax_year), tax_year)
+        insights['tax_year'] = tax_year
         
-        # Generate insights
-        insights = {
+        # Subscriptions still to be charged this year add to the year's deductions
+        if tax_year == datetime.now().year:
+            recurring = get_recurring_charges(user_id)
+            projected = recurring['projected_remaining_deduction']
+            insights['recurring_charges'] = recurring['charges']
+            insights['summary']['projected_recurring_deductions'] = projected
+            insights['summary']['projected_tax_savings'] = (
+                insights['summary']['estimated_tax_savings'] + self._calculate_tax_savings(projected, 100)
+            )
+        return insights
+    
+    def _build_insights(self, analytics: Dict, tax_year: int) -> Dict:
+        """
+        Assemble the insights payload from ledger analytics
+        """
+        totals = analytics['totals']
+        return {
             'summary': {
-                'total_expenses': abs(total_expenses),
-                'total_income': total_income,
-                'total_deductible': total_deductible,
-                'estimated_tax_savings': total_savings,
-                'average_confidence': 89  # Mock confidence score
+                'total_expenses': totals['expenses'],
+                'total_income': totals['income'],
+                'total_deductible': totals['deductible'],
+                'estimated_tax_savings': round(self._calculate_tax_savings(totals['deductible'], 100), 2),
+                'average_confidence': analytics['confidence_distribution']['average'],
+                'transaction_count': totals['transaction_count']
             },
-            'category_breakdown': category_totals,
-            'recommendations': [
-                {
-                    'type': 'deduction_opportunity',
-                    'title': 'Home Office Deduction',
-                    'description': 'You may qualify for home office deduction if you use part of your home exclusively for business.',
-                    'potential_savings': 340,
-                    'action': 'Track home office usage and expenses'
-                },
-                {
-                    'type': 'missing_documentation',
-                    'title': 'Missing Receipts',
-                    'description': 'Some expenses lack proper documentation for audit protection.',
-                    'potential_risk': 89,
-                    'action': 'Upload receipts for undocumented expenses'
-                },
-                {
-                    'type': 'optimization',
-                    'title': 'Meal Deduction Optimization',
-                    'description': 'Business meals are 50% deductible. Ensure proper documentation.',
-                    'potential_savings': 120,
-                    'action': 'Document business purpose for meal expenses'
-                }
-            ],
-            'upcoming_deadlines': [
-                {
-                    'date': '2025-01-15',
-                    'description': 'Q4 2024 estimated tax payments due',
-                    'type': 'payment'
-                },
-                {
-                    'date': '2025-03-15',
-                    'description': 'File 2024 tax return (with extension)',
-                    'type': 'filing'
-                }
-            ]
+            'category_breakdown': analytics['category_totals'],
+            'deductible_by_category': analytics['deductible_by_category'],
+            'confidence_distribution': analytics['confidence_distribution'],
+            'missing_receipts': analytics['missing_receipts'],
+            'monthly_trends': analytics['monthly_trends'],
+            'recommendations': self._build_recommendations(analytics),
+            'upcoming_deadlines': upcoming_deadlines(tax_year)
         }
+    
+    def _build_recommendations(self, analytics: Dict) -> List[Dict]:
+        """
+        Recommendations backed by the ledger's figures (only those that apply)
+        """
+        recommendations = []
+        missing = analytics['missing_receipts']
+        if missing['count']:
+            recommendations.append({
+                'type': 'missing_documentation',
+                'title': 'Missing Receipts',
+                'description': f"{missing['count']} deductible expenses ({missing['over_threshold']} of "
+                               f"${RECEIPT_THRESHOLD} or more) have no receipt attached.",
+                'potential_risk': round(self._calculate_tax_savings(missing['deductible_amount'], 100), 2),
+                'action': 'Upload receipts for undocumented expenses'
+            })
         
-        return insights
+        low_confidence = analytics['confidence_distribution']['low']
+        if low_confidence:
+            recommendations.append({
+                'type': 'review',
+                'title': 'Review Uncertain Categories',
+                'description': f"{low_confidence} expenses were categorized with low confidence and may be "
+                               f"deducted at the wrong rate.",
+                'action': 'Confirm or correct the categories of flagged transactions'
+            })
+        
+        meals = analytics['deductible_by_category'].get('meals')
+        if meals:
+            recommendations.append({
+                'type': 'optimization',
+                'title': 'Meal Deduction Documentation',
+                'description': f"${meals:,.2f} of business meals is deductible at 50%. Each meal needs its "
+                               f"business purpose and attendees recorded.",
+                'potential_risk': round(self._calculate_tax_savings(meals, 100), 2),
+                'action': 'Document business purpose for meal expenses'
+            })
+        
+        trends = [month for month in analytics['monthly_trends'] if month['transactions']]
+        if len(trends) >= 3:
+            latest = trends[-1]
+            previous = [month['expenses'] for month in trends[:-1]]
+            average = sum(previous) / len(previous)
+            if average and latest['expenses'] > average * 1.5:
+                recommendations.append({
+                    'type': 'spending_change',
+                    'title': 'Spending Increase',
+                    'description': f"Expenses in {latest['month']} were ${latest['expenses']:,.2f}, "
+                                   f"{latest['expenses'] / average:.1f}x the monthly average of ${average:,.2f}.",
+                    'action': 'Check the month for misclassified personal or duplicate charges'
+                })
+        
+        return recommendations
+
+# process_receipt_ocr still returns placeholder data rather than reading the
+# file, so uploads only suggest candidate transactions until OCR is real
+AUTO_LINK_RECEIPTS = False
+
+# Transactions sent to the AI per request during deferred categorization
+AI_BATCH_SIZE = 25
+
+# Upper bound on transactions the AI reviews per deferred run
+AI_MAX_ROWS_PER_RUN = 500
+
+_categorizing = set()
+_categorizing_lock = threading.Lock()
+
+def run_deferred_categorization(user_id: int, max_rows: int = AI_MAX_ROWS_PER_RUN) -> int:
+    """
+    Re-categorize a user's low-confidence ledger transactions with the AI in batches
+    
+    Stops early if the AI is unavailable; the remaining rows stay queued for
+    the next run.
+    
+    Returns:
+        Number of transactions reviewed
+    """
+    ledger = SmartLedger()
+    reviewed = 0
+    
+    while reviewed < max_rows:
+        batch = get_low_confidence_transactions(user_id, min(AI_BATCH_SIZE, max_rows - reviewed))
+        if not batch:
+            break
+        
+        results = ledger.categorize_batch([
+            {'merchant': t.merchant, 'description': t.description, 'amount': float(t.amount)}
+            for t in batch
+        ])
+        if results is None:
+            logging.warning(f"AI categorization unavailable; {len(batch)}+ ledger rows left queued for user {user_id}")
+            break
+        
+        updates = {}
+        for transaction, result in zip(batch, results):
+            # Rows the AI skipped keep their rule-based category but leave the queue
+            result = result or {
+                'category': transaction.category,
+                'deductible_percentage': transaction.deductible_percentage,
+                'confidence': transaction.confidence,
+            }
+            updates[transaction.id] = dict(result, categorized_by='ai')
+        
+        try:
+            recategorize_transactions(user_id, updates)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error saving AI categorization for user {user_id}: {str(e)}")
+            break
+        reviewed += len(batch)
+    
+    return reviewed
+
+def start_deferred_categorization(app, user_id: int) -> bool:
+    """
+    Run deferred AI categorization for a user in a background thread
+    
+    Returns:
+        True if a run was started, False if one is already running
+    """
+    with _categorizing_lock:
+        if user_id in _categorizing:
+            return False
+        _categorizing.add(user_id)
+    
+    def _run():
+        try:
+            with app.app_context():
+                try:
+                    run_deferred_categorization(user_id)
+                finally:
+                    db.session.remove()
+        finally:
+            with _categorizing_lock:
+                _categorizing.discard(user_id)
+    
+    threading.Thread(target=_run, daemon=True).start()
+    return True
 
 # Flask Blueprint for Smart Ledger routes
 smart_ledger_bp = Blueprint('smart_ledger', __name__)
 
+def ledger_login_required(f):
+    """Decorator for ledger API routes: JSON 401 instead of a login redirect for anonymous users"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user or not current_user.is_authenticated:
+            return jsonify({
+                'error': 'AUTHENTICATION_REQUIRED',
+                'message': 'Please log in to use Smart Ledger'
+            }), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 @smart_ledger_bp.route('/smart-ledger')
 def smart_ledger():
     """Smart Ledger main page"""
@@ -375,6 +605,25 @@ def analyze_transaction():
         logging.error(f"Transaction analysis error: {str(e)}")
         return jsonify({'error': 'Analysis failed'}), 500
 
+def _save_receipt_upload(file, user_id=None):
+    """
+    Save an uploaded receipt under uploads/ and return (file_id, file_path)
+
+    Uploads by a logged-in user are recorded against them so the file can
+    later be linked by its ID (the caller commits).
+    """
+    filename = secure_filename(file.filename)
+    file_id = str(uuid.uuid4())
+    file_path = os.path.join('uploads', f"{file_id}_{filename}")
+
+    # Ensure uploads directory exists
+    os.makedirs('uploads', exist_ok=True)
+    file.save(file_path)
+    if user_id is not None:
+        db.session.add(ReceiptUpload(id=file_id, user_id=user_id, original_filename=file.filename[:255],
+                                     file_path=file_path))
+    return file_id, file_path
+
 @smart_ledger_bp.route('/api/upload-receipt', methods=['POST'])
 def upload_receipt():
     """API endpoint for receipt upload and OCR processing"""
@@ -387,13 +636,9 @@ def upload_receipt():
             return jsonify({'error': 'No file selected'}), 400
         
         # Save uploaded file
-        filename = secure_filename(file.filename)
-        file_id = str(uuid.uuid4())
-        file_path = os.path.join('uploads', f"{file_id}_{filename}")
-        
-        # Ensure uploads directory exists
-        os.makedirs('uploads', exist_ok=True)
-        file.save(file_path)
+        user_id = current_user.id if current_user and current_user.is_authenticated else None
+        file_id, file_path = _save_receipt_upload(file, user_id)
+        db.session.commit()
         
         # Process with OCR
         ledger = SmartLedger()
@@ -402,35 +647,239 @@ def upload_receipt():
         if ocr_result:
             # Analyze the extracted transaction
             analysis = ledger.analyze_transaction(ocr_result)
-            
-            return jsonify({
+            response = {
                 'success': True,
                 'file_id': file_id,
                 'extracted_data': ocr_result,
                 'analysis': analysis
-            })
+            }
+
+            # Suggest the ledger transactions the receipt may document
+            if current_user and current_user.is_authenticated:
+                response['match'] = match_receipt(current_user.id, dict(ocr_result, path=file_path),
+                                                  auto_link=AUTO_LINK_RECEIPTS)
+
+            return jsonify(response)
         else:
             return jsonify({'error': 'OCR processing failed'}), 500
             
     except Exception as e:
+        db.session.rollback()
         logging.error(f"Receipt upload error: {str(e)}")
         return jsonify({'error': 'Upload failed'}), 500
 
+@smart_ledger_bp.route('/api/upload-receipts', methods=['POST'])
+@ledger_login_required
+def upload_receipts():
+    """API endpoint for bulk receipt upload, matching every receipt against the ledger"""
+    try:
+        files = [file for file in request.files.getlist('files') if file and file.filename]
+        if not files:
+            return jsonify({'error': 'No files uploaded'}), 400
+
+        ledger = SmartLedger()
+        receipts = []
+        file_ids = {}
+        for file in files:
+            file_id, file_path = _save_receipt_upload(file, current_user.id)
+            file_ids[file_path] = file_id
+            receipts.append(dict(ledger.process_receipt_ocr(file_path) or {}, path=file_path))
+        db.session.commit()
+
+        results = match_receipts(current_user.id, receipts, auto_link=AUTO_LINK_RECEIPTS)
+        for result in results:
+            result['file_id'] = file_ids.get(result.pop('receipt'))
+
+        return jsonify({
+            'success': True,
+            'linked': sum(1 for result in results if result['status'] == 'linked'),
+            'results': results
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Bulk receipt upload error: {str(e)}")
+        return jsonify({'error': 'Upload failed'}), 500
+
+@smart_ledger_bp.route('/api/transactions/<int:transaction_id>/receipt', methods=['POST'])
+@ledger_login_required
+def link_transaction_receipt(transaction_id):
+    """API endpoint linking an uploaded receipt (by file_id) to a transaction the user picked"""
+    try:
+        file_id = str((request.get_json(silent=True) or {}).get('file_id') or '')
+        try:
+            uuid.UUID(file_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid file_id'}), 400
+        upload = ReceiptUpload.query.filter_by(id=file_id, user_id=current_user.id).first()
+        if upload is None:
+            return jsonify({'error': 'Receipt not found'}), 404
+
+        if not link_receipt(current_user.id, transaction_id, upload.file_path):
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Transaction not found or already has a receipt'}), 404
+        db.session.commit()
+        return jsonify({'success': True, 'transaction_id': transaction_id})
+
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Receipt link error: {str(e)}")
+        return jsonify({'error': 'Failed to link receipt'}), 500
+
+@smart_ledger_bp.route('/api/transactions', methods=['POST'])
+@ledger_login_required
+def add_ledger_transactions():
+    """API endpoint for saving one transaction or a batch to the ledger"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No transaction data provided'}), 400
+        transactions = data.get('transactions', [data]) if isinstance(data, dict) else data
+
+        # Transactions that arrive without a category get the rule-based one
+        ledger = SmartLedger()
+        categorized = []
+        for transaction in transactions:
+            if not transaction.get('category'):
+                analysis = ledger._rule_based_categorization(transaction)
+                transaction = dict(
+                    transaction,
+                    category=analysis['category'],
+                    deductible_percentage=analysis['deductible_percentage'],
+                    confidence=analysis['confidence']
+                )
+            elif 'deductible_percentage' not in transaction:
+                category_info = ledger.categories.get(transaction['category'], ledger.categories['personal'])
+                transaction = dict(transaction, deductible_percentage=category_info.get('percentage', 0))
+            categorized.append(transaction)
+
+        count, tax_years = add_transactions(current_user.id, categorized)
+        db.session.commit()
+
+        # The rows are saved; a failed duplicate scan mustn't report them as lost
+        duplicates = None
+        try:
+            duplicates = find_duplicates(current_user.id, tax_years)
+        except Exception as e:
+            logging.error(f"Duplicate scan after adding transactions failed: {str(e)}")
+        return jsonify({'success': True, 'added': count, 'duplicates': duplicates})
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Ledger transaction error: {str(e)}")
+        return jsonify({'error': 'Failed to save transactions'}), 500
+
+@smart_ledger_bp.route('/api/import-statement', methods=['POST'])
+@ledger_login_required
+def import_statement_file():
+    """API endpoint for importing an OFX, QFX or CSV bank statement into the ledger"""
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'error': 'No file uploaded'}), 400
+
+        file_extension = upload.filename.rsplit('.', 1)[-1].lower() if '.' in upload.filename else ''
+        if file_extension not in STATEMENT_EXTENSIONS:
+            return jsonify({'error': 'Upload an .ofx, .qfx or .csv statement'}), 400
+
+        dry_run = str(request.values.get('dry_run', '')).lower() in ('1', 'true', 'yes', 'on')
+        ledger = SmartLedger()
+        report = import_statement(
+            current_user.id, upload.stream, file_extension,
+            ledger._rule_based_categorization, ledger.categories, dry_run=dry_run
+        )
+
+        # The same charges may already be in the ledger from another source.
+        # The import is committed by now, so a failed scan is logged rather than reported as a failed import
+        if report['imported']:
+            report['duplicates'] = None
+            try:
+                report['duplicates'] = find_duplicates(current_user.id, report['tax_years'])
+                report['recurring_charges'] = len(get_recurring_charges(current_user.id)['charges'])
+            except Exception as e:
+                logging.error(f"Duplicate scan after statement import failed: {str(e)}")
+
+        # Low-confidence rows are sent to the AI in the background
+        report['ai_review_started'] = False
+        if report['imported'] and report['low_confidence'] and current_user.has_feature('smart_ledger_ai'):
+            report['ai_review_started'] = start_deferred_categorization(
+                current_app._get_current_object(), current_user.id
+            )
+
+        return jsonify(dict(report, success=report['error_count'] == 0))
+
+    except StatementImportError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Statement import error: {str(e)}")
+        return jsonify({'error': 'Import failed'}), 500
+
+@smart_ledger_bp.route('/api/duplicates')
+@ledger_login_required
+def list_duplicates():
+    """API endpoint listing possible duplicate transactions waiting for review"""
+    try:
+        return jsonify({'success': True, 'duplicates': get_pending_duplicates(current_user.id)})
+
+    except Exception as e:
+        logging.error(f"Duplicate listing error: {str(e)}")
+        return jsonify({'error': 'Failed to load duplicates'}), 500
+
+@smart_ledger_bp.route('/api/duplicates/scan', methods=['POST'])
+@ledger_login_required
+def scan_ledger_duplicates():
+    """API endpoint that rescans the ledger for duplicates"""
+    try:
+        tax_year = request.values.get('tax_year', type=int)
+        result = find_duplicates(current_user.id, [tax_year] if tax_year else None)
+        return jsonify(dict(result, success=True))
+
+    except Exception as e:
+        logging.error(f"Duplicate scan error: {str(e)}")
+        return jsonify({'error': 'Duplicate scan failed'}), 500
+
+@smart_ledger_bp.route('/api/duplicates/<int:candidate_id>/<action>', methods=['POST'])
+@ledger_login_required
+def resolve_ledger_duplicate(candidate_id, action):
+    """API endpoint to merge or dismiss a possible duplicate"""
+    try:
+        if action not in ('merge', 'dismiss'):
+            return jsonify({'success': False, 'error': f'Unknown action: {action}'}), 400
+        if not resolve_duplicate(current_user.id, candidate_id, action):
+            return jsonify({'success': False, 'error': 'Duplicate not found'}), 404
+        return jsonify({'success': True})
+
+    except Exception as e:
+        logging.error(f"Duplicate resolution error: {str(e)}")
+        return jsonify({'error': 'Failed to resolve duplicate'}), 500
+
+@smart_ledger_bp.route('/api/recurring')
+@ledger_login_required
+def list_recurring_charges():
+    """API endpoint listing detected subscriptions and other recurring charges"""
+    try:
+        return jsonify(dict(get_recurring_charges(current_user.id), success=True))
+
+    except Exception as e:
+        logging.error(f"Recurring charge detection error: {str(e)}")
+        return jsonify({'error': 'Failed to detect recurring charges'}), 500
+
 @smart_ledger_bp.route('/api/tax-insights')
+@ledger_login_required
 def get_tax_insights():
     """API endpoint for tax insights generation"""
     try:
-        # Mock transaction data for demo
-        mock_transactions = [
-            {'merchant': 'Office Depot', 'description': 'Office supplies', 'amount': -89.47, 'date': '2024-12-15'},
-            {'merchant': 'Delta Airlines', 'description': 'Business travel', 'amount': -432.89, 'date': '2024-12-12'},
-            {'merchant': 'ABC Corp', 'description': 'Client payment', 'amount': 2500.00, 'date': '2024-12-10'},
-            {'merchant': 'Starbucks', 'description': 'Business meeting', 'amount': -25.50, 'date': '2024-12-08'},
-            {'merchant': 'Amazon Business', 'description': 'Office equipment', 'amount': -156.78, 'date': '2024-12-05'}
-        ]
-        
+        # Default to the latest year with transactions
+        tax_year = request.args.get('tax_year', type=int)
+        if tax_year is None:
+            years = get_ledger_years(current_user.id)
+            tax_year = years[0] if years else datetime.now().year
+
         ledger = SmartLedger()
-        insights = ledger.get_tax_insights(mock_transactions)
+        insights = ledger.get_ledger_insights(current_user.id, tax_year)
         
         return jsonify(insights)
         
@@ -438,6 +887,134 @@ def get_tax_insights():
         logging.error(f"Tax insights error: {str(e)}")
         return jsonify({'error': 'Failed to generate insights'}), 500
 
+@smart_ledger_bp.route('/api/export')
+@ledger_login_required
+def export_ledger():
+    """API endpoint for downloading the whole ledger as a Parquet, Arrow or gzipped CSV snapshot"""
+    try:
+        # Spooled to disk so large ledgers don't sit in memory
+        snapshot = tempfile.TemporaryFile()
+        try:
+            result = export_ledger_snapshot(current_user.id, snapshot, request.args.get('format'))
+        except Exception:
+            snapshot.close()
+            raise
+        snapshot.seek(0)
+
+        extension, mimetype = SNAPSHOT_FORMATS[result['format']]
+        return send_file(
+            snapshot, mimetype=mimetype, as_attachment=True,
+            download_name=f"ledger-{datetime.now().strftime('%Y%m%d')}.{extension}"
+        )
+
+    except LedgerSnapshotError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Ledger export error: {str(e)}")
+        return jsonify({'error': 'Export failed'}), 500
+
+@smart_ledger_bp.route('/api/restore', methods=['POST'])
+@ledger_login_required
+def restore_ledger():
+    """
+    API endpoint for restoring a ledger snapshot
+
+    replace=true deletes the current ledger first; otherwise the snapshot's
+    rows are appended without deduplication. Receipt links in the uploaded
+    file are not restored.
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'error': 'No file uploaded'}), 400
+
+        replace = str(request.values.get('replace', '')).lower() in ('1', 'true', 'yes', 'on')
+        restored = import_ledger_snapshot(current_user.id, upload.stream, replace=replace)
+        db.session.commit()
+        return jsonify({'success': True, 'restored': restored, 'replaced': replace})
+
+    except LedgerSnapshotError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Ledger restore error: {str(e)}")
+        return jsonify({'error': 'Restore failed'}), 500
+
+@smart_ledger_bp.route('/api/mileage')
+@ledger_login_required
+def list_mileage():
+    """API endpoint for a tax year's mileage summary and most recent trips"""
+    try:
+        tax_year = request.args.get('tax_year', datetime.now().year, type=int)
+        limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+        return jsonify({
+            'summary': get_mileage_summary(current_user.id, tax_year),
+            'trips': [trip.to_dict() for trip in get_trips(current_user.id, tax_year, limit)]
+        })
+
+    except Exception as e:
+        logging.error(f"Mileage log error: {str(e)}")
+        return jsonify({'error': 'Failed to load mileage log'}), 500
+
+@smart_ledger_bp.route('/api/mileage', methods=['POST'])
+@ledger_login_required
+def add_mileage_trips():
+    """API endpoint for logging one trip or a batch"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No trip data provided'}), 400
+        trips = data.get('trips', [data]) if isinstance(data, dict) else data
+
+        count = add_trips(current_user.id, trips)
+        db.session.commit()
+        return jsonify({'success': True, 'added': count})
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Mileage trip error: {str(e)}")
+        return jsonify({'error': 'Failed to save trips'}), 500
+
+@smart_ledger_bp.route('/api/mileage/import', methods=['POST'])
+@ledger_login_required
+def import_mileage_file():
+    """API endpoint for importing a trip-tracking app's CSV export"""
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'error': 'No file uploaded'}), 400
+        if not upload.filename.lower().endswith('.csv'):
+            return jsonify({'error': 'Upload a .csv trip export'}), 400
+
+        dry_run = str(request.values.get('dry_run', '')).lower() in ('1', 'true', 'yes', 'on')
+        report = import_trips(current_user.id, upload.stream, dry_run=dry_run)
+        return jsonify(dict(report, success=report['error_count'] == 0))
+
+    except MileageImportError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Mileage import error: {str(e)}")
+        return jsonify({'error': 'Import failed'}), 500
+
+@smart_ledger_bp.route('/api/mileage/<int:trip_id>', methods=['DELETE'])
+@ledger_login_required
+def delete_mileage_trip(trip_id):
+    """API endpoint for deleting a logged trip"""
+    try:
+        if not delete_trips(current_user.id, [trip_id]):
+            return jsonify({'success': False, 'error': 'Trip not found'}), 404
+        db.session.commit()
+        return jsonify({'success': True})
+
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Mileage delete error: {str(e)}")
+        return jsonify({'error': 'Failed to delete trip'}), 500
+
 def init_smart_ledger(app):
     """Initialize Smart Ledger module with Flask app"""
     app.register_blueprint(smart_ledger_bp, url_prefix='/ledger')
@@ -12,7 +12,7 @@ from app.models import User, TaxForm, TaxStrategy, UserPlan
 from app.access_control import requires_access_level
 from ai.tax_strategy import generate_detailed_strategies, get_entity_optimization
 from modules.upgrade_prompts import should_show_upgrade_prompt, get_upgrade_prompt_message
-from modules.export_utils import export_strategy_as_pdf, export_strategy_as_json, export_strategy_as_html
+from modules.export_utils import export_strategy_as_pdf, export_strategy_as_json, export_strategy_as_html, export_all_strategies
 import json
 from datetime import datetime
 
@@ -137,6 +137,18 @@ def export_strategy(strategy_id):
         flash(f"Unsupported export format: {export_format}", "danger")
         return redirect(url_for('tax_strategy.index'))
 
+@tax_strategy_bp.route('/export-all')
+@login_required
+@requires_access_level('export_forms')
+def export_all():
+    """Export every saved strategy as one archive of PDFs"""
+    strategies = TaxStrategy.query.filter_by(user_id=current_user.id).order_by(TaxStrategy.created_at.desc()).all()
+    if not strategies:
+        flash("You don't have any saved strategies to export.", "warning")
+        return redirect(url_for('tax_strategy.index'))
+    
+    return export_all_strategies(current_user.id, strategies)
+
 @tax_strategy_bp.route('/delete/<int:strategy_id>', methods=['POST'])
 @login_required
 def delete_strategy(strategy_id):
@@ -0,0 +1,20 @@
+"""
+Rebuild per-tax-year contractor payment rollups from contractor_payments
+Usage: python rebuild_contractor_rollups.py [user_id]
+"""
+
+import sys
+from app import create_app
+from modules.contractor_rollups import rebuild_rollups
+
+def rebuild(user_id=None):
+    app = create_app()
+    with app.app_context():
+        count = rebuild_rollups(user_id)
+        print(f"Wrote {count} rollup rows")
+        return True
+
+if __name__ == "__main__":
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    success = rebuild(user_id)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,20 @@
+"""
+Rebuild the document full-text search index
+Usage: python rebuild_document_search_index.py [user_id]
+"""
+
+import sys
+from app import create_app
+from modules.document_search import rebuild_index
+
+def rebuild(user_id=None):
+    app = create_app()
+    with app.app_context():
+        count = rebuild_index(user_id)
+        print(f"Indexed {count} documents")
+        return True
+
+if __name__ == "__main__":
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    success = rebuild(user_id)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,20 @@
+"""
+Rebuild per-tax-year mileage totals from mileage_trips
+Usage: python rebuild_mileage_totals.py [user_id]
+"""
+
+import sys
+from app import create_app
+from modules.mileage_log import rebuild_mileage_totals
+
+def rebuild(user_id=None):
+    app = create_app()
+    with app.app_context():
+        count = rebuild_mileage_totals(user_id)
+        print(f"Wrote {count} mileage total rows")
+        return True
+
+if __name__ == "__main__":
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    success = rebuild(user_id)
+    sys.exit(0 if success else 1)
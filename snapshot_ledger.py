@@ -0,0 +1,45 @@
+"""
+Export a user's ledger to a snapshot file, or restore one
+Usage: python snapshot_ledger.py export <user_id> <path> [parquet|arrow|csv]
+       python snapshot_ledger.py restore <user_id> <path> [--replace]
+
+Without --replace, restored rows are appended to the ledger without
+deduplication. Receipt links in the snapshot are kept.
+"""
+
+import sys
+from app import create_app, db
+from modules.ledger_snapshot import export_ledger_snapshot, import_ledger_snapshot
+
+def export(user_id, path, snapshot_format=None):
+    app = create_app()
+    with app.app_context():
+        with open(path, 'wb') as snapshot:
+            result = export_ledger_snapshot(user_id, snapshot, snapshot_format)
+        print(f"Exported {result['rows']} transactions to {path} ({result['format']})")
+        return True
+
+def restore(user_id, path, replace=False):
+    app = create_app()
+    with app.app_context():
+        try:
+            with open(path, 'rb') as snapshot:
+                restored = import_ledger_snapshot(user_id, snapshot, replace=replace, keep_receipts=True)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Restore failed: {e}")
+            return False
+        print(f"Restored {restored} transactions from {path}" + (" (replaced existing ledger)" if replace else ""))
+        return True
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) in (3, 4) and args[0] == 'export':
+        success = export(int(args[1]), args[2], args[3] if len(args) == 4 else None)
+    elif len(args) in (3, 4) and args[0] == 'restore' and args[3:] in ([], ['--replace']):
+        success = restore(int(args[1]), args[2], replace=args[3:] == ['--replace'])
+    else:
+        print(__doc__.strip())
+        sys.exit(1)
+    sys.exit(0 if success else 1)
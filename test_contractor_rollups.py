@@ -0,0 +1,90 @@
+"""
+Tests for contractor payment rollups
+
+Covers incremental rollup updates from payment imports, the cache version
+only moving once the payment write has committed, and the cached summary
+following writes committed on another session.
+"""
+
+import io
+from decimal import Decimal
+
+from app import db
+from app.models import Contractor
+from modules.contractor_payment_import import import_payments
+from modules.contractor_rollups import (
+    CONTRACTORS_SCOPE, apply_payment_deltas, get_rollup_version, get_year_totals, mark_contractors_changed
+)
+from modules.contractor_summary import get_contractor_summary
+
+
+def _contractor(user):
+    contractor = Contractor(user_id=user.id, name='Jane Doe', email='jane@example.com')
+    db.session.add(contractor)
+    db.session.commit()
+    return contractor
+
+
+def test_rollup_version_moves_only_after_commit(user, committed_version):
+    contractor = _contractor(user)
+    before = get_rollup_version(user.id)
+
+    apply_payment_deltas(user.id, {(contractor.id, 2025): (Decimal('400'), 1)})
+    assert committed_version(user.id, CONTRACTORS_SCOPE) == before
+
+    db.session.commit()
+    after = get_rollup_version(user.id)
+    assert after != before
+    assert get_year_totals(user.id, 2025) == {contractor.id: Decimal('400')}
+
+
+def test_rolled_back_write_keeps_rollup_version(user):
+    contractor = _contractor(user)
+    before = get_rollup_version(user.id)
+
+    apply_payment_deltas(user.id, {(contractor.id, 2025): (Decimal('400'), 1)})
+    db.session.rollback()
+    db.session.commit()
+
+    assert get_rollup_version(user.id) == before
+    assert get_year_totals(user.id, 2025) == {}
+
+
+def test_summary_cache_follows_writes_committed_elsewhere(app, user):
+    contractor = _contractor(user)
+    assert get_contractor_summary(user.id)['total_contractors'] == 1
+
+    # A separate app context has its own session, like a request in another worker
+    with app.app_context():
+        apply_payment_deltas(user.id, {(contractor.id, 2025): (Decimal('700'), 1)})
+        db.session.add(Contractor(user_id=user.id, name='John Roe'))
+        mark_contractors_changed(user.id)
+        db.session.commit()
+        db.session.remove()
+
+    summary = get_contractor_summary(user.id)
+    assert summary['total_contractors'] == 2
+    assert summary['years'][2025]['contractors_need_1099'] == 1
+
+
+def test_payment_import_updates_rollups(user):
+    contractor = _contractor(user)
+    csv_content = (
+        "Contractor ID,Amount,Payment Date\n"
+        f"{contractor.id},\"$1,250.00\",2025-01-15\n"
+        f"{contractor.id},300,2024-12-30\n"
+    ).encode('utf-8')
+
+    report = import_payments(user.id, io.BytesIO(csv_content), 'csv')
+    assert report['imported'] is True
+    assert report['total_amount'] == 1550.0
+    assert report['contractors_affected'] == 1
+    assert get_year_totals(user.id, 2025) == {contractor.id: Decimal('1250.00')}
+
+    # One unknown contractor and nothing is saved
+    report = import_payments(user.id, io.BytesIO(
+        b"Email,Amount,Date\njane@example.com,50,2025-02-01\nnobody@example.com,50,2025-02-01\n"
+    ), 'csv')
+    assert report['imported'] is False
+    assert report['errors'] == [{'line': 3, 'error': 'No contractor with email nobody@example.com'}]
+    assert get_year_totals(user.id, 2025) == {contractor.id: Decimal('1250.00')}
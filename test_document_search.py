@@ -0,0 +1,38 @@
+"""
+Tests for document search
+
+Covers snippets for matches found only in the title, and the substring
+fallback taking % and _ in a query literally.
+"""
+
+import uuid
+
+from app import db
+from app.models import Document
+from modules.document_search import SQLiteFTSBackend, SubstringSearchBackend
+
+
+def _document(user, filename, text):
+    document = Document(id=str(uuid.uuid4()), user_id=user.id, original_filename=filename,
+                        unique_filename=filename, file_path=f'uploads/{filename}', extracted_text=text)
+    db.session.add(document)
+    db.session.commit()
+    return document
+
+
+def test_title_only_match_is_highlighted(user):
+    backend = SQLiteFTSBackend()
+    backend.ensure_schema()
+    document = _document(user, 'acme_invoice.pdf', 'Payment received for consulting services')
+    backend.index_document(document)
+
+    [(found, _, snippet)] = backend.search(user.id, 'acme')
+    assert found.id == document.id
+    assert '<mark>acme</mark>' in snippet
+
+
+def test_substring_search_takes_wildcards_literally(user):
+    literal = _document(user, 'w_2.pdf', 'Form w_2 wages')
+    _document(user, 'w92.pdf', 'Form w92 notes')
+
+    assert [found.id for found, _, _ in SubstringSearchBackend().search(user.id, 'w_2')] == [literal.id]
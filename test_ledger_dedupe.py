@@ -0,0 +1,222 @@
+"""
+Tests for ledger duplicate detection
+
+Covers the scan, automatic merging of exact duplicates, queueing of fuzzy
+matches and the review actions, receipts surviving merges, plus the
+add-transactions route reporting saved rows even when the follow-up
+duplicate scan fails.
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from app import db
+from app.models import LedgerDuplicateCandidate, LedgerTransaction
+from modules.ledger_dedupe import find_duplicates, resolve_duplicate, scan_duplicates
+from modules.ledger_store import (
+    LEDGER_SCOPE, add_transactions, clear_transactions, get_category_rollups, get_ledger_version, rebuild_ledger_rollups
+)
+
+
+def _add(user_id, *transactions):
+    """Add transactions with sensible defaults and commit"""
+    rows = [
+        dict({'category': 'office_supplies', 'deductible_percentage': 100, 'source': 'manual'}, **transaction)
+        for transaction in transactions
+    ]
+    count, tax_years = add_transactions(user_id, rows)
+    db.session.commit()
+    return count, tax_years
+
+
+def _ids(user_id):
+    return [row.id for row in LedgerTransaction.query.filter_by(user_id=user_id).order_by(LedgerTransaction.id)]
+
+
+def test_add_transactions_returns_tax_years(user):
+    count, tax_years = _add(
+        user.id,
+        {'date': '2024-12-31', 'amount': -10, 'merchant': 'Staples'},
+        {'date': ' 2025-01-02 ', 'amount': -12, 'merchant': 'Staples'},
+    )
+    assert count == 2
+    assert tax_years == [2024, 2025]
+
+
+def test_ledger_version_moves_only_after_commit(user, committed_version):
+    before = get_ledger_version(user.id)
+    add_transactions(user.id, [{'date': '2025-02-01', 'amount': -10, 'merchant': 'Staples',
+                                'category': 'office_supplies'}])
+    assert committed_version(user.id, LEDGER_SCOPE) == before
+
+    db.session.rollback()
+    assert get_ledger_version(user.id) == before
+
+    _add(user.id, {'date': '2025-02-01', 'amount': -10, 'merchant': 'Staples'})
+    added = get_ledger_version(user.id)
+    assert added != before
+    assert committed_version(user.id, LEDGER_SCOPE) == added
+
+    clear_transactions(user.id)
+    assert committed_version(user.id, LEDGER_SCOPE) == added
+    db.session.commit()
+    assert get_ledger_version(user.id) != added
+
+
+def test_full_rebuild_moves_every_ledger_version(user):
+    _add(user.id, {'date': '2025-02-01', 'amount': -10, 'merchant': 'Staples'})
+    before = get_ledger_version(user.id)
+
+    rebuild_ledger_rollups()
+    assert get_ledger_version(user.id) != before
+    assert get_category_rollups(user.id, 2025)['office_supplies']['count'] == 1
+
+
+def test_same_fitid_reimport_is_merged(user):
+    charge = {'date': '2025-03-04', 'amount': -42.5, 'merchant': 'OFFICE DEPOT #1234',
+              'source': 'import', 'external_id': 'FITID-1'}
+    _add(user.id, charge)
+    _add(user.id, charge)
+
+    exact, fuzzy = scan_duplicates(user.id)
+    assert len(exact) == 1
+    assert fuzzy == []
+
+    result = find_duplicates(user.id, [2025])
+    assert result == {'merged': 1, 'queued': 0}
+    assert len(_ids(user.id)) == 1
+
+    # The rollups only count the surviving copy
+    rollup = get_category_rollups(user.id, 2025)['office_supplies']
+    assert rollup['count'] == 1
+    assert rollup['expenses'] == Decimal('42.50')
+
+
+def test_same_charge_from_another_source_keeps_user_categorized_copy(user):
+    _add(
+        user.id,
+        {'date': '2025-05-01', 'amount': -89.99, 'merchant': 'Adobe', 'source': 'import'},
+        {'date': '2025-05-01', 'amount': -89.99, 'merchant': 'ADOBE', 'source': 'manual',
+         'category': 'software', 'categorized_by': 'user'},
+    )
+
+    assert find_duplicates(user.id) == {'merged': 1, 'queued': 0}
+    survivor = LedgerTransaction.query.filter_by(user_id=user.id).one()
+    assert survivor.source == 'manual'
+    assert survivor.categorized_by == 'user'
+
+
+def test_similar_charges_are_queued_not_merged(user):
+    _add(
+        user.id,
+        {'date': '2025-06-10', 'amount': -15.75, 'merchant': 'Starbucks Coffee'},
+        {'date': '2025-06-11', 'amount': -15.75, 'merchant': 'STARBUCKS COFFEE #0421', 'source': 'import'},
+    )
+
+    exact, fuzzy = scan_duplicates(user.id)
+    assert exact == []
+    assert [reason for _, _, _, reason in fuzzy] == ['nearby_date']
+
+    assert find_duplicates(user.id) == {'merged': 0, 'queued': 1}
+    assert len(_ids(user.id)) == 2
+    assert LedgerDuplicateCandidate.query.filter_by(user_id=user.id, status='pending').count() == 1
+
+
+def test_unrelated_or_distant_charges_are_not_duplicates(user):
+    _add(
+        user.id,
+        {'date': '2025-07-01', 'amount': -20, 'merchant': 'Uber'},
+        {'date': '2025-07-01', 'amount': -21, 'merchant': 'Uber'},
+        {'date': '2025-07-20', 'amount': -20, 'merchant': 'Uber', 'source': 'import'},
+        {'date': '2025-07-01', 'amount': -20, 'merchant': 'Chipotle', 'source': 'import'},
+    )
+
+    assert scan_duplicates(user.id) == ([], [])
+    assert find_duplicates(user.id) == {'merged': 0, 'queued': 0}
+
+
+def test_dismissed_pair_is_not_queued_again(user):
+    _add(
+        user.id,
+        {'date': '2025-08-01', 'amount': -60, 'merchant': 'Delta Airlines'},
+        {'date': '2025-08-02', 'amount': -60, 'merchant': 'Delta', 'source': 'import'},
+    )
+    find_duplicates(user.id)
+    candidate = LedgerDuplicateCandidate.query.filter_by(user_id=user.id).one()
+
+    assert resolve_duplicate(user.id, candidate.id, 'dismiss') is True
+    assert resolve_duplicate(user.id, candidate.id, 'dismiss') is False
+
+    assert find_duplicates(user.id) == {'merged': 0, 'queued': 0}
+    assert LedgerDuplicateCandidate.query.filter_by(user_id=user.id, status='pending').count() == 0
+    assert len(_ids(user.id)) == 2
+
+
+def test_merging_a_candidate_deletes_the_duplicate(user):
+    _add(
+        user.id,
+        {'date': '2025-09-01', 'amount': -30, 'merchant': 'Shell Oil'},
+        {'date': '2025-09-03', 'amount': -30, 'merchant': 'Shell', 'source': 'import'},
+    )
+    find_duplicates(user.id)
+    candidate = LedgerDuplicateCandidate.query.filter_by(user_id=user.id).one()
+    duplicate_id, survivor_id = candidate.transaction_id, candidate.duplicate_of_id
+
+    assert resolve_duplicate(user.id, candidate.id, 'merge') is True
+    assert _ids(user.id) == [survivor_id]
+    assert db.session.get(LedgerTransaction, duplicate_id) is None
+
+
+def _attach_receipt(transaction_id, receipt_path):
+    LedgerTransaction.query.filter_by(id=transaction_id).update(
+        {'receipt_path': receipt_path, 'receipt_matched_by': 'user'}
+    )
+    db.session.commit()
+
+
+def test_merges_keep_the_receipt(user):
+    _add(
+        user.id,
+        {'date': '2025-05-01', 'amount': -89.99, 'merchant': 'ADOBE', 'source': 'manual',
+         'category': 'software', 'categorized_by': 'user'},
+        {'date': '2025-05-01', 'amount': -89.99, 'merchant': 'Adobe', 'source': 'import'},
+        {'date': '2025-09-01', 'amount': -30, 'merchant': 'Shell Oil'},
+        {'date': '2025-09-03', 'amount': -30, 'merchant': 'Shell', 'source': 'import'},
+    )
+    adobe_import = LedgerTransaction.query.filter_by(user_id=user.id, merchant='Adobe').one()
+    shell_import = LedgerTransaction.query.filter_by(user_id=user.id, merchant='Shell').one()
+    _attach_receipt(adobe_import.id, 'uploads/a_adobe.pdf')
+    _attach_receipt(shell_import.id, 'uploads/b_shell.pdf')
+
+    # Exact duplicates: the copy with the receipt survives
+    assert find_duplicates(user.id) == {'merged': 1, 'queued': 1}
+    assert db.session.get(LedgerTransaction, adobe_import.id).receipt_path == 'uploads/a_adobe.pdf'
+
+    # Reviewed merge: the receipt moves onto the kept transaction
+    candidate = LedgerDuplicateCandidate.query.filter_by(user_id=user.id).one()
+    duplicate_id, survivor_id = candidate.transaction_id, candidate.duplicate_of_id
+    assert duplicate_id == shell_import.id
+    assert resolve_duplicate(user.id, candidate.id, 'merge') is True
+    survivor = db.session.get(LedgerTransaction, survivor_id)
+    assert (survivor.merchant, survivor.receipt_path) == ('Shell Oil', 'uploads/b_shell.pdf')
+
+
+def test_resolve_duplicate_rejects_unknown_action(user):
+    with pytest.raises(ValueError):
+        resolve_duplicate(user.id, 1, 'ignore')
+
+
+def test_failed_duplicate_scan_still_reports_saved_transactions(client, user, monkeypatch):
+    def _fail(*args, **kwargs):
+        raise RuntimeError('scan failed')
+
+    monkeypatch.setattr('modules.smart_ledger.find_duplicates', _fail)
+    response = client.post('/ledger/api/transactions', json={'transactions': [
+        {'date': '2025-10-01', 'amount': -25, 'merchant': 'Staples', 'category': 'office_supplies'},
+    ]})
+
+    assert response.status_code == 200
+    assert response.get_json()['added'] == 1
+    assert response.get_json()['duplicates'] is None
+    assert LedgerTransaction.query.filter_by(user_id=user.id).count() == 1
@@ -0,0 +1,142 @@
+"""
+Tests for bank statement imports
+
+Covers merchant name normalization, booking card payments, transfers and
+refunds outside income, and the all-or-nothing OFX/CSV import report.
+"""
+
+import io
+from decimal import Decimal
+
+import pytest
+
+from app.models import LedgerTransaction
+from modules.ledger_import import StatementImportError, import_statement, normalize_merchant
+from modules.ledger_store import get_category_rollups
+
+
+CARD_OFX = b"""OFXHEADER:100
+DATA:OFXSGML
+<OFX><CREDITCARDMSGSRSV1><CCSTMTTRNRS><CCSTMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250305120000<TRNAMT>-120.00<FITID>c1<NAME>VISA PURCHASE OFFICE DEPOT #1234</STMTTRN>
+<STMTTRN><TRNTYPE>PAYMENT<DTPOSTED>20250310<TRNAMT>500.00<FITID>c2<NAME>PAYMENT THANK YOU</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250312<TRNAMT>20.00<FITID>c3<NAME>OFFICE DEPOT #1234</STMTTRN>
+</BANKTRANLIST></CCSTMTRS></CCSTMTTRNRS></CREDITCARDMSGSRSV1></OFX>
+"""
+
+BANK_OFX = b"""<?xml version="1.0"?>
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DIRECTDEP</TRNTYPE><DTPOSTED>20250401</DTPOSTED><TRNAMT>2500.00</TRNAMT><FITID>b1</FITID><NAME>ACME CLIENT LLC</NAME></STMTTRN>
+<STMTTRN><TRNTYPE>XFER</TRNTYPE><DTPOSTED>20250402</DTPOSTED><TRNAMT>300.00</TRNAMT><FITID>b2</FITID><NAME>FROM SAVINGS</NAME></STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20250403</DTPOSTED><TRNAMT>75.00</TRNAMT><FITID>b3</FITID><NAME>Online Transfer from CHK 1234</NAME></STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def _import(user, content, extension, **kwargs):
+    # Imported here: smart_ledger builds its OpenAI client at import time
+    from modules.smart_ledger import SmartLedger
+    ledger = SmartLedger()
+    return import_statement(
+        user.id, io.BytesIO(content), extension,
+        ledger._rule_based_categorization, ledger.categories, **kwargs
+    )
+
+
+def _categories(user):
+    return {
+        row.external_id or row.merchant: row.category
+        for row in LedgerTransaction.query.filter_by(user_id=user.id)
+    }
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('Web Services Inc', 'Web Services Inc'),
+    ('Visa Inc', 'Visa Inc'),
+    ('ACH Foods', 'ACH Foods'),
+    ('Recurring Payment Netflix', 'Recurring Payment Netflix'),
+    ('POSITIVE ENERGY', 'Positive Energy'),
+    ('VISA PURCHASE AMAZON MKTPLACE', 'Amazon Mktplace'),
+    ('POS STARBUCKS #1234', 'Starbucks'),
+    ('WEB*NETFLIX.COM', 'Netflix.Com'),
+    ('ACH DEBIT COMCAST', 'Comcast'),
+    ('PURCHASE 0412 STARBUCKS', 'Starbucks'),
+    ('CHECKCARD 0412 SHELL OIL 12345678', 'Shell Oil'),
+    ('Debit Card Purchase Target 00012345', 'Target'),
+    ('SQ *BLUE BOTTLE', 'Blue Bottle'),
+    ('RECURRING *SPOTIFY', 'Spotify'),
+])
+def test_normalize_merchant(raw, expected):
+    assert normalize_merchant(raw) == expected
+
+
+def test_card_payments_and_refunds_are_not_income(user):
+    report = _import(user, CARD_OFX, 'ofx')
+
+    assert report['imported'] is True
+    assert report['valid_rows'] == 3
+    assert report['total_income'] == 0
+    assert report['total_expenses'] == 120.0
+    assert _categories(user) == {'c1': 'office_supplies', 'c2': 'transfer', 'c3': 'refund'}
+
+    rollups = get_category_rollups(user.id, 2025)
+    assert sum(rollup['income'] for rollup in rollups.values()) == 0
+    assert rollups['transfer']['count'] == 1
+
+
+def test_bank_deposits_are_income_but_transfers_are_not(user):
+    report = _import(user, BANK_OFX, 'ofx')
+
+    assert report['total_income'] == 2500.0
+    assert _categories(user) == {'b1': 'income', 'b2': 'transfer', 'b3': 'transfer'}
+    assert get_category_rollups(user.id, 2025)['income']['income'] == Decimal('2500.00')
+
+
+def test_csv_type_column_books_payments_and_returns(user):
+    csv_content = (
+        b"Transaction Date,Description,Type,Amount\n"
+        b"03/01/2025,STAPLES 00123,Sale,-45.10\n"
+        b"03/02/2025,AUTOMATIC PAYMENT,Payment,200.00\n"
+        b"03/03/2025,STAPLES 00123,Return,15.00\n"
+        b"03/04/2025,ACME CLIENT LLC,Credit,900.00\n"
+    )
+    report = _import(user, csv_content, 'csv')
+
+    assert report['imported'] is True
+    assert report['total_income'] == 900.0
+    assert report['total_expenses'] == 45.1
+    categories = _categories(user)
+    assert categories['Automatic Payment'] == 'transfer'
+    assert categories['Acme Client Llc'] == 'income'
+    assert sorted(categories.values()).count('refund') == 1
+
+
+def test_invalid_row_rejects_the_whole_import(user):
+    csv_content = (
+        b"Date,Payee,Debit,Credit\n"
+        b"2025-01-05,Staples,45.10,\n"
+        b"not a date,Staples,12.00,\n"
+        b"2025-01-07,Client,,300.00\n"
+    )
+    report = _import(user, csv_content, 'csv')
+
+    assert report['imported'] is False
+    assert report['valid_rows'] == 2
+    assert report['errors'] == [{'line': 3, 'error': 'Invalid date: not a date'}]
+    assert LedgerTransaction.query.filter_by(user_id=user.id).count() == 0
+
+
+def test_dry_run_saves_nothing(user):
+    report = _import(user, CARD_OFX, 'ofx', dry_run=True)
+
+    assert report['dry_run'] is True
+    assert report['imported'] is False
+    assert report['valid_rows'] == 3
+    assert LedgerTransaction.query.filter_by(user_id=user.id).count() == 0
+
+
+def test_unreadable_statements_raise(user):
+    with pytest.raises(StatementImportError):
+        _import(user, b"Payee,Amount\nStaples,-4.00\n", 'csv')
+    with pytest.raises(StatementImportError):
+        _import(user, b"%PDF-1.4", 'pdf')
@@ -0,0 +1,65 @@
+"""
+Tests for ledger snapshots
+
+Covers an export/restore round trip, appending versus replacing on restore,
+and receipt links being kept only for trusted (CLI) restores.
+"""
+
+import io
+
+from app import db
+from app.models import LedgerTransaction
+from modules.ledger_snapshot import export_ledger_snapshot, import_ledger_snapshot
+from modules.ledger_store import add_transactions, get_category_rollups
+
+
+def _snapshot(user):
+    add_transactions(user.id, [
+        {'date': '2025-05-01', 'amount': -89.99, 'merchant': 'Adobe', 'category': 'software',
+         'deductible_percentage': 100},
+        {'date': '2025-05-02', 'amount': 1200, 'merchant': 'Acme Client', 'category': 'income'},
+    ])
+    db.session.commit()
+    LedgerTransaction.query.filter_by(user_id=user.id, merchant='Adobe').update(
+        {'receipt_path': 'uploads/abc_adobe.pdf', 'receipt_matched_by': 'user'}
+    )
+    db.session.commit()
+
+    snapshot = io.BytesIO()
+    result = export_ledger_snapshot(user.id, snapshot, 'csv')
+    assert result['rows'] == 2
+    return snapshot.getvalue()
+
+
+def _receipts(user):
+    return sorted(
+        (row.receipt_path or '', row.receipt_matched_by or '')
+        for row in LedgerTransaction.query.filter_by(user_id=user.id, merchant='Adobe')
+    )
+
+
+def test_trusted_restore_keeps_receipts(user):
+    snapshot = _snapshot(user)
+
+    assert import_ledger_snapshot(user.id, io.BytesIO(snapshot), replace=True, keep_receipts=True) == 2
+    db.session.commit()
+
+    assert _receipts(user) == [('uploads/abc_adobe.pdf', 'user')]
+    assert get_category_rollups(user.id, 2025)['software']['count'] == 1
+
+
+def test_api_restore_drops_receipts_and_appends_without_dedupe(client, user):
+    snapshot = _snapshot(user)
+
+    response = client.post('/ledger/api/restore', data={'file': (io.BytesIO(snapshot), 'ledger.csv.gz')})
+    assert response.status_code == 200
+    assert response.get_json() == {'success': True, 'restored': 2, 'replaced': False}
+    assert LedgerTransaction.query.filter_by(user_id=user.id).count() == 4
+    assert _receipts(user) == [('', ''), ('uploads/abc_adobe.pdf', 'user')]
+
+    response = client.post('/ledger/api/restore', data={
+        'file': (io.BytesIO(snapshot), 'ledger.csv.gz'), 'replace': 'true'
+    })
+    assert response.get_json()['restored'] == 2
+    assert _receipts(user) == [('', '')]
+    assert get_category_rollups(user.id, 2025)['software']['count'] == 1
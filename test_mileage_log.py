@@ -0,0 +1,122 @@
+"""
+Tests for the mileage log
+
+Covers trip-app CSV imports (skipping trips already logged, the
+all-or-nothing error report and non-UTF-8 exports), yearly totals kept in
+step with inserts and deletes, and the totals fallback for databases without
+an upsert.
+"""
+
+import io
+
+import pytest
+
+from app.models import MileageTrip
+from modules.mileage_log import (
+    MileageImportError, delete_trips, get_mileage_summary, import_trips, rebuild_mileage_totals
+)
+
+MILEIQ_EXPORT = (
+    "Date,Distance (mi),Classification,Purpose,From,To\n"
+    "2025-02-03,12.4,Business,Client visit,Office,Acme HQ\n"
+    "2025-02-04,8,Personal,,Home,Gym\n"
+    "02/05/2025,30.3 mi,Business,,Office,Airport\n"
+)
+
+
+def _import(user, content, **kwargs):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return import_trips(user.id, io.BytesIO(content), **kwargs)
+
+
+def _summary(user):
+    return {
+        key: value for key, value in get_mileage_summary(user.id, 2025).items()
+        if key in ('trip_count', 'business_miles', 'personal_miles', 'undocumented_trips')
+    }
+
+
+def test_import_updates_yearly_totals(user):
+    report = _import(user, MILEIQ_EXPORT)
+
+    assert report['imported'] is True
+    assert report['valid_rows'] == 3
+    assert report['business_miles'] == 42.7
+    assert report['tax_years'] == [2025]
+    assert _summary(user) == {'trip_count': 3, 'business_miles': 42.7, 'personal_miles': 8.0, 'undocumented_trips': 1}
+
+
+def test_reimport_skips_logged_trips(user):
+    _import(user, MILEIQ_EXPORT)
+    report = _import(user, MILEIQ_EXPORT + "2025-02-06,5,Business,Bank run,Office,Bank\n")
+
+    assert report['duplicates_skipped'] == 3
+    assert report['valid_rows'] == 1
+    assert MileageTrip.query.filter_by(user_id=user.id).count() == 4
+    assert _summary(user)['trip_count'] == 4
+
+
+def test_invalid_row_rejects_the_whole_import(user):
+    report = _import(user, MILEIQ_EXPORT + "2025-02-07,4500,Business,Odometer,Office,Office\nsoon,3,,,,\n")
+
+    assert report['imported'] is False
+    assert report['error_count'] == 2
+    assert [error['line'] for error in report['errors']] == [5, 6]
+    assert MileageTrip.query.filter_by(user_id=user.id).count() == 0
+    assert _summary(user)['trip_count'] == 0
+
+
+def test_dry_run_saves_nothing(user):
+    report = _import(user, MILEIQ_EXPORT, dry_run=True)
+
+    assert report['imported'] is False
+    assert report['valid_rows'] == 3
+    assert MileageTrip.query.filter_by(user_id=user.id).count() == 0
+
+
+def test_cp1252_export_is_read(user):
+    report = _import(user, "Date,Miles,Purpose\n2025-03-01,7,Café meeting\n".encode('cp1252'))
+
+    assert report['imported'] is True
+    trip = MileageTrip.query.filter_by(user_id=user.id).one()
+    assert trip.purpose.startswith('Caf')
+
+
+def test_export_without_miles_column_is_rejected(user):
+    with pytest.raises(MileageImportError):
+        _import(user, "Date,Purpose\n2025-03-01,Client visit\n")
+
+
+def test_import_route_reports_bad_encoding_as_a_normal_import(client, user):
+    response = client.post('/ledger/api/mileage/import', data={
+        'file': (io.BytesIO("Date,Miles,Purpose\n2025-03-01,7,Résumé drop-off\n".encode('cp1252')), 'trips.csv')
+    })
+
+    assert response.status_code == 200
+    assert response.get_json()['success'] is True
+
+    response = client.post('/ledger/api/mileage/import', data={
+        'file': (io.BytesIO(b"Date,Notes\n2025-03-01,x\n"), 'trips.csv')
+    })
+    assert response.status_code == 400
+
+
+def test_delete_and_rebuild_agree(user):
+    _import(user, MILEIQ_EXPORT)
+    trip = MileageTrip.query.filter_by(user_id=user.id, purpose=None, business=True).one()
+
+    assert delete_trips(user.id, [trip.id]) == 1
+    after_delete = _summary(user)
+    assert after_delete == {'trip_count': 2, 'business_miles': 12.4, 'personal_miles': 8.0, 'undocumented_trips': 0}
+
+    rebuild_mileage_totals(user.id)
+    assert _summary(user) == after_delete
+
+
+def test_totals_without_upsert_support(user, monkeypatch):
+    monkeypatch.setattr('modules.db_utils.dialect_insert', lambda: None)
+    _import(user, MILEIQ_EXPORT)
+    _import(user, "Date,Miles\n2025-04-01,10\n")
+
+    assert _summary(user) == {'trip_count': 4, 'business_miles': 52.7, 'personal_miles': 8.0, 'undocumented_trips': 2}
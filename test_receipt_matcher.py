@@ -0,0 +1,81 @@
+"""
+Tests for receipt matching
+
+Covers candidate lookup for a receipt, linking a receipt moving the ledger
+version so cached analytics stop reporting it as missing, and uploads only
+being linkable by the user who uploaded them.
+"""
+
+import uuid
+
+from app import db
+from app.models import LedgerTransaction, ReceiptUpload, User
+from modules.ledger_analytics import get_ledger_analytics
+from modules.ledger_store import LEDGER_SCOPE, add_transactions, get_ledger_version
+from modules.receipt_matcher import find_receipt_candidates, link_receipt
+
+
+def _expense(user):
+    add_transactions(user.id, [{'date': '2025-06-03', 'amount': -64.20, 'merchant': 'Office Depot',
+                                'category': 'office_supplies', 'deductible_percentage': 100}])
+    db.session.commit()
+    return LedgerTransaction.query.filter_by(user_id=user.id).one()
+
+
+def test_candidates_within_amount_and_date_window(user):
+    expense = _expense(user)
+
+    candidates = find_receipt_candidates(user.id, {'amount': '64.00', 'date': '2025-06-01', 'merchant': 'OFFICE DEPOT'})
+    assert [row.id for _, row in candidates] == [expense.id]
+    assert find_receipt_candidates(user.id, {'amount': '64.00', 'date': '2025-06-20'}) == []
+
+
+def test_link_bumps_ledger_version_after_commit(user, committed_version):
+    expense = _expense(user)
+    before = get_ledger_version(user.id)
+
+    assert link_receipt(user.id, expense.id, 'uploads/a_receipt.pdf') is True
+    assert committed_version(user.id, LEDGER_SCOPE) == before
+    db.session.rollback()
+    assert get_ledger_version(user.id) == before
+
+    assert link_receipt(user.id, expense.id, 'uploads/a_receipt.pdf') is True
+    db.session.commit()
+    assert get_ledger_version(user.id) != before
+
+    # Already linked: nothing changes
+    linked = get_ledger_version(user.id)
+    assert link_receipt(user.id, expense.id, 'uploads/b_receipt.pdf') is False
+    db.session.commit()
+    assert get_ledger_version(user.id) == linked
+
+
+def _upload(user_id):
+    upload = ReceiptUpload(id=str(uuid.uuid4()), user_id=user_id, original_filename='receipt.pdf',
+                           file_path='uploads/receipt.pdf')
+    db.session.add(upload)
+    db.session.commit()
+    return upload.id
+
+
+def test_linking_through_the_api_refreshes_cached_analytics(client, user):
+    expense = _expense(user)
+    assert get_ledger_analytics(user.id, 2025)['missing_receipts']['count'] == 1
+
+    response = client.post(f'/ledger/api/transactions/{expense.id}/receipt', json={'file_id': _upload(user.id)})
+
+    assert response.status_code == 200
+    assert db.session.get(LedgerTransaction, expense.id).receipt_path == 'uploads/receipt.pdf'
+    assert get_ledger_analytics(user.id, 2025)['missing_receipts']['count'] == 0
+
+
+def test_another_users_upload_cannot_be_linked(client, user):
+    expense = _expense(user)
+    other = User(username='other', email='other@example.com')
+    db.session.add(other)
+    db.session.commit()
+
+    response = client.post(f'/ledger/api/transactions/{expense.id}/receipt', json={'file_id': _upload(other.id)})
+
+    assert response.status_code == 404
+    assert db.session.get(LedgerTransaction, expense.id).receipt_path is None
@@ -0,0 +1,47 @@
+"""
+Tests for recurring charge detection
+
+Covers a monthly subscription being detected and the cached result being
+refreshed when another request commits ledger changes.
+"""
+
+from datetime import date, timedelta
+
+from app import db
+from modules.ledger_store import add_transactions
+from modules.recurring_charges import detect_recurring_charges, get_recurring_charges
+
+
+def _subscription(user_id, merchant, amount, dates):
+    add_transactions(user_id, [
+        {'date': day.isoformat(), 'amount': amount, 'merchant': merchant,
+         'category': 'software', 'deductible_percentage': 100}
+        for day in dates
+    ])
+    db.session.commit()
+
+
+def _recent_months(count):
+    """Charge dates 30 days apart, the latest one last week"""
+    last = date.today() - timedelta(days=7)
+    return [last - timedelta(days=30 * months_back) for months_back in range(count)]
+
+
+def test_monthly_subscription_is_detected(user):
+    _subscription(user.id, 'Adobe', -54.99, [date(2026, month, 5) for month in (6, 7, 8, 9)])
+
+    charges = detect_recurring_charges(user.id, as_of=date(2026, 10, 1))['charges']
+    assert [(charge['cadence'], charge['amount']) for charge in charges] == [('monthly', 54.99)]
+    assert charges[0]['next_date'] == '2026-10-05'
+
+
+def test_cache_follows_writes_committed_elsewhere(app, user):
+    _subscription(user.id, 'Adobe', -54.99, _recent_months(4))
+    assert len(get_recurring_charges(user.id)['charges']) == 1
+
+    # A separate app context has its own session, like a request in another worker
+    with app.app_context():
+        _subscription(user.id, 'Dropbox', -11.99, _recent_months(3))
+        db.session.remove()
+
+    assert len(get_recurring_charges(user.id)['charges']) == 2
@@ -0,0 +1,28 @@
+"""
+Validate contractor TINs and write a duplicate-payee merge plan as JSON
+Usage: python validate_contractor_tins.py [user_id] [output.json]
+"""
+
+import json
+import sys
+from app import create_app
+from modules.contractor_tin_validation import validate_contractors
+
+def validate(user_id=None, output_path=None):
+    app = create_app()
+    with app.app_context():
+        report = validate_contractors(user_id)
+        print(f"Checked {report['contractors_checked']} contractors: "
+              f"{report['invalid_count']} invalid TINs, {report['duplicate_groups']} duplicate groups")
+
+        if output_path:
+            with open(output_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written to {output_path}")
+        return True
+
+if __name__ == "__main__":
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else None
+    output_path = sys.argv[-1] if len(sys.argv) > 1 and sys.argv[-1].endswith('.json') else None
+    success = validate(user_id, output_path)
+    sys.exit(0 if success else 1)